@@ -0,0 +1,127 @@
+import os
+import re
+import time
+import shutil
+import hashlib
+import logging
+from typing import Optional, Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "data/artifacts")
+ARTIFACT_RETENTION_HOURS = float(os.getenv("ARTIFACT_RETENTION_HOURS", "72"))
+ARTIFACT_SUMMARY_CHARS = int(os.getenv("ARTIFACT_SUMMARY_CHARS", "300"))
+
+# Artifact ids are short hex strings so output cleaning (which strips UUIDs) never touches references
+ARTIFACT_REFERENCE_PATTERN = re.compile(r"\{\{artifact:([0-9a-f]{12})\}\}")
+
+
+class ArtifactStore:
+    """
+    Stores intermediate outputs of an execution on disk under data/artifacts/{execution_id}/.
+    Prompts carry short {{artifact:<id>}} references and summaries instead of full outputs;
+    expand_references() assembles the final text server-side from the stored artifacts.
+    """
+    def __init__(
+        self,
+        directory: str = ARTIFACT_DIR,
+        retention_hours: float = ARTIFACT_RETENTION_HOURS,
+        summary_chars: int = ARTIFACT_SUMMARY_CHARS
+    ):
+        self.directory = directory
+        self.retention_seconds = retention_hours * 3600
+        self.summary_chars = summary_chars
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _execution_dir(self, execution_id: str) -> str:
+        if not execution_id or os.sep in execution_id or ".." in execution_id:
+            raise ValueError(f"Invalid execution id: {execution_id}")
+        return os.path.join(self.directory, execution_id)
+
+    def _path(self, execution_id: str, artifact_id: str) -> str:
+        return os.path.join(self._execution_dir(execution_id), f"{artifact_id}.txt")
+
+    @staticmethod
+    def artifact_id(key: str) -> str:
+        """Derives a stable artifact id from a key such as a step id."""
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+    @staticmethod
+    def reference(artifact_id: str) -> str:
+        return f"{{{{artifact:{artifact_id}}}}}"
+
+    def summarize(self, content: str) -> str:
+        """Returns a short single-paragraph preview of an artifact."""
+        text = re.sub(r"\s+", " ", content or "").strip()
+        if len(text) <= self.summary_chars:
+            return text
+        return f"{text[:self.summary_chars].rstrip()}... ({len(content)} chars)"
+
+    def put(self, execution_id: str, key: str, content: str) -> Dict[str, Any]:
+        """Stores an artifact and returns its reference metadata."""
+        artifact_id = self.artifact_id(key)
+        os.makedirs(self._execution_dir(execution_id), exist_ok=True)
+        path = self._path(execution_id, artifact_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content or "")
+        os.replace(tmp_path, path)
+        return {
+            "id": artifact_id,
+            "key": key,
+            "size": len(content or ""),
+            "summary": self.summarize(content),
+            "reference": self.reference(artifact_id)
+        }
+
+    def path(self, execution_id: str, artifact_id: str) -> Optional[str]:
+        """Returns the file path of an existing artifact, for streaming it back without loading it."""
+        if not re.fullmatch(r"[0-9a-f]{12}", artifact_id or ""):
+            return None
+        path = self._path(execution_id, artifact_id)
+        return path if os.path.exists(path) else None
+
+    def get(self, execution_id: str, artifact_id: str) -> Optional[str]:
+        """Returns an artifact's content, or None if it does not exist."""
+        path = self._path(execution_id, artifact_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+
+    def resolve_references(self, execution_id: str, text: str) -> Tuple[str, int]:
+        """Replaces {{artifact:<id>}} references with the stored artifact contents; also returns how many resolved."""
+        resolved = 0
+
+        def replace(match):
+            nonlocal resolved
+            content = self.get(execution_id, match.group(1))
+            if content is None:
+                logger.warning(f"Unknown artifact reference {match.group(0)} (Execution ID: {execution_id})")
+                return match.group(0)
+            resolved += 1
+            return content
+        return ARTIFACT_REFERENCE_PATTERN.sub(replace, text or ""), resolved
+
+    def expand_references(self, execution_id: str, text: str) -> str:
+        """Replaces {{artifact:<id>}} references with the stored artifact contents."""
+        return self.resolve_references(execution_id, text)[0]
+
+    def delete_execution(self, execution_id: str):
+        shutil.rmtree(self._execution_dir(execution_id), ignore_errors=True)
+
+    def purge_expired(self) -> int:
+        """Deletes artifact directories not modified within the retention window."""
+        cutoff = time.time() - self.retention_seconds
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            logger.info(f"Purged {removed} expired artifact directories from {self.directory}")
+        return removed
@@ -0,0 +1,193 @@
+import io
+import os
+import csv
+import json
+import uuid
+import shutil
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+BATCH_DIR = os.getenv("BATCH_DIR", "data/batches")
+BATCH_RETENTION_HOURS = float(os.getenv("BATCH_RETENTION_HOURS", "72"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+BATCH_DEFAULT_CONCURRENCY = int(os.getenv("BATCH_DEFAULT_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+# Columns / keys holding the input when a CSV row or JSONL object has several fields
+INPUT_FIELDS = ["input", "userInput", "user_input"]
+
+
+def item_input(item: Any, input_field: Optional[str] = None) -> str:
+    """The agent input of a batch item: strings as-is, objects by their input field or as JSON."""
+    if isinstance(item, dict):
+        for field in ([input_field] if input_field else []) + INPUT_FIELDS:
+            if field in item:
+                return str(item[field])
+        if len(item) == 1:
+            return str(next(iter(item.values())))
+        return json.dumps(item, ensure_ascii=False)
+    if isinstance(item, str):
+        return item
+    return json.dumps(item, ensure_ascii=False)
+
+
+def parse_batch_file(filename: str, data: bytes, input_field: Optional[str] = None) -> List[str]:
+    """
+    Reads batch inputs from an uploaded CSV (one row per item, with a header) or JSONL (one JSON
+    value per line) file. Raises ValueError for other formats or malformed content.
+    """
+    text = data.decode("utf-8-sig", errors="replace")
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension == ".csv":
+        return [item_input(dict(row), input_field) for row in csv.DictReader(io.StringIO(text))]
+    if extension in [".jsonl", ".ndjson"]:
+        inputs = []
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                inputs.append(item_input(json.loads(line), input_field))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on line {line_number}: {e}")
+        return inputs
+    raise ValueError("Batch files must be CSV (.csv) or JSON Lines (.jsonl)")
+
+
+class BatchStore:
+    """
+    Persists batch runs under data/batches/{batch_id}/: batch.json (metadata), inputs.jsonl and
+    results.jsonl, to which every finished item is appended (the last record per index wins).
+    Resuming a batch re-runs the items without a completed result.
+    """
+    def __init__(self, directory: str = BATCH_DIR, retention_hours: float = BATCH_RETENTION_HOURS):
+        self.directory = directory
+        self.retention = timedelta(hours=retention_hours)
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _dir(self, batch_id: str) -> str:
+        if not batch_id or os.sep in batch_id or ".." in batch_id:
+            raise ValueError(f"Invalid batch id: {batch_id}")
+        return os.path.join(self.directory, batch_id)
+
+    def _write_meta(self, meta: Dict[str, Any]):
+        meta["updated_at"] = datetime.utcnow().isoformat()
+        path = os.path.join(self._dir(meta["batch_id"]), "batch.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def create(self, agent_id: str, inputs: List[str], execution_id: str) -> Dict[str, Any]:
+        """Stores a new batch and its inputs; applies the retention policy to older batches."""
+        self.purge_expired()
+        batch_id = uuid.uuid4().hex
+        os.makedirs(self._dir(batch_id))
+        with open(os.path.join(self._dir(batch_id), "inputs.jsonl"), "w", encoding="utf-8") as f:
+            for value in inputs:
+                f.write(json.dumps(value, ensure_ascii=False) + "\n")
+        meta = {
+            "batch_id": batch_id,
+            "agent_id": agent_id,
+            "total": len(inputs),
+            "status": "running",
+            "execution_ids": [execution_id],
+            "created_at": datetime.utcnow().isoformat(),
+            "counts": {}
+        }
+        with self._lock:
+            self._write_meta(meta)
+        return meta
+
+    def load(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self._dir(batch_id), "batch.json")
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except json.JSONDecodeError as e:
+            logger.error(f"Corrupt batch metadata {path}: {e}")
+            return None
+
+    def inputs(self, batch_id: str) -> List[str]:
+        with open(os.path.join(self._dir(batch_id), "inputs.jsonl"), "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def record(self, batch_id: str, result: Dict[str, Any]):
+        """Appends a finished item ({"index", "status", "output", "error", ...})."""
+        line = json.dumps({**result, "finished_at": datetime.utcnow().isoformat()}, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(os.path.join(self._dir(batch_id), "results.jsonl"), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def results(self, batch_id: str) -> Dict[int, Dict[str, Any]]:
+        """Latest result per item index."""
+        path = os.path.join(self._dir(batch_id), "results.jsonl")
+        results = {}
+        if not os.path.exists(path):
+            return results
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a crash; that item simply runs again on resume
+                    continue
+                results[result["index"]] = result
+        return results
+
+    def pending_indices(self, batch_id: str) -> List[int]:
+        """Indices of the items without a completed result."""
+        meta = self.load(batch_id) or {}
+        results = self.results(batch_id)
+        return [index for index in range(meta.get("total", 0)) if results.get(index, {}).get("status") != "completed"]
+
+    def mark_running(self, batch_id: str, execution_id: str):
+        with self._lock:
+            meta = self.load(batch_id)
+            if meta is None:
+                return
+            meta["status"] = "running"
+            meta["execution_ids"].append(execution_id)
+            self._write_meta(meta)
+
+    def finish(self, batch_id: str, status: str):
+        """Marks the batch completed, failed or cancelled, with counts over the latest item results."""
+        counts = {}
+        for result in self.results(batch_id).values():
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        with self._lock:
+            meta = self.load(batch_id)
+            if meta is None:
+                return
+            meta["status"] = status
+            meta["counts"] = counts
+            self._write_meta(meta)
+
+    def purge_expired(self) -> int:
+        """Deletes batches not updated within the retention window."""
+        now = datetime.utcnow()
+        removed = 0
+        for batch_id in os.listdir(self.directory):
+            path = os.path.join(self.directory, batch_id)
+            meta_path = os.path.join(path, "batch.json")
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                expired = now - datetime.fromisoformat(meta.get("updated_at") or meta["created_at"]) > self.retention
+            except (OSError, ValueError, KeyError):
+                # Unreadable metadata: fall back to the directory's age
+                try:
+                    expired = now - datetime.utcfromtimestamp(os.path.getmtime(path)) > self.retention
+                except OSError:
+                    continue
+            if expired:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        if removed:
+            logger.info(f"Purged {removed} expired batches from {self.directory}")
+        return removed
@@ -0,0 +1,273 @@
+import os
+import time
+import logging
+import threading
+from typing import Optional, Dict, Any, Callable
+
+from cancellation import CancellationToken
+
+logger = logging.getLogger(__name__)
+
+# Defaults for agents without a budget config; 0 disables a limit
+EXECUTION_TIMEOUT_SECONDS = float(os.getenv("EXECUTION_TIMEOUT_SECONDS", "600"))
+EXECUTION_MAX_LLM_CALLS = int(os.getenv("EXECUTION_MAX_LLM_CALLS", "100"))
+EXECUTION_MAX_TOOL_CALLS = int(os.getenv("EXECUTION_MAX_TOOL_CALLS", "100"))
+EXECUTION_MAX_TOKENS = int(os.getenv("EXECUTION_MAX_TOKENS", "0"))
+# Rough chars-per-token ratio for in-flight estimates until crewai reports real usage
+CHARS_PER_TOKEN = 4
+PARTIAL_OUTPUT_CHARS = 4000
+# Start of the message a tool returns instead of running once the budget is spent
+REFUSAL_PREFIX = "Execution budget exhausted"
+
+
+class BudgetExceeded(RuntimeError):
+    """Raised inside an execution once one of its budgets is exhausted; carries usage and partial output."""
+    def __init__(self, limit: str, message: str, usage: Dict[str, Any], partial_output: str = ""):
+        super().__init__(message)
+        self.limit = limit
+        self.message = message
+        self.usage = usage
+        self.partial_output = partial_output
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "error": "budget_exceeded",
+            "limit": self.limit,
+            "message": self.message,
+            "usage": self.usage,
+            "partial_output": self.partial_output
+        }
+
+
+def _step_text(step: Any) -> str:
+    """Text of a crewai step (AgentAction / AgentFinish): the final output, tool observation or thought."""
+    for attr in ["output", "result", "text", "thought"]:
+        value = getattr(step, attr, None)
+        if value:
+            return str(value)
+    return str(step) if isinstance(step, str) else ""
+
+
+def _prompt_text(task: Any) -> str:
+    """Prompt text a crewai Task sends on every LLM call: the agent's role, goal and backstory plus the task."""
+    agent = getattr(task, "agent", None)
+    parts = [getattr(agent, attr, None) for attr in ["role", "goal", "backstory"]]
+    parts += [getattr(task, "description", None), getattr(task, "expected_output", None)]
+    return "\n".join(str(part) for part in parts if part)
+
+
+def _reported_tokens(result: Any) -> Optional[int]:
+    usage = getattr(result, "token_usage", None)
+    total = getattr(usage, "total_tokens", None) if usage is not None else None
+    if total is None and isinstance(usage, dict):
+        total = usage.get("total_tokens")
+    return int(total) if total else None
+
+
+class CrewTracker:
+    """
+    Accounts one crew kickoff: an LLM call per agent step, tokens estimated until the crew reports usage.
+    Every step resends the task's prompt and the steps so far, so both count as prompt tokens of the step.
+    Steps are reported after their LLM call, so a step that needs a follow-up call (a tool action)
+    stops the run once the LLM call cap is reached.
+    """
+    def __init__(self, budget: "ExecutionBudget", task: Any = None):
+        self.budget = budget
+        self.prompt_chars = len(_prompt_text(task)) if task is not None else 0
+        self.scratchpad_chars = 0
+        self.steps = 0
+        self.estimated_tokens = 0
+
+    def on_step(self, step: Any):
+        text = _step_text(step)
+        tokens = (self.prompt_chars + self.scratchpad_chars + len(text)) // CHARS_PER_TOKEN
+        self.scratchpad_chars += len(text)
+        self.steps += 1
+        self.estimated_tokens += tokens
+        self.budget.charge(llm_calls=1, tokens=tokens, partial_output=text)
+        self.budget.check(next_llm_call=getattr(step, "tool", None) is not None)
+
+    def finish(self, result: Any) -> Any:
+        """Reconciles estimates with the crew's reported token usage and enforces the budget."""
+        reported = _reported_tokens(result)
+        output = str(getattr(result, "raw", result) or "")
+        if reported is not None:
+            tokens = reported - self.estimated_tokens
+        else:
+            tokens = 0 if self.steps else (self.prompt_chars + len(output)) // CHARS_PER_TOKEN
+        self.budget.charge(llm_calls=0 if self.steps else 1, tokens=tokens, partial_output=output)
+        self.budget.check()
+        return result
+
+
+class ExecutionBudget:
+    """
+    Wall-clock deadline and caps on LLM calls, tool calls and tokens for one execution, shared by
+    every agent and crew of the execution. Crews report through CrewTracker; tools through
+    guard_tool(). check() raises BudgetExceeded, which ends the run with its partial output, or
+    ExecutionCancelled once the execution's cancel token is set.
+    """
+    def __init__(
+        self,
+        timeout_seconds: float = EXECUTION_TIMEOUT_SECONDS,
+        max_llm_calls: int = EXECUTION_MAX_LLM_CALLS,
+        max_tool_calls: int = EXECUTION_MAX_TOOL_CALLS,
+        max_tokens: int = EXECUTION_MAX_TOKENS,
+        cancel_token: Optional[CancellationToken] = None
+    ):
+        self.timeout_seconds = timeout_seconds or None
+        self.max_llm_calls = max_llm_calls or None
+        self.max_tool_calls = max_tool_calls or None
+        self.max_tokens = max_tokens or None
+        self.started_at = time.monotonic()
+        self.llm_calls = 0
+        self.tool_calls = 0
+        self.tokens = 0
+        self.partial_output = ""
+        self.exceeded: Optional[str] = None
+        # Set when a result_as_answer tool returned {"error": ...}, which then became the final answer
+        self.failed_answer = False
+        self.cancel_token = cancel_token
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]], cancel_token: Optional[CancellationToken] = None) -> "ExecutionBudget":
+        """Builds a budget from an agent's budget settings; missing values use the EXECUTION_* defaults."""
+        config = config or {}
+        pick = lambda key, default: default if config.get(key) is None else config[key]
+        return cls(
+            timeout_seconds=pick("timeoutSeconds", EXECUTION_TIMEOUT_SECONDS),
+            max_llm_calls=pick("maxLlmCalls", EXECUTION_MAX_LLM_CALLS),
+            max_tool_calls=pick("maxToolCalls", EXECUTION_MAX_TOOL_CALLS),
+            max_tokens=pick("maxTokens", EXECUTION_MAX_TOKENS),
+            cancel_token=cancel_token
+        )
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None without a deadline."""
+        if self.timeout_seconds is None:
+            return None
+        return max(0.0, self.timeout_seconds - self.elapsed())
+
+    def clamp_timeout(self, timeout: float) -> float:
+        """Caps a per-call timeout (e.g. a tool's HTTP timeout) at the time left in the execution."""
+        remaining = self.remaining()
+        return timeout if remaining is None else max(0.1, min(timeout, remaining))
+
+    def _over_limit(self) -> Optional[str]:
+        if self.exceeded:
+            return self.exceeded
+        if self.timeout_seconds is not None and self.elapsed() >= self.timeout_seconds:
+            return "timeout"
+        if self.max_llm_calls is not None and self.llm_calls > self.max_llm_calls:
+            return "llm_calls"
+        if self.max_tool_calls is not None and self.tool_calls > self.max_tool_calls:
+            return "tool_calls"
+        if self.max_tokens is not None and self.tokens > self.max_tokens:
+            return "tokens"
+        return None
+
+    def charge(self, llm_calls: int = 0, tool_calls: int = 0, tokens: int = 0, partial_output: str = ""):
+        with self._lock:
+            self.llm_calls += llm_calls
+            self.tool_calls += tool_calls
+            self.tokens = max(0, self.tokens + tokens)
+            # A tool's budget refusal can come back as the final answer; the last real output is kept instead
+            if partial_output and REFUSAL_PREFIX not in partial_output:
+                self.partial_output = partial_output[:PARTIAL_OUTPUT_CHARS]
+            if not self.exceeded:
+                self.exceeded = self._over_limit()
+                if self.exceeded:
+                    logger.warning(f"Execution budget exceeded ({self.exceeded}): {self.usage()}")
+
+    def exhausted(self) -> Optional[str]:
+        """The limit that ended the budget ("timeout", "llm_calls", "tool_calls" or "tokens"), or None."""
+        with self._lock:
+            if not self.exceeded:
+                self.exceeded = self._over_limit()
+            return self.exceeded
+
+    def check(self, next_llm_call: bool = False):
+        """
+        Raises ExecutionCancelled once cancelled, or BudgetExceeded once any limit is exhausted (including
+        the deadline). With next_llm_call, also once no LLM call is left for the caller's next step.
+        """
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled()
+        if next_llm_call:
+            with self._lock:
+                if not self.exceeded and self.max_llm_calls is not None and self.llm_calls >= self.max_llm_calls:
+                    self.exceeded = "llm_calls"
+                    logger.warning(f"Execution budget exceeded ({self.exceeded}): {self.usage()}")
+        limit = self.exhausted()
+        if limit:
+            raise self.error(limit)
+
+    def error(self, limit: Optional[str] = None, partial_output: Optional[str] = None) -> BudgetExceeded:
+        limit = limit or self.exceeded or "timeout"
+        limits = {
+            "timeout": f"wall-clock deadline of {self.timeout_seconds}s",
+            "llm_calls": f"limit of {self.max_llm_calls} LLM calls",
+            "tool_calls": f"limit of {self.max_tool_calls} tool calls",
+            "tokens": f"limit of {self.max_tokens} tokens"
+        }
+        return BudgetExceeded(
+            limit,
+            f"Execution stopped: {limits.get(limit, limit)} exceeded",
+            self.usage(),
+            self.partial_output if partial_output is None else partial_output
+        )
+
+    def tracker(self, task: Any = None) -> CrewTracker:
+        """
+        Tracker for one crew kickoff, created right before it; raises if the kickoff's first LLM call is
+        not allowed. Pass the crew's Task so its prompt counts towards the token estimate.
+        """
+        self.check(next_llm_call=True)
+        return CrewTracker(self, task)
+
+    def guard_tool(self, tool):
+        """Wraps a LangChain tool so each call is counted against this budget; see guard_tool()."""
+        return guard_tool(tool, lambda: self)
+
+    def usage(self) -> Dict[str, Any]:
+        return {
+            "elapsed_seconds": round(self.elapsed(), 3),
+            "llm_calls": self.llm_calls,
+            "tool_calls": self.tool_calls,
+            "tokens": self.tokens,
+            "limits": {
+                "timeout_seconds": self.timeout_seconds,
+                "max_llm_calls": self.max_llm_calls,
+                "max_tool_calls": self.max_tool_calls,
+                "max_tokens": self.max_tokens
+            }
+        }
+
+
+def guard_tool(tool, budget: Callable[[], ExecutionBudget]):
+    """
+    Wraps a LangChain tool so each call is counted against the budget returned by budget() at call
+    time; once the budget is spent the tool refuses to run, and a cancelled execution stops at the
+    tool call. Executors shared by concurrent runs pass a provider of the current run's budget.
+    An error result from a result_as_answer tool marks the budget's failed_answer.
+    """
+    func = tool.func
+
+    def guarded(*args, **kwargs):
+        current = budget()
+        if current.cancel_token is not None:
+            current.cancel_token.raise_if_cancelled()
+        current.charge(tool_calls=1)
+        if current.exceeded:
+            return f"{REFUSAL_PREFIX} ({current.exceeded}). Do not call more tools; give your final answer now."
+        result = func(*args, **kwargs)
+        if getattr(tool, "result_as_answer", False) and isinstance(result, dict) and "error" in result:
+            current.failed_answer = True
+        return result
+
+    tool.func = guarded
+    return tool
@@ -0,0 +1,108 @@
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Optional, Dict, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# How often a waiting request handler checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "1"))
+
+
+class ExecutionCancelled(RuntimeError):
+    """Raised inside an execution at its next LLM step or tool call once it has been cancelled."""
+    def __init__(self, reason: str = "cancelled"):
+        super().__init__(f"Execution cancelled: {reason}")
+        self.reason = reason
+
+
+class ClientDisconnected(RuntimeError):
+    """Raised to a request handler whose client went away while it waited for an execution."""
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation flag of one execution. Executors check it between LLM steps and tool
+    calls; cancel() also drops the bound pool future if the execution has not started yet.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+        self._future: Optional[Future] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def bind(self, future: Future):
+        self._future = future
+        if self.cancelled:
+            future.cancel()
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+        if self._future is not None:
+            self._future.cancel()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise ExecutionCancelled(self.reason or "cancelled")
+
+
+class CancellationRegistry:
+    """Tokens of the running executions by execution_id, for the cancel endpoint and disconnect handling."""
+    def __init__(self):
+        self._tokens: Dict[str, CancellationToken] = {}
+        self._lock = threading.Lock()
+        self.cancellations = 0
+
+    def register(self, execution_id: str) -> CancellationToken:
+        with self._lock:
+            token = self._tokens.get(execution_id)
+            if token is None:
+                token = self._tokens[execution_id] = CancellationToken()
+            return token
+
+    def get(self, execution_id: str) -> Optional[CancellationToken]:
+        with self._lock:
+            return self._tokens.get(execution_id)
+
+    def cancel(self, execution_id: str, reason: str = "cancelled") -> bool:
+        """Cancels a running execution; returns False when it is unknown or already finished."""
+        token = self.get(execution_id)
+        if token is None:
+            return False
+        token.cancel(reason)
+        with self._lock:
+            self.cancellations += 1
+        logger.info(f"Execution {execution_id} cancelled ({reason})")
+        return True
+
+    def release(self, execution_id: str):
+        with self._lock:
+            self._tokens.pop(execution_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"running": len(self._tokens), "cancellations": self.cancellations}
+
+
+async def await_unless_disconnected(request, future: Future, on_disconnect: Callable[[], None], poll_seconds: float = DISCONNECT_POLL_SECONDS):
+    """
+    Awaits a pool future while polling the client connection. When the client disconnects first,
+    on_disconnect() is called (typically to cancel the execution) and ClientDisconnected is raised.
+    """
+    waiter = asyncio.wrap_future(future)
+    while True:
+        done, _ = await asyncio.wait({waiter}, timeout=poll_seconds)
+        if done:
+            if waiter.cancelled():
+                raise ExecutionCancelled("cancelled before it started")
+            return waiter.result()
+        if await request.is_disconnected():
+            on_disconnect()
+            raise ClientDisconnected("Client disconnected before the execution finished")
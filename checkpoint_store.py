@@ -0,0 +1,154 @@
+import os
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "data/checkpoints")
+# Incomplete runs are kept long enough to be resumed; completed runs only need to outlive a retry window
+CHECKPOINT_RETENTION_HOURS = float(os.getenv("CHECKPOINT_RETENTION_HOURS", "72"))
+CHECKPOINT_COMPLETED_RETENTION_HOURS = float(os.getenv("CHECKPOINT_COMPLETED_RETENTION_HOURS", "24"))
+
+
+class CheckpointStore:
+    """
+    Persists multi-agent step progress per execution_id so a failed run can resume
+    from its first incomplete step instead of repeating completed LLM calls.
+    One JSON file per execution, rewritten atomically after every step; step outputs
+    themselves are kept in the ArtifactStore and referenced by artifact_id.
+    """
+    def __init__(
+        self,
+        directory: str = CHECKPOINT_DIR,
+        retention_hours: float = CHECKPOINT_RETENTION_HOURS,
+        completed_retention_hours: float = CHECKPOINT_COMPLETED_RETENTION_HOURS
+    ):
+        self.directory = directory
+        self.retention = timedelta(hours=retention_hours)
+        self.completed_retention = timedelta(hours=completed_retention_hours)
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, execution_id: str) -> str:
+        if not execution_id or os.sep in execution_id or ".." in execution_id:
+            raise ValueError(f"Invalid execution id: {execution_id}")
+        return os.path.join(self.directory, f"{execution_id}.json")
+
+    def _write(self, checkpoint: Dict[str, Any]):
+        checkpoint["updated_at"] = datetime.utcnow().isoformat()
+        path = self._path(checkpoint["execution_id"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load(self, execution_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the checkpoint for an execution, or None if it does not exist."""
+        path = self._path(execution_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except json.JSONDecodeError as e:
+            logger.error(f"Corrupt checkpoint {path}: {e}")
+            return None
+
+    def create(self, execution_id: str, multi_agent_id: Optional[str], user_input: str) -> Dict[str, Any]:
+        """Starts a new checkpoint and applies the retention policy to older ones."""
+        self.purge_expired()
+        checkpoint = {
+            "execution_id": execution_id,
+            "multi_agent_id": multi_agent_id,
+            "user_input": user_input,
+            "status": "running",
+            "created_at": datetime.utcnow().isoformat(),
+            "steps": {},
+            "final_output": None,
+            "error": None
+        }
+        with self._lock:
+            self._write(checkpoint)
+        return checkpoint
+
+    def save_step(self, execution_id: str, step_id: str, result: Dict[str, Any]):
+        """Records a finished step; outputs live in the artifact store and are referenced by artifact_id."""
+        with self._lock:
+            checkpoint = self.load(execution_id)
+            if checkpoint is None:
+                logger.warning(f"No checkpoint found for execution {execution_id}, step {step_id} not saved")
+                return
+            checkpoint["steps"][step_id] = {
+                "status": result.get("status"),
+                "agent_id": result.get("agent_id"),
+                "artifact_id": result.get("artifact_id"),
+                "error": result.get("error"),
+                "duration": result.get("duration"),
+                "finished_at": datetime.utcnow().isoformat()
+            }
+            self._write(checkpoint)
+
+    def finish(self, execution_id: str, status: str, final_output: Optional[str] = None, error: Optional[str] = None):
+        """Marks an execution as completed or failed."""
+        with self._lock:
+            checkpoint = self.load(execution_id)
+            if checkpoint is None:
+                return
+            checkpoint["status"] = status
+            checkpoint["final_output"] = final_output
+            checkpoint["error"] = error
+            self._write(checkpoint)
+
+    def mark_running(self, execution_id: str):
+        """Flags a resumed execution as running again."""
+        with self._lock:
+            checkpoint = self.load(execution_id)
+            if checkpoint is None:
+                return
+            checkpoint["status"] = "running"
+            checkpoint["error"] = None
+            checkpoint["resumed_count"] = checkpoint.get("resumed_count", 0) + 1
+            self._write(checkpoint)
+
+    def completed_steps(self, execution_id: str) -> Dict[str, Dict[str, Any]]:
+        """Returns the completed steps of an execution keyed by step id."""
+        checkpoint = self.load(execution_id) or {}
+        return {
+            step_id: step for step_id, step in checkpoint.get("steps", {}).items()
+            if step.get("status") == "completed"
+        }
+
+    def delete(self, execution_id: str):
+        path = self._path(execution_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def purge_expired(self) -> int:
+        """Deletes checkpoints older than the retention window for their status."""
+        now = datetime.utcnow()
+        removed = 0
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    checkpoint = json.load(f)
+                updated_at = datetime.fromisoformat(checkpoint.get("updated_at") or checkpoint["created_at"])
+                retention = self.completed_retention if checkpoint.get("status") == "completed" else self.retention
+                expired = now - updated_at > retention
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Removing unreadable checkpoint {path}: {e}")
+                expired = True
+            if expired:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        if removed:
+            logger.info(f"Purged {removed} expired checkpoints from {self.directory}")
+        return removed
@@ -0,0 +1,374 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable, Tuple
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+from google.oauth2 import service_account
+from google.cloud import bigquery
+
+logger = logging.getLogger(__name__)
+
+POSTGRES_POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1"))
+POSTGRES_POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "5"))
+POSTGRES_POOL_IDLE_TIMEOUT = float(os.getenv("POSTGRES_POOL_IDLE_TIMEOUT", "300"))
+POSTGRES_POOL_WAIT_TIMEOUT = float(os.getenv("POSTGRES_POOL_WAIT_TIMEOUT", "30"))
+POSTGRES_HEALTH_CHECK_INTERVAL = float(os.getenv("POSTGRES_HEALTH_CHECK_INTERVAL", "30"))
+POSTGRES_CONNECT_TIMEOUT = int(os.getenv("POSTGRES_CONNECT_TIMEOUT", "10"))
+BIGQUERY_CLIENT_IDLE_TIMEOUT = float(os.getenv("BIGQUERY_CLIENT_IDLE_TIMEOUT", "1800"))
+BIGQUERY_MAX_ADHOC_CLIENTS = int(os.getenv("BIGQUERY_MAX_ADHOC_CLIENTS", "8"))
+
+
+def postgres_params(connector: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Maps a connector record (PostgresConnectionConfig fields) or a connection-test config
+    (host/port/database/user/password) to psycopg2 connection parameters.
+    """
+    port = connector.get("vectorStorePort", connector.get("port"))
+    try:
+        port = int(port)
+    except (TypeError, ValueError):
+        raise ValueError("Port must be a valid number")
+    return {
+        "host": connector.get("vectorStoreHost", connector.get("host")),
+        "port": port,
+        "dbname": connector.get("vectorStoreDBName", connector.get("database")),
+        "user": connector.get("vectorStoreUser", connector.get("user")),
+        "password": connector.get("vectorStorePassword", connector.get("password", "")) or ""
+    }
+
+
+def bigquery_settings(connector: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any]]:
+    """Returns (project_id, dataset_id, service_account_info) for a BigQuery connector or test config."""
+    service_account_info = connector.get("serviceAccountKey")
+    if isinstance(service_account_info, str):
+        # Handle backward compatibility with string format
+        try:
+            service_account_info = json.loads(service_account_info)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid service account key format: {e}")
+    if not isinstance(service_account_info, dict) or not service_account_info:
+        raise ValueError("Invalid service account key format: expected a JSON object")
+    return connector.get("projectId"), connector.get("datasetId"), service_account_info
+
+
+def connector_fingerprint(params: Dict[str, Any]) -> str:
+    """Hashes connection settings so pools and clients are rebuilt when credentials change."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class _PostgresPool:
+    def __init__(self, params: Dict[str, Any], fingerprint: str, min_size: int, max_size: int, connect_timeout: int):
+        self.fingerprint = fingerprint
+        self.pool = pg_pool.ThreadedConnectionPool(min_size, max_size, connect_timeout=connect_timeout, **params)
+        # ThreadedConnectionPool raises when exhausted; the semaphore makes borrowers wait instead
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.last_used = time.monotonic()
+        self.last_checked = {}
+        self.borrowed = 0
+        self.in_use = 0
+
+    def close(self):
+        try:
+            self.pool.closeall()
+        except pg_pool.PoolError:
+            pass
+
+
+class PostgresPoolManager:
+    """
+    Keeps one psycopg2 connection pool per data connector id.
+    Connections are health-checked on borrow, pools idle longer than idle_timeout are closed,
+    and a pool is rebuilt when its connector's connection settings change.
+    """
+    def __init__(
+        self,
+        min_size: int = POSTGRES_POOL_MIN_SIZE,
+        max_size: int = POSTGRES_POOL_MAX_SIZE,
+        idle_timeout: float = POSTGRES_POOL_IDLE_TIMEOUT,
+        wait_timeout: float = POSTGRES_POOL_WAIT_TIMEOUT,
+        health_check_interval: float = POSTGRES_HEALTH_CHECK_INTERVAL,
+        connect_timeout: int = POSTGRES_CONNECT_TIMEOUT
+    ):
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size, 1)
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self.health_check_interval = health_check_interval
+        self.connect_timeout = connect_timeout
+        self._pools: Dict[str, _PostgresPool] = {}
+        # Pools being built, by (connector, settings fingerprint)
+        self._building: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+
+    def _get_pool(self, pool_key: str, params: Dict[str, Any]) -> _PostgresPool:
+        """
+        Returns the connector's pool, building it on first use. The pool is built outside the
+        manager lock, so a slow or unreachable database only delays callers of that connector;
+        concurrent callers for the same connector wait on the one build.
+        """
+        fingerprint = connector_fingerprint(params)
+        build_key = (pool_key, fingerprint)
+        with self._lock:
+            entry = self._pools.get(pool_key)
+            if entry and entry.fingerprint == fingerprint:
+                entry.last_used = time.monotonic()
+                return entry
+            building = self._building.get(build_key)
+            is_builder = building is None
+            if is_builder:
+                building = self._building[build_key] = Future()
+        if not is_builder:
+            entry = building.result()
+            with self._lock:
+                entry.last_used = time.monotonic()
+            return entry
+
+        try:
+            entry = _PostgresPool(params, fingerprint, self.min_size, self.max_size, self.connect_timeout)
+        except BaseException as e:
+            with self._lock:
+                self._building.pop(build_key, None)
+            building.set_exception(e)
+            raise
+        with self._lock:
+            self._building.pop(build_key, None)
+            stale = self._pools.get(pool_key)
+            if stale:
+                logger.info(f"Connection settings changed for connector {pool_key}, rebuilding pool")
+            self._pools[pool_key] = entry
+            entry.last_used = time.monotonic()
+        logger.info(f"Created Postgres pool for connector {pool_key} (min={self.min_size}, max={self.max_size})")
+        building.set_result(entry)
+        if stale:
+            stale.close()
+        return entry
+
+    def _is_healthy(self, entry: _PostgresPool, conn) -> bool:
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if now - entry.last_checked.get(id(conn), 0) < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            conn.rollback()
+            entry.last_checked[id(conn)] = now
+            return True
+        except psycopg2.Error as e:
+            logger.warning(f"Discarding unhealthy pooled connection: {e}")
+            return False
+
+    @contextmanager
+    def connection(self, connector_id: Optional[str], connector: Dict[str, Any]):
+        """
+        Borrows a healthy connection for a connector and returns it to the pool afterwards.
+        Ad-hoc configs without an id (e.g. connection tests of unsaved connectors) are pooled by fingerprint.
+        """
+        self.evict_idle()
+        params = postgres_params(connector)
+        pool_key = connector_id or f"adhoc:{connector_fingerprint(params)[:16]}"
+        entry = self._get_pool(pool_key, params)
+
+        if not entry.slots.acquire(timeout=self.wait_timeout):
+            raise TimeoutError(f"Timed out waiting for a pooled connection for connector {pool_key}")
+        with self._lock:
+            entry.in_use += 1
+        conn = None
+        try:
+            conn = entry.pool.getconn()
+            if not self._is_healthy(entry, conn):
+                entry.last_checked.pop(id(conn), None)
+                entry.pool.putconn(conn, close=True)
+                conn = entry.pool.getconn()
+                if not self._is_healthy(entry, conn):
+                    raise psycopg2.OperationalError(f"Could not obtain a healthy connection for connector {pool_key}")
+            entry.borrowed += 1
+            yield conn
+        finally:
+            if conn is not None:
+                discard = conn.closed != 0
+                if not discard:
+                    try:
+                        # Never hand back a connection with an open or aborted transaction
+                        conn.rollback()
+                    except psycopg2.Error:
+                        discard = True
+                if discard:
+                    entry.last_checked.pop(id(conn), None)
+                try:
+                    entry.pool.putconn(conn, close=discard)
+                except pg_pool.PoolError:
+                    # The pool was closed by an invalidation while this connection was borrowed
+                    if not conn.closed:
+                        conn.close()
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.monotonic()
+            entry.slots.release()
+
+    def invalidate(self, connector_id: str):
+        """Closes a connector's pool so the next borrow reconnects with its current settings."""
+        with self._lock:
+            entry = self._pools.pop(connector_id, None)
+        if entry:
+            entry.close()
+            logger.info(f"Closed Postgres pool for connector {connector_id}")
+
+    def evict_idle(self):
+        """Closes pools that have not been used within the idle timeout."""
+        now = time.monotonic()
+        with self._lock:
+            idle_keys = [
+                key for key, entry in self._pools.items()
+                if entry.in_use == 0 and now - entry.last_used > self.idle_timeout
+            ]
+            idle = [self._pools.pop(key) for key in idle_keys]
+        for key, entry in zip(idle_keys, idle):
+            entry.close()
+            logger.info(f"Evicted idle Postgres pool for connector {key}")
+
+    def close_all(self):
+        with self._lock:
+            entries = list(self._pools.values())
+            self._pools.clear()
+        for entry in entries:
+            entry.close()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                key: {
+                    "borrowed_total": entry.borrowed,
+                    "in_use": entry.in_use,
+                    "idle_seconds": round(time.monotonic() - entry.last_used, 1),
+                    "max_size": self.max_size
+                }
+                for key, entry in self._pools.items()
+            }
+
+
+def _build_bigquery_client(project_id: str, service_account_info: Dict[str, Any]):
+    credentials = service_account.Credentials.from_service_account_info(service_account_info)
+    return bigquery.Client(credentials=credentials, project=project_id)
+
+
+class BigQueryClientCache:
+    """
+    Caches one BigQuery client per connector id and credentials hash, so the service account
+    key is parsed and the client constructed once instead of on every call. Clients idle longer
+    than idle_timeout are closed, and at most max_adhoc_clients clients for ad-hoc credentials
+    (configs without a connector id, e.g. connection tests) are kept.
+    client_factory(project_id, service_account_info) can be swapped for a local stub.
+    """
+    def __init__(
+        self,
+        client_factory: Optional[Callable[[str, Dict[str, Any]], Any]] = None,
+        idle_timeout: float = BIGQUERY_CLIENT_IDLE_TIMEOUT,
+        max_adhoc_clients: int = BIGQUERY_MAX_ADHOC_CLIENTS
+    ):
+        self.client_factory = client_factory or _build_bigquery_client
+        self.idle_timeout = idle_timeout
+        self.max_adhoc_clients = max(1, max_adhoc_clients)
+        self._clients: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # Clients being built, by (cache id, credentials fingerprint)
+        self._building: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+
+    def get_client(self, connector_id: Optional[str], connector: Dict[str, Any]):
+        """
+        Returns the cached client for a connector, creating it lazily on first use. The client is
+        built outside the cache lock, so slow credential loading only delays callers of that
+        connector; concurrent callers for the same connector wait on the one build.
+        """
+        project_id, _, service_account_info = bigquery_settings(connector)
+        fingerprint = connector_fingerprint({"project": project_id, "key": service_account_info})
+        cache_id = connector_id or f"adhoc:{fingerprint[:16]}"
+        key = (cache_id, fingerprint)
+
+        self.evict_idle()
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                entry["uses"] += 1
+                entry["last_used"] = time.monotonic()
+                return entry["client"]
+            building = self._building.get(key)
+            is_builder = building is None
+            if is_builder:
+                building = self._building[key] = Future()
+        if not is_builder:
+            client = building.result()
+            with self._lock:
+                entry = self._clients.get(key)
+                if entry is not None:
+                    entry["uses"] += 1
+                    entry["last_used"] = time.monotonic()
+            return client
+
+        try:
+            client = self.client_factory(project_id, service_account_info)
+        except BaseException as e:
+            with self._lock:
+                self._building.pop(key, None)
+            building.set_exception(e)
+            raise
+        with self._lock:
+            self._building.pop(key, None)
+            # Credentials changed for this connector: drop clients built from the old ones
+            stale = [self._clients.pop(k) for k in list(self._clients) if k[0] == cache_id]
+            now = time.monotonic()
+            self._clients[key] = {"client": client, "created_at": now, "last_used": now, "uses": 1}
+            if cache_id.startswith("adhoc:"):
+                adhoc = sorted((k for k in self._clients if k[0].startswith("adhoc:")), key=lambda k: self._clients[k]["last_used"])
+                stale.extend(self._clients.pop(k) for k in adhoc[:max(0, len(adhoc) - self.max_adhoc_clients)])
+        logger.info(f"Created BigQuery client for connector {cache_id} (project {project_id})")
+        building.set_result(client)
+        for old in stale:
+            self._close(old["client"])
+        return client
+
+    def evict_idle(self):
+        """Closes clients that have not been used within the idle timeout."""
+        now = time.monotonic()
+        with self._lock:
+            idle_keys = [key for key, entry in self._clients.items() if now - entry["last_used"] > self.idle_timeout]
+            idle = [self._clients.pop(key) for key in idle_keys]
+        for key, entry in zip(idle_keys, idle):
+            self._close(entry["client"])
+            logger.info(f"Evicted idle BigQuery client for connector {key[0]}")
+
+    @staticmethod
+    def _close(client):
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning(f"Error closing BigQuery client: {e}")
+
+    def invalidate(self, connector_id: str):
+        """Drops a connector's cached clients; the next call rebuilds them from the current record."""
+        with self._lock:
+            stale = [self._clients.pop(k) for k in list(self._clients) if k[0] == connector_id]
+        for entry in stale:
+            self._close(entry["client"])
+        if stale:
+            logger.info(f"Closed BigQuery client for connector {connector_id}")
+
+    def close_all(self):
+        with self._lock:
+            entries = list(self._clients.values())
+            self._clients.clear()
+        for entry in entries:
+            self._close(entry["client"])
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {key[0]: {"uses": entry["uses"]} for key, entry in self._clients.items()}
@@ -0,0 +1,85 @@
+import os
+import json
+import hashlib
+from typing import Optional
+
+import PyPDF2
+
+ALLOWED_FILE_TYPES = {
+    "image/jpeg": "image",
+    "image/png": "image",
+    "image/gif": "image",
+    "text/csv": "csv",
+    "application/json": "json",
+    "text/plain": "text",
+    "application/pdf": "pdf"
+}
+
+EXTENSION_TO_MIME = {
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "csv": "text/csv",
+    "json": "application/json",
+    "txt": "text/plain",
+    "md": "text/plain",
+    "pdf": "application/pdf"
+}
+
+
+def mime_type_for(path: str) -> Optional[str]:
+    """Guesses a supported MIME type from a file name's extension."""
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    return EXTENSION_TO_MIME.get(extension)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_csv_as_text(csv_path: str) -> str:
+    with open(csv_path, "r", encoding="utf-8", errors="replace") as csv_file:
+        return csv_file.read()
+
+
+def read_json_as_text(json_path: str) -> str:
+    with open(json_path, "r", encoding="utf-8", errors="replace") as json_file:
+        data = json.load(json_file)
+        return json.dumps(data, indent=2, ensure_ascii=False)
+
+
+def read_txt_as_text(txt_path: str) -> str:
+    with open(txt_path, "r", encoding="utf-8", errors="replace") as txt_file:
+        return txt_file.read()
+
+
+def read_pdf_as_text(pdf_path: str) -> str:
+    with open(pdf_path, "rb") as pdf_file:
+        reader = PyPDF2.PdfReader(pdf_file)
+        text = "".join(page.extract_text() or "" for page in reader.pages)
+        return text.strip() or "No readable text in PDF"
+
+
+READERS = {
+    "text/csv": read_csv_as_text,
+    "application/json": read_json_as_text,
+    "text/plain": read_txt_as_text,
+    "application/pdf": read_pdf_as_text
+}
+
+
+def extract_text(file_path: str, file_type: Optional[str] = None) -> str:
+    """
+    Extracts the text of a supported document. Raises ValueError for unsupported types
+    (images have no text to extract); reader errors propagate to the caller.
+    """
+    file_type = (file_type or mime_type_for(file_path) or "").lower()
+    reader = READERS.get(file_type)
+    if reader is None:
+        raise ValueError(f"Unsupported file type for text extraction: {file_type or 'unknown'}")
+    return reader(file_path)
@@ -0,0 +1,223 @@
+import os
+import time
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Any
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "2048"))
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+HTTP_CACHE_MAX_ENTRY_BYTES = int(os.getenv("HTTP_CACHE_MAX_ENTRY_BYTES", str(2 * 1024 * 1024)))
+CACHEABLE_STATUSES = {200, 203}
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Any]:
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else True
+    return directives
+
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    try:
+        return parsedate_to_datetime(value).timestamp() if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_lifetime(headers: Dict[str, str]) -> Optional[float]:
+    """
+    Seconds a response stays fresh per Cache-Control max-age/s-maxage (minus Age) or Expires.
+    Returns None when the response carries no explicit freshness information.
+    """
+    directives = parse_cache_control(headers.get("Cache-Control"))
+    if "no-cache" in directives:
+        return 0.0
+    for name in ["s-maxage", "max-age"]:
+        if name in directives:
+            try:
+                age = float(headers.get("Age") or 0)
+                return max(0.0, float(directives[name]) - age)
+            except ValueError:
+                return 0.0
+    expires = _http_date(headers.get("Expires"))
+    if headers.get("Expires") is not None:
+        if expires is None:
+            # An invalid Expires (e.g. "0") means already expired
+            return 0.0
+        date = _http_date(headers.get("Date")) or time.time()
+        return max(0.0, expires - date)
+    return None
+
+
+class HttpResponseCache:
+    """
+    Private HTTP cache for tool GETs, keyed by URL, query parameters and auth identity (a hash of
+    the request headers). Honors Cache-Control (no-store, no-cache, max-age, s-maxage) and Expires,
+    and revalidates stale entries with If-None-Match / If-Modified-Since. A per-tool TTL overrides
+    the server's freshness. Bounded by entry count and total body bytes with LRU eviction.
+    """
+    def __init__(
+        self,
+        max_entries: int = HTTP_CACHE_MAX_ENTRIES,
+        max_bytes: int = HTTP_CACHE_MAX_BYTES,
+        max_entry_bytes: int = HTTP_CACHE_MAX_ENTRY_BYTES
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, Any]] = None) -> str:
+        identity = sorted((str(k).lower(), str(v)) for k, v in (headers or {}).items())
+        query = sorted((str(k), json.dumps(v, sort_keys=True, default=str)) for k, v in (params or {}).items())
+        return hashlib.sha256(json.dumps(["GET", url, query, identity]).encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the entry (fresh or stale) and counts a hit when it is fresh."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry["expires_at"] > time.time():
+                self.counters["hits"] += 1
+            else:
+                self.counters["misses"] += 1
+            return entry
+
+    @staticmethod
+    def is_fresh(entry: Dict[str, Any]) -> bool:
+        return entry["expires_at"] > time.time()
+
+    @staticmethod
+    def conditional_headers(entry: Dict[str, Any]) -> Dict[str, str]:
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(
+        self,
+        key: str,
+        response: requests.Response,
+        ttl_override: Optional[float] = None,
+        tag: Optional[str] = None,
+        streamed: bool = False
+    ) -> bool:
+        """
+        Caches a response if HTTP semantics (or the tool's TTL override) allow it. A streamed body
+        is only read here when its Content-Length shows it fits an entry.
+        """
+        if response.status_code not in CACHEABLE_STATUSES:
+            return False
+        directives = parse_cache_control(response.headers.get("Cache-Control"))
+        if "no-store" in directives:
+            return False
+        lifetime = ttl_override if ttl_override is not None else freshness_lifetime(response.headers)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if lifetime is None:
+            if not (etag or last_modified):
+                return False
+            # Validators only: keep the body and revalidate on every use
+            lifetime = 0.0
+        content_length = response.headers.get("Content-Length")
+        if content_length and content_length.isdigit():
+            if int(content_length) > self.max_entry_bytes:
+                return False
+        elif streamed:
+            return False
+        content = response.content
+        if len(content) > self.max_entry_bytes:
+            return False
+        entry = {
+            "status_code": response.status_code,
+            "headers": dict(response.headers),
+            "content": content,
+            "encoding": response.encoding,
+            "url": response.url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "ttl_override": ttl_override,
+            "tag": tag,
+            "expires_at": time.time() + lifetime
+        }
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous:
+                self._bytes -= len(previous["content"])
+            self._entries[key] = entry
+            self._bytes += len(content)
+            self.counters["stores"] += 1
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted["content"])
+                self.counters["evictions"] += 1
+        return True
+
+    def revalidated(self, key: str, entry: Dict[str, Any], not_modified: requests.Response):
+        """Refreshes an entry's freshness (and updated headers) after a 304 Not Modified."""
+        lifetime = entry["ttl_override"] if entry["ttl_override"] is not None else freshness_lifetime(not_modified.headers)
+        with self._lock:
+            for header in ["Cache-Control", "Expires", "Date", "ETag", "Last-Modified", "Age"]:
+                if header in not_modified.headers:
+                    entry["headers"][header] = not_modified.headers[header]
+            entry["etag"] = not_modified.headers.get("ETag", entry["etag"])
+            entry["expires_at"] = time.time() + (lifetime or 0.0)
+            self.counters["revalidated"] += 1
+
+    @staticmethod
+    def to_response(entry: Dict[str, Any], cache_status: str) -> requests.Response:
+        response = requests.Response()
+        response.status_code = entry["status_code"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.headers["X-Cache"] = cache_status
+        response._content = entry["content"]
+        response._content_consumed = True
+        response.encoding = entry["encoding"]
+        response.url = entry["url"]
+        return response
+
+    def invalidate(self, tag: str) -> int:
+        """Drops every entry stored under a tag (the tool id)."""
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry["tag"] == tag]
+            for key in keys:
+                self._bytes -= len(self._entries.pop(key)["content"])
+        if keys:
+            logger.info(f"Invalidated {len(keys)} cached HTTP responses for tool {tag}")
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
@@ -0,0 +1,342 @@
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional, Dict, Any, Callable
+from urllib.parse import urlsplit
+
+import requests
+
+from http_cache import HttpResponseCache
+
+logger = logging.getLogger(__name__)
+
+TOOL_HTTP_TIMEOUT = float(os.getenv("TOOL_HTTP_TIMEOUT", "30"))
+TOOL_HTTP_MAX_ATTEMPTS = int(os.getenv("TOOL_HTTP_MAX_ATTEMPTS", "3"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+HEDGE_WORKERS = int(os.getenv("HEDGE_WORKERS", "16"))
+# Adaptive hedging waits for the endpoint's observed p95 latency, once enough samples exist
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without sending a request while a host's circuit breaker is open."""
+
+
+class RetryPolicy:
+    """Retry settings of one tool endpoint; built from the tool's "resilience" metadata."""
+    def __init__(
+        self,
+        max_attempts: int = TOOL_HTTP_MAX_ATTEMPTS,
+        base_delay: float = 0.2,
+        max_delay: float = 2.0,
+        timeout: float = TOOL_HTTP_TIMEOUT,
+        retry_post: bool = False,
+        hedge: bool = False,
+        hedge_after: Optional[float] = None
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.retry_post = retry_post
+        self.hedge = hedge or hedge_after is not None
+        self.hedge_after = hedge_after
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> "RetryPolicy":
+        config = config or {}
+        hedge_after_ms = config.get("hedge_after_ms")
+        return cls(
+            max_attempts=config.get("max_attempts") or TOOL_HTTP_MAX_ATTEMPTS,
+            base_delay=(config.get("base_delay_ms") or 200) / 1000,
+            max_delay=(config.get("max_delay_ms") or 2000) / 1000,
+            timeout=config.get("timeout_seconds") or TOOL_HTTP_TIMEOUT,
+            retry_post=bool(config.get("retry_post")),
+            hedge=bool(config.get("hedge")),
+            hedge_after=hedge_after_ms / 1000 if hedge_after_ms else None
+        )
+
+    def retries(self, method: str) -> bool:
+        return method in IDEMPOTENT_METHODS or (self.retry_post and method in ["POST", "PATCH"])
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff; a server Retry-After is honored up to max_delay."""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+class CircuitBreaker:
+    """
+    Per-host breaker: opens after consecutive failures, fails fast while open, and after the reset
+    timeout lets a single trial request through (half-open) whose outcome closes or reopens it.
+    """
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.opens = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> bool:
+        """Returns True when this failure opened the breaker."""
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or (self.state == "closed" and self.consecutive_failures >= self.failure_threshold):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.opens += 1
+                return True
+            return False
+
+    def release_trial(self):
+        """Frees the half-open trial slot of a request that ended without a success or failure being recorded."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive_failures, "opens": self.opens}
+
+
+class ResilientHttpClient:
+    """
+    HTTP client for OpenAPI tool calls: jittered retries for idempotent methods, a circuit breaker
+    per host, optional hedged GETs (a second request after a delay, first response wins), an
+    optional HTTP response cache for GETs and counters for the metrics endpoint. One instance is
+    shared by all executors so breaker state, latency history and cached responses survive
+    across executions.
+    """
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        hedge_workers: int = HEDGE_WORKERS,
+        response_cache: Optional[HttpResponseCache] = None
+    ):
+        self.session = session or requests.Session()
+        self.response_cache = response_cache
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, deque] = {}
+        self._hedge_pool = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="tool-http-hedge")
+        self._lock = threading.Lock()
+        self.counters = {
+            "requests": 0,
+            "attempts": 0,
+            "retries": 0,
+            "failures": 0,
+            "short_circuits": 0,
+            "breaker_opens": 0,
+            "hedges": 0,
+            "hedge_wins": 0
+        }
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker()
+            return breaker
+
+    def _record_latency(self, endpoint: str, seconds: float):
+        with self._lock:
+            self._latencies.setdefault(endpoint, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def p95_latency(self, endpoint: str) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies.get(endpoint, []))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[int(len(samples) * 0.95) - 1]
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        policy: Optional[RetryPolicy] = None,
+        endpoint: Optional[str] = None,
+        use_cache: bool = True,
+        cache_ttl: Optional[float] = None,
+        cache_tag: Optional[str] = None,
+        **kwargs
+    ) -> requests.Response:
+        """
+        Sends a request under the policy and returns the final response (which may still be an
+        error status once retries are exhausted). Raises CircuitOpenError when the host's breaker
+        is open, or the last transport error. GETs go through the response cache when one is
+        attached; cache_ttl overrides the server's freshness and cache_tag (the tool id) groups
+        entries for invalidation.
+        """
+        method = method.upper()
+        if method != "GET" or not use_cache or self.response_cache is None:
+            return self._send(method, url, policy, endpoint, **kwargs)
+
+        cache = self.response_cache
+        key = cache.key(url, kwargs.get("params"), kwargs.get("headers"))
+        entry = cache.lookup(key)
+        if entry is not None and cache.is_fresh(entry):
+            return cache.to_response(entry, "HIT")
+        if entry is not None:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **cache.conditional_headers(entry)}
+        response = self._send(method, url, policy, endpoint, **kwargs)
+        if entry is not None and response.status_code == 304:
+            cache.revalidated(key, entry, response)
+            response.close()
+            return cache.to_response(entry, "REVALIDATED")
+        cache.store(key, response, ttl_override=cache_ttl, tag=cache_tag, streamed=bool(kwargs.get("stream")))
+        return response
+
+    def _send(
+        self,
+        method: str,
+        url: str,
+        policy: Optional[RetryPolicy] = None,
+        endpoint: Optional[str] = None,
+        **kwargs
+    ) -> requests.Response:
+        policy = policy or RetryPolicy()
+        endpoint = endpoint or f"{method} {url.split('?')[0]}"
+        host = urlsplit(url).netloc
+        breaker = self.breaker(host)
+        kwargs.setdefault("timeout", policy.timeout)
+        self._count("requests")
+
+        send = lambda: self._timed_send(method, url, endpoint, kwargs)
+        hedge_after = None
+        if method == "GET" and policy.hedge:
+            hedge_after = policy.hedge_after or self.p95_latency(endpoint)
+
+        for attempt in range(1, policy.max_attempts + 1):
+            if not breaker.allow():
+                self._count("short_circuits")
+                raise CircuitOpenError(f"Circuit open for {host}: upstream failing, retry after {breaker.reset_timeout:.0f}s")
+            self._count("attempts")
+            retry_after = None
+            try:
+                response = self._hedged(send, hedge_after) if hedge_after else send()
+            except requests.RequestException as e:
+                self._failure(breaker, host)
+                if not policy.retries(method) or attempt == policy.max_attempts:
+                    raise
+                logger.warning(f"{endpoint} attempt {attempt} failed: {e}")
+            else:
+                if response.status_code in RETRY_STATUSES:
+                    self._failure(breaker, host)
+                else:
+                    breaker.record_success()
+                if response.status_code not in RETRY_STATUSES or not policy.retries(method) or attempt == policy.max_attempts:
+                    return response
+                logger.warning(f"{endpoint} attempt {attempt} returned {response.status_code}")
+                retry_after = _retry_after_seconds(response)
+                response.close()
+            finally:
+                # Other errors (e.g. raised by a response hook) record no outcome; without this a
+                # half-open trial would stay in flight and the breaker would never close again
+                breaker.release_trial()
+            self._count("retries")
+            time.sleep(policy.backoff(attempt, retry_after))
+        raise RuntimeError("unreachable")
+
+    def _failure(self, breaker: CircuitBreaker, host: str):
+        self._count("failures")
+        if breaker.record_failure():
+            self._count("breaker_opens")
+            logger.warning(f"Circuit breaker opened for {host}")
+
+    def _timed_send(self, method: str, url: str, endpoint: str, kwargs: Dict[str, Any]) -> requests.Response:
+        started = time.monotonic()
+        response = self.session.request(method, url, **kwargs)
+        self._record_latency(endpoint, time.monotonic() - started)
+        return response
+
+    def _hedged(self, send: Callable[[], requests.Response], hedge_after: float) -> requests.Response:
+        primary = self._hedge_pool.submit(send)
+        done, _ = wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+        self._count("hedges")
+        backup = self._hedge_pool.submit(send)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except requests.RequestException as e:
+                    error = e
+                    continue
+                if future is backup:
+                    self._count("hedge_wins")
+                # The slower copy is closed when it finishes
+                for other in pending:
+                    other.add_done_callback(lambda f: f.exception() is None and f.result().close())
+                return response
+        raise error
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            breakers = dict(self._breakers)
+        stats = {**counters, "breakers": {host: breaker.snapshot() for host, breaker in breakers.items()}}
+        if self.response_cache is not None:
+            stats["response_cache"] = self.response_cache.stats()
+        return stats
+
+    def close(self):
+        self._hedge_pool.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+
+def _retry_after_seconds(response: requests.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+_default_client: Optional[ResilientHttpClient] = None
+_default_lock = threading.Lock()
+
+
+def default_http_client() -> ResilientHttpClient:
+    """Process-wide client for executors constructed without an explicit one."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = ResilientHttpClient()
+        return _default_client
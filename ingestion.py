@@ -0,0 +1,225 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List
+
+from document_readers import extract_text, file_sha256
+from knowledge_base import KnowledgeBase, KnowledgeBaseStore
+
+logger = logging.getLogger(__name__)
+
+INGESTION_JOBS_DIR = os.getenv("INGESTION_JOBS_DIR", "data/ingestion_jobs")
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "4"))
+INGESTION_BATCH_SIZE = int(os.getenv("INGESTION_BATCH_SIZE", "32"))
+# Prepared documents are written to the index whenever this many chunks are pending
+INGESTION_FLUSH_CHUNKS = int(os.getenv("INGESTION_FLUSH_CHUNKS", "20000"))
+MAX_JOB_ERRORS = 50
+
+
+class IngestionPipeline:
+    """
+    Ingests batches of documents into agent knowledge bases in the background.
+    Extraction, chunking and embedding run on a worker pool; documents whose source hash
+    matches the indexed one are skipped, and prepared documents plus deletions are applied
+    to the index in bulk, so re-ingesting a mostly unchanged corpus only re-embeds the edits.
+    Job progress is kept in memory and mirrored to data/ingestion_jobs/{job_id}.json.
+    """
+    def __init__(
+        self,
+        knowledge_bases: KnowledgeBaseStore,
+        max_workers: int = INGESTION_WORKERS,
+        batch_size: int = INGESTION_BATCH_SIZE,
+        jobs_dir: str = INGESTION_JOBS_DIR
+    ):
+        self.knowledge_bases = knowledge_bases
+        self.batch_size = batch_size
+        self.jobs_dir = jobs_dir
+        self._workers = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kb-ingest")
+        self._jobs_runner = ThreadPoolExecutor(max_workers=2, thread_name_prefix="kb-ingest-job")
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._agent_locks: Dict[str, threading.Lock] = {}
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+    def submit(
+        self,
+        agent_id: str,
+        documents: List[Dict[str, Any]],
+        delete_ids: Optional[List[str]] = None,
+        prune: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Queues an ingestion job. Each document has a doc_id and either a file path (plus optional
+        file_type) or text, and optionally title, source and cleanup (delete the file afterwards).
+        prune=True deletes indexed documents that are not part of this batch.
+        """
+        # A doc_id listed twice would be indexed twice; the last entry wins
+        documents = list({document["doc_id"]: document for document in documents}.values())
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "agent_id": agent_id,
+            "status": "queued",
+            "total": len(documents),
+            "processed": 0,
+            "indexed": 0,
+            "skipped": 0,
+            "deleted": 0,
+            "failed": 0,
+            "errors": [],
+            "created_at": datetime.utcnow().isoformat(),
+            "started_at": None,
+            "finished_at": None
+        }
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+        self._save_job(job)
+        self._jobs_runner.submit(self._run, job, documents, delete_ids or [], prune)
+        logger.info(f"Queued ingestion job {job['job_id']} for agent {agent_id}: {len(documents)} documents, {len(delete_ids or [])} deletions")
+        return self._snapshot(job)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                return self._snapshot(job)
+        path = self._job_path(job_id)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return None
+
+    def list_jobs(self, agent_id: str) -> List[Dict[str, Any]]:
+        jobs = []
+        for filename in os.listdir(self.jobs_dir):
+            if filename.endswith(".json"):
+                job = self.get_job(filename[:-5])
+                if job and job.get("agent_id") == agent_id:
+                    jobs.append(job)
+        return sorted(jobs, key=lambda job: job["created_at"], reverse=True)
+
+    def shutdown(self):
+        self._jobs_runner.shutdown(wait=False, cancel_futures=True)
+        self._workers.shutdown(wait=False, cancel_futures=True)
+
+    def _job_path(self, job_id: str) -> str:
+        if not job_id or os.sep in job_id or ".." in job_id:
+            raise ValueError(f"Invalid job id: {job_id}")
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _snapshot(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        snapshot = {**job, "errors": list(job["errors"])}
+        snapshot["progress"] = round(job["processed"] / job["total"], 4) if job["total"] else 1.0
+        return snapshot
+
+    def _save_job(self, job: Dict[str, Any]):
+        with self._lock:
+            snapshot = self._snapshot(job)
+        path = self._job_path(job["job_id"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _update(self, job: Dict[str, Any], **counters):
+        with self._lock:
+            for key, value in counters.items():
+                job[key] += value
+
+    def _prepare(self, kb: KnowledgeBase, document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Extracts, chunks and embeds one document; returns None if it is unchanged."""
+        doc_id = document["doc_id"]
+        path = document.get("path")
+        if path:
+            source_hash = file_sha256(path)
+            if kb.is_unchanged(doc_id, source_hash):
+                return None
+            text = extract_text(path, document.get("file_type"))
+        else:
+            text = document.get("text") or ""
+            source_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            if kb.is_unchanged(doc_id, source_hash):
+                return None
+        chunks, vectors = kb.prepare_document(text)
+        return {
+            "doc_id": doc_id,
+            "title": document.get("title") or doc_id,
+            "source": document.get("source"),
+            "source_hash": source_hash,
+            "text": text,
+            "chunks": chunks,
+            "vectors": vectors
+        }
+
+    def _run(self, job: Dict[str, Any], documents: List[Dict[str, Any]], delete_ids: List[str], prune: bool):
+        agent_id = job["agent_id"]
+        with self._lock:
+            agent_lock = self._agent_locks.setdefault(agent_id, threading.Lock())
+        # Jobs for the same knowledge base run one at a time so their bulk writes do not interleave
+        with agent_lock:
+            with self._lock:
+                job["status"] = "running"
+                job["started_at"] = datetime.utcnow().isoformat()
+            self._save_job(job)
+            try:
+                kb = self.knowledge_bases.get(agent_id)
+                deletes = set(delete_ids)
+                if prune:
+                    submitted = {document["doc_id"] for document in documents}
+                    deletes |= {doc_id for doc_id in kb.documents if doc_id not in submitted}
+
+                pending: List[Dict[str, Any]] = []
+                pending_chunks = 0
+                for start in range(0, len(documents), self.batch_size):
+                    batch = documents[start:start + self.batch_size]
+                    futures = [(document, self._workers.submit(self._prepare, kb, document)) for document in batch]
+                    for document, future in futures:
+                        try:
+                            prepared = future.result()
+                        except Exception as e:
+                            logger.warning(f"Ingestion job {job['job_id']} failed on document {document['doc_id']}: {e}")
+                            with self._lock:
+                                job["failed"] += 1
+                                job["processed"] += 1
+                                if len(job["errors"]) < MAX_JOB_ERRORS:
+                                    job["errors"].append({"doc_id": document["doc_id"], "error": str(e)})
+                            continue
+                        finally:
+                            if document.get("cleanup") and document.get("path"):
+                                try:
+                                    os.remove(document["path"])
+                                except OSError:
+                                    pass
+                        if prepared is None:
+                            self._update(job, skipped=1, processed=1)
+                            continue
+                        pending.append(prepared)
+                        pending_chunks += len(prepared["chunks"])
+                        self._update(job, processed=1)
+
+                    if pending_chunks >= INGESTION_FLUSH_CHUNKS:
+                        self._update(job, indexed=kb.apply_changes(pending)["indexed"])
+                        pending, pending_chunks = [], 0
+                    self._save_job(job)
+
+                result = kb.apply_changes(pending, list(deletes))
+                self._update(job, indexed=result["indexed"], deleted=result["deleted"])
+                with self._lock:
+                    job["status"] = "completed"
+            except Exception as e:
+                logger.error(f"Ingestion job {job['job_id']} failed: {e}", exc_info=True)
+                with self._lock:
+                    job["status"] = "failed"
+                    job["errors"].append({"doc_id": None, "error": str(e)})
+            finally:
+                with self._lock:
+                    job["finished_at"] = datetime.utcnow().isoformat()
+                self._save_job(job)
+                logger.info(
+                    f"Ingestion job {job['job_id']} {job['status']}: indexed={job['indexed']} skipped={job['skipped']} "
+                    f"deleted={job['deleted']} failed={job['failed']}"
+                )
@@ -0,0 +1,578 @@
+import os
+import re
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_BASE_DIR = os.getenv("KNOWLEDGE_BASE_DIR", "data/knowledge_base")
+KB_EMBEDDER = os.getenv("KB_EMBEDDER", "hashing")
+KB_EMBEDDING_DIM = int(os.getenv("KB_EMBEDDING_DIM", "256"))
+KB_CHUNK_SIZE = int(os.getenv("KB_CHUNK_SIZE", "800"))
+KB_CHUNK_OVERLAP = int(os.getenv("KB_CHUNK_OVERLAP", "120"))
+KB_TOP_K = int(os.getenv("KB_TOP_K", "4"))
+KB_CONTEXT_MAX_CHARS = int(os.getenv("KB_CONTEXT_MAX_CHARS", "4000"))
+# Corpora at or above this many chunks also get an IVF index; smaller ones are searched exhaustively
+KB_ANN_THRESHOLD = int(os.getenv("KB_ANN_THRESHOLD", "50000"))
+KB_IVF_NPROBE = int(os.getenv("KB_IVF_NPROBE", "8"))
+# The IVF index is retrained only once incrementally assigned rows have drifted this far from their
+# centroids (weighted by their share of the index) or this fraction of rows is tombstoned
+KB_IVF_MAX_DRIFT = float(os.getenv("KB_IVF_MAX_DRIFT", "0.05"))
+KB_IVF_MAX_TOMBSTONE_RATIO = float(os.getenv("KB_IVF_MAX_TOMBSTONE_RATIO", "0.2"))
+
+# Rows scored per matrix product; bounds temporary memory for batched queries
+SEARCH_BLOCK_ROWS = 65536
+
+
+def chunk_text(text: str, chunk_size: int = KB_CHUNK_SIZE, overlap: int = KB_CHUNK_OVERLAP) -> List[str]:
+    """
+    Splits text into chunks of at most chunk_size characters along paragraph boundaries.
+    Paragraphs longer than a chunk are cut into windows; consecutive chunks share `overlap` characters.
+    """
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text or "") if p.strip()]
+    pieces = []
+    step = max(1, chunk_size - overlap)
+    for paragraph in paragraphs:
+        paragraph = re.sub(r"\s+", " ", paragraph)
+        if len(paragraph) <= chunk_size:
+            pieces.append(paragraph)
+        else:
+            pieces.extend(paragraph[start:start + chunk_size] for start in range(0, len(paragraph) - overlap, step))
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > chunk_size:
+            chunks.append(current)
+            tail = current[-overlap:] if overlap else ""
+            current = f"{tail} {piece}".strip() if len(tail) + len(piece) + 1 <= chunk_size else piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class HashingEmbedder:
+    """
+    Deterministic local embedder: feature-hashes unigrams and bigrams into a fixed number of
+    dimensions. Needs no model download or network access, so it is the default and the test embedder.
+    """
+    name = "hashing"
+
+    def __init__(self, dim: int = KB_EMBEDDING_DIM):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        tokens = re.findall(r"\w+", (text or "").lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts: Dict[str, int] = {}
+            for feature in self._features(text):
+                counts[feature] = counts.get(feature, 0) + 1
+            for feature, count in counts.items():
+                digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                sign = 1.0 if digest & 1 else -1.0
+                vectors[row, (digest >> 1) % self.dim] += sign * (1.0 + np.log(count))
+        return normalize_rows(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """Embedder backed by a sentence-transformers model (optional dependency)."""
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str = os.getenv("KB_EMBEDDING_MODEL", "all-MiniLM-L6-v2"), **kwargs):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError("KB_EMBEDDER=sentence-transformers requires the sentence-transformers package")
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"sentence-transformers:{model_name}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return normalize_rows(np.asarray(self.model.encode(texts, batch_size=64), dtype=np.float32))
+
+
+EMBEDDERS = {
+    "hashing": HashingEmbedder,
+    "sentence-transformers": SentenceTransformerEmbedder
+}
+
+
+def get_embedder(name: str = KB_EMBEDDER, **kwargs):
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown embedder '{name}'. Available: {', '.join(EMBEDDERS)}")
+    return EMBEDDERS[name](**kwargs)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+def _top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns (scores, indices) of the k best entries per row, best first."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.float32), np.empty((scores.shape[0], 0), dtype=np.int64)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return np.take_along_axis(part_scores, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+
+class VectorIndex:
+    """
+    In-process cosine-similarity index over L2-normalized float32 vectors.
+    Search is an exact batched matrix product; build_ivf() adds an inverted-file index
+    (k-means coarse quantizer) that probes only the nearest lists for large corpora.
+    Once the IVF index exists, added rows are assigned to their nearest centroid and deleted rows
+    are tombstoned, so updates do not retrain it; needs_retrain() reports when it has gone stale.
+    Persisted as .npy files and reopened memory-mapped.
+    """
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.centroids: Optional[np.ndarray] = None
+        self.list_offsets: Optional[np.ndarray] = None
+        self.list_ids: Optional[np.ndarray] = None
+        self.deleted: Optional[np.ndarray] = None
+        # Mean centroid similarity of the training rows, and the count and similarity sum of rows assigned since
+        self.trained_similarity = 0.0
+        self.added_rows = 0
+        self.added_similarity = 0.0
+        self.nprobe = KB_IVF_NPROBE
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    @property
+    def has_ivf(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def tombstones(self) -> int:
+        return int(np.count_nonzero(self.deleted)) if self.deleted is not None else 0
+
+    @property
+    def live_count(self) -> int:
+        return len(self) - self.tombstones
+
+    def add(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        first_row = len(self)
+        # Concatenation also materializes a memory-mapped matrix before it is rewritten
+        self.vectors = np.concatenate([np.asarray(self.vectors), vectors])
+        if self.has_ivf and len(vectors):
+            self._assign(vectors, first_row)
+
+    def _assign(self, vectors: np.ndarray, first_row: int):
+        """Appends rows starting at first_row to the inverted list of their nearest centroid."""
+        similarities = vectors @ self.centroids.T
+        assignment = np.argmax(similarities, axis=1)
+        n_lists = len(self.centroids)
+        # np.insert places each new id at the end of its list, keeping every list sorted by row id
+        self.list_ids = np.insert(self.list_ids, self.list_offsets[assignment + 1], np.arange(first_row, first_row + len(vectors)))
+        self.list_offsets = self.list_offsets + np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+        self.deleted = np.concatenate([self.deleted, np.zeros(len(vectors), dtype=bool)])
+        self.added_rows += len(vectors)
+        self.added_similarity += float(np.take_along_axis(similarities, assignment[:, None], axis=1).sum())
+
+    def delete(self, mask: np.ndarray):
+        """Tombstones the rows where mask is True; only valid while the IVF index exists (use keep() otherwise)."""
+        self.deleted = self.deleted | mask
+
+    def keep(self, mask: np.ndarray):
+        """Keeps only the rows where mask is True; drops the IVF index, which must then be rebuilt."""
+        self.vectors = np.asarray(self.vectors)[mask]
+        self.drop_ivf()
+
+    def compact(self) -> Optional[np.ndarray]:
+        """Removes tombstoned rows and drops the IVF index. Returns the mask of kept rows, or None if nothing was removed."""
+        if not self.tombstones:
+            self.drop_ivf()
+            return None
+        mask = ~self.deleted
+        self.keep(mask)
+        return mask
+
+    def drop_ivf(self):
+        self.centroids = self.list_offsets = self.list_ids = self.deleted = None
+        self.trained_similarity = self.added_similarity = 0.0
+        self.added_rows = 0
+
+    @property
+    def drift(self) -> float:
+        """Drop in centroid similarity of the rows assigned since training, weighted by their share of the index."""
+        if not self.has_ivf or not self.added_rows or not len(self):
+            return 0.0
+        added_mean = self.added_similarity / self.added_rows
+        return max(0.0, self.trained_similarity - added_mean) * self.added_rows / len(self)
+
+    def needs_retrain(self, max_drift: float = KB_IVF_MAX_DRIFT, max_tombstone_ratio: float = KB_IVF_MAX_TOMBSTONE_RATIO) -> bool:
+        if not self.has_ivf:
+            return True
+        return self.drift > max_drift or self.tombstones > max_tombstone_ratio * len(self)
+
+    def build_ivf(self, n_lists: Optional[int] = None, iterations: int = 10, sample_size: int = 20000, seed: int = 0):
+        """Clusters the vectors with spherical k-means and stores the lists in CSR form. Call compact() first."""
+        n = len(self)
+        if n == 0:
+            return
+        n_lists = n_lists or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(self.vectors[rng.choice(n, size=min(n, max(sample_size, n_lists)), replace=False)])
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = normalize_rows(centroids)
+
+        assignments, similarity = [], 0.0
+        for start in range(0, n, SEARCH_BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + SEARCH_BLOCK_ROWS]) @ centroids.T
+            assignments.append(np.argmax(block, axis=1))
+            similarity += float(block.max(axis=1).sum())
+        assignment = np.concatenate(assignments)
+        self.list_ids = np.argsort(assignment, kind="stable").astype(np.int64)
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))]).astype(np.int64)
+        self.centroids = centroids
+        self.deleted = np.zeros(n, dtype=bool)
+        self.trained_similarity = similarity / n
+        self.added_rows = 0
+        self.added_similarity = 0.0
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (scores, row ids) with shape (len(queries), k') for k' = min(k, len(self))."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if len(self) == 0:
+            return np.empty((len(queries), 0), dtype=np.float32), np.empty((len(queries), 0), dtype=np.int64)
+        if self.has_ivf:
+            return self._search_ivf(queries, k)
+
+        best_scores, best_ids = None, None
+        for start in range(0, len(self), SEARCH_BLOCK_ROWS):
+            block_scores, block_ids = _top_k(queries @ self.vectors[start:start + SEARCH_BLOCK_ROWS].T, k)
+            block_ids = block_ids + start
+            if best_scores is None:
+                best_scores, best_ids = block_scores, block_ids
+            else:
+                merged_scores = np.concatenate([best_scores, block_scores], axis=1)
+                merged_ids = np.concatenate([best_ids, block_ids], axis=1)
+                best_scores, order = _top_k(merged_scores, k)
+                best_ids = np.take_along_axis(merged_ids, order, axis=1)
+        return best_scores, best_ids
+
+    def _search_ivf(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        nprobe = min(self.nprobe, len(self.centroids))
+        _, probes = _top_k(queries @ self.centroids.T, nprobe)
+        all_scores, all_ids = [], []
+        for query, lists in zip(queries, probes):
+            candidates = np.concatenate([self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in lists])
+            candidates = candidates[~self.deleted[candidates]]
+            candidates.sort()
+            scores, order = _top_k((np.asarray(self.vectors[candidates]) @ query)[None, :], k)
+            all_scores.append(scores[0])
+            all_ids.append(candidates[order[0]])
+        width = min(len(s) for s in all_scores)
+        return np.stack([s[:width] for s in all_scores]), np.stack([i[:width] for i in all_ids])
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        _save_npy(os.path.join(directory, "vectors.npy"), np.asarray(self.vectors))
+        ivf_path = os.path.join(directory, "ivf.npz")
+        if self.has_ivf:
+            tmp_path = f"{ivf_path}.tmp.npz"
+            np.savez(
+                tmp_path, centroids=self.centroids, list_offsets=self.list_offsets, list_ids=self.list_ids, deleted=self.deleted,
+                stats=np.array([self.trained_similarity, self.added_rows, self.added_similarity], dtype=np.float64)
+            )
+            os.replace(tmp_path, ivf_path)
+        elif os.path.exists(ivf_path):
+            os.remove(ivf_path)
+
+    @classmethod
+    def load(cls, directory: str, dim: int) -> "VectorIndex":
+        index = cls(dim)
+        vectors_path = os.path.join(directory, "vectors.npy")
+        if os.path.exists(vectors_path):
+            index.vectors = np.load(vectors_path, mmap_mode="r")
+        ivf_path = os.path.join(directory, "ivf.npz")
+        if os.path.exists(ivf_path):
+            with np.load(ivf_path) as data:
+                index.centroids = data["centroids"]
+                index.list_offsets = data["list_offsets"]
+                index.list_ids = data["list_ids"]
+                # Indexes saved before tombstones were tracked have none
+                index.deleted = data["deleted"] if "deleted" in data.files else np.zeros(len(index), dtype=bool)
+                if "stats" in data.files:
+                    index.trained_similarity, added_rows, index.added_similarity = (float(value) for value in data["stats"])
+                    index.added_rows = int(added_rows)
+        return index
+
+
+def _save_npy(path: str, array: np.ndarray):
+    tmp_path = f"{path}.tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+class KnowledgeBase:
+    """
+    Chunked, embedded documents of one agent under data/knowledge_base/{agent_id}/:
+    documents.json (per-document metadata), chunks.jsonl (chunk text, one line per index row),
+    vectors.npy (memory-mapped embeddings) and ivf.npz once the corpus is large.
+    While the IVF index exists, deleted chunks stay in place marked "deleted" until it is retrained.
+    """
+    def __init__(self, directory: str, embedder=None):
+        self.directory = directory
+        self.embedder = embedder or get_embedder()
+        self._lock = threading.RLock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        manifest = {}
+        if os.path.exists(self._path("manifest.json")):
+            with open(self._path("manifest.json"), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        if manifest and (manifest.get("embedder") != self.embedder.name or manifest.get("dim") != self.embedder.dim):
+            # Vectors from another embedder are not comparable; re-embed from the stored chunk text
+            logger.warning(f"Embedder changed for {self.directory}, re-embedding stored chunks")
+            self.documents = self._read_documents()
+            self.chunks = [chunk for chunk in self._read_chunks() if not chunk.get("deleted")]
+            self.index = VectorIndex(self.embedder.dim)
+            if self.chunks:
+                self.index.add(self.embedder.embed([chunk["text"] for chunk in self.chunks]))
+            self._refresh_ivf()
+            self._save()
+            return
+        self.documents = self._read_documents()
+        self.chunks = self._read_chunks()
+        self.index = VectorIndex.load(self.directory, self.embedder.dim)
+        if len(self.index) != len(self.chunks):
+            logger.error(f"Knowledge base {self.directory} has {len(self.chunks)} chunks but {len(self.index)} vectors, rebuilding vectors")
+            self.chunks = [chunk for chunk in self.chunks if not chunk.get("deleted")]
+            self.index = VectorIndex(self.embedder.dim)
+            if self.chunks:
+                self.index.add(self.embedder.embed([chunk["text"] for chunk in self.chunks]))
+            self._refresh_ivf()
+            self._save()
+
+    def _read_documents(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self._path("documents.json")):
+            return {}
+        with open(self._path("documents.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _read_chunks(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self._path("chunks.jsonl")):
+            return []
+        with open(self._path("chunks.jsonl"), "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _write_json(self, name: str, data: Any):
+        tmp_path = self._path(f"{name}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self._path(name))
+
+    def _save(self):
+        self.index.save(self.directory)
+        tmp_path = self._path("chunks.jsonl.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for chunk in self.chunks:
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self._path("chunks.jsonl"))
+        self._write_json("documents.json", self.documents)
+        self._write_json("manifest.json", {
+            "embedder": self.embedder.name,
+            "dim": self.embedder.dim,
+            "chunks": self.index.live_count,
+            "tombstones": self.index.tombstones,
+            "ivf": self.index.has_ivf
+        })
+        # Reopen memory-mapped so resident memory stays bounded between writes
+        self.index = VectorIndex.load(self.directory, self.embedder.dim)
+
+    def _compact(self):
+        """Drops tombstoned chunks and their vectors, which also drops the IVF index."""
+        mask = self.index.compact()
+        if mask is not None:
+            self.chunks = [chunk for chunk, keep in zip(self.chunks, mask) if keep]
+
+    def _refresh_ivf(self):
+        """
+        Below KB_ANN_THRESHOLD live chunks the index stays exhaustive. Above it the IVF index is built once
+        and then updated incrementally, and only retrained when drift or tombstones pass their thresholds.
+        """
+        if self.index.live_count < KB_ANN_THRESHOLD:
+            if self.index.has_ivf:
+                self._compact()
+            return
+        if self.index.needs_retrain():
+            drift, tombstones = self.index.drift, self.index.tombstones
+            self._compact()
+            self.index.build_ivf()
+            logger.info(f"Built IVF index over {len(self.index)} chunks in {self.directory} (drift {drift:.3f}, {tombstones} tombstones)")
+
+    def prepare_document(self, text: str) -> Tuple[List[str], np.ndarray]:
+        """Chunks and embeds a document without touching the index (safe to run on worker threads)."""
+        chunks = chunk_text(text)
+        if not chunks:
+            raise ValueError("Document has no text to index")
+        return chunks, self.embedder.embed(chunks)
+
+    def is_unchanged(self, doc_id: str, source_hash: str) -> bool:
+        """True if doc_id is indexed from a source with the same hash, so re-ingesting it can be skipped."""
+        document = self.documents.get(doc_id)
+        return bool(document) and source_hash in (document.get("source_hash"), document.get("content_hash"))
+
+    def add_document(self, text: str, doc_id: Optional[str] = None, title: Optional[str] = None, source: Optional[str] = None) -> Dict[str, Any]:
+        """Chunks, embeds and stores a document; an existing document with the same id is replaced."""
+        chunks, vectors = self.prepare_document(text)
+        doc_id = doc_id or str(uuid.uuid4())
+        self.apply_changes([{
+            "doc_id": doc_id, "title": title, "source": source, "text": text, "chunks": chunks, "vectors": vectors
+        }])
+        logger.info(f"Indexed document {doc_id} ({len(chunks)} chunks) in {self.directory}")
+        return self.documents[doc_id]
+
+    def apply_changes(self, upserts: List[Dict[str, Any]], deletes: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Applies a batch of prepared documents and deletions with one index rewrite.
+        Each upsert carries doc_id, text, chunks and vectors (from prepare_document) plus optional
+        title, source and source_hash. Deleted and replaced rows are masked out (tombstoned while the
+        IVF index exists); nothing is re-embedded.
+        """
+        deletes = set(deletes or [])
+        with self._lock:
+            removed = [doc_id for doc_id in deletes if doc_id in self.documents]
+            replaced = {upsert["doc_id"] for upsert in upserts} | set(removed)
+            if replaced & set(self.documents):
+                mask = np.array([chunk["doc_id"] not in replaced for chunk in self.chunks], dtype=bool)
+                if self.index.has_ivf:
+                    self.index.delete(~mask)
+                    for chunk, keep in zip(self.chunks, mask):
+                        if not keep:
+                            chunk["deleted"] = True
+                else:
+                    self.chunks = [chunk for chunk, keep in zip(self.chunks, mask) if keep]
+                    self.index.keep(mask)
+                for doc_id in replaced:
+                    self.documents.pop(doc_id, None)
+
+            now = datetime.utcnow().isoformat()
+            for upsert in upserts:
+                doc_id = upsert["doc_id"]
+                self.chunks.extend(
+                    {"doc_id": doc_id, "chunk": position, "text": chunk}
+                    for position, chunk in enumerate(upsert["chunks"])
+                )
+                self.documents[doc_id] = {
+                    "doc_id": doc_id,
+                    "title": upsert.get("title") or doc_id,
+                    "source": upsert.get("source"),
+                    "chunks": len(upsert["chunks"]),
+                    "characters": len(upsert["text"]),
+                    "content_hash": hashlib.sha256(upsert["text"].encode("utf-8")).hexdigest(),
+                    "source_hash": upsert.get("source_hash"),
+                    "added_at": now
+                }
+            if upserts:
+                self.index.add(np.concatenate([upsert["vectors"] for upsert in upserts]))
+            if upserts or removed:
+                self._refresh_ivf()
+                self._save()
+        return {"indexed": len(upserts), "deleted": len(removed)}
+
+    def remove_document(self, doc_id: str) -> bool:
+        return self.apply_changes([], [doc_id])["deleted"] == 1
+
+    def list_documents(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self.documents.values())
+
+    def search(self, query: str, top_k: int = KB_TOP_K) -> List[Dict[str, Any]]:
+        """Returns the top_k chunks most similar to query, best first."""
+        if not query or not query.strip():
+            return []
+        query_vector = self.embedder.embed([query])
+        with self._lock:
+            scores, ids = self.index.search(query_vector, top_k)
+            results = []
+            for score, row in zip(scores[0], ids[0]):
+                chunk = self.chunks[int(row)]
+                document = self.documents.get(chunk["doc_id"], {})
+                results.append({
+                    "doc_id": chunk["doc_id"],
+                    "title": document.get("title"),
+                    "chunk": chunk["chunk"],
+                    "text": chunk["text"],
+                    "score": round(float(score), 4)
+                })
+        return results
+
+    def build_context(self, query: str, top_k: int = KB_TOP_K, max_chars: int = KB_CONTEXT_MAX_CHARS) -> str:
+        """Formats the best matching chunks as prompt context, bounded by max_chars."""
+        sections = []
+        used = 0
+        for result in self.search(query, top_k):
+            if result["score"] <= 0:
+                continue
+            section = f"[{result['title']} #{result['chunk'] + 1}]\n{result['text']}"
+            if used + len(section) > max_chars:
+                break
+            sections.append(section)
+            used += len(section)
+        return "\n\n".join(sections)
+
+
+class KnowledgeBaseStore:
+    """Opens and caches one KnowledgeBase per agent id."""
+    def __init__(self, directory: str = KNOWLEDGE_BASE_DIR, embedder=None):
+        self.directory = directory
+        self.embedder = embedder
+        self._bases: Dict[str, KnowledgeBase] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _agent_dir(self, agent_id: str) -> str:
+        if not agent_id or os.sep in agent_id or ".." in agent_id:
+            raise ValueError(f"Invalid agent id: {agent_id}")
+        return os.path.join(self.directory, agent_id)
+
+    def get(self, agent_id: str) -> KnowledgeBase:
+        with self._lock:
+            if agent_id not in self._bases:
+                if self.embedder is None:
+                    self.embedder = get_embedder()
+                self._bases[agent_id] = KnowledgeBase(self._agent_dir(agent_id), self.embedder)
+            return self._bases[agent_id]
+
+    def exists(self, agent_id: str) -> bool:
+        return os.path.exists(os.path.join(self._agent_dir(agent_id), "manifest.json"))
+
+    def delete(self, agent_id: str):
+        with self._lock:
+            self._bases.pop(agent_id, None)
+            shutil.rmtree(self._agent_dir(agent_id), ignore_errors=True)
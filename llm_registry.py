@@ -0,0 +1,186 @@
+import os
+import time
+import random
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict, Any
+
+from crewai import LLM
+
+try:
+    from crewai import BaseLLM
+except ImportError:
+    BaseLLM = LLM
+
+from cache_utils import TTLCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LLM_PROVIDER = os.getenv("DEFAULT_LLM_PROVIDER", "impact")
+DEFAULT_LLM_MODEL = os.getenv("DEFAULT_LLM_MODEL", "gemini-2.5-flash-preview-04-17")
+INTERNAL_LLM_PROVIDER = os.getenv("INTERNAL_LLM_PROVIDER", "google")
+INTERNAL_LLM_MODEL = os.getenv("INTERNAL_LLM_MODEL", "gemini-2.0-flash")
+LLM_CLIENT_CACHE_SIZE = int(os.getenv("LLM_CLIENT_CACHE_SIZE", "256"))
+STUB_LLM_RESPONSE = os.getenv("STUB_LLM_RESPONSE")
+STUB_LLM_LATENCY_MS = float(os.getenv("STUB_LLM_LATENCY_MS", "0"))
+
+# Providers backed by Gemini share key pools; callers pick the pool (free, paid or internal)
+GEMINI_PROVIDERS = {"impact", "google", "gemini"}
+
+# litellm prefix, key source and model aliases per provider; unknown providers are passed to
+# litellm as "<provider>/<model>" with the agent's own key
+PROVIDERS = {
+    "impact": {
+        "prefix": "gemini/",
+        "key_env": "GEMINI_API_KEYS",
+        "models": {"impact-storm-11": "gemini-2.5-flash-preview-04-17"},
+        "default_model": DEFAULT_LLM_MODEL
+    },
+    "google": {"prefix": "gemini/", "key_env": "GEMINI_API_KEYS"},
+    "gemini": {"prefix": "gemini/", "key_env": "GEMINI_API_KEYS"},
+    "openai": {"prefix": "openai/", "key_env": "OPENAI_API_KEY"},
+    "anthropic": {"prefix": "anthropic/", "key_env": "ANTHROPIC_API_KEY"},
+    "stub": {"prefix": "stub/"}
+}
+
+
+class StubLLM(BaseLLM):
+    """
+    Offline provider for tests and load runs: no network calls, a fixed reply (STUB_LLM_RESPONSE)
+    or an echo of the last message, and optional simulated latency.
+    """
+    def __init__(self, model: str = "echo", response: Optional[str] = STUB_LLM_RESPONSE, latency_ms: float = STUB_LLM_LATENCY_MS):
+        super().__init__(model=f"stub/{model}")
+        self.response = response
+        self.latency = latency_ms / 1000
+        self.calls = 0
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs) -> str:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.response is not None:
+            text = self.response
+        elif isinstance(messages, str):
+            text = messages
+        else:
+            text = next((m.get("content", "") for m in reversed(messages or []) if m.get("role") == "user"), "")
+        return f"Thought: I now know the final answer\nFinal Answer: {text}"
+
+    def supports_function_calling(self) -> bool:
+        return False
+
+    def supports_stop_words(self) -> bool:
+        return False
+
+    def get_context_window_size(self) -> int:
+        return 8192
+
+
+def _is_placeholder_key(api_key: Optional[str]) -> bool:
+    """Masked keys as stored by the UI ("****") or empty values mean: use the server's keys."""
+    return not api_key or not api_key.strip() or set(api_key.strip()) == {"*"}
+
+
+class LLMRegistry:
+    """
+    Builds and caches LLM clients per (provider, model, key, options), so agents run on the
+    provider and model they are configured with and executions reuse clients instead of
+    constructing them per run.
+    """
+    def __init__(self, max_clients: int = LLM_CLIENT_CACHE_SIZE):
+        self._clients = TTLCache(max_entries=max_clients, ttl=0)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def resolve_model(provider: Optional[str], model: Optional[str]) -> str:
+        """Returns the litellm model string, e.g. ("impact", "impact-storm-11") -> "gemini/gemini-2.5-flash-preview-04-17"."""
+        provider = (provider or DEFAULT_LLM_PROVIDER).lower()
+        spec = PROVIDERS.get(provider, {"prefix": f"{provider}/"})
+        if model and "/" in model and provider != "stub":
+            return model
+        model = spec.get("models", {}).get(model, model) or spec.get("default_model") or DEFAULT_LLM_MODEL
+        return f"{spec['prefix']}{model}"
+
+    @staticmethod
+    def api_key(provider: Optional[str], api_key: Optional[str] = None, gemini_key_env: Optional[str] = None) -> Optional[str]:
+        """The agent's own key when set, else a random key from the provider's (comma-separated) pool."""
+        if not _is_placeholder_key(api_key):
+            return api_key.strip()
+        provider = (provider or DEFAULT_LLM_PROVIDER).lower()
+        key_env = PROVIDERS.get(provider, {}).get("key_env")
+        if gemini_key_env and provider in GEMINI_PROVIDERS:
+            key_env = gemini_key_env
+        if not key_env:
+            return None
+        key_list = [key.strip() for key in os.getenv(key_env, "").split(",") if key.strip()]
+        if not key_list:
+            logger.warning(f"No API keys found in {key_env} for provider {provider}")
+            return None
+        return random.choice(key_list)
+
+    def client(
+        self,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        api_key: Optional[str] = None,
+        gemini_key_env: Optional[str] = None,
+        **options
+    ):
+        """Returns the cached client for a provider and model, creating it on first use."""
+        provider = (provider or DEFAULT_LLM_PROVIDER).lower()
+        resolved = self.resolve_model(provider, model)
+        key = self.api_key(provider, api_key, gemini_key_env)
+        key_hash = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16] if key else None
+        cache_key = (provider, resolved, key_hash, tuple(sorted(options.items())))
+        with self._lock:
+            llm = self._clients.get(cache_key)
+            if llm is None:
+                if provider == "stub":
+                    llm = StubLLM(model=resolved[len("stub/"):])
+                else:
+                    llm = LLM(model=resolved, api_key=key, **options)
+                self._clients.set(cache_key, llm)
+                logger.info(f"Created LLM client for {resolved} (provider: {provider})")
+        return llm
+
+    def for_agent(self, agent_config: Dict[str, Any], gemini_key_env: Optional[str] = None, **options):
+        """Client for an agent's llmProvider, llmModel and apiKey; missing settings use the defaults."""
+        return self.client(
+            agent_config.get("llmProvider"),
+            agent_config.get("llmModel"),
+            agent_config.get("apiKey"),
+            gemini_key_env=gemini_key_env,
+            **options
+        )
+
+    def internal_for_agent(self, agent_config: Optional[Dict[str, Any]] = None):
+        """
+        Client for the internal schema and payload agents. An agent can route them to another
+        model with internalLlmProvider / internalLlmModel; otherwise INTERNAL_LLM_* apply.
+        """
+        agent_config = agent_config or {}
+        provider = (agent_config.get("internalLlmProvider") or INTERNAL_LLM_PROVIDER).lower()
+        model = agent_config.get("internalLlmModel")
+        if not model:
+            model = INTERNAL_LLM_MODEL if provider in GEMINI_PROVIDERS else agent_config.get("llmModel")
+        # The agent's key only applies when the internal agents use the agent's own provider
+        api_key = agent_config.get("apiKey") if provider == (agent_config.get("llmProvider") or "").lower() else None
+        return self.client(provider, model, api_key, gemini_key_env="INTERNAL_GEMINI_API_KEY")
+
+    def stats(self) -> Dict[str, Any]:
+        return self._clients.stats()
+
+
+_default_registry: Optional[LLMRegistry] = None
+_default_lock = threading.Lock()
+
+
+def default_llm_registry() -> LLMRegistry:
+    """Process-wide registry for executors constructed without an explicit one."""
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = LLMRegistry()
+        return _default_registry
@@ -1,17 +1,23 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Response, BackgroundTasks
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Dict, Optional, List, Union, Any
 import json
 import os
 import uuid
+import hashlib
+import asyncio
+import time
 from datetime import datetime, timedelta
 import shutil
 from pathlib import Path
 from langchain.tools import Tool  # If tools are needed for manager/agents
 from fastapi.templating import Jinja2Templates
+from workflow_dag import validate_workflow_steps
+from tool_digest import build_operation_index
 
 
 import logging
@@ -26,10 +32,49 @@ MIN_AGENTSFOR_MULTI = 1
 if ENABLE_AGENT_RUN:
     from task_executor import TaskExecutor
     from multi_agent_executor import MultiAgentExecutor
+    from checkpoint_store import CheckpointStore
+    from artifact_store import ArtifactStore
     import psycopg2
     from psycopg2 import Error as PostgresError
-    from google.oauth2 import service_account
-    from google.cloud import bigquery
+    from connector_pools import PostgresPoolManager, BigQueryClientCache
+    from query_engine import DataQueryEngine, QueryError, QueryResultCache
+    from schema_introspection import SchemaIntrospector, render_schema_digest, SCHEMA_DIGEST_MAX_TOKENS
+    from knowledge_base import KnowledgeBaseStore
+    from ingestion import IngestionPipeline
+    from document_readers import mime_type_for
+    from response_cache import ResponseCache, agent_config_fingerprint
+    from worker_pool import WorkerPool, SingleFlight, when_all_done
+    from payload_cache import PayloadCache
+    from http_resilience import ResilientHttpClient
+    from http_cache import HttpResponseCache
+    from llm_registry import LLMRegistry
+    from budget import BudgetExceeded, ExecutionBudget
+    from batch_store import BatchStore, item_input, parse_batch_file, BATCH_MAX_ITEMS, BATCH_DEFAULT_CONCURRENCY, BATCH_MAX_CONCURRENCY
+    from cancellation import CancellationRegistry, CancellationToken, ExecutionCancelled, ClientDisconnected, await_unless_disconnected
+    from scheduler import CronExpression, ScheduleStore, Scheduler, TARGET_TYPES, SCHEDULER_ENABLED
+
+    postgres_pools = PostgresPoolManager()
+    bigquery_clients = BigQueryClientCache()
+    schema_introspector = SchemaIntrospector(postgres_pools, bigquery_clients)
+    query_result_cache = QueryResultCache()
+    knowledge_bases = KnowledgeBaseStore()
+    ingestion_pipeline = IngestionPipeline(knowledge_bases)
+    response_cache = ResponseCache()
+    payload_cache = PayloadCache()
+    artifact_store = ArtifactStore()
+    tool_response_cache = HttpResponseCache()
+    tool_http_client = ResilientHttpClient(response_cache=tool_response_cache)
+    llm_clients = LLMRegistry()
+    agent_workers = WorkerPool()
+    inference_flights = SingleFlight(agent_workers)
+    execution_cancellations = CancellationRegistry()
+    batch_store = BatchStore()
+    data_query_engine = DataQueryEngine(
+        postgres_pools,
+        bigquery_clients,
+        schema_introspector=schema_introspector,
+        result_cache=query_result_cache
+    )
 
 import logging
 # Configure logging
@@ -79,6 +124,18 @@ class AgentFeatures(BaseModel):
     knowledgeBase: bool = False
     dataQuery: bool = False
 
+class ResponseCacheConfig(BaseModel):
+    enabled: bool = False  # Serve identical requests from cache instead of re-running the agent
+    ttlSeconds: int = 3600
+    persistent: bool = False  # Keep cached responses on disk across restarts
+
+class ExecutionBudgetConfig(BaseModel):
+    # Unset values use the EXECUTION_* environment defaults; 0 disables a limit
+    timeoutSeconds: Optional[float] = None  # Wall-clock deadline of one execution
+    maxLlmCalls: Optional[int] = None
+    maxToolCalls: Optional[int] = None
+    maxTokens: Optional[int] = None
+
 class Agent(BaseModel):
     id: str
     name: str
@@ -86,6 +143,8 @@ class Agent(BaseModel):
     llmProvider: str
     llmModel: str
     apiKey: str
+    internalLlmProvider: Optional[str] = None  # Routes the internal schema/payload agents to another provider
+    internalLlmModel: Optional[str] = None
     role: str
     goal: str = ""
     expectedOutput: str = ""
@@ -93,6 +152,8 @@ class Agent(BaseModel):
     instructions: str
     verbose: bool = False
     features: AgentFeatures
+    responseCache: ResponseCacheConfig = ResponseCacheConfig()
+    budget: ExecutionBudgetConfig = ExecutionBudgetConfig()
     tools: List[str] = []  # List of tool IDs
     advanced_tools: List[str] = []  # List of advanced tool IDs
     sample_user_input: str = ""  # Sample user input for the agent
@@ -103,6 +164,8 @@ class AgentCreate(BaseModel):
     llmProvider: str
     llmModel: str
     apiKey: str
+    internalLlmProvider: Optional[str] = None  # Routes the internal schema/payload agents to another provider
+    internalLlmModel: Optional[str] = None
     role: str
     goal: str = ""
     expectedOutput: str = ""
@@ -110,6 +173,8 @@ class AgentCreate(BaseModel):
     instructions: str
     verbose: bool = False
     features: AgentFeatures
+    responseCache: ResponseCacheConfig = ResponseCacheConfig()
+    budget: ExecutionBudgetConfig = ExecutionBudgetConfig()
     tools: List[str] = []  # List of tool IDs
     advanced_tools: List[str] = []
     sample_user_input: str = ""  # Sample user input for the agent
@@ -138,6 +203,19 @@ class OpenAPISchema(BaseModel):
     servers: List[OpenAPIServer]
     paths: Dict[str, dict]
 
+class ToolResilienceConfig(BaseModel):
+    max_attempts: int = 3
+    base_delay_ms: int = 200
+    max_delay_ms: int = 2000
+    timeout_seconds: float = 30
+    retry_post: bool = False  # POST/PATCH are only retried when the API is known to be idempotent
+    hedge: bool = False  # Hedge GETs after the endpoint's observed p95 latency
+    hedge_after_ms: Optional[int] = None
+
+class ToolHttpCacheConfig(BaseModel):
+    enabled: bool = True  # GET responses are cached per HTTP caching headers
+    ttl_seconds: Optional[int] = None  # Overrides the server's Cache-Control/Expires freshness
+
 class CustomTool(BaseModel):
     name: str
     description: str
@@ -145,6 +223,10 @@ class CustomTool(BaseModel):
     schema: Dict[str, Any]
     is_custom: bool = True
     data_connector_id: Optional[str] = None
+    cache_query_results: bool = False  # Opt-in result caching for the connector's dataQuery tool
+    query_cache_ttl: Optional[int] = None
+    resilience: Optional[ToolResilienceConfig] = None
+    http_cache: Optional[ToolHttpCacheConfig] = None
 
 # Tool Authentication Models
 class ToolAuth(BaseModel):
@@ -336,6 +418,15 @@ class PostgresConnectionTest(BaseModel):
     type: str
     config: Dict[str, Any]
 
+class DataQueryRequest(BaseModel):
+    sql: str
+    params: Optional[Dict[str, Any]] = None
+    max_rows: Optional[int] = None
+    use_cache: bool = False
+
+class QueryCacheInvalidation(BaseModel):
+    tables: List[str] = []  # Empty list drops every cached result of the connector
+
 @app.post("/api/data-connectors", status_code=201)
 async def save_data_connector(connector_config: Union[PostgresConnectionConfig, BigQueryConnectionConfig]):
     if connector_config.connectorType not in ['postgres', 'bigquery']:
@@ -400,6 +491,13 @@ async def update_data_connector(connector_id: str, connector_config: Union[Postg
 
     connectors[connector_index] = updated_connector
     save_connectors(connectors)
+
+    # Drop pooled connections and cached clients so the next use picks up the updated credentials
+    if ENABLE_AGENT_RUN:
+        postgres_pools.invalidate(connector_id)
+        bigquery_clients.invalidate(connector_id)
+        schema_introspector.invalidate(connector_id)
+        query_result_cache.invalidate_connector(connector_id)
     
     if connector_config.connectorType == 'postgres':
         return PostgresConnectionConfig(**updated_connector)
@@ -430,6 +528,11 @@ async def delete_data_connector(connector_id: str):
     connectors = load_connectors()
     connectors = [c for c in connectors if c["id"] != connector_id]
     save_connectors(connectors)
+    if ENABLE_AGENT_RUN:
+        postgres_pools.invalidate(connector_id)
+        bigquery_clients.invalidate(connector_id)
+        schema_introspector.invalidate(connector_id)
+        query_result_cache.invalidate_connector(connector_id)
     return {"message": "Connector deleted successfully"}
 
 if ENABLE_AGENT_RUN:
@@ -448,43 +551,33 @@ if ENABLE_AGENT_RUN:
 
             try:
                 try:
-                    port = int(config['port'])
+                    int(config['port'])
                 except ValueError:
                     raise HTTPException(status_code=400, detail="Port must be a valid number")
 
-                conn = psycopg2.connect(
-                    host=config['host'],
-                    port=port,
-                    database=config['database'],
-                    user=config['user'],
-                    password=config.get('password', ''),
-                    connect_timeout=10
-                )
+                # Saved connectors pass their id so the test reuses (and warms) the connector's pool
+                with postgres_pools.connection(config.get('id'), config) as conn:
+                    try:
+                        with conn.cursor() as cur:
+                            cur.execute('SELECT version();')
+                            version = cur.fetchone()[0]
+                    except PostgresError as e:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=f"Database query failed: {str(e)}"
+                        )
 
-                try:
-                    with conn.cursor() as cur:
-                        cur.execute('SELECT version();')
-                        version = cur.fetchone()[0]
-                
-                    conn.close()
-
-                    return {
-                        "status": "success",
-                        "message": "Connection successful",
-                        "details": {
-                            "version": version,
-                            "connected_to": f"{config['host']}:{config['port']}/{config['database']}"
-                        }
+                return {
+                    "status": "success",
+                    "message": "Connection successful",
+                    "details": {
+                        "version": version,
+                        "connected_to": f"{config['host']}:{config['port']}/{config['database']}"
                     }
+                }
 
-                except PostgresError as e:
-                    if not conn.closed:
-                        conn.close()
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Database query failed: {str(e)}"
-                    )
-
+            except HTTPException:
+                raise
             except PostgresError as e:
                 error_message = str(e)
                 if "timeout expired" in error_message.lower():
@@ -500,6 +593,8 @@ if ENABLE_AGENT_RUN:
                     status_code=400,
                     detail=error_message
                 )
+            except TimeoutError as e:
+                raise HTTPException(status_code=503, detail=str(e))
             except Exception as e:
                 raise HTTPException(
                     status_code=500,
@@ -517,22 +612,11 @@ if ENABLE_AGENT_RUN:
                 )
 
             try:
-                # Parse service account key JSON
-                try:
-                    service_account_info = config['serviceAccountKey']
-                    if isinstance(service_account_info, str):
-                        # Handle backward compatibility with string format
-                        service_account_info = json.loads(service_account_info)
-                except (json.JSONDecodeError, TypeError) as e:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Invalid service account key format: {str(e)}"
-                    )
-
-                # Initialize BigQuery client
+                # Reuse the connector's cached client; it is built (and the key parsed) only on first use
                 try:
-                    credentials = service_account.Credentials.from_service_account_info(service_account_info)
-                    client = bigquery.Client(credentials=credentials, project=config['projectId'])
+                    client = bigquery_clients.get_client(config.get('id'), config)
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
                 except Exception as e:
                     raise HTTPException(
                         status_code=400,
@@ -556,9 +640,9 @@ if ENABLE_AGENT_RUN:
                         status_code=400,
                         detail=f"Failed to access dataset: {str(e)}"
                     )
-                finally:
-                    client.close()
 
+            except HTTPException:
+                raise
             except Exception as e:
                 raise HTTPException(
                     status_code=500,
@@ -567,6 +651,85 @@ if ENABLE_AGENT_RUN:
         else:
             raise HTTPException(status_code=400, detail="Unsupported connector type")
 
+    @app.post("/api/data-connectors/{connector_id}/query")
+    def query_data_connector(connector_id: str, request: DataQueryRequest):
+        # Plain def: FastAPI runs it in its threadpool, so a slow query does not block the event loop
+        connector = next((c for c in load_connectors() if c.get("id") == connector_id), None)
+        if not connector:
+            raise HTTPException(status_code=404, detail=f"Connector with ID '{connector_id}' not found.")
+        try:
+            result = data_query_engine.execute(
+                connector, request.sql, request.params, max_rows=request.max_rows, use_cache=request.use_cache
+            )
+        except QueryError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except TimeoutError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return MessageResponse(
+            type="table",
+            content=TableData(headers=result["headers"], rows=result["rows"], truncated=result["truncated"])
+        )
+
+    @app.post("/api/data-connectors/{connector_id}/cache/invalidate")
+    async def invalidate_query_cache(connector_id: str, invalidation: QueryCacheInvalidation):
+        # Called by loaders after they change tables, so dashboards do not read stale cached results
+        if invalidation.tables:
+            removed = query_result_cache.invalidate_tables(connector_id, invalidation.tables)
+        else:
+            removed = query_result_cache.invalidate_connector(connector_id)
+        return {"message": "Query cache invalidated", "removed": removed}
+
+    @app.get("/api/query-cache/stats")
+    async def get_query_cache_stats():
+        return query_result_cache.stats()
+
+    @app.get("/api/payload-cache/stats")
+    async def get_payload_cache_stats():
+        return payload_cache.stats()
+
+    @app.get("/api/tool-http/metrics")
+    async def get_tool_http_metrics():
+        return tool_http_client.stats()
+
+    @app.get("/api/llm-clients/stats")
+    async def get_llm_client_stats():
+        return llm_clients.stats()
+
+    @app.get("/api/tool-http/cache/stats")
+    async def get_tool_http_cache_stats():
+        return tool_response_cache.stats()
+
+    @app.delete("/api/tool-http/cache")
+    async def clear_tool_http_cache():
+        tool_response_cache.clear()
+        return {"message": "Tool HTTP response cache cleared"}
+
+    @app.get("/api/data-connectors/{connector_id}/schema")
+    def get_data_connector_schema(connector_id: str, refresh: bool = False, max_tokens: int = SCHEMA_DIGEST_MAX_TOKENS):
+        connector = next((c for c in load_connectors() if c.get("id") == connector_id), None)
+        if not connector:
+            raise HTTPException(status_code=404, detail=f"Connector with ID '{connector_id}' not found.")
+        try:
+            schema = schema_introspector.get_schema(connector, refresh=refresh)
+        except TimeoutError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Schema introspection failed: {str(e)}")
+        return {"schema": schema, "digest": render_schema_digest(schema, max_tokens)}
+
+    @app.on_event("shutdown")
+    def close_connector_pools():
+        postgres_pools.close_all()
+        bigquery_clients.close_all()
+        ingestion_pipeline.shutdown()
+        scheduler.stop()
+        agent_workers.shutdown()
+        tool_http_client.close()
+
 # --- API Endpoints ---
 
 @app.get("/api/agents")
@@ -602,6 +765,8 @@ async def update_agent(agent_id: str, updated_agent: AgentCreate):
                 **updated_agent.dict()
             }
             save_agents(agents)
+            if ENABLE_AGENT_RUN:
+                response_cache.invalidate_agent(agent_id)
             return agents[i]
     raise HTTPException(status_code=404, detail="Agent not found")
 
@@ -610,6 +775,9 @@ async def delete_agent(agent_id: str):
     agents = load_agents()
     agents = [agent for agent in agents if agent["id"] != agent_id]
     save_agents(agents)
+    if ENABLE_AGENT_RUN:
+        knowledge_bases.delete(agent_id)
+        response_cache.invalidate_agent(agent_id)
     return {"message": "Agent deleted"}
 
 @app.get("/api/tools", response_model=List[Tool])
@@ -628,6 +796,40 @@ async def add_tool(tool_id: str):
     save_tools(tools)
     return {"message": "Tool added successfully"}
 
+def tool_connector_metadata(tool: CustomTool) -> dict:
+    metadata = {"data_connector_id": tool.data_connector_id}
+    if tool.cache_query_results:
+        metadata["cache_query_results"] = True
+        if tool.query_cache_ttl:
+            metadata["query_cache_ttl"] = tool.query_cache_ttl
+    return metadata
+
+def write_tool_metadata(tool_id: str, tool: CustomTool):
+    """Stores connector settings and the precomputed operation index (per-operation digests) of the schema."""
+    metadata = tool_connector_metadata(tool) if tool.data_connector_id else {}
+    operation_index = build_operation_index(tool.schema)
+    if operation_index:
+        metadata["operation_index"] = operation_index
+    if tool.resilience:
+        metadata["resilience"] = tool.resilience.dict()
+    if tool.http_cache:
+        metadata["http_cache"] = tool.http_cache.dict()
+    metadata_dir = "tool_metadata"
+    os.makedirs(metadata_dir, exist_ok=True)
+    with open(f"{metadata_dir}/{tool_id}.json", 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+def load_tool_metadata(tool_id: str) -> dict:
+    metadata_path = f"tool_metadata/{tool_id}.json"
+    if not os.path.exists(metadata_path):
+        return {}
+    try:
+        with open(metadata_path, 'r') as f:
+            return json.load(f)
+    except json.JSONDecodeError as e:
+        logger.warning(f"Invalid JSON in metadata file {metadata_path}: {e}")
+        return {}
+
 @app.post("/api/tools/custom")
 async def create_custom_tool(tool: CustomTool):
     custom_tools = load_custom_tools()
@@ -651,12 +853,8 @@ async def create_custom_tool(tool: CustomTool):
     with open(f"{schema_dir}/{new_tool.id}.json", 'w') as f:
         json.dump(tool.schema, f, indent=2)
     
-    # Handle metadata (data connector)
-    if tool.data_connector_id:
-        metadata_dir = "tool_metadata"
-        os.makedirs(metadata_dir, exist_ok=True)
-        with open(f"{metadata_dir}/{new_tool.id}.json", 'w') as f:
-            json.dump({"data_connector_id": tool.data_connector_id}, f, indent=2)
+    # Handle metadata (data connector, schema digest)
+    write_tool_metadata(new_tool.id, tool)
     
     custom_tools.append(new_tool)
     save_custom_tools(custom_tools)
@@ -672,6 +870,18 @@ async def get_tool_schema(tool_id: str):
     with open(schema_path, 'r') as f:
         return json.load(f)
 
+@app.get("/api/tools/{tool_id}/operations")
+async def get_tool_operations(tool_id: str):
+    schema_path = f"tool_schemas/{tool_id}.json"
+    if not os.path.exists(schema_path):
+        raise HTTPException(status_code=404, detail="Schema not found")
+
+    operation_index = load_tool_metadata(tool_id).get("operation_index")
+    if not operation_index:
+        with open(schema_path, 'r') as f:
+            operation_index = build_operation_index(json.load(f))
+    return (operation_index or {}).get("operations", [])
+
 @app.put("/api/tools/{tool_id}/auth")
 async def update_tool_auth(tool_id: str, auth: ToolAuth):
     auth_dir = "tool_auth"
@@ -713,23 +923,14 @@ async def update_tool(tool_id: str, updated_tool: CustomTool):
             with open(f"{schema_dir}/{tool_id}.json", 'w') as f:
                 json.dump(updated_tool.schema, f, indent=2)
             
-            # Handle metadata
-            metadata_dir = "tool_metadata"
-            metadata_path = f"{metadata_dir}/{tool_id}.json"
-            
-            if updated_tool.data_connector_id:
-                # Update metadata with connector
-                metadata = {"data_connector_id": updated_tool.data_connector_id}
-                os.makedirs(metadata_dir, exist_ok=True)
-                with open(metadata_path, 'w') as f:
-                    json.dump(metadata, f, indent=2)
-            else:
-                # Remove metadata file if data connector is unselected
-                if os.path.exists(metadata_path):
-                    os.remove(metadata_path)
+            # Handle metadata; connector settings are dropped if the data connector is unselected
+            write_tool_metadata(tool_id, updated_tool)
             
             custom_tools[i] = updated
             save_custom_tools(custom_tools)
+            if ENABLE_AGENT_RUN:
+                payload_cache.invalidate_tool(tool_id)
+                tool_response_cache.invalidate(tool_id)
             return updated
             
     raise HTTPException(status_code=404, detail="Tool not found")
@@ -747,6 +948,13 @@ async def delete_tool(tool_id: str):
     auth_path = f"tool_auth/{tool_id}.json"
     if os.path.exists(auth_path):
         os.remove(auth_path)
+
+    metadata_path = f"tool_metadata/{tool_id}.json"
+    if os.path.exists(metadata_path):
+        os.remove(metadata_path)
+    if ENABLE_AGENT_RUN:
+        payload_cache.invalidate_tool(tool_id)
+        tool_response_cache.invalidate(tool_id)
     
     agents = load_agents()
     for agent in agents:
@@ -797,6 +1005,7 @@ async def read_page_fragment(page_name: str):
 class TableData(BaseModel):
     headers: List[str]
     rows: List[List[str]]
+    truncated: bool = False
 
 class ChartData(BaseModel):
     type: str
@@ -816,11 +1025,28 @@ class ErrorData(BaseModel):
     message: str
     details: Optional[str] = None
 
+class BudgetErrorData(ErrorData):
+    limit: str  # "timeout", "llm_calls", "tool_calls" or "tokens"
+    usage: Dict[str, Any]
+    partial_output: str = ""
+
 class MessageResponse(BaseModel):
     type: str
-    content: Union[TextData, ErrorData, TableData, ChartData, CodeData, ListData, Dict[str, Any]]
+    content: Union[TextData, BudgetErrorData, ErrorData, TableData, ChartData, CodeData, ListData, Dict[str, Any]]
     execution_id: Optional[str] = None
     log_url: Optional[str] = None
+    # Set when the request was served by another request's in-flight execution
+    coalesced_with: Optional[str] = None
+
+class KnowledgeDocument(BaseModel):
+    text: str
+    title: Optional[str] = None
+    doc_id: Optional[str] = None
+    source: Optional[str] = None
+
+class KnowledgeSearchRequest(BaseModel):
+    query: str
+    top_k: int = 4
 
 class InferenceRequest(BaseModel):
     agentId: str
@@ -847,23 +1073,127 @@ if ENABLE_AGENT_RUN:
             # Fallback for problematic inputs
             return str(text).encode("utf-8", errors="replace").decode("utf-8")
 
-    @app.post("/api/agent/infer")
-    async def agent_infer(
-        request: Request,
-        agentId: Optional[str] = Form(None),
-        userInput: Optional[str] = Form(None),
-        file: Optional[UploadFile] = File(None)
+    def get_agent_or_404(agent_id: str) -> dict:
+        agent = next((a for a in load_agents() if a["id"] == agent_id), None)
+        if not agent:
+            raise HTTPException(status_code=404, detail="Agent not found")
+        return agent
+
+    @app.delete("/api/agents/{agent_id}/response-cache")
+    def clear_agent_response_cache(agent_id: str):
+        return {"message": "Response cache cleared", "removed": response_cache.invalidate_agent(agent_id)}
+
+    @app.get("/api/response-cache/stats")
+    def get_response_cache_stats():
+        return response_cache.stats()
+
+    @app.get("/api/agent/infer/stats")
+    def get_agent_infer_stats():
+        return {"workers": agent_workers.stats(), "coalescing": inference_flights.stats(), "cancellation": execution_cancellations.stats()}
+
+    def close_execution_logger(execution_logger: logging.Logger, future=None):
+        """Closes a per-execution logger's handlers, once the execution's pool future (if any) has finished."""
+        if future is not None and not future.done():
+            future.add_done_callback(lambda _: close_execution_logger(execution_logger))
+            return
+        for handler in list(execution_logger.handlers):
+            execution_logger.removeHandler(handler)
+            handler.close()
+        logging.Logger.manager.loggerDict.pop(execution_logger.name, None)
+
+    @app.post("/api/executions/{execution_id}/cancel")
+    def cancel_execution(execution_id: str):
+        """Cancels a running agent or multi-agent execution at its next LLM step or tool call."""
+        if not execution_cancellations.cancel(execution_id, "cancelled by user"):
+            raise HTTPException(status_code=404, detail="No running execution with this ID")
+        inference_flights.drop(execution_id)
+        return {"execution_id": execution_id, "status": "cancelling"}
+
+    @app.post("/api/agents/{agent_id}/knowledge", status_code=201)
+    def add_knowledge_document(agent_id: str, document: KnowledgeDocument):
+        get_agent_or_404(agent_id)
+        try:
+            return knowledge_bases.get(agent_id).add_document(
+                document.text, doc_id=document.doc_id, title=document.title, source=document.source
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.get("/api/agents/{agent_id}/knowledge")
+    def list_knowledge_documents(agent_id: str):
+        get_agent_or_404(agent_id)
+        return knowledge_bases.get(agent_id).list_documents()
+
+    @app.delete("/api/agents/{agent_id}/knowledge/{doc_id}")
+    def delete_knowledge_document(agent_id: str, doc_id: str):
+        get_agent_or_404(agent_id)
+        if not knowledge_bases.get(agent_id).remove_document(doc_id):
+            raise HTTPException(status_code=404, detail="Document not found")
+        return {"message": "Document deleted"}
+
+    @app.post("/api/agents/{agent_id}/knowledge/ingest", status_code=202)
+    async def ingest_knowledge_documents(
+        agent_id: str,
+        files: List[UploadFile] = File([]),
+        delete_ids: str = Form(""),
+        prune: bool = Form(False)
     ):
-        # Generate execution ID
-        execution_uuid = str(uuid.uuid4())
-        timestamp = datetime.now(pytz.UTC).strftime("%Y%m%d_%H%M%S")
-        execution_id = f"{execution_uuid}_{timestamp}"
+        """Queues uploaded files for background ingestion; the file name is the document id."""
+        get_agent_or_404(agent_id)
+        upload_dir = UPLOAD_DIR / "knowledge" / agent_id
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        names = [file.filename for file in files]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise HTTPException(status_code=400, detail=f"Duplicate file names: {', '.join(duplicates)}")
+        documents = []
+        for file in files:
+            file_type = file.content_type if file.content_type in ALLOWED_FILE_TYPES else mime_type_for(file.filename)
+            if not file_type or ALLOWED_FILE_TYPES.get(file_type) == "image":
+                raise HTTPException(status_code=400, detail=f"Unsupported file type for {file.filename}: {file.content_type}")
+            file_path = upload_dir / f"{uuid.uuid4()}{os.path.splitext(file.filename)[1]}"
+            with open(file_path, "wb") as buffer:
+                shutil.copyfileobj(file.file, buffer)
+            documents.append({
+                "doc_id": file.filename,
+                "title": file.filename,
+                "source": file.filename,
+                "path": str(file_path),
+                "file_type": file_type,
+                "cleanup": True
+            })
+        deletes = [doc_id.strip() for doc_id in delete_ids.split(",") if doc_id.strip()]
+        if not documents and not deletes and not prune:
+            raise HTTPException(status_code=400, detail="No files or deletions provided")
+        return ingestion_pipeline.submit(agent_id, documents, delete_ids=deletes, prune=prune)
+
+    @app.get("/api/agents/{agent_id}/knowledge/ingest")
+    def list_ingestion_jobs(agent_id: str):
+        return ingestion_pipeline.list_jobs(agent_id)
+
+    @app.get("/api/agents/{agent_id}/knowledge/ingest/{job_id}")
+    def get_ingestion_job(agent_id: str, job_id: str):
+        try:
+            job = ingestion_pipeline.get_job(job_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not job or job.get("agent_id") != agent_id:
+            raise HTTPException(status_code=404, detail="Ingestion job not found")
+        return job
+
+    @app.post("/api/agents/{agent_id}/knowledge/search")
+    def search_knowledge(agent_id: str, request: KnowledgeSearchRequest):
+        get_agent_or_404(agent_id)
+        return knowledge_bases.get(agent_id).search(request.query, request.top_k)
+
+    def get_agent_logger(execution_id: str) -> tuple[logging.Logger, str, str]:
+        """Logger writing the execution's log file (served by /api/logs/{execution_id}); returns logger, log file and log URL."""
         log_filename = f"agent_execution_{execution_id}.log"
         log_file = os.path.join(LOG_DIR, log_filename)
-        
+
         # Generate log URL
         log_url = f"{BASE_URL}/api/logs/{execution_id}"
-        
+
         # Configure logger
         logger = logging.getLogger(f"agent_infer_{execution_id}")
         logger.setLevel(logging.DEBUG)
@@ -877,6 +1207,67 @@ if ENABLE_AGENT_RUN:
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
         logger.addHandler(console_handler)
+        return logger, log_file, log_url
+
+    def load_agent_tools_config(agent: Dict[str, Any], logger: logging.Logger) -> List[Dict[str, Any]]:
+        """Schema, auth, metadata and data connector of each of an agent's tools, as TaskExecutor expects them."""
+        tools_config = []
+        all_tools = load_custom_tools()
+        connectors = load_connectors()
+
+        for tool_id in agent.get("tools", []):
+            schema_path = f"tool_schemas/{tool_id}.json"
+            auth_path = f"tool_auth/{tool_id}.json"
+
+            if os.path.exists(schema_path):
+                tool_config = {"id": tool_id, "metadata": load_tool_metadata(tool_id)}
+                tool = next((t for t in all_tools if t.id == tool_id), None)
+                if tool and tool.data_connector_id:
+                    connector = next((c for c in connectors if c["id"] == tool.data_connector_id), None)
+                    if connector:
+                        tool_config["data_connector"] = connector
+
+                with open(schema_path, "r", encoding="utf-8") as f:
+                    tool_config["schema"] = json.load(f)
+                if os.path.exists(auth_path):
+                    with open(auth_path, "r", encoding="utf-8") as f:
+                        tool_config["auth"] = json.load(f)
+                tools_config.append(tool_config)
+                logger.debug(f"Loaded tool: {tool_id}")
+        return tools_config
+
+    def agent_executor_config(agent: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "role": agent["role"],
+            "goal": agent["goal"],
+            "backstory": agent["backstory"],
+            "instructions": agent["instructions"],
+            "features": agent.get("features", {}),
+            "llmProvider": agent.get("llmProvider"),
+            "llmModel": agent.get("llmModel"),
+            "apiKey": agent.get("apiKey"),
+            "internalLlmProvider": agent.get("internalLlmProvider"),
+            "internalLlmModel": agent.get("internalLlmModel"),
+            "budget": agent.get("budget")
+        }
+
+    @app.post("/api/agent/infer")
+    async def agent_infer(
+        request: Request,
+        response: Response,
+        background_tasks: BackgroundTasks,
+        agentId: Optional[str] = Form(None),
+        userInput: Optional[str] = Form(None),
+        file: Optional[UploadFile] = File(None)
+    ):
+        # Generate execution ID
+        execution_uuid = str(uuid.uuid4())
+        timestamp = datetime.now(pytz.UTC).strftime("%Y%m%d_%H%M%S")
+        execution_id = f"{execution_uuid}_{timestamp}"
+        logger, log_file, log_url = get_agent_logger(execution_id)
+        # The handlers are closed after the response, or once a still-running execution finishes
+        flight = None
+        background_tasks.add_task(lambda: close_execution_logger(logger, flight["future"] if flight else None))
 
         # Check content type to determine if it's JSON or form data
         content_type = request.headers.get("content-type", "")
@@ -944,9 +1335,11 @@ if ENABLE_AGENT_RUN:
             file_info = None
             file_path = None
             file_type = None
+            attachment_hash = None
             if file:
                 contents = await file.read()
                 file_size = len(contents)
+                attachment_hash = hashlib.sha256(contents).hexdigest()
                 logger.debug(f"Processing file: {sanitized_file_name}, size: {file_size} bytes")
                 if file_size > 10 * 1024 * 1024:
                     logger.error("File too large: exceeds 10MB")
@@ -990,65 +1383,135 @@ if ENABLE_AGENT_RUN:
                 file_type = file.content_type
                 logger.info(f"File saved: {file_path}")
 
-            tools_config = []
-            all_tools = load_custom_tools()
-            connectors = load_connectors()
-            
-            for tool_id in agent.get("tools", []):
-                schema_path = f"tool_schemas/{tool_id}.json"
-                auth_path = f"tool_auth/{tool_id}.json"
-                
-                if os.path.exists(schema_path):
-                    tool_config = {"id": tool_id}
-                    tool = next((t for t in all_tools if t.id == tool_id), None)
-                    if tool and tool.data_connector_id:
-                        connector = next((c for c in connectors if c["id"] == tool.data_connector_id), None)
-                        if connector:
-                            tool_config["data_connector"] = connector
-                    
-                    with open(schema_path, "r", encoding="utf-8") as f:
-                        tool_config["schema"] = json.load(f)
-                    if os.path.exists(auth_path):
-                        with open(auth_path, "r", encoding="utf-8") as f:
-                            tool_config["auth"] = json.load(f)
-                    tools_config.append(tool_config)
-                    logger.debug(f"Loaded tool: {tool_id}")
-
-            agent_config_dict = {
-                "role": agent["role"],
-                "goal": agent["goal"],
-                "backstory": agent["backstory"],
-                "instructions": agent["instructions"]
-            }
-            
-            logger.info("Initializing TaskExecutor")
-            executor = TaskExecutor(
-                agent_config=agent_config_dict,
-                tools_config=tools_config,
-                log_file=log_file
-            )
+            tools_config = load_agent_tools_config(agent, logger)
+
+            # Identical (agent, config version, input, attachment) requests share a response cache
+            # entry and, while one is executing, a single in-flight execution
+            knowledge_fingerprint = None
+            if agent.get("features", {}).get("knowledgeBase"):
+                knowledge_fingerprint = sorted(
+                    (doc["doc_id"], doc["content_hash"]) for doc in knowledge_bases.get(agentId).list_documents()
+                )
+            config_fingerprint = agent_config_fingerprint(agent, tools_config, knowledge_fingerprint)
+            request_key = response_cache.key(agentId, config_fingerprint, userInput, attachment_hash)
+
+            cache_settings = agent.get("responseCache") or {}
+            cache_key = None
+            if cache_settings.get("enabled"):
+                cache_key = request_key
+                cached = response_cache.get(agentId, cache_key, persistent=cache_settings.get("persistent", False))
+                if cached is not None:
+                    logger.info(f"Response cache hit for agent {agentId} (first served by execution {cached.get('source_execution_id')})")
+                    response.headers["X-Cache"] = "HIT"
+                    return MessageResponse(
+                        type="text",
+                        content=TextData(text=cached["text"]),
+                        execution_id=execution_id,
+                        log_url=log_url
+                    )
+                response.headers["X-Cache"] = "MISS"
+
+            agent_config_dict = agent_executor_config(agent)
 
             if userInput:
                 agent["instructions"] = check_in_sentence(agent["instructions"], "{{input}}")
 
-            logger.info("Executing task")
-            result = executor.execute_task(
-                description=agent["instructions"],
-                expected_output=agent["expectedOutput"],
-                task_name=agent["name"],
-                file_path=file_path,
-                file_type=file_type,
-                input=userInput
-            )
+            cancel_token = execution_cancellations.register(execution_id)
+
+            def run_execution():
+                logger.info("Initializing TaskExecutor")
+                executor = TaskExecutor(
+                    agent_config=agent_config_dict,
+                    tools_config=tools_config,
+                    log_file=log_file,
+                    query_engine=data_query_engine,
+                    payload_cache=payload_cache,
+                    http_client=tool_http_client,
+                    execution_id=execution_id,
+                    artifact_store=artifact_store,
+                    llm_registry=llm_clients,
+                    cancel_token=cancel_token,
+                    knowledge_base=knowledge_bases.get(agentId) if agent.get("features", {}).get("knowledgeBase") else None
+                )
+                try:
+                    logger.info("Executing task")
+                    result = executor.execute_task(
+                        description=agent["instructions"],
+                        expected_output=agent["expectedOutput"],
+                        task_name=agent["name"],
+                        file_path=file_path,
+                        file_type=file_type,
+                        input=userInput
+                    )
+                finally:
+                    executor.close()
+                # Only successful answers are cached; a tool error returned as the answer is not
+                if cache_key and not executor.budget.failed_answer:
+                    response_cache.set(
+                        agentId,
+                        cache_key,
+                        result,
+                        ttl=cache_settings.get("ttlSeconds"),
+                        persistent=cache_settings.get("persistent", False),
+                        source_execution_id=execution_id
+                    )
+                elif cache_key:
+                    logger.info(f"Not caching the response of execution {execution_id}: a tool error was returned as the answer")
+                return result
+
+            flight, is_leader = inference_flights.submit(request_key, run_execution, execution_id, log_url)
+            if is_leader:
+                cancel_token.bind(flight["future"])
+                flight["future"].add_done_callback(lambda _: execution_cancellations.release(execution_id))
+            else:
+                execution_cancellations.release(execution_id)
+                logger.info(f"Coalesced with in-flight execution {flight['execution_id']}; shared log: {flight['log_url']}")
+                response.headers["X-Coalesced-With"] = flight["execution_id"]
+                if file_path:
+                    # The leader reads its own copy of the identical attachment
+                    os.remove(file_path)
+
+            def on_disconnect():
+                # Coalesced requests share the execution; it is cancelled once its last waiting client is gone
+                if inference_flights.leave(request_key, flight) == 0:
+                    execution_cancellations.cancel(flight["execution_id"], "client disconnected")
+
+            result = await await_unless_disconnected(request, flight["future"], on_disconnect)
             logger.info(f"Agent inference result: {sanitize_for_logging(result)}")
 
             return MessageResponse(
                 type="text",
                 content=TextData(text=result),
                 execution_id=execution_id,
+                log_url=log_url,
+                coalesced_with=None if is_leader else flight["execution_id"]
+            )
+
+        except (ExecutionCancelled, ClientDisconnected) as e:
+            logger.warning(f"Agent inference stopped: {e}")
+            return MessageResponse(
+                type="error",
+                content=ErrorData(
+                    message="Execution cancelled",
+                    details=str(e)
+                ),
+                execution_id=execution_id,
+                log_url=log_url
+            )
+        except BudgetExceeded as e:
+            logger.warning(f"Agent inference stopped by its execution budget: {e.message}")
+            return MessageResponse(
+                type="error",
+                content=BudgetErrorData(
+                    message=e.message,
+                    details="The execution exceeded its budget; partial output is included.",
+                    limit=e.limit,
+                    usage=e.usage,
+                    partial_output=e.partial_output
+                ),
+                execution_id=execution_id,
                 log_url=log_url
             )
-            
         except Exception as e:
             logger.error(f"Error in agent_infer: {sanitize_for_logging(str(e))}", exc_info=True)
             return MessageResponse(
@@ -1062,6 +1525,175 @@ if ENABLE_AGENT_RUN:
             )
         
 
+    class AgentBatchRequest(BaseModel):
+        inputs: List[Any] = []  # Strings, or objects whose input field (inputField or input/userInput) is used
+        concurrency: Optional[int] = None  # Items running at once; defaults to BATCH_DEFAULT_CONCURRENCY
+        inputField: Optional[str] = None  # CSV column / JSON key holding the input
+        resumeBatchId: Optional[str] = None  # Re-runs the items of an earlier batch that did not complete
+
+    async def read_batch_request(request: Request) -> tuple[AgentBatchRequest, List[str]]:
+        """Parses a JSON batch request or a multipart upload of a CSV / JSONL file (plus form fields)."""
+        content_type = request.headers.get("content-type", "")
+        try:
+            if "application/json" in content_type:
+                batch_request = AgentBatchRequest(**(await request.json()))
+                return batch_request, [item_input(item, batch_request.inputField) for item in batch_request.inputs]
+            form = await request.form()
+            batch_request = AgentBatchRequest(
+                concurrency=form.get("concurrency") or None,
+                inputField=form.get("inputField") or None,
+                resumeBatchId=form.get("resumeBatchId") or None
+            )
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                return batch_request, []
+            return batch_request, await run_in_threadpool(parse_batch_file, upload.filename, await upload.read(), batch_request.inputField)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid batch request: {e}")
+
+    @app.post("/api/agents/{agent_id}/batch")
+    async def run_agent_batch(agent_id: str, request: Request):
+        """
+        Runs an agent over many inputs with one TaskExecutor, items running concurrently on the worker
+        pool (each with its own budget). Streams NDJSON: a "batch" header line, one "item" line per
+        finished item in completion order (with its index) and a closing "summary" line.
+        """
+        # Agent and batch store file I/O, tool loading and executor construction run on the thread pool,
+        # not on the event loop
+        agent = await run_in_threadpool(get_agent_or_404, agent_id)
+        batch_request, inputs = await read_batch_request(request)
+
+        execution_uuid = str(uuid.uuid4())
+        timestamp = datetime.now(pytz.UTC).strftime("%Y%m%d_%H%M%S")
+        execution_id = f"{execution_uuid}_{timestamp}"
+
+        def open_batch() -> tuple[Dict[str, Any], List[str], List[int]]:
+            """Creates the batch, or reopens an earlier one and returns the items that did not complete."""
+            if batch_request.resumeBatchId:
+                try:
+                    batch = batch_store.load(batch_request.resumeBatchId)
+                except ValueError:
+                    raise HTTPException(status_code=400, detail="Invalid batch ID")
+                if not batch or batch["agent_id"] != agent_id:
+                    raise HTTPException(status_code=404, detail="Batch not found for this agent. It may have expired.")
+                if batch["status"] == "running" and execution_cancellations.get(batch["execution_ids"][-1]):
+                    raise HTTPException(status_code=409, detail="Batch is still running")
+                batch_inputs = batch_store.inputs(batch["batch_id"])
+                pending = batch_store.pending_indices(batch["batch_id"])
+                batch_store.mark_running(batch["batch_id"], execution_id)
+                return batch, batch_inputs, pending
+            if not inputs:
+                raise HTTPException(status_code=400, detail="Provide inputs or a CSV / JSONL file")
+            if len(inputs) > BATCH_MAX_ITEMS:
+                raise HTTPException(status_code=400, detail=f"Batches are limited to {BATCH_MAX_ITEMS} items")
+            return batch_store.create(agent_id, inputs, execution_id), inputs, list(range(len(inputs)))
+
+        batch, inputs, indices = await run_in_threadpool(open_batch)
+        batch_id = batch["batch_id"]
+        concurrency = max(1, min(batch_request.concurrency or BATCH_DEFAULT_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+
+        logger, log_file, log_url = get_agent_logger(execution_id)
+        logger.info(f"Batch {batch_id} for agent {agent_id}: {len(indices)} of {len(inputs)} items, concurrency {concurrency}")
+        cancel_token = execution_cancellations.register(execution_id)
+
+        def create_executor() -> TaskExecutor:
+            # Tool loading and executor construction are paid once for the whole batch
+            try:
+                return TaskExecutor(
+                    agent_config=agent_executor_config(agent),
+                    tools_config=load_agent_tools_config(agent, logger),
+                    log_file=log_file,
+                    query_engine=data_query_engine,
+                    payload_cache=payload_cache,
+                    http_client=tool_http_client,
+                    execution_id=execution_id,
+                    artifact_store=artifact_store,
+                    llm_registry=llm_clients,
+                    cancel_token=cancel_token,
+                    knowledge_base=knowledge_bases.get(agent_id) if agent.get("features", {}).get("knowledgeBase") else None
+                )
+            except Exception as e:
+                logger.error(f"Batch {batch_id} setup failed: {sanitize_for_logging(e)}", exc_info=True)
+                batch_store.finish(batch_id, "failed")
+                execution_cancellations.release(execution_id)
+                close_execution_logger(logger)
+                raise HTTPException(status_code=500, detail=f"Batch setup failed: {e}")
+
+        instructions = check_in_sentence(agent["instructions"], "{{input}}")
+        executor = await run_in_threadpool(create_executor)
+
+        def run_item(index: int) -> Dict[str, Any]:
+            started = time.monotonic()
+            result = {"index": index, "status": "completed", "output": None, "error": None}
+            try:
+                result["output"] = executor.execute_task(
+                    description=instructions,
+                    expected_output=agent["expectedOutput"],
+                    task_name=f"{agent['name']} [{index}]",
+                    input=inputs[index],
+                    budget=ExecutionBudget.from_config(agent.get("budget"), cancel_token=cancel_token)
+                )
+            except ExecutionCancelled as e:
+                result.update(status="cancelled", error=str(e))
+            except BudgetExceeded as e:
+                result.update(status="failed", error=e.message, output=e.partial_output or None, limit=e.limit, usage=e.usage)
+            except Exception as e:
+                logger.error(f"Batch item {index} failed: {sanitize_for_logging(e)}")
+                result.update(status="failed", error=str(e))
+            result["duration"] = round(time.monotonic() - started, 3)
+            batch_store.record(batch_id, result)
+            return result
+
+        def cleanup(status: Optional[str] = None):
+            if status:
+                batch_store.finish(batch_id, status)
+            executor.close()
+            execution_cancellations.release(execution_id)
+            close_execution_logger(logger)
+
+        async def stream_results():
+            counts = {"completed": 0, "failed": 0, "cancelled": 0}
+            queue = iter(indices)
+            running = {}
+            yield json.dumps({"type": "batch", "batch_id": batch_id, "execution_id": execution_id, "log_url": log_url, "total": len(inputs), "scheduled": len(indices)}) + "\n"
+            try:
+                while True:
+                    # Keep at most `concurrency` items on the shared worker pool
+                    while len(running) < concurrency and not cancel_token.cancelled:
+                        index = next(queue, None)
+                        if index is None:
+                            break
+                        future = agent_workers.submit(run_item, index)
+                        running[asyncio.wrap_future(future)] = future
+                    if not running:
+                        break
+                    done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                    for waiter in done:
+                        running.pop(waiter)
+                        if waiter.cancelled():
+                            continue
+                        result = waiter.result()
+                        counts[result["status"]] += 1
+                        yield json.dumps({"type": "item", **result}, ensure_ascii=False, default=str) + "\n"
+                status = "cancelled" if cancel_token.cancelled else ("failed" if counts["failed"] else "completed")
+                await run_in_threadpool(batch_store.finish, batch_id, status)
+                logger.info(f"Batch {batch_id} {status}: {counts}")
+                yield json.dumps({"type": "summary", "batch_id": batch_id, "status": status, "counts": counts}) + "\n"
+            finally:
+                if running:
+                    # The client went away mid-batch: stop the remaining items; the batch is marked cancelled
+                    # and cleaned up by the last of them to stop, off the event loop
+                    cancel_token.cancel("client disconnected")
+                    for future in running.values():
+                        future.cancel()
+                    when_all_done(list(running.values()), lambda: agent_workers.submit(cleanup, "cancelled"))
+                else:
+                    cleanup()
+
+        return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
     # List of keys to mask in JSON objects
     MASKED_KEYS = ["db_config", "api_key", "password", "credentials_json"]
     
@@ -1115,6 +1747,17 @@ if ENABLE_AGENT_RUN:
         return reconstructed_lines
 
 
+    @app.get("/api/executions/{execution_id}/artifacts/{artifact_id}")
+    def get_execution_artifact(execution_id: str, artifact_id: str):
+        """Full body of a large tool response (or a step output) stored for an execution."""
+        try:
+            path = artifact_store.path(execution_id, artifact_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not path:
+            raise HTTPException(status_code=404, detail="Artifact not found")
+        return FileResponse(path, media_type="text/plain; charset=utf-8")
+
     @app.get("/api/logs/{execution_id}", response_class=HTMLResponse)
     async def get_log_file(execution_id: str, request: Request):
         log_file = os.path.join(LOG_DIR, f"agent_execution_{execution_id}.log")
@@ -1192,21 +1835,73 @@ if ENABLE_AGENT_RUN:
         user_input: str
 
     
-    @app.post("/api/multi_agent/infer")
-    async def multi_agent_infer(request: MultiAgentInferenceRequest):
-        # Generate execution ID
-        execution_uuid = str(uuid.uuid4())
-        timestamp = datetime.now(pytz.UTC).strftime("%Y%m%d_%H%M%S")
-        execution_id = f"{execution_uuid}_{timestamp}"
+    def build_worker_agent_config(agent_data: dict, all_tools: list, connectors: list, logger: logging.Logger) -> dict:
+        agent_id = agent_data["id"]
+        worker_tools_config = []
+        for tool_id in agent_data.get("tools", []):
+            schema_path = f"tool_schemas/{tool_id}.json"
+            auth_path = f"tool_auth/{tool_id}.json"
+            tool_cfg = {"id": tool_id, "metadata": load_tool_metadata(tool_id)}
+
+            if os.path.exists(schema_path):
+                try:
+                    with open(schema_path, 'r') as f:
+                        tool_cfg["schema"] = json.load(f)
+                except json.JSONDecodeError as e:
+                    logger.warning(f"Invalid JSON in schema file {schema_path} for agent {agent_id}: {e}")
+                    continue
+            else:
+                logger.warning(f"Schema file not found for tool {tool_id} in agent {agent_id}")
+                continue
+
+            if os.path.exists(auth_path):
+                try:
+                    with open(auth_path, 'r') as f:
+                        tool_cfg["auth"] = json.load(f)
+                except json.JSONDecodeError as e:
+                    logger.warning(f"Invalid JSON in auth file {auth_path} for agent {agent_id}: {e}")
+                    tool_cfg["auth"] = {}
+
+            tool = next((t for t in all_tools if t.id == tool_id), None)
+            if tool and tool.data_connector_id:
+                connector = next((c for c in connectors if c["id"] == tool.data_connector_id), None)
+                if connector:
+                    tool_cfg["data_connector"] = connector
+
+            worker_tools_config.append(tool_cfg)
+
+        worker_config = {
+            "id": agent_data["id"],
+            "name": agent_data.get("name", agent_data["role"]),
+            "role": agent_data["role"],
+            "goal": agent_data["goal"],
+            "backstory": agent_data["backstory"],
+            "instructions": agent_data.get("instructions", f"Perform tasks as {agent_data['role']}"),
+            "expectedOutput": agent_data.get("expectedOutput", "A contribution to the overall goal"),
+            "features": agent_data.get("features", {}),
+            "llmProvider": agent_data.get("llmProvider"),
+            "llmModel": agent_data.get("llmModel"),
+            "apiKey": agent_data.get("apiKey"),
+            "internalLlmProvider": agent_data.get("internalLlmProvider"),
+            "internalLlmModel": agent_data.get("internalLlmModel"),
+            "tools": worker_tools_config
+        }
+        return worker_config
+
+    checkpoint_store = CheckpointStore()
+
+    def get_multi_agent_logger(execution_id: str) -> tuple[logging.Logger, str]:
         log_filename = f"multi_agent_execution_{execution_id}.log"
         log_file = os.path.join(LOG_DIR, log_filename)
         
         # Generate log URL
         log_url = f"{BASE_URL}/api/multi_agent/logs/{execution_id}"
         
-        # Configure logger
+        # Configure logger (appends, so a resumed run continues the original log)
         logger = logging.getLogger(f"multi_agent_infer_{execution_id}")
         logger.setLevel(logging.DEBUG)
+        if logger.handlers:
+            return logger, log_url
         formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
         try:
             file_handler = logging.FileHandler(log_file, encoding="utf-8")
@@ -1217,6 +1912,153 @@ if ENABLE_AGENT_RUN:
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
         logger.addHandler(console_handler)
+        return logger, log_url
+
+    def multi_agent_error_response(message: str, details: str, execution_id: str, log_url: str) -> dict:
+        return {
+            "type": "error",
+            "content": {
+                "message": message,
+                "details": details
+            },
+            "execution_id": execution_id,
+            "log_url": log_url
+        }
+
+    def run_multi_agent(multi_agent_id: str, user_input: str, execution_id: str, log_url: str, logger: logging.Logger, resume: bool = False, cancel_token: Optional[CancellationToken] = None) -> dict:
+        multi_agents = load_multi_agents()
+        multi_agent_config = next((ma for ma in multi_agents if ma["id"] == multi_agent_id), None)
+        
+        if not multi_agent_config:
+            logger.error(f"Multi-Agent not found: {multi_agent_id}")
+            return multi_agent_error_response("Multi-Agent not found", f"No multi-agent found with ID: {multi_agent_id}", execution_id, log_url)
+
+        multi_agent_config.setdefault("role", "Coordinator")
+        multi_agent_config.setdefault("goal", "Efficiently manage and delegate tasks.")
+        multi_agent_config.setdefault("backstory", "Orchestrator for connected agents.")
+        multi_agent_config.setdefault("description", "Coordinate the processing of the user request by delegating to worker agents.")
+
+        multi_agent_config.setdefault("expected_output", (
+            "Agent Outputs:\n"
+            "<agent_name> Output: <output from agent>\n"
+            "(repeated for each agent in the sequence)\n"
+        ))
+        all_agents = load_agents()
+        connected_agent_ids = multi_agent_config.get("agent_ids", [])
+        worker_agent_configs = []
+
+        all_tools = load_custom_tools()
+        connectors = load_connectors()
+
+        for agent_id in connected_agent_ids:
+            agent_data = next((a for a in all_agents if a["id"] == agent_id), None)
+            if not agent_data:
+                logger.warning(f"Agent with ID {agent_id} not found, skipping.")
+                continue
+
+            worker_config = build_worker_agent_config(agent_data, all_tools, connectors, logger)
+            worker_agent_configs.append(worker_config)
+            logger.info(f"Loaded config for worker agent {agent_id} ({worker_config['name']})")
+
+        aggregator_agent_config = None
+        aggregator_agent_id = multi_agent_config.get("aggregator_agent_id")
+        if multi_agent_config.get("merge_strategy") == "aggregator" and aggregator_agent_id:
+            aggregator_data = next((a for a in all_agents if a["id"] == aggregator_agent_id), None)
+            if aggregator_data:
+                aggregator_agent_config = build_worker_agent_config(aggregator_data, all_tools, connectors, logger)
+                logger.info(f"Loaded config for aggregator agent {aggregator_agent_id} ({aggregator_agent_config['name']})")
+            else:
+                logger.warning(f"Aggregator agent with ID {aggregator_agent_id} not found, falling back to template merge.")
+
+        # Workflows may have a single step; sequential and parallel runs need at least two workers
+        if multi_agent_config.get("execution_mode") == "workflow":
+            if not worker_agent_configs:
+                logger.error("At least one worker agent is required.")
+                return multi_agent_error_response("Insufficient worker agents", "Workflow requires at least one worker agent", execution_id, log_url)
+        elif len(worker_agent_configs) < 2:
+            logger.error("At least two worker agents are required.")
+            return multi_agent_error_response("Insufficient worker agents", "Multi-agent requires at least two worker agents", execution_id, log_url)
+
+        if user_input:
+            default_description = multi_agent_config["description"]
+            if "{{input}}" in default_description:
+                multi_agent_config["description"] = default_description.replace("{{input}}", user_input)
+            else:
+                multi_agent_config["description"] = f"{default_description}\nInput to process: {user_input}"
+
+        executor = MultiAgentExecutor(
+            multi_agent_config=multi_agent_config,
+            worker_agent_configs=worker_agent_configs,
+            execution_id=execution_id,
+            log_url=log_url,
+            aggregator_agent_config=aggregator_agent_config,
+            checkpoint_store=checkpoint_store,
+            artifact_store=artifact_store,
+            query_engine=data_query_engine,
+            payload_cache=payload_cache,
+            http_client=tool_http_client,
+            llm_registry=llm_clients,
+            cancel_token=cancel_token
+        )
+
+        result = executor.execute_task(user_input=user_input, resume=resume)
+        for timing in executor.step_timings:
+            logger.info(f"Step timing: step={timing['step_id']} agent={timing['agent_id']} status={timing['status']} duration={timing['duration']}s")
+        if executor.cancel_token.cancelled:
+            logger.warning(f"Multi-agent execution cancelled ({executor.cancel_token.reason}); completed steps are checkpointed for resume")
+            return multi_agent_error_response("Execution cancelled", result, execution_id, log_url)
+        if executor.budget_error:
+            logger.warning(f"Multi-agent execution stopped by its budget: {executor.budget_error.message}")
+            return {
+                "type": "error",
+                "content": {
+                    "message": executor.budget_error.message,
+                    "details": "The execution exceeded its budget; partial output is included.",
+                    "limit": executor.budget_error.limit,
+                    "usage": executor.budget_error.usage,
+                    "partial_output": executor.budget_error.partial_output
+                },
+                "execution_id": execution_id,
+                "log_url": log_url
+            }
+        logger.info("Multi-agent task completed successfully")
+
+        return {
+            "type": "text",
+            "content": {
+                "response": result,
+                "sender_agent_name": "Manager Agent"
+            },
+            "execution_id": execution_id,
+            "log_url": log_url
+        }
+
+    async def run_multi_agent_on_pool(http_request: Request, execution: Dict[str, Any], multi_agent_id: str, user_input: str, execution_id: str, log_url: str, logger: logging.Logger, resume: bool = False) -> dict:
+        """
+        Runs run_multi_agent on the worker pool with a cancel token, so the cancel endpoint and a
+        client disconnect stop it. The pool future is kept in execution["future"].
+        """
+        cancel_token = execution_cancellations.register(execution_id)
+        future = agent_workers.submit(run_multi_agent, multi_agent_id, user_input, execution_id, log_url, logger, resume=resume, cancel_token=cancel_token)
+        execution["future"] = future
+        cancel_token.bind(future)
+        future.add_done_callback(lambda _: execution_cancellations.release(execution_id))
+        try:
+            return await await_unless_disconnected(http_request, future, lambda: execution_cancellations.cancel(execution_id, "client disconnected"))
+        except (ExecutionCancelled, ClientDisconnected) as e:
+            logger.warning(f"Multi-agent execution stopped: {e}")
+            return multi_agent_error_response("Execution cancelled", str(e), execution_id, log_url)
+
+    @app.post("/api/multi_agent/infer")
+    async def multi_agent_infer(request: MultiAgentInferenceRequest, http_request: Request, background_tasks: BackgroundTasks):
+        # Generate execution ID
+        execution_uuid = str(uuid.uuid4())
+        timestamp = datetime.now(pytz.UTC).strftime("%Y%m%d_%H%M%S")
+        execution_id = f"{execution_uuid}_{timestamp}"
+        logger, log_url = get_multi_agent_logger(execution_id)
+        # The handlers are closed after the response, or once a still-running execution finishes
+        execution = {}
+        background_tasks.add_task(lambda: close_execution_logger(logger, execution.get("future")))
 
         try:
             multi_agent_id = request.multi_agent_id
@@ -1229,165 +2071,54 @@ if ENABLE_AGENT_RUN:
 
             if not user_input or user_input.strip() == "":
                 logger.error("Empty or invalid user input provided.")
-                return {
-                    "type": "error",
-                    "content": {
-                        "message": "User input cannot be empty",
-                        "details": "Please provide valid user input"
-                    },
-                    "execution_id": execution_id,
-                    "log_url": log_url
-                }
-
-            multi_agents = load_multi_agents()
-            multi_agent_config = next((ma for ma in multi_agents if ma["id"] == multi_agent_id), None)
-            
-            if not multi_agent_config:
-                logger.error(f"Multi-Agent not found: {multi_agent_id}")
-                return {
-                    "type": "error",
-                    "content": {
-                        "message": "Multi-Agent not found",
-                        "details": f"No multi-agent found with ID: {multi_agent_id}"
-                    },
-                    "execution_id": execution_id,
-                    "log_url": log_url
-                }
-
-            multi_agent_config.setdefault("role", "Coordinator")
-            multi_agent_config.setdefault("goal", "Efficiently manage and delegate tasks.")
-            multi_agent_config.setdefault("backstory", "Orchestrator for connected agents.")
-            multi_agent_config.setdefault("description", "Coordinate the processing of the user request by delegating to worker agents.")
-
-            multi_agent_config.setdefault("expected_output", (
-                "Agent Outputs:\n"
-                "<agent_name> Output: <output from agent>\n"
-                "(repeated for each agent in the sequence)\n"
-            ))
-            all_agents = load_agents()
-            connected_agent_ids = multi_agent_config.get("agent_ids", [])
-            worker_agent_configs = []
-
-            all_tools = load_custom_tools()
-            connectors = load_connectors()
-
-            for agent_id in connected_agent_ids:
-                agent_data = next((a for a in all_agents if a["id"] == agent_id), None)
-                if not agent_data:
-                    logger.warning(f"Agent with ID {agent_id} not found, skipping.")
-                    continue
-
-                worker_tools_config = []
-                for tool_id in agent_data.get("tools", []):
-                    schema_path = f"tool_schemas/{tool_id}.json"
-                    auth_path = f"tool_auth/{tool_id}.json"
-                    tool_cfg = {"id": tool_id}
-
-                    if os.path.exists(schema_path):
-                        try:
-                            with open(schema_path, 'r') as f:
-                                tool_cfg["schema"] = json.load(f)
-                        except json.JSONDecodeError as e:
-                            logger.warning(f"Invalid JSON in schema file {schema_path} for agent {agent_id}: {e}")
-                            continue
-                    else:
-                        logger.warning(f"Schema file not found for tool {tool_id} in agent {agent_id}")
-                        continue
-
-                    if os.path.exists(auth_path):
-                        try:
-                            with open(auth_path, 'r') as f:
-                                tool_cfg["auth"] = json.load(f)
-                        except json.JSONDecodeError as e:
-                            logger.warning(f"Invalid JSON in auth file {auth_path} for agent {agent_id}: {e}")
-                            tool_cfg["auth"] = {}
-
-                    tool = next((t for t in all_tools if t.id == tool_id), None)
-                    if tool and tool.data_connector_id:
-                        connector = next((c for c in connectors if c["id"] == tool.data_connector_id), None)
-                        if connector:
-                            tool_cfg["data_connector"] = connector
-
-                    worker_tools_config.append(tool_cfg)
-
-                worker_config = {
-                    "id": agent_data["id"],
-                    "name": agent_data.get("name", agent_data["role"]),
-                    "role": agent_data["role"],
-                    "goal": agent_data["goal"],
-                    "backstory": agent_data["backstory"],
-                    "instructions": agent_data.get("instructions", f"Perform tasks as {agent_data['role']}"),
-                    "expectedOutput": agent_data.get("expectedOutput", "A contribution to the overall goal"),
-                    "tools": worker_tools_config
-                }
-                worker_agent_configs.append(worker_config)
-                logger.info(f"Loaded config for worker agent {agent_id} ({worker_config['name']})")
-
-            MIN_AGENTSFOR_MULTI = 2
-            if len(worker_agent_configs) < MIN_AGENTSFOR_MULTI:
-                logger.error("At least two worker agents are required.")
-                return {
-                    "type": "error",
-                    "content": {
-                        "message": "Insufficient worker agents",
-                        "details": "Multi-agent requires at least two worker agents"
-                    },
-                    "execution_id": execution_id,
-                    "log_url": log_url
-                }
-
-            if user_input:
-                default_description = multi_agent_config["description"]
-                if "{{input}}" in default_description:
-                    multi_agent_config["description"] = default_description.replace("{{input}}", user_input)
-                else:
-                    multi_agent_config["description"] = f"{default_description}\nInput to process: {user_input}"
+                return multi_agent_error_response("User input cannot be empty", "Please provide valid user input", execution_id, log_url)
 
-            executor = MultiAgentExecutor(
-                multi_agent_config=multi_agent_config,
-                worker_agent_configs=worker_agent_configs
-            )
+            return await run_multi_agent_on_pool(http_request, execution, multi_agent_id, user_input, execution_id, log_url, logger)
 
-            result = executor.execute_task(user_input=user_input)
-            logger.info("Multi-agent task completed successfully")
+        except HTTPException as http_exc:
+            logger.error(f"HTTP error in multi_agent_infer: {http_exc.detail}")
+            return multi_agent_error_response(http_exc.detail, str(http_exc), execution_id, log_url)
+        except Exception as e:
+            logger.error(f"Error in multi_agent_infer: {e}", exc_info=True)
+            return multi_agent_error_response("Internal server error", str(e), execution_id, log_url)
 
+    @app.post("/api/multi_agent/resume/{execution_id}")
+    async def multi_agent_resume(execution_id: str, http_request: Request, background_tasks: BackgroundTasks):
+        try:
+            checkpoint = checkpoint_store.load(execution_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid execution ID")
+        if not checkpoint:
+            raise HTTPException(status_code=404, detail="No checkpoint found for this execution. It may have expired.")
+        if execution_cancellations.get(execution_id):
+            raise HTTPException(status_code=409, detail="Execution is still running")
+
+        logger, log_url = get_multi_agent_logger(execution_id)
+        execution = {}
+        background_tasks.add_task(lambda: close_execution_logger(logger, execution.get("future")))
+        if checkpoint.get("status") == "completed":
+            logger.info("Resume requested for a completed execution, returning stored result")
             return {
                 "type": "text",
                 "content": {
-                    "response": result,
+                    "response": checkpoint.get("final_output"),
                     "sender_agent_name": "Manager Agent"
                 },
                 "execution_id": execution_id,
                 "log_url": log_url
             }
 
+        try:
+            logger.info(f"Resuming multi-agent execution for ID: {checkpoint.get('multi_agent_id')} with {len(checkpoint_store.completed_steps(execution_id))} completed steps")
+            return await run_multi_agent_on_pool(http_request, execution, checkpoint.get("multi_agent_id"), checkpoint.get("user_input", ""), execution_id, log_url, logger, resume=True)
         except HTTPException as http_exc:
-            logger.error(f"HTTP error in multi_agent_infer: {http_exc.detail}")
-            return {
-                "type": "error",
-                "content": {
-                    "message": http_exc.detail,
-                    "details": str(http_exc)
-                },
-                "execution_id": execution_id,
-                "log_url": log_url
-            }
+            logger.error(f"HTTP error in multi_agent_resume: {http_exc.detail}")
+            return multi_agent_error_response(http_exc.detail, str(http_exc), execution_id, log_url)
         except Exception as e:
-            logger.error(f"Error in multi_agent_infer: {e}", exc_info=True)
-            return {
-                "type": "error",
-                "content": {
-                    "message": "Internal server error",
-                    "details": str(e)
-                },
-                "execution_id": execution_id,
-                "log_url": log_url
-            }
-        
+            logger.error(f"Error in multi_agent_resume: {e}", exc_info=True)
+            return multi_agent_error_response("Internal server error", str(e), execution_id, log_url)
 
 
-
-    
     # Shared log reading and masking function
     async def read_and_mask_log_file(execution_id: str, log_prefix: str) -> tuple[str, str, str]:
         log_file = os.path.join(LOG_DIR, f"{log_prefix}_{execution_id}.log")
@@ -1460,6 +2191,175 @@ if ENABLE_AGENT_RUN:
             }
         )
 
+    # --- Scheduled executions ---
+
+    class ScheduleCreate(BaseModel):
+        name: Optional[str] = None
+        target_type: str  # "agent" or "multi_agent"
+        target_id: str
+        cron: str  # Five-field cron expression or @hourly / @daily / @weekly / @monthly
+        timezone: str = "UTC"
+        user_input: str = ""
+        enabled: bool = True
+        allow_overlap: bool = False  # Start a run even while the previous one is still running
+
+    schedule_store = ScheduleStore()
+
+    def validate_schedule(schedule: ScheduleCreate) -> Dict[str, Any]:
+        if schedule.target_type not in TARGET_TYPES:
+            raise HTTPException(status_code=400, detail=f"target_type must be one of {TARGET_TYPES}")
+        try:
+            CronExpression(schedule.cron)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid cron expression: {e}")
+        if schedule.timezone not in pytz.all_timezones_set:
+            raise HTTPException(status_code=400, detail=f"Unknown timezone: {schedule.timezone}")
+        targets = load_agents() if schedule.target_type == "agent" else load_multi_agents()
+        if not any(t["id"] == schedule.target_id for t in targets):
+            raise HTTPException(status_code=404, detail=f"No {schedule.target_type} found with ID: {schedule.target_id}")
+        return schedule.dict()
+
+    def scheduled_log_url(schedule: Dict[str, Any], execution_id: str) -> str:
+        if schedule["target_type"] == "multi_agent":
+            return f"{BASE_URL}/api/multi_agent/logs/{execution_id}"
+        return f"{BASE_URL}/api/logs/{execution_id}"
+
+    def run_scheduled_agent(schedule: Dict[str, Any], execution_id: str, cancel_token: CancellationToken) -> Dict[str, Any]:
+        logger, log_file, log_url = get_agent_logger(execution_id)
+        try:
+            agent = next((a for a in load_agents() if a["id"] == schedule["target_id"]), None)
+            if not agent:
+                logger.error(f"Agent not found: {schedule['target_id']}")
+                return {"status": "failed", "error": f"No agent found with ID: {schedule['target_id']}"}
+            logger.info(f"Scheduled run of agent {agent['id']} (schedule {schedule['id']}), userInput={sanitize_for_logging(schedule['user_input'])}")
+            instructions = agent["instructions"]
+            if schedule["user_input"]:
+                instructions = check_in_sentence(instructions, "{{input}}")
+            executor = TaskExecutor(
+                agent_config=agent_executor_config(agent),
+                tools_config=load_agent_tools_config(agent, logger),
+                log_file=log_file,
+                query_engine=data_query_engine,
+                payload_cache=payload_cache,
+                http_client=tool_http_client,
+                execution_id=execution_id,
+                artifact_store=artifact_store,
+                llm_registry=llm_clients,
+                cancel_token=cancel_token,
+                knowledge_base=knowledge_bases.get(agent["id"]) if agent.get("features", {}).get("knowledgeBase") else None
+            )
+            try:
+                output = executor.execute_task(
+                    description=instructions,
+                    expected_output=agent["expectedOutput"],
+                    task_name=agent["name"],
+                    input=schedule["user_input"]
+                )
+            finally:
+                executor.close()
+            logger.info(f"Scheduled agent run completed: {sanitize_for_logging(output)}")
+            return {"status": "completed", "output": output}
+        except ExecutionCancelled as e:
+            logger.warning(f"Scheduled agent run stopped: {e}")
+            return {"status": "cancelled", "error": str(e)}
+        except BudgetExceeded as e:
+            logger.warning(f"Scheduled agent run stopped by its execution budget: {e.message}")
+            return {"status": "budget_exceeded", "error": e.message, "output": e.partial_output}
+        except Exception as e:
+            logger.error(f"Error in scheduled agent run: {sanitize_for_logging(str(e))}", exc_info=True)
+            return {"status": "failed", "error": str(e)}
+        finally:
+            close_execution_logger(logger)
+
+    def run_scheduled_multi_agent(schedule: Dict[str, Any], execution_id: str, cancel_token: CancellationToken) -> Dict[str, Any]:
+        logger, log_url = get_multi_agent_logger(execution_id)
+        try:
+            logger.info(f"Scheduled run of multi-agent {schedule['target_id']} (schedule {schedule['id']}), userInput={sanitize_for_logging(schedule['user_input'])}")
+            result = run_multi_agent(schedule["target_id"], schedule["user_input"], execution_id, log_url, logger, cancel_token=cancel_token)
+        except Exception as e:
+            logger.error(f"Error in scheduled multi-agent run: {e}", exc_info=True)
+            return {"status": "failed", "error": str(e)}
+        finally:
+            close_execution_logger(logger)
+        content = result["content"]
+        if result["type"] == "text":
+            return {"status": "completed", "output": content["response"]}
+        if cancel_token.cancelled:
+            return {"status": "cancelled", "error": content["details"]}
+        if "limit" in content:
+            return {"status": "budget_exceeded", "error": content["message"], "output": content["partial_output"]}
+        return {"status": "failed", "error": f"{content['message']}: {content['details']}"}
+
+    def run_scheduled(schedule: Dict[str, Any], execution_id: str) -> Dict[str, Any]:
+        """Runs a schedule's target; registered like interactive executions, so the cancel endpoint stops it."""
+        cancel_token = execution_cancellations.register(execution_id)
+        try:
+            if schedule["target_type"] == "multi_agent":
+                return run_scheduled_multi_agent(schedule, execution_id, cancel_token)
+            return run_scheduled_agent(schedule, execution_id, cancel_token)
+        finally:
+            execution_cancellations.release(execution_id)
+
+    scheduler = Scheduler(schedule_store, agent_workers, run_scheduled, scheduled_log_url)
+
+    @app.on_event("startup")
+    def start_scheduler():
+        if SCHEDULER_ENABLED:
+            scheduler.start()
+
+    def get_schedule_or_404(schedule_id: str) -> Dict[str, Any]:
+        schedule = schedule_store.get(schedule_id)
+        if not schedule:
+            raise HTTPException(status_code=404, detail="Schedule not found")
+        return schedule
+
+    @app.get("/api/schedules")
+    def get_schedules(target_id: Optional[str] = None):
+        schedules = schedule_store.list()
+        if target_id:
+            schedules = [s for s in schedules if s["target_id"] == target_id]
+        return schedules
+
+    @app.post("/api/schedules", status_code=201)
+    def create_schedule(schedule: ScheduleCreate):
+        return schedule_store.create(validate_schedule(schedule))
+
+    @app.get("/api/schedules/{schedule_id}")
+    def get_schedule(schedule_id: str):
+        return get_schedule_or_404(schedule_id)
+
+    @app.put("/api/schedules/{schedule_id}")
+    def update_schedule(schedule_id: str, schedule: ScheduleCreate):
+        updated = schedule_store.update(schedule_id, validate_schedule(schedule))
+        if not updated:
+            raise HTTPException(status_code=404, detail="Schedule not found")
+        return updated
+
+    @app.delete("/api/schedules/{schedule_id}")
+    def delete_schedule(schedule_id: str):
+        if not schedule_store.delete(schedule_id):
+            raise HTTPException(status_code=404, detail="Schedule not found")
+        return {"message": "Schedule deleted successfully"}
+
+    @app.get("/api/schedules/{schedule_id}/runs")
+    def get_schedule_runs(schedule_id: str):
+        """Recent runs, newest first, each with its execution_id and log_url."""
+        return list(reversed(get_schedule_or_404(schedule_id)["runs"]))
+
+    @app.post("/api/schedules/{schedule_id}/run", status_code=202)
+    def run_schedule_now(schedule_id: str):
+        """Fires a schedule on the scheduler's next tick, subject to its overlap and concurrency limits."""
+        if not get_schedule_or_404(schedule_id).get("enabled", True):
+            raise HTTPException(status_code=409, detail="Schedule is disabled")
+        schedule = schedule_store.run_now(schedule_id)
+        if not schedule:
+            raise HTTPException(status_code=404, detail="Schedule not found")
+        return {"schedule_id": schedule_id, "status": "due", "next_run_at": schedule["next_run_at"]}
+
+    @app.get("/api/scheduler/status")
+    def get_scheduler_status():
+        return {**scheduler.status(), "enabled": SCHEDULER_ENABLED, "workers": agent_workers.stats()}
+
 def check_in_sentence(sentence="", input_to_check="{{input}}"):
     sentence_lower = sentence.lower()
     input_lower = input_to_check.lower()
@@ -1534,24 +2434,72 @@ async def upload_file(file: UploadFile = File(...), agentId: str = None):
             )
         )
 
+class StepCondition(BaseModel):
+    source: str = "input"  # "input" or the id of an upstream step
+    operator: str = "contains"  # contains, not_contains, equals, not_equals, empty, not_empty
+    value: str = ""
+
+class WorkflowStep(BaseModel):
+    id: str
+    agent_id: str
+    inputs: List[str] = ["input"]  # "input" and/or ids of upstream steps
+    condition: Optional[StepCondition] = None
+    timeout: Optional[int] = None  # Seconds; overrides branch_timeout for this step
+
 class MultiAgentCreate(BaseModel):
     name: str
     description: str
-    agent_ids: List[str]
+    agent_ids: List[str] = []
     role: Optional[str] = "Coordinator"
     goal: Optional[str] = "Efficiently manage and delegate tasks to connected agents based on user requests."
     backstory: Optional[str] = "I am a manager agent responsible for orchestrating multiple specialized agents to achieve complex goals."
     expected_output: str
+    execution_mode: str = "sequential"  # "sequential" (manager delegation), "parallel" (fan-out / fan-in) or "workflow" (DAG of steps)
+    max_concurrency: int = 4  # Max worker agents running at once in parallel mode
+    branch_timeout: Optional[int] = None  # Seconds each parallel branch may run
+    merge_strategy: str = "template"  # "template" or "aggregator"
+    merge_template: Optional[str] = None  # Supports {{name}}, {{output}} and {{status}}
+    aggregator_agent_id: Optional[str] = None
+    steps: List[WorkflowStep] = []  # Used by the "workflow" execution mode
+    llmProvider: Optional[str] = None  # Manager agent model; defaults to DEFAULT_LLM_PROVIDER / DEFAULT_LLM_MODEL
+    llmModel: Optional[str] = None  # Model within llmProvider, e.g. "gemini-2.0-flash"
+    budget: ExecutionBudgetConfig = ExecutionBudgetConfig()  # Shared by all steps of an execution
 
 class MultiAgent(MultiAgentCreate):
     id: str
 
+def validate_multi_agent(multi_agent: MultiAgentCreate):
+    if multi_agent.execution_mode not in ["sequential", "parallel", "workflow"]:
+        raise HTTPException(status_code=400, detail="execution_mode must be 'sequential', 'parallel' or 'workflow'")
+    if multi_agent.execution_mode == "workflow":
+        try:
+            validate_workflow_steps([step.dict() for step in multi_agent.steps])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid workflow: {e}")
+        # Workers are derived from the steps so the rest of the app keeps seeing agent_ids
+        for step in multi_agent.steps:
+            if step.agent_id not in multi_agent.agent_ids:
+                multi_agent.agent_ids.append(step.agent_id)
+    elif multi_agent.steps:
+        raise HTTPException(status_code=400, detail="steps are only supported with execution_mode 'workflow'")
+    if not multi_agent.agent_ids:
+        raise HTTPException(status_code=400, detail="At least one agent is required")
+    if multi_agent.merge_strategy not in ["template", "aggregator"]:
+        raise HTTPException(status_code=400, detail="merge_strategy must be 'template' or 'aggregator'")
+    if multi_agent.merge_strategy == "aggregator" and not multi_agent.aggregator_agent_id:
+        raise HTTPException(status_code=400, detail="aggregator_agent_id is required when merge_strategy is 'aggregator'")
+    if multi_agent.max_concurrency < 1:
+        raise HTTPException(status_code=400, detail="max_concurrency must be at least 1")
+    if multi_agent.branch_timeout is not None and multi_agent.branch_timeout <= 0:
+        raise HTTPException(status_code=400, detail="branch_timeout must be a positive number of seconds")
+
 @app.get("/api/multi-agents")
 async def get_multi_agents():
     return load_multi_agents()
 
 @app.post("/api/multi-agents")
 async def create_multi_agent(multi_agent: MultiAgentCreate):
+    validate_multi_agent(multi_agent)
     multi_agents = load_multi_agents()
     agent_data = multi_agent.dict(exclude_unset=False)
     new_multi_agent = MultiAgent(
@@ -1575,6 +2523,7 @@ async def get_multi_agent(multi_agent_id: str):
 
 @app.put("/api/multi-agents/{multi_agent_id}")
 async def update_multi_agent(multi_agent_id: str, updated_multi_agent: MultiAgentCreate):
+    validate_multi_agent(updated_multi_agent)
     multi_agents = load_multi_agents()
     for i, ma in enumerate(multi_agents):
         if ma["id"] == multi_agent_id:
@@ -1,15 +1,36 @@
 import os
-import requests
-import random
 import json
 import re
 import uuid
+import time
 import logging
-from typing import Optional, Dict, Any, List
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional, Dict, Any, List, Callable
 from dotenv import load_dotenv
-from crewai import Crew, Process, Task, Agent as CrewAgent, LLM
+from crewai import Crew, Process, Task, Agent as CrewAgent
 from functools import partial
 from datetime import datetime
+from checkpoint_store import CheckpointStore
+from artifact_store import ArtifactStore
+from query_engine import DataQueryEngine, create_query_tools, describe_connector
+from payload_cache import PayloadCache
+from payload_validation import operation_validator, repair_feedback, PAYLOAD_REPAIR_ATTEMPTS
+from http_resilience import ResilientHttpClient, RetryPolicy, default_http_client
+from tool_responses import read_tool_response
+from llm_registry import LLMRegistry, default_llm_registry
+from budget import ExecutionBudget, BudgetExceeded
+from cancellation import CancellationToken, ExecutionCancelled
+from tool_digest import (
+    operation_index_for,
+    operation_tool_names,
+    operation_tool_description,
+    render_operation_digest,
+    split_payload,
+    merge_headers,
+    connector_summary
+)
+from workflow_dag import USER_INPUT_SOURCE, step_dependencies, validate_workflow_steps, sink_steps, evaluate_condition
 
 load_dotenv()
 
@@ -19,37 +40,68 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 logger.info("CrewAI telemetry disabled")
 
+EXECUTION_MODES = ["sequential", "parallel", "workflow"]
+MERGE_STRATEGIES = ["template", "aggregator"]
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MERGE_TEMPLATE = "{{name}} Output: {{output}}"
+MANAGER_STEP_ID = "__manager__"
+
 class MultiAgentExecutor:
     """
-    Orchestrates multiple agents with a manager agent that delegates tasks dynamically.
-    Handles user input, preserves context, and ensures robust error handling with logging.
+    Orchestrates multiple worker agents as a sequential chain, a parallel fan-out or a DAG workflow,
+    with a manager agent assembling the final response for sequential runs.
+    Handles user input, preserves context, checkpoints step outputs and ensures robust error handling with logging.
     """
     def __init__(
         self,
         multi_agent_config: Dict[str, Any],
         worker_agent_configs: List[Dict[str, Any]],
         execution_id: Optional[str] = None,
-        log_url: Optional[str] = None
+        log_url: Optional[str] = None,
+        aggregator_agent_config: Optional[Dict[str, Any]] = None,
+        checkpoint_store: Optional[CheckpointStore] = None,
+        artifact_store: Optional[ArtifactStore] = None,
+        query_engine: Optional[DataQueryEngine] = None,
+        payload_cache: Optional[PayloadCache] = None,
+        http_client: Optional[ResilientHttpClient] = None,
+        llm_registry: Optional[LLMRegistry] = None,
+        budget: Optional[ExecutionBudget] = None,
+        cancel_token: Optional[CancellationToken] = None
     ):
         self.multi_agent_config = multi_agent_config
         self.worker_agent_configs = worker_agent_configs
+        self.aggregator_agent_config = aggregator_agent_config
+        self.checkpoint_store = checkpoint_store
+        self.artifact_store = artifact_store or ArtifactStore()
+        self.query_engine = query_engine
+        self.payload_cache = payload_cache
+        self.http_client = http_client or default_http_client()
+        # Parallel and workflow steps generate payloads concurrently
+        self.payload_cache_counts = {"hits": 0, "misses": 0}
+        self._payload_cache_lock = threading.Lock()
+        self.artifacts = {}
+        self.step_timings = []
+        self.completed_steps = {}
+        self.step_results = {}
         self.execution_id = execution_id or str(uuid.uuid4())
         self.log_url = log_url
+        # One budget (deadline, LLM call, tool call and token caps) shared by all steps of the execution
+        self.budget = budget or ExecutionBudget.from_config(self.multi_agent_config.get("budget"))
+        self.budget_error: Optional[BudgetExceeded] = None
+        # Checked by the budget at every agent step and tool call, and by the step scheduler
+        self.cancel_token = cancel_token or self.budget.cancel_token or CancellationToken()
+        self.budget.cancel_token = self.cancel_token
         self._validate_configs()
 
-        # Initialize LLM client
-        self.llm_client = LLM(
-            model="gemini/gemini-2.5-flash-preview-04-17",
-            api_key=self._get_api_key(),
-            max_retries=3,
-            retry_delay=34
-        )
+        # Initialize LLM clients; the manager follows the multi-agent's llmProvider / llmModel and each
+        # worker its own agent settings, with clients shared across executions by the registry
+        self.llm_registry = llm_registry or default_llm_registry()
+        self.llm_client = self.llm_registry.for_agent(self.multi_agent_config, max_retries=3, retry_delay=34)
 
         # Initialize Internal LLM client for schema and payload agents
-        self.internal_llm_client = LLM(
-            model="gemini/gemini-2.0-flash",
-            api_key=os.getenv("INTERNAL_GEMINI_API_KEY")
-        )
+        self.internal_llm_client = self.llm_registry.internal_for_agent()
+        # Per-branch state (cancel token, payload agents) of the step running on the current thread
+        self._branch = threading.local()
 
         # Initialize Schema Agent
         self.schema_agent = CrewAgent(
@@ -61,15 +113,6 @@ class MultiAgentExecutor:
             llm=self.internal_llm_client
         )
 
-        self.payload_agent = CrewAgent(
-            role="Payload Generator",
-            goal="Generate accurate payloads and endpoint URLs for API tools",
-            backstory="I'm an expert at creating valid API payloads and determining endpoint URLs.",
-            verbose=False,
-            allow_delegation=False,
-            llm=self.internal_llm_client
-        )
-
         # Initialize Manager Agent
         self.manager_agent = CrewAgent(
             role=self.multi_agent_config.get("role", "Coordinator"),
@@ -77,7 +120,7 @@ class MultiAgentExecutor:
             backstory=self.multi_agent_config.get("backstory", "Orchestrates worker agents."),
             llm=self.llm_client,
             verbose=True,
-            allow_delegation=True
+            allow_delegation=False
         )
         logger.info(f"Initialized Manager Agent: {self.manager_agent.role} (Execution ID: {self.execution_id})")
 
@@ -86,25 +129,41 @@ class MultiAgentExecutor:
         self.worker_map = {}
         for config in self.worker_agent_configs:
             tools = self._load_agent_tools(config)
-            agent = CrewAgent(
-                role=config["role"],
-                goal=config["goal"],
-                backstory=config["backstory"],
-                llm=self.llm_client,
-                tools=tools,
-                verbose=True,
-                allow_delegation=False
-            )
+            agent = self._create_worker_agent(config, tools)
             self.worker_agents.append(agent)
             self.worker_map[config["id"]] = {
                 "agent": agent,
-                "config": config
+                "config": config,
+                "tools": tools
             }
             logger.info(f"Initialized Worker Agent: {agent.role} (ID: {config['id']}, Name: {config['name']}, Execution ID: {self.execution_id})")
 
         if not self.worker_agents:
             logger.warning("No worker agents initialized.")
 
+        # Initialize optional Aggregator Agent used to merge parallel branch outputs
+        self.aggregator = None
+        if self.aggregator_agent_config:
+            tools = self._load_agent_tools(self.aggregator_agent_config)
+            self.aggregator = {
+                "agent": self._create_worker_agent(self.aggregator_agent_config, tools),
+                "config": self.aggregator_agent_config,
+                "tools": tools
+            }
+            logger.info(f"Initialized Aggregator Agent: {self.aggregator_agent_config['role']} (ID: {self.aggregator_agent_config['id']}, Execution ID: {self.execution_id})")
+
+    def _create_worker_agent(self, config: Dict[str, Any], tools: List) -> CrewAgent:
+        """Creates a CrewAgent for a worker configuration, on the worker's own provider and model."""
+        return CrewAgent(
+            role=config["role"],
+            goal=config["goal"],
+            backstory=config["backstory"],
+            llm=self.llm_registry.for_agent(config, max_retries=3, retry_delay=34),
+            tools=tools,
+            verbose=True,
+            allow_delegation=False
+        )
+
     def _validate_configs(self):
         """Validates configurations."""
         required_manager_fields = ["role", "goal", "backstory", "description", "expected_output", "agent_ids"]
@@ -128,13 +187,71 @@ class MultiAgentExecutor:
                 config["name"] = config["role"]
                 logger.warning(f"Missing name for agent {config['id']}, using role: {config['name']} (Execution ID: {self.execution_id}).")
 
-    def _get_api_key(self) -> str:
-        """Selects a random API key."""
-        keys = os.getenv("GEMINI_API_KEYS", "").split(",")
-        key_list = [key.strip() for key in keys if key.strip()]
-        if not key_list:
-            raise ValueError("No API keys found in GEMINI_API_KEYS.")
-        return random.choice(key_list)
+        if self.aggregator_agent_config:
+            for field in required_worker_fields:
+                if field not in self.aggregator_agent_config:
+                    self.aggregator_agent_config[field] = f"Default {field}"
+            self.aggregator_agent_config.setdefault("name", self.aggregator_agent_config["role"])
+
+        execution_mode = self.multi_agent_config.get("execution_mode") or "sequential"
+        if execution_mode not in EXECUTION_MODES:
+            logger.warning(f"Unknown execution mode '{execution_mode}', using sequential (Execution ID: {self.execution_id}).")
+            execution_mode = "sequential"
+        self.multi_agent_config["execution_mode"] = execution_mode
+
+        merge_strategy = self.multi_agent_config.get("merge_strategy") or "template"
+        if merge_strategy not in MERGE_STRATEGIES or (merge_strategy == "aggregator" and not self.aggregator_agent_config):
+            logger.warning(f"Merge strategy '{merge_strategy}' unavailable, using template (Execution ID: {self.execution_id}).")
+            merge_strategy = "template"
+        self.multi_agent_config["merge_strategy"] = merge_strategy
+
+    def _create_payload_agent(self, config: Dict[str, Any]) -> CrewAgent:
+        """Payload Generator for a worker, on its internalLlmProvider / internalLlmModel if set."""
+        override = config.get("internalLlmProvider") or config.get("internalLlmModel")
+        return CrewAgent(
+            role="Payload Generator",
+            goal="Generate accurate payloads and endpoint URLs for API tools",
+            backstory="I'm an expert at creating valid API payloads and determining endpoint URLs.",
+            verbose=False,
+            allow_delegation=False,
+            llm=self.llm_registry.internal_for_agent(config) if override else self.internal_llm_client
+        )
+
+    def _payload_agent_for(self, config: Dict[str, Any]) -> CrewAgent:
+        """
+        Payload Generator of a worker for the branch running on the current thread. CrewAI agents
+        are stateful, so concurrent branches never share one; each branch builds its own.
+        """
+        agents = getattr(self._branch, "payload_agents", None)
+        if agents is None:
+            agents = self._branch.payload_agents = {}
+        if config.get("id") not in agents:
+            agents[config.get("id")] = self._create_payload_agent(config)
+        return agents[config.get("id")]
+
+    def _check_branch(self):
+        """Raises ExecutionCancelled in a branch that was cancelled on its own, e.g. after its step timeout."""
+        cancel_token = getattr(self._branch, "cancel_token", None)
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+
+    def _step_callback(self, tracker) -> Callable[[Any], None]:
+        """Crew step callback: stops a cancelled branch, then accounts the step against the budget."""
+        def on_step(step: Any):
+            self._check_branch()
+            tracker.on_step(step)
+        return on_step
+
+    def _guard_branch(self, tool):
+        """Wraps a tool so a cancelled branch stops at its next tool call."""
+        func = tool.func
+
+        def guarded(*args, **kwargs):
+            self._check_branch()
+            return func(*args, **kwargs)
+
+        tool.func = guarded
+        return tool
 
     def _sanitize_for_logging(self, text: Any) -> str:
         """Sanitizes strings for logging, preserving emojis and handling non-UTF-8 bytes."""
@@ -173,35 +290,38 @@ class MultiAgentExecutor:
             logger.error(f"Error parsing time '{user_input_lower}': {self._sanitize_for_logging(e)} (Execution ID: {self.execution_id})")
             return datetime.now().hour
 
-    def generate_payload(self, user_input: str, schema: dict, tool_data_connector: Optional[dict] = None) -> Dict[str, Any]:
-        """Generates a valid JSON payload and endpoint URL based on user input, schema, and data connector."""
+    def generate_payload(
+        self,
+        user_input: str,
+        schema: dict,
+        tool_data_connector: Optional[dict] = None,
+        tool_id: Optional[str] = None,
+        operation: Optional[dict] = None,
+        validator: Optional[Callable[[Any], List[str]]] = None,
+        payload_agent: Optional[CrewAgent] = None
+    ) -> Dict[str, Any]:
+        """Generates a valid JSON payload and endpoint URL for one operation based on user input, schema, and data connector."""
+        payload_agent = payload_agent or self._payload_agent_for({})
         logger.info(f"Generating payload and endpoint URL for input: '{self._sanitize_for_logging(user_input)}' (Execution ID: {self.execution_id})")
-        paths = schema.get("paths", {})
-        if not paths:
-            logger.error(f"No paths found in schema (Execution ID: {self.execution_id})")
-            return {"error": "No paths in schema"}
+        if operation is None:
+            operation_index = operation_index_for({"schema": schema})
+            if not operation_index:
+                logger.error(f"No operations found in schema (Execution ID: {self.execution_id})")
+                return {"error": "No operations in schema"}
+            operation = operation_index["operations"][0]
+            validator = operation_validator(schema, operation_index["schema_hash"], operation)
+        method = operation["method"]
 
-        path_key = next(iter(paths))
-        method = next((m for m in paths[path_key] if m.lower() in ["get", "post"]), "post")
-        
-        # Determine request schema based on method
-        request_schema = {}
-        required_fields = []
-        properties = {}
-        if method == "get":
-            parameters = paths[path_key].get(method, {}).get("parameters", [])
-            if parameters:
-                request_schema = {"parameters": parameters}
-                required_fields = [param["name"] for param in parameters if param.get("required", False)]
-                properties = {param["name"]: param.get("schema", {}) for param in parameters}
-        else:  # method == "post"
-            request_body = paths[path_key].get(method, {}).get("requestBody", {})
-            if request_body:
-                request_schema = request_body.get("content", {}).get("application/json", {}).get("schema", {})
-                required_fields = request_schema.get("required", [])
-                properties = request_schema.get("properties", {})
-
-        connector_info = f"Tool Data Connector:\n{json.dumps(tool_data_connector, indent=2, ensure_ascii=False)}\n" if tool_data_connector else ""
+        # Top-level query, header, cookie and body fields of the operation; path parameters are part of the URL
+        payload_fields = [f for f in operation["fields"] if f["in"] != "path" and "." not in f["name"]]
+        required_fields = [f["name"] for f in payload_fields if f["required"]]
+        properties = {f["name"]: f for f in payload_fields}
+
+        # The prompt carries a compact digest of the called operation instead of the raw OpenAPI document
+        operation_info = f"Operation:\n{render_operation_digest(operation)}"
+
+        # Only non-secret connector fields go into the prompt; credentials stay server-side
+        connector_info = f"Tool Data Connector: {connector_summary(describe_connector(tool_data_connector))}" if tool_data_connector else ""
         
         # Parse time if required by schema
         time_field = None
@@ -216,58 +336,78 @@ class MultiAgentExecutor:
             default_payload[time_field] = parsed_hour
             logger.info(f"Set {time_field} to {parsed_hour} based on user input (Execution ID: {self.execution_id})")
 
+        # The parsed hour is part of the prompt, so it is part of the key as well
+        cache_key = None
+        if self.payload_cache:
+            cache_key = self.payload_cache.key(tool_id, schema, user_input, {"operation": operation["operation_id"], "connector": connector_info, "defaults": default_payload})
+            cached = self.payload_cache.get(cache_key)
+            with self._payload_cache_lock:
+                self.payload_cache_counts["hits" if cached is not None else "misses"] += 1
+            if cached is not None:
+                logger.info(f"Payload cache hit for tool {tool_id}: {self._sanitize_for_logging(cached['endpoint_url'])} (Execution ID: {self.execution_id})")
+                return cached
+
         # Generate payload and endpoint URL
-        payload_task = Task(
-            description=f"""
+        description = f"""
                 User Input: '{self._sanitize_for_logging(user_input)}'
-                Request Schema: {json.dumps(request_schema, indent=2, ensure_ascii=False)}
-                Full Schema: {json.dumps(schema, indent=2, ensure_ascii=False)}
+                {operation_info}
                 {connector_info}
                 Generate a valid JSON payload (if required) and the endpoint URL for the API call.
-                For GET requests, return a dictionary of query parameters if parameters are defined in the schema, otherwise return null.
-                For POST requests, generate a JSON payload if a requestBody is defined in the schema, otherwise return null.
+                The payload is a single flat JSON object holding the operation's query, header, cookie and body fields by name (nested body fields as nested objects), or null if the operation has no fields.
                 Return a JSON object with two keys:
-                - "payload": The JSON payload or query parameters (or null if not applicable, required fields: {required_fields}).
-                - "endpoint_url": The full URL for the API endpoint, using the appropriate server URL from the schema's "servers" field and the correct path from the "paths" field.
+                - "payload": The JSON payload (or null if not applicable, required fields: {required_fields}).
+                - "endpoint_url": The full URL for the API endpoint, built from the operation's URL template with any path parameters substituted.
                 For the payload:
                 - Extract relevant information from the user input.
-                - For required fields without user input, use sensible defaults or null.
+                - For required fields without user input, use sensible defaults that satisfy the field's type and constraints.
                 - If a time-related field (e.g., {time_field}) is required, use the parsed time {default_payload.get(time_field, 'N/A')} (24-hour format, 0-23).
                 - Validate against schema constraints (e.g., min/max, patterns).
                 - Ensure compatibility with the tool_data_connector if provided.
-                Ensure the endpoint_url is valid and corresponds to the {method.upper()} endpoint in the schema.
+                Ensure the endpoint_url is valid and corresponds to the {method.upper()} operation.
                 Log any validation errors or default substitutions.
                 If no valid URL can be determined, return {{"payload": {json.dumps(default_payload)}, "endpoint_url": ""}}.
-            """,
-            expected_output="JSON object with 'payload' and 'endpoint_url'",
-            agent=self.payload_agent
-        )
-        crew = Crew(agents=[self.payload_agent], tasks=[payload_task], process=Process.sequential)
-        result = crew.kickoff()
-        try:
-            result_str = str(result.raw if hasattr(result, 'raw') else result).strip('`').strip('json').strip()
-            result_json = json.loads(result_str)
-            payload = result_json.get("payload")
-            endpoint_url = result_json.get("endpoint_url")
-            
+            """
+
+        # Payloads are validated locally against the operation's schema; validation errors are fed
+        # back to the generator for a bounded number of repair attempts instead of reaching the API
+        repair_note = ""
+        for attempt in range(PAYLOAD_REPAIR_ATTEMPTS + 1):
+            payload_task = Task(
+                description=description + repair_note,
+                expected_output="JSON object with 'payload' and 'endpoint_url'",
+                agent=payload_agent
+            )
+            tracker = self.budget.tracker(payload_task)
+            crew = Crew(agents=[payload_agent], tasks=[payload_task], process=Process.sequential, step_callback=self._step_callback(tracker))
+            result = tracker.finish(crew.kickoff())
+            try:
+                result_str = str(result.raw if hasattr(result, 'raw') else result).strip('`').strip('json').strip()
+                result_json = json.loads(result_str)
+                payload = result_json.get("payload")
+                endpoint_url = result_json.get("endpoint_url")
+            except (json.JSONDecodeError, AttributeError) as e:
+                logger.error(f"Error parsing payload or endpoint_url: {self._sanitize_for_logging(e)} (Execution ID: {self.execution_id})")
+                return {"error": f"Error parsing payload or endpoint_url: {self._sanitize_for_logging(e)}"}
+
             if not endpoint_url:
                 logger.error(f"Missing endpoint_url in agent response (Execution ID: {self.execution_id})")
                 return {"error": "Missing endpoint_url in agent response"}
-            
-            # Validate required fields if payload exists
-            if payload:
-                missing_fields = [f for f in required_fields if f not in payload or payload[f] is None]
-                if missing_fields:
-                    logger.warning(f"Missing required fields {missing_fields}, using defaults (Execution ID: {self.execution_id})")
-                    for field in missing_fields:
-                        payload[field] = None
-
-            logger.info(f"Generated payload: {self._sanitize_for_logging(json.dumps(payload, ensure_ascii=False) if payload else 'null')} (Execution ID: {self.execution_id})")
-            logger.info(f"Generated endpoint URL: {self._sanitize_for_logging(endpoint_url)} (Execution ID: {self.execution_id})")
-            return {"payload": payload, "endpoint_url": endpoint_url}
-        except (json.JSONDecodeError, AttributeError) as e:
-            logger.error(f"Error parsing payload or endpoint_url: {self._sanitize_for_logging(e)} (Execution ID: {self.execution_id})")
-            return {"error": f"Error parsing payload or endpoint_url: {self._sanitize_for_logging(e)}"}
+
+            validation_errors = validator(payload) if validator else []
+            if not validation_errors:
+                break
+            logger.warning(f"Generated payload failed validation (attempt {attempt + 1}): {self._sanitize_for_logging(validation_errors)} (Execution ID: {self.execution_id})")
+            repair_note = repair_feedback(payload, validation_errors)
+        else:
+            logger.error(f"Payload still invalid after {PAYLOAD_REPAIR_ATTEMPTS} repair attempts (Execution ID: {self.execution_id})")
+            return {"error": f"Generated payload failed schema validation: {'; '.join(validation_errors)}"}
+
+        logger.info(f"Generated payload: {self._sanitize_for_logging(json.dumps(payload, ensure_ascii=False) if payload else 'null')} (Execution ID: {self.execution_id})")
+        logger.info(f"Generated endpoint URL: {self._sanitize_for_logging(endpoint_url)} (Execution ID: {self.execution_id})")
+        result = {"payload": payload, "endpoint_url": endpoint_url}
+        if cache_key:
+            self.payload_cache.set(cache_key, result)
+        return result
 
     def _load_agent_tools(self, agent_config: Dict[str, Any]) -> List:
         """Loads tools for an agent."""
@@ -289,8 +429,26 @@ class MultiAgentExecutor:
             tool_headers = tool_config.get("auth", {}).get("headers", {}) or {}
             tool_params = tool_config.get("auth", {}).get("params", {}) or {}
             tool_data_connector = tool_config.get("data_connector", None)
+            operation_index = operation_index_for(tool_config)
+            retry_policy = RetryPolicy.from_config((tool_config.get("metadata") or {}).get("resilience"))
+            cache_config = (tool_config.get("metadata") or {}).get("http_cache") or {}
+            if not operation_index:
+                logger.warning(f"Skipping tool {tool_config.get('id')} in agent {agent_id}: no GET, POST, PUT, PATCH or DELETE operation in schema (Execution ID: {self.execution_id})")
+                continue
 
-            def create_api_caller(schema: Dict, headers: Dict, params: Dict, agent_id: str, tool_data_connector: Optional[dict] = None):
+            def create_api_caller(
+                schema: Dict,
+                headers: Dict,
+                params: Dict,
+                agent_id: str,
+                operation: Dict,
+                tool_data_connector: Optional[dict] = None,
+                tool_id: Optional[str] = None,
+                validator: Optional[Callable] = None,
+                retry_policy: Optional[RetryPolicy] = None,
+                cache_config: Optional[Dict] = None
+            ):
+                cache_config = cache_config or {}
                 def api_caller(input_text: str, **kwargs) -> Dict:
                     try:
                         logger.info(f"Agent {agent_id} api_caller received input_text: '{self._sanitize_for_logging(input_text)}' (Execution ID: {self.execution_id})")
@@ -298,7 +456,7 @@ class MultiAgentExecutor:
                             logger.error(f"Invalid input for API call by agent {agent_id}: '{self._sanitize_for_logging(input_text)}' (Execution ID: {self.execution_id})")
                             return {"error": f"Invalid input: '{input_text}'"}
 
-                        result = self.generate_payload(input_text, schema, tool_data_connector)
+                        result = self.generate_payload(input_text, schema, tool_data_connector, tool_id=tool_id, operation=operation, validator=validator, payload_agent=self._payload_agent_for(agent_config))
                         if not result or "error" in result:
                             logger.error(f"Failed to generate payload or endpoint URL for agent {agent_id}: {self._sanitize_for_logging(result.get('error', 'Unknown error'))} (Execution ID: {self.execution_id})")
                             return {"error": result.get("error", "Failed to generate payload or endpoint URL")}
@@ -309,58 +467,52 @@ class MultiAgentExecutor:
                             logger.error(f"Missing endpoint URL for agent {agent_id} (Execution ID: {self.execution_id})")
                             return {"error": "Missing endpoint URL"}
 
-                        # Determine HTTP method from schema
-                        paths = schema.get("paths", {})
-                        if not paths:
-                            logger.error(f"No paths found in schema for agent {agent_id} (Execution ID: {self.execution_id})")
-                            return {"error": "No paths found in schema"}
-
-                        path_key = next(iter(paths))
-                        method = None
-                        for m in paths[path_key]:
-                            if m.lower() in ["get", "post"]:
-                                method = m.lower()
-                                break
-                        if not method:
-                            logger.error(f"No supported HTTP method (GET/POST) found in schema for agent {agent_id} (Execution ID: {self.execution_id})")
-                            return {"error": "No supported HTTP method (GET/POST) found in schema"}
-
-                        # Ensure headers and params are dictionaries
-                        request_headers = headers or {}
-                        request_params = params or {}
-
-                        if method == "get":
-                            # For GET, payload contains query parameters (if any)
-                            if payload:
-                                request_params.update(payload)
-                            logger.info(f"Agent {agent_id} calling GET {endpoint_url} with params: {self._sanitize_for_logging(json.dumps(request_params, ensure_ascii=False) if request_params else 'none')} (Execution ID: {self.execution_id})")
-                            response = requests.get(
-                                endpoint_url,
-                                headers=request_headers,
-                                params=request_params if request_params else None
-                            )
-                        else:  # method == "post"
-                            logger.info(f"Agent {agent_id} calling POST {endpoint_url} with payload: {self._sanitize_for_logging(json.dumps(payload, ensure_ascii=False) if payload else 'none')} (Execution ID: {self.execution_id})")
-                            response = requests.post(
-                                endpoint_url,
-                                headers=request_headers,
-                                params=request_params if request_params else None,
-                                json=payload if payload else None
-                            )
+                        # Ensure headers and params are dictionaries; the payload is split into query parameters, body and headers by the operation's fields
+                        method = operation["method"]
+                        request_params = dict(params or {})
+                        query, body, parameter_headers = split_payload(operation, payload)
+                        request_headers = merge_headers(headers, parameter_headers)
+                        request_params.update(query)
 
+                        logger.info(f"Agent {agent_id} calling {method} {endpoint_url} with params: {self._sanitize_for_logging(json.dumps(request_params, ensure_ascii=False) if request_params else 'none')}, payload: {self._sanitize_for_logging(json.dumps(body, ensure_ascii=False) if body else 'none')} (Execution ID: {self.execution_id})")
+                        response = self.http_client.request(
+                            method,
+                            endpoint_url,
+                            policy=retry_policy,
+                            timeout=self.budget.clamp_timeout(retry_policy.timeout),
+                            endpoint=f"{method} {operation['url_template']}",
+                            headers=request_headers,
+                            params=request_params if request_params else None,
+                            json=body if body else None,
+                            use_cache=cache_config.get("enabled", True),
+                            cache_ttl=cache_config.get("ttl_seconds"),
+                            cache_tag=tool_id,
+                            stream=True
+                        )
+
+                        # The body is read with a byte cap; large bodies are stored as artifacts and summarized
+                        tool_response = read_tool_response(
+                            response,
+                            artifact_store=self.artifact_store,
+                            execution_id=self.execution_id,
+                            artifact_key=f"tool-response:{agent_id}:{operation['operation_id']}"
+                        )
+                        data = tool_response["data"]
+                        if tool_response["summarized"]:
+                            logger.info(f"Agent {agent_id} API response of {tool_response['size']} bytes summarized{' (capped)' if tool_response['capped'] else ''}, full body in artifact {(tool_response['artifact'] or {}).get('id')} (Execution ID: {self.execution_id})")
                         if 200 <= response.status_code < 300:
-                            try:
-                                result = response.json()
-                                logger.info(f"Agent {agent_id} API response: {self._sanitize_for_logging(json.dumps(result, ensure_ascii=False))} (Execution ID: {self.execution_id})")
-                                return result
-                            except json.JSONDecodeError:
-                                result = {"success": True, "content": response.text}
-                                logger.info(f"Agent {agent_id} API non-JSON response: {self._sanitize_for_logging(result)} (Execution ID: {self.execution_id})")
-                                return result
+                            if tool_response["is_json"] or tool_response["summarized"]:
+                                logger.info(f"Agent {agent_id} API response: {self._sanitize_for_logging(json.dumps(data, ensure_ascii=False, default=str))} (Execution ID: {self.execution_id})")
+                                return data
+                            result = {"success": True, "content": data}
+                            logger.info(f"Agent {agent_id} API non-JSON response: {self._sanitize_for_logging(result)} (Execution ID: {self.execution_id})")
+                            return result
                         else:
-                            error_content = response.json().get('detail', response.text) if response.text else response.text
+                            error_content = data.get('detail', data) if isinstance(data, dict) and not tool_response["summarized"] else data
                             logger.error(f"API call failed for agent {agent_id} ({response.status_code}): {self._sanitize_for_logging(error_content)} (Execution ID: {self.execution_id})")
                             return {"error": f"API call failed ({response.status_code}): {error_content}"}
+                    except (ExecutionCancelled, BudgetExceeded):
+                        raise
                     except Exception as e:
                         logger.error(f"Error in API call for agent {agent_id}: {self._sanitize_for_logging(e)} (Execution ID: {self.execution_id})")
                         return {"error": f"API call error: {str(e)}"}
@@ -368,27 +520,44 @@ class MultiAgentExecutor:
 
             tool_name = tool_schema.get("info", {}).get("title", f"tool_{tool_config.get('id')}")
             tool_name = tool_name.lower().replace(" ", "_")
-            api_caller_instance = partial(
-                create_api_caller(tool_schema, tool_headers, tool_params, agent_id, tool_data_connector),
-                headers=tool_headers,
-                params=tool_params
-            )
-
             tool_title = tool_schema.get("info", {}).get("title", "Unknown API")
-            tool_description = tool_schema.get("info", {}).get("description", "")
-            tool_description = f"Calls API: {tool_title}. {tool_description}"
-
-            tools.append(
-                Tool(
-                    name=tool_name,
-                    func=api_caller_instance,
-                    description=tool_description,
-                    result_as_answer=True
+
+            # Every operation of the schema is its own tool, so the agent picks the operation directly
+            operations = operation_index["operations"]
+            for operation, name in zip(operations, operation_tool_names(tool_name, operations)):
+                api_caller_instance = partial(
+                    create_api_caller(
+                        tool_schema,
+                        tool_headers,
+                        tool_params,
+                        agent_id,
+                        operation,
+                        tool_data_connector,
+                        tool_config.get("id"),
+                        operation_validator(tool_schema, operation_index["schema_hash"], operation),
+                        retry_policy,
+                        cache_config
+                    ),
+                    headers=tool_headers,
+                    params=tool_params
                 )
-            )
-            logger.info(f"Loaded tool {tool_name} for agent {agent_id} (Execution ID: {self.execution_id})")
+                tools.append(
+                    Tool(
+                        name=name,
+                        func=api_caller_instance,
+                        description=operation_tool_description(tool_title, operation),
+                        result_as_answer=True
+                    )
+                )
+            logger.info(f"Loaded tool {tool_name} ({len(operations)} operations) for agent {agent_id} (Execution ID: {self.execution_id})")
 
-        return tools
+        if self.query_engine and agent_config.get("features", {}).get("dataQuery"):
+            query_tools = create_query_tools(self.query_engine, tools_config, logger)
+            tools.extend(query_tools)
+            logger.info(f"Loaded {len(query_tools)} data query tools for agent {agent_id} (Execution ID: {self.execution_id})")
+
+        # Every tool call counts against the execution's tool call budget and stops a cancelled branch
+        return [self._guard_branch(self.budget.guard_tool(tool)) for tool in tools]
 
     def clean_output(self, output: str) -> str:
         """Cleans output by removing UUIDs and specific metadata, preserving content and formatting."""
@@ -414,12 +583,433 @@ class MultiAgentExecutor:
             logger.error(f"Error cleaning output: {self._sanitize_for_logging(e)} (Execution ID: {self.execution_id})")
             return output
 
-    def execute_task(self, user_input: str, file_path: Optional[str] = None) -> str:
-        """Executes multi-agent orchestration with manager delegating tasks in sequence."""
+    def _run_worker(self, agent_id: str, task_input: str) -> str:
+        """Runs a single worker agent on the given input in its own crew."""
+        worker = self.worker_map.get(agent_id)
+        if worker is None and self.aggregator and self.aggregator["config"]["id"] == agent_id:
+            worker = self.aggregator
+        if worker is None:
+            raise ValueError(f"Unknown worker agent: {agent_id}")
+        config = worker["config"]
+        # Build a fresh agent per run so concurrent branches never share executor state
+        agent = self._create_worker_agent(config, worker["tools"])
+
+        description = config["instructions"]
+        if "{{input}}" in description:
+            description = description.replace("{{input}}", task_input)
+        else:
+            description = f"{description}\n\nInput to process: {task_input}"
+
+        task = Task(
+            description=description,
+            expected_output=config["expectedOutput"],
+            agent=agent
+        )
+        tracker = self.budget.tracker(task)
+        crew = Crew(agents=[agent], tasks=[task], process=Process.sequential, verbose=True, step_callback=self._step_callback(tracker))
+        result = tracker.finish(crew.kickoff())
+        return str(getattr(result, 'raw', result)).strip()
+
+    def _restore_step_output(self, saved: Dict[str, Any]) -> Optional[str]:
+        """Loads a checkpointed step output from its artifact (older checkpoints inline the output)."""
+        if saved.get("artifact_id"):
+            return self.artifact_store.get(self.execution_id, saved["artifact_id"])
+        return saved.get("output")
+
+    def _build_step_input(self, step: Dict[str, Any], user_input: str, results: Dict[str, Dict[str, Any]]) -> str:
+        """Builds a step's input from the user input and the outputs of its upstream steps."""
+        sources = step.get("inputs") or [USER_INPUT_SOURCE]
+        if len(sources) == 1:
+            return user_input if sources[0] == USER_INPUT_SOURCE else results[sources[0]]["output"]
+
+        sections = []
+        for source in sources:
+            if source == USER_INPUT_SOURCE:
+                sections.append(f"Original User Input: '{user_input}'")
+            else:
+                sections.append(f"Output from step '{source}':\n{results[source]['output']}")
+        return "\n\n".join(sections)
+
+    def _run_step_graph(self, steps: List[Dict[str, Any]], user_input: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Runs workflow steps on a bounded pool, starting each step as soon as its upstream steps finish.
+        Steps whose condition fails, or whose upstream steps did not complete, are skipped, as are
+        all remaining steps once the execution budget is exhausted. Cancelling the execution
+        cancels the remaining steps and stops waiting for the running ones.
+        Records per-step timing in self.step_timings.
+        """
+        max_concurrency = int(self.multi_agent_config.get("max_concurrency") or DEFAULT_MAX_CONCURRENCY)
+        default_timeout = self.multi_agent_config.get("branch_timeout")
+        max_workers = max(1, min(max_concurrency, len(steps)))
+
+        step_map = {step["id"]: step for step in steps}
+        dependencies = {step["id"]: step_dependencies(step) for step in steps}
+        results = {}
+        started_at = {}
+        futures = {}
+        branch_tokens = {}
+
+        # Reuse outputs checkpointed by an earlier run of this execution
+        for step_id, saved in self.completed_steps.items():
+            if step_id in step_map and saved.get("agent_id") == step_map[step_id]["agent_id"]:
+                output = self._restore_step_output(saved)
+                if output is None:
+                    logger.warning(f"Artifact for checkpointed step '{step_id}' is missing, step will run again (Execution ID: {self.execution_id})")
+                    continue
+                results[step_id] = {"status": "completed", "output": output, "error": None, "duration": 0.0, "artifact_id": saved.get("artifact_id")}
+                self.artifacts[step_id] = {"id": saved.get("artifact_id"), "summary": self.artifact_store.summarize(output)}
+                logger.info(f"Step '{step_id}' restored from checkpoint (Execution ID: {self.execution_id})")
+
+        def run_step(step: Dict[str, Any], step_input: str) -> str:
+            started_at[step["id"]] = time.monotonic()
+            # Each branch has its own cancel token and payload agents for the duration of the step
+            self._branch.cancel_token = branch_tokens[step["id"]]
+            self._branch.payload_agents = {}
+            try:
+                # Steps queued on the pool before the budget ran out stop here instead of calling the LLM
+                self.budget.check()
+                self._check_branch()
+                logger.info(f"Step '{step['id']}' started on agent {step['agent_id']} (Execution ID: {self.execution_id})")
+                return self._run_worker(step["agent_id"], step_input)
+            finally:
+                self._branch.__dict__.clear()
+
+        def record(step_id: str, status: str, output: str = "", error: Optional[str] = None):
+            now = time.monotonic()
+            duration = round(now - started_at[step_id], 3) if step_id in started_at else 0.0
+            results[step_id] = {"status": status, "output": output, "error": error, "duration": duration}
+            if status == "completed":
+                artifact = self.artifact_store.put(self.execution_id, f"step:{step_id}", output)
+                results[step_id]["artifact_id"] = artifact["id"]
+                self.artifacts[step_id] = artifact
+            self.step_timings.append({
+                "step_id": step_id,
+                "agent_id": step_map[step_id]["agent_id"],
+                "status": status,
+                "duration": duration,
+                "finished_at": datetime.now().isoformat()
+            })
+            if self.checkpoint_store:
+                self.checkpoint_store.save_step(self.execution_id, step_id, {"agent_id": step_map[step_id]["agent_id"], **results[step_id]})
+            message = f"Step '{step_id}' {status} in {duration}s" + (f": {self._sanitize_for_logging(error)}" if error else "")
+            (logger.info if status in ["completed", "skipped", "cancelled"] else logger.error)(f"{message} (Execution ID: {self.execution_id})")
+
+        def submit_ready_steps():
+            progressed = True
+            while progressed:
+                progressed = False
+                for step_id, step in step_map.items():
+                    if step_id in results or step_id in futures.values():
+                        continue
+                    if any(dep not in results for dep in dependencies[step_id]):
+                        continue
+                    progressed = True
+                    if self.cancel_token.cancelled:
+                        record(step_id, "cancelled", error=f"Execution cancelled: {self.cancel_token.reason}")
+                        continue
+                    blocked = [dep for dep in dependencies[step_id] if results[dep]["status"] != "completed"]
+                    if blocked:
+                        record(step_id, "skipped", error=f"Upstream steps did not complete: {', '.join(blocked)}")
+                        continue
+                    limit = self.budget.exhausted()
+                    if limit:
+                        record(step_id, "skipped", error=f"Execution budget exhausted ({limit})")
+                        continue
+                    outputs = {dep: results[dep]["output"] for dep in dependencies[step_id]}
+                    if not evaluate_condition(step.get("condition"), user_input, outputs):
+                        record(step_id, "skipped", error="Condition not met")
+                        continue
+                    branch_tokens[step_id] = CancellationToken()
+                    future = pool.submit(run_step, step, self._build_step_input(step, user_input, results))
+                    branch_tokens[step_id].bind(future)
+                    futures[future] = step_id
+
+        pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"multi_agent_{self.execution_id[:8]}")
+        try:
+            submit_ready_steps()
+            pending = set(futures)
+            while pending:
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step_id = futures[future]
+                    if step_id in results:
+                        continue
+                    try:
+                        record(step_id, "completed", output=future.result())
+                    except Exception as e:
+                        record(step_id, "cancelled" if isinstance(e, ExecutionCancelled) else "failed", error=str(e))
+
+                now = time.monotonic()
+                deadline_passed = self.budget.exhausted() == "timeout"
+                for future in list(pending):
+                    step_id = futures[future]
+                    if step_id in results:
+                        continue
+                    timeout = step_map[step_id].get("timeout") or default_timeout
+                    if self.cancel_token.cancelled:
+                        # The worker stops at its next LLM step or tool call; its result is discarded
+                        future.cancel()
+                        record(step_id, "cancelled", error=f"Execution cancelled: {self.cancel_token.reason}")
+                    elif deadline_passed:
+                        future.cancel()
+                        record(step_id, "timed_out", error=f"Execution deadline of {self.budget.timeout_seconds}s reached")
+                    elif timeout and step_id in started_at and now - started_at[step_id] > float(timeout):
+                        # The abandoned branch stops at its next LLM step or tool call instead of running on
+                        branch_tokens[step_id].cancel(f"step timed out after {timeout}s")
+                        record(step_id, "timed_out", error=f"Timed out after {timeout}s")
+
+                submit_ready_steps()
+                pending = {future for future, step_id in futures.items() if step_id not in results}
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        self.step_results.update(results)
+        return results
+
+    def _assemble_outputs(self, entries: List[Dict[str, Any]], results: Dict[str, Dict[str, Any]]) -> str:
+        """Builds the final text server-side: the merge template per step, outputs read back from the artifact store."""
+        sections = []
+        template = self.multi_agent_config.get("merge_template") or DEFAULT_MERGE_TEMPLATE
+        for entry in entries:
+            result = results.get(entry["key"], {"status": "failed", "output": "", "error": "Step did not run"})
+            if result["status"] != "completed":
+                output = f"[{result['status']}: {result.get('error') or 'no output'}]"
+            elif result.get("artifact_id"):
+                output = self.artifact_store.reference(result["artifact_id"])
+            else:
+                output = result["output"]
+            sections.append(
+                template.replace("{{name}}", entry["name"])
+                .replace("{{status}}", result["status"])
+                .replace("{{output}}", output)
+            )
+        text = f"{'-' * 40}\n" + "\n".join(sections) + f"\n{'-' * 40}"
+        return self.artifact_store.expand_references(self.execution_id, text)
+
+    def _reference_listing(self, entries: List[Dict[str, Any]], results: Dict[str, Dict[str, Any]]) -> List[str]:
+        """One line per step for manager / aggregator prompts: its artifact reference and a short preview."""
+        lines = []
+        for entry in entries:
+            result = results.get(entry["key"], {"status": "failed", "error": "Step did not run"})
+            artifact = self.artifacts.get(entry["key"])
+            if result["status"] == "completed" and artifact:
+                lines.append(f"- {entry['name']}: {self.artifact_store.reference(artifact['id'])} Preview: {artifact['summary']}")
+            else:
+                lines.append(f"- {entry['name']}: [{result['status']}: {result.get('error') or 'no output'}]")
+        return lines
+
+    def _expand_or_assemble(self, text: str, entries: List[Dict[str, Any]], results: Dict[str, Dict[str, Any]], author: str) -> str:
+        """
+        Expands the artifact references an agent wrote into the stored outputs. When none of them
+        resolves the agent's text would drop the worker outputs, so the server-side assembly is returned.
+        """
+        expanded, resolved = self.artifact_store.resolve_references(self.execution_id, text)
+        if resolved:
+            return expanded.strip()
+        logger.warning(f"{author} response resolves no artifact references, assembling the outputs server-side (Execution ID: {self.execution_id})")
+        return self._assemble_outputs(entries, results)
+
+    def _merge_outputs(self, user_input: str, entries: List[Dict[str, Any]], results: Dict[str, Dict[str, Any]]) -> str:
+        """Merges step outputs using the configured template or the aggregator agent."""
+        if self.multi_agent_config.get("merge_strategy") == "aggregator" and self.aggregator:
+            aggregator_id = self.aggregator["config"]["id"]
+            # Like the manager, the aggregator sees references and previews; full outputs stay in the artifact store
+            aggregator_input = "\n".join(
+                [
+                    f"Original User Input: '{user_input}'",
+                    "\nWorker outputs are stored server-side and shown here only as references with a short preview:"
+                ]
+                + self._reference_listing(entries, results)
+                + [
+                    "\nTo include a worker's full output, write its reference token exactly as shown. "
+                    "Tokens are replaced with the stored outputs after you respond, so never copy or rephrase outputs yourself."
+                ]
+            )
+            logger.info(f"Merging {len(entries)} outputs with aggregator agent {aggregator_id} (Execution ID: {self.execution_id})")
+            try:
+                return self._expand_or_assemble(self._run_worker(aggregator_id, aggregator_input), entries, results, "Aggregator")
+            except Exception as e:
+                logger.error(f"Aggregator agent failed, falling back to template merge: {self._sanitize_for_logging(e)} (Execution ID: {self.execution_id})")
+
+        return self._assemble_outputs(entries, results)
+
+    def _execute_fan_out(self, user_input: str, agent_sequence: List[Dict[str, Any]]) -> str:
+        """Sends the user input to every worker concurrently and merges their outputs."""
+        logger.info(f"Fan-out execution across {len(agent_sequence)} workers (Execution ID: {self.execution_id})")
+        start = time.monotonic()
+        steps = [{"id": agent["id"], "agent_id": agent["id"], "inputs": [USER_INPUT_SOURCE]} for agent in agent_sequence]
+        results = self._run_step_graph(steps, user_input)
+        logger.info(f"Fan-out completed in {round(time.monotonic() - start, 3)}s (Execution ID: {self.execution_id})")
+
+        if not any(r["status"] == "completed" for r in results.values()):
+            logger.error(f"All fan-out branches failed (Execution ID: {self.execution_id})")
+            return "Error: All worker agents failed. " + "; ".join(f"{key}: {r.get('error')}" for key, r in results.items())
+
+        entries = [{"key": agent["id"], "name": agent["name"]} for agent in agent_sequence]
+        return self._merge_outputs(user_input, entries, results)
+
+    def _execute_sequential(self, user_input: str, agent_sequence: List[Dict[str, Any]], file_content: str = "") -> str:
+        """Runs the workers as a checkpointed chain, each receiving the previous worker's output."""
+        steps = [
+            {
+                "id": agent["id"],
+                "agent_id": agent["id"],
+                "inputs": [USER_INPUT_SOURCE] if i == 0 else [agent_sequence[i - 1]["id"]]
+            }
+            for i, agent in enumerate(agent_sequence)
+        ]
+        chain_input = f"{user_input}\n\nFile Content: {file_content}" if file_content else user_input
+        logger.info(f"Sequential execution of {len(steps)} steps (Execution ID: {self.execution_id})")
+        results = self._run_step_graph(steps, chain_input)
+
+        for agent in agent_sequence:
+            result = results.get(agent["id"], {})
+            if result.get("status") != "completed":
+                error = result.get("error") or "Step did not run"
+                logger.error(f"Sequence stopped at '{agent['name']}': {self._sanitize_for_logging(error)} (Execution ID: {self.execution_id})")
+                if "RateLimitError" in error:
+                    return f"Error: API rate limit exceeded at step '{agent['name']}'. Completed steps were saved; resume execution {self.execution_id} to continue."
+                return f"Error: Step '{agent['name']}' did not complete: {error}"
+
+        return self._format_with_manager(user_input, agent_sequence, results)
+
+    def _format_with_manager(self, user_input: str, agent_sequence: List[Dict[str, Any]], results: Dict[str, Dict[str, Any]]) -> str:
+        """Has the manager agent assemble the final response from the collected worker outputs."""
+        if MANAGER_STEP_ID in self.completed_steps:
+            output = self._restore_step_output(self.completed_steps[MANAGER_STEP_ID])
+            if output is not None:
+                logger.info(f"Manager output restored from checkpoint (Execution ID: {self.execution_id})")
+                return output
+
+        # The manager only sees references and short previews; full outputs stay in the artifact store
+        entries = [{"key": agent["id"], "name": agent["name"]} for agent in agent_sequence]
+        instructions = [
+            f"Original User Input: '{self._sanitize_for_logging(user_input)}'",
+            "\nThe worker agents ran in this order. Their full outputs are stored server-side and shown here only as references with a short preview:"
+        ] + self._reference_listing([{**entry, "name": f"{agent['name']} ({agent['role']})"} for entry, agent in zip(entries, agent_sequence)], results)
+        instructions.append(
+            "\nTo include a worker's full output, write its reference token exactly as shown, e.g. "
+            f"{self.artifact_store.reference(self.artifacts[agent_sequence[0]['id']]['id'])}. "
+            "Tokens are replaced with the stored outputs after you respond, so never copy or rephrase outputs yourself.\n"
+            "Unless the task above asks for something else, format the final result as follows:\n"
+            f"{'-' * 40}\n" +
+            "\n".join([f"{agent['name']} Output: {self.artifact_store.reference(self.artifacts[agent['id']]['id'])}" for agent in agent_sequence]) + "\n" +
+            f"{'-' * 40}"
+        )
+        manager_task = Task(
+            description=f"{self.multi_agent_config.get('description', 'Coordinate the processing of the user request.')}\n\n" + "\n".join(instructions),
+            expected_output=self.multi_agent_config.get("expected_output"),
+            agent=self.manager_agent
+        )
+        tracker = self.budget.tracker(manager_task)
+        crew = Crew(agents=[self.manager_agent], tasks=[manager_task], process=Process.sequential, verbose=True, step_callback=tracker.on_step)
+
+        logger.info(f"Starting manager formatting (Execution ID: {self.execution_id})")
+        start = time.monotonic()
+        result = tracker.finish(crew.kickoff())
+        duration = round(time.monotonic() - start, 3)
+        logger.info(f"Manager formatting completed in {duration}s (Execution ID: {self.execution_id})")
+
+        # Clean the manager's own text before expansion so worker outputs are returned exactly as produced
+        manager_text = self.clean_output(str(getattr(result, 'raw', result)).strip())
+        final_result = self._expand_or_assemble(manager_text, entries, results, "Manager")
+        logger.info(f"Final output: '{self._sanitize_for_logging(final_result[:100])}{'...' if len(final_result) > 100 else ''}' (Execution ID: {self.execution_id})")
+        if not final_result:
+            logger.warning(f"Empty result after cleaning (Execution ID: {self.execution_id})")
+            return "No output generated."
+
+        if self.checkpoint_store:
+            artifact = self.artifact_store.put(self.execution_id, f"step:{MANAGER_STEP_ID}", final_result)
+            self.checkpoint_store.save_step(self.execution_id, MANAGER_STEP_ID, {"status": "completed", "agent_id": None, "artifact_id": artifact["id"], "duration": duration})
+        return final_result
+
+    def _execute_workflow(self, user_input: str) -> str:
+        """Runs the configured DAG of workflow steps and merges the outputs of its final steps."""
+        steps = self.multi_agent_config.get("steps") or []
+        try:
+            order = validate_workflow_steps(steps)
+        except ValueError as e:
+            logger.error(f"Invalid workflow: {self._sanitize_for_logging(e)} (Execution ID: {self.execution_id})")
+            return f"Error: Invalid workflow: {e}"
+
+        missing_agents = sorted({step["agent_id"] for step in steps if step["agent_id"] not in self.worker_map})
+        if missing_agents:
+            logger.error(f"Workflow references unknown agents: {missing_agents} (Execution ID: {self.execution_id})")
+            return f"Error: Missing required agents with IDs: {', '.join(missing_agents)}"
+
+        logger.info(f"Workflow execution of {len(steps)} steps, topological order: {order} (Execution ID: {self.execution_id})")
+        start = time.monotonic()
+        results = self._run_step_graph(steps, user_input)
+        logger.info(f"Workflow completed in {round(time.monotonic() - start, 3)}s (Execution ID: {self.execution_id})")
+
+        if not any(r["status"] == "completed" for r in results.values()):
+            logger.error(f"No workflow step completed (Execution ID: {self.execution_id})")
+            return "Error: No workflow step completed. " + "; ".join(f"{key}: {r.get('error')}" for key, r in results.items())
+
+        # The final answer is built from the terminal steps that actually ran
+        final_step_ids = [step_id for step_id in sink_steps(steps) if results[step_id]["status"] != "skipped"]
+        if not final_step_ids:
+            final_step_ids = [next(step_id for step_id in reversed(order) if results[step_id]["status"] == "completed")]
+        step_agents = {step["id"]: step["agent_id"] for step in steps}
+        entries = [
+            {"key": step_id, "name": f"{self.worker_map[step_agents[step_id]]['config']['name']} ({step_id})"}
+            for step_id in final_step_ids
+        ]
+        return self._merge_outputs(user_input, entries, results)
+
+    def execute_task(self, user_input: str, file_path: Optional[str] = None, resume: bool = False) -> str:
+        """
+        Executes multi-agent orchestration in the configured mode.
+        With a checkpoint store, every finished step is persisted under the execution_id;
+        resume=True reuses the completed steps of a previous run of the same execution_id.
+        """
+        self.completed_steps = {}
+        self.step_results = {}
+        self.budget_error = None
+        if self.checkpoint_store:
+            if resume:
+                self.completed_steps = self.checkpoint_store.completed_steps(self.execution_id)
+                self.checkpoint_store.mark_running(self.execution_id)
+                logger.info(f"Resuming with {len(self.completed_steps)} completed steps from checkpoint (Execution ID: {self.execution_id})")
+            else:
+                self.checkpoint_store.create(self.execution_id, self.multi_agent_config.get("id"), user_input)
+        if not resume:
+            self.artifact_store.purge_expired()
+
+        result = self._execute(user_input, file_path)
+        if self.cancel_token.cancelled:
+            logger.warning(f"Execution cancelled ({self.cancel_token.reason}); usage: {self.budget.usage()} (Execution ID: {self.execution_id})")
+            result = f"Error: Execution cancelled ({self.cancel_token.reason})"
+        elif self.budget.exceeded:
+            # End cleanly: whatever the completed steps produced is returned alongside a structured error
+            partial_output = "\n\n".join(
+                f"{step_id} Output: {step['output']}" for step_id, step in self.step_results.items() if step["status"] == "completed"
+            )
+            self.budget_error = self.budget.error(partial_output=partial_output or None)
+            logger.warning(f"{self.budget_error.message}; usage: {self.budget_error.usage} (Execution ID: {self.execution_id})")
+            result = f"Error: {self.budget_error.message}"
+        if self.payload_cache:
+            logger.info(f"Payload cache: {self.payload_cache_counts['hits']} hits, {self.payload_cache_counts['misses']} misses (Execution ID: {self.execution_id})")
+
+        if self.checkpoint_store:
+            incomplete = [t["step_id"] for t in self.step_timings if t["status"] in ["failed", "timed_out", "cancelled"]]
+            if self.cancel_token.cancelled:
+                # Completed steps stay checkpointed, so a cancelled run can be resumed
+                self.checkpoint_store.finish(self.execution_id, "cancelled", final_output=result, error=result)
+            elif result.startswith(("Error:", "An error occurred")) or incomplete:
+                self.checkpoint_store.finish(self.execution_id, "failed", final_output=result, error=f"Incomplete steps: {incomplete}" if incomplete else result)
+            else:
+                self.checkpoint_store.finish(self.execution_id, "completed", final_output=result)
+        return result
+
+    def _execute(self, user_input: str, file_path: Optional[str] = None) -> str:
+        """Validates the worker sequence and dispatches to the configured execution mode."""
         try:
-            if len(self.worker_agents) < 2:
-                logger.error(f"At least two worker agents are required (Execution ID: {self.execution_id})")
-                return "Error: At least two worker agents are required."
+            # A workflow may consist of a single step; the other modes combine several workers
+            min_workers = 1 if self.multi_agent_config.get("execution_mode") == "workflow" else 2
+            if len(self.worker_agents) < min_workers:
+                logger.error(f"At least {min_workers} worker agents are required (Execution ID: {self.execution_id})")
+                return "Error: At least two worker agents are required." if min_workers == 2 else "Error: At least one worker agent is required."
 
             logger.info(f"Starting task execution with user_input: '{self._sanitize_for_logging(user_input)}' (Execution ID: {self.execution_id})")
             if self.log_url:
@@ -465,69 +1055,16 @@ class MultiAgentExecutor:
                         agent_sequence.append(meta)
                         break
 
-            if len(agent_sequence) < 2:
+            if len(agent_sequence) < min_workers:
                 logger.error(f"Insufficient valid agents in sequence: {len(agent_sequence)} (Execution ID: {self.execution_id})")
-                return "Error: At least two valid agents are required."
-
-            # Construct manager task description
-            instructions = [f"Original User Input: '{self._sanitize_for_logging(user_input)}'"]
-            if file_content:
-                instructions.append(f"File Content: {file_content}")
-
-            instructions.append("\nFollow these steps exactly:")
-            for i, agent in enumerate(agent_sequence):
-                if i == 0:
-                    instructions.append(
-                        f"{i+1}. Delegate to '{agent['name']}' to process the user input.\n"
-                        f"   - Role: {agent['role']}\n"
-                        f"   - Instructions: {agent['instructions']}\n"
-                        f"   - Expected output: {agent['expectedOutput']}"
-                    )
-                else:
-                    instructions.append(
-                        f"{i+1}. Pass the output from '{agent_sequence[i-1]['name']}' to '{agent['name']}'.\n"
-                        f"   - Role: {agent['role']}\n"
-                        f"   - Instructions: {agent['instructions']}\n"
-                        f"   - Expected output: {agent['expectedOutput']}"
-                    )
-            instructions.append(
-                f"{len(agent_sequence)+1}. Collect the output from each agent and format the final result as follows:\n"
-                f"{'-' * 40}\n" +
-                "\n".join([f"{agent['name']} Output: <output from {agent['name']}>" for agent in agent_sequence]) + "\n" +
-                f"{'-' * 40}\n"
-                "Do not modify or rephrase any of the agent outputs. Display each exactly as received."
-            )
-
-            manager_task_description = f"{self.multi_agent_config.get('description', 'Coordinate the processing of the user request.')}\n\n" + "\n".join(instructions)
+                return "Error: At least two valid agents are required." if min_workers == 2 else "Error: At least one valid agent is required."
 
-            manager_task = Task(
-                description=manager_task_description,
-                expected_output=self.multi_agent_config.get("expected_output"),
-                agent=self.manager_agent
-            )
-
-            # Create crew with manager and workers
-            crew = Crew(
-                agents=[self.manager_agent] + self.worker_agents,
-                tasks=[manager_task],
-                process=Process.sequential,
-                manager=self.manager_agent,
-                verbose=True
-            )
+            if self.multi_agent_config.get("execution_mode") == "parallel":
+                return self._execute_fan_out(user_input, agent_sequence)
+            if self.multi_agent_config.get("execution_mode") == "workflow":
+                return self._execute_workflow(user_input)
 
-            # Execute crew
-            logger.info(f"Starting crew execution (Execution ID: {self.execution_id})")
-            result = crew.kickoff()
-            logger.info(f"Crew execution completed (Execution ID: {self.execution_id})")
-
-            # Clean and return result
-            raw_result = str(getattr(result, 'raw', result)).strip()
-            final_result = self.clean_output(raw_result)
-            logger.info(f"Final cleaned output: '{self._sanitize_for_logging(final_result[:100])}{'...' if len(final_result) > 100 else ''}' (Execution ID: {self.execution_id})")
-            if not final_result:
-                logger.warning(f"Empty result after cleaning (Execution ID: {self.execution_id})")
-                return "No output generated."
-            return final_result
+            return self._execute_sequential(user_input, agent_sequence, file_content)
 
         except Exception as e:
             logger.error(f"Error during execution: {self._sanitize_for_logging(e)} (Execution ID: {self.execution_id})", exc_info=True)
@@ -0,0 +1,60 @@
+import os
+import re
+import json
+import hashlib
+import logging
+from typing import Optional, Dict, Any
+
+from cache_utils import TTLCache
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_CACHE_MAX_ENTRIES = int(os.getenv("PAYLOAD_CACHE_MAX_ENTRIES", "2048"))
+PAYLOAD_CACHE_TTL = float(os.getenv("PAYLOAD_CACHE_TTL", "3600"))
+
+
+def schema_hash(schema: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(schema, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def normalize_tool_input(input_text: Any) -> str:
+    """Collapses whitespace only; case and punctuation can change the generated payload."""
+    return re.sub(r"\s+", " ", str(input_text or "")).strip()
+
+
+class PayloadCache:
+    """
+    Memoizes generate_payload results ({"payload", "endpoint_url"}) keyed by tool id, schema hash,
+    normalized tool input and any extra prompt context (connector description, parsed values).
+    Shared by every executor, so repeated tool calls skip the payload-generation LLM round trip
+    within a run and across runs. Only successful results are stored.
+    """
+    def __init__(self, max_entries: int = PAYLOAD_CACHE_MAX_ENTRIES, ttl: float = PAYLOAD_CACHE_TTL):
+        self._cache = TTLCache(max_entries=max_entries, ttl=ttl)
+
+    @staticmethod
+    def key(tool_id: Optional[str], schema: Dict[str, Any], input_text: Any, extra: Any = None) -> tuple:
+        extra_hash = hashlib.sha256(json.dumps(extra, sort_keys=True, default=str).encode("utf-8")).hexdigest() if extra else None
+        return (tool_id, schema_hash(schema), normalize_tool_input(input_text), extra_hash)
+
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        result = self._cache.get(key)
+        # Callers may mutate the payload (e.g. merge auth params), so hand out copies
+        return json.loads(json.dumps(result)) if result is not None else None
+
+    def set(self, key: tuple, result: Dict[str, Any]):
+        if not result or "error" in result or not result.get("endpoint_url"):
+            return
+        self._cache.set(key, json.loads(json.dumps(result)))
+
+    def invalidate_tool(self, tool_id: str) -> int:
+        removed = self._cache.remove_where(lambda key: key[0] == tool_id)
+        if removed:
+            logger.info(f"Invalidated {removed} cached payloads for tool {tool_id}")
+        return removed
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
@@ -0,0 +1,202 @@
+import os
+import re
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from cache_utils import TTLCache
+from tool_digest import resolve_schema, operation_payload_schema
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_REPAIR_ATTEMPTS = int(os.getenv("PAYLOAD_REPAIR_ATTEMPTS", "2"))
+PAYLOAD_VALIDATOR_CACHE_SIZE = int(os.getenv("PAYLOAD_VALIDATOR_CACHE_SIZE", "1024"))
+MAX_REPORTED_ERRORS = 10
+
+Validator = Callable[[Any, str], List[str]]
+
+FORMAT_PATTERNS = {
+    "date": re.compile(r"^\d{4}-\d{2}-\d{2}$"),
+    "date-time": re.compile(r"^\d{4}-\d{2}-\d{2}[Tt ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?([Zz]|[+-]\d{2}:?\d{2})?$"),
+    "time": re.compile(r"^\d{2}:\d{2}(:\d{2}(\.\d+)?)?([Zz]|[+-]\d{2}:?\d{2})?$"),
+    "email": re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$"),
+    "uuid": re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$"),
+    "uri": re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*:\S+$")
+}
+
+
+def _is_type(value: Any, json_type: str) -> bool:
+    if json_type == "integer":
+        return isinstance(value, int) and not isinstance(value, bool) or isinstance(value, float) and value.is_integer()
+    if json_type == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return {
+        "string": lambda v: isinstance(v, str),
+        "boolean": lambda v: isinstance(v, bool),
+        "array": lambda v: isinstance(v, list),
+        "object": lambda v: isinstance(v, dict),
+        "null": lambda v: v is None
+    }.get(json_type, lambda v: True)(value)
+
+
+def _compile(node: Any, root: Dict[str, Any], memo: Dict[Any, Validator]) -> Validator:
+    """
+    Compiles a schema node into a closure once, so validating a payload is plain Python calls.
+    Refs are memoized by pointer, which also terminates recursive schemas.
+    """
+    if not isinstance(node, dict) or not node:
+        return lambda value, path: []
+    memo_key = node.get("$ref") or id(node)
+    if memo_key in memo:
+        return memo[memo_key]
+    compiled: List[Validator] = []
+    memo[memo_key] = lambda value, path: compiled[0](value, path)
+    node = resolve_schema(node, root)
+
+    checks: List[Validator] = []
+    types = node.get("type")
+    types = [types] if isinstance(types, str) else list(types or [])
+    nullable = node.get("nullable", False) or "null" in types
+
+    if "enum" in node:
+        allowed = node["enum"]
+        checks.append(lambda v, p: [] if v in allowed else [f"{p}: {json.dumps(v, default=str)} is not one of {allowed}"])
+    if "const" in node:
+        const = node["const"]
+        checks.append(lambda v, p: [] if v == const else [f"{p}: must equal {json.dumps(const)}"])
+
+    for key, compare, message in [
+        ("minimum", lambda v, b: v >= b, "must be >= {}"),
+        ("maximum", lambda v, b: v <= b, "must be <= {}"),
+        ("exclusiveMinimum", lambda v, b: v > b, "must be > {}"),
+        ("exclusiveMaximum", lambda v, b: v < b, "must be < {}")
+    ]:
+        bound = node.get(key)
+        if isinstance(bound, bool):
+            # OpenAPI 3.0 boolean form tightens minimum/maximum instead
+            continue
+        if bound is not None:
+            checks.append(lambda v, p, b=bound, c=compare, m=message: [] if not _is_type(v, "number") or c(v, b) else [f"{p}: {m.format(b)}"])
+    if node.get("exclusiveMinimum") is True and "minimum" in node:
+        checks.append(lambda v, p, b=node["minimum"]: [] if not _is_type(v, "number") or v > b else [f"{p}: must be > {b}"])
+    if node.get("exclusiveMaximum") is True and "maximum" in node:
+        checks.append(lambda v, p, b=node["maximum"]: [] if not _is_type(v, "number") or v < b else [f"{p}: must be < {b}"])
+    if node.get("multipleOf"):
+        step = node["multipleOf"]
+        checks.append(lambda v, p: [] if not _is_type(v, "number") or abs(v / step - round(v / step)) < 1e-9 else [f"{p}: must be a multiple of {step}"])
+
+    if "minLength" in node or "maxLength" in node:
+        low, high = node.get("minLength", 0), node.get("maxLength")
+        checks.append(lambda v, p: [] if not isinstance(v, str) or (len(v) >= low and (high is None or len(v) <= high))
+                      else [f"{p}: length must be between {low} and {high if high is not None else 'unbounded'}"])
+    if "pattern" in node:
+        try:
+            pattern = re.compile(node["pattern"])
+            checks.append(lambda v, p: [] if not isinstance(v, str) or pattern.search(v) else [f"{p}: does not match pattern {node['pattern']}"])
+        except re.error:
+            logger.warning(f"Ignoring invalid pattern in schema: {node['pattern']}")
+    format_pattern = FORMAT_PATTERNS.get(node.get("format"))
+    if format_pattern:
+        checks.append(lambda v, p: [] if not isinstance(v, str) or format_pattern.match(v) else [f"{p}: is not a valid {node['format']}"])
+
+    if "items" in node:
+        item_validator = _compile(node["items"], root, memo)
+        checks.append(lambda v, p: [e for i, item in enumerate(v) for e in item_validator(item, f"{p}[{i}]")] if isinstance(v, list) else [])
+    if "minItems" in node or "maxItems" in node:
+        low, high = node.get("minItems", 0), node.get("maxItems")
+        checks.append(lambda v, p: [] if not isinstance(v, list) or (len(v) >= low and (high is None or len(v) <= high))
+                      else [f"{p}: must have between {low} and {high if high is not None else 'unbounded'} items"])
+    if node.get("uniqueItems"):
+        checks.append(lambda v, p: [] if not isinstance(v, list) or len({json.dumps(i, sort_keys=True, default=str) for i in v}) == len(v) else [f"{p}: items must be unique"])
+
+    properties = {name: _compile(prop, root, memo) for name, prop in (node.get("properties") or {}).items()}
+    required = list(node.get("required") or [])
+    additional = node.get("additionalProperties", True)
+    additional_validator = _compile(additional, root, memo) if isinstance(additional, dict) else None
+    if properties or required or additional is not True:
+        def check_object(v, p):
+            if not isinstance(v, dict):
+                return []
+            errors = [f"{p}.{name}: is required" for name in required if v.get(name) is None and not (name in v and name in properties and _accepts_null(node, name, root))]
+            for name, item in v.items():
+                if item is None and name in required:
+                    # Already reported as missing, or explicitly nullable
+                    continue
+                if name in properties:
+                    errors.extend(properties[name](item, f"{p}.{name}"))
+                elif additional is False:
+                    errors.append(f"{p}.{name}: is not an allowed property")
+                elif additional_validator:
+                    errors.extend(additional_validator(item, f"{p}.{name}"))
+            return errors
+        checks.append(check_object)
+
+    for combinator in ["oneOf", "anyOf"]:
+        if node.get(combinator):
+            variants = [_compile(variant, root, memo) for variant in node[combinator]]
+            exactly_one = combinator == "oneOf"
+            def check_variants(v, p, variants=variants, exactly_one=exactly_one, combinator=combinator):
+                matches = sum(1 for variant in variants if not variant(v, p))
+                if matches == 0 or (exactly_one and matches > 1):
+                    return [f"{p}: must match {'exactly one' if exactly_one else 'at least one'} of the {combinator} schemas"]
+                return []
+            checks.append(check_variants)
+
+    def validate(value: Any, path: str) -> List[str]:
+        if value is None:
+            if nullable or not types:
+                return []
+            return [f"{path}: must not be null"]
+        if types and not any(_is_type(value, t) for t in types):
+            return [f"{path}: expected {'|'.join(types)}, got {type(value).__name__}"]
+        errors = []
+        for check in checks:
+            errors.extend(check(value, path))
+        return errors
+
+    compiled.append(validate)
+    memo[memo_key] = validate
+    return validate
+
+
+def _accepts_null(node: Dict[str, Any], name: str, root: Dict[str, Any]) -> bool:
+    prop = resolve_schema(node["properties"][name], root)
+    prop_type = prop.get("type")
+    return bool(prop.get("nullable")) or prop_type == "null" or isinstance(prop_type, list) and "null" in prop_type
+
+
+def compile_validator(schema_node: Dict[str, Any], root: Dict[str, Any]) -> Callable[[Any], List[str]]:
+    """Compiles a JSON Schema (OpenAPI dialect) into a function returning a list of error messages."""
+    validate = _compile(schema_node, root, {})
+    return lambda value: validate(value, "payload")[:MAX_REPORTED_ERRORS]
+
+
+_validators = TTLCache(max_entries=PAYLOAD_VALIDATOR_CACHE_SIZE, ttl=0)
+
+
+def operation_validator(schema: Dict[str, Any], schema_hash: str, operation: Dict[str, Any]) -> Optional[Callable[[Any], List[str]]]:
+    """
+    Returns the compiled payload validator of a tool operation, compiling it on first use.
+    Validators are cached by (schema hash, operation id) and shared across executions.
+    """
+    key = (schema_hash, operation["operation_id"])
+    validator = _validators.get(key)
+    if validator is None:
+        try:
+            payload_schema = operation_payload_schema(schema, operation["path"], operation["method"].lower())
+            validator = compile_validator(payload_schema, schema)
+        except Exception as e:
+            logger.warning(f"Could not compile payload validator for {operation['method']} {operation['path']}: {e}")
+            return None
+        _validators.set(key, validator)
+    return validator
+
+
+def repair_feedback(payload: Any, errors: List[str]) -> str:
+    """Prompt addendum telling the payload generator why its previous attempt was rejected."""
+    problems = "\n".join(f"- {error}" for error in errors)
+    return (
+        f"\nA previous attempt returned this payload: {json.dumps(payload, ensure_ascii=False, default=str)}\n"
+        f"It was rejected by schema validation:\n{problems}\n"
+        f"Return a corrected JSON object that fixes every problem listed."
+    )
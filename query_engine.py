@@ -0,0 +1,496 @@
+import os
+import json
+import re
+import time
+import uuid
+import logging
+from typing import Optional, Dict, Any, List, Union, Tuple
+
+import psycopg2
+from google.cloud import bigquery
+from langchain.tools import Tool
+
+from cache_utils import TTLCache
+from connector_pools import PostgresPoolManager, BigQueryClientCache, bigquery_settings
+
+logger = logging.getLogger(__name__)
+
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "500"))
+QUERY_MAX_BYTES = int(os.getenv("QUERY_MAX_BYTES", str(256 * 1024)))
+QUERY_TIMEOUT_SECONDS = float(os.getenv("QUERY_TIMEOUT_SECONDS", "30"))
+QUERY_FETCH_SIZE = int(os.getenv("QUERY_FETCH_SIZE", "200"))
+# Cell values are cut to this length so one wide column cannot use the whole byte budget
+QUERY_MAX_CELL_CHARS = int(os.getenv("QUERY_MAX_CELL_CHARS", "500"))
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "512"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "300"))
+
+READ_ONLY_STATEMENTS = ("select", "with", "explain", "show", "values", "table")
+# Postgres server-side (named) cursors only accept queries; EXPLAIN and SHOW run on a plain cursor
+CURSOR_STATEMENTS = ("select", "with", "values", "table")
+
+# String literals ('' escapes), quoted identifiers, backtick identifiers, line and block comments
+SQL_SEGMENT_PATTERN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|--[^\n]*|/\*.*?\*/", re.DOTALL)
+SQL_TOKEN_PATTERN = re.compile(r"[A-Za-z_][\w$]*|\d+(?:\.\d+)?|\S")
+# Words that end a table item in a FROM list; anything else right after a table name is its alias
+SQL_CLAUSE_KEYWORDS = {
+    "where", "group", "order", "limit", "offset", "fetch", "for", "having", "window", "qualify",
+    "union", "intersect", "except", "join", "inner", "left", "right", "full", "cross", "natural",
+    "outer", "on", "using", "tablesample", "pivot", "unpivot", "select", "from", "with"
+}
+JOIN_KEYWORDS = {"join", "inner", "left", "right", "full", "cross", "natural", "outer", "on", "using"}
+# Dependency marker for statements whose tables cannot be determined: invalidated by any table
+ALL_TABLES = "*"
+
+
+class QueryError(ValueError):
+    """Raised when a query is rejected or fails to execute."""
+
+
+def split_sql(sql: str) -> List[Tuple[str, str]]:
+    """
+    Splits SQL into ("code" | "quoted" | "comment", text) segments, so checks and rewrites only
+    look at code outside string literals, quoted identifiers and comments. Raises QueryError for an
+    unterminated literal, identifier or block comment.
+    """
+    sql = sql or ""
+    segments = []
+    position = 0
+    for match in SQL_SEGMENT_PATTERN.finditer(sql):
+        if match.start() > position:
+            segments.append(("code", sql[position:match.start()]))
+        token = match.group(0)
+        segments.append(("comment" if token.startswith(("--", "/*")) else "quoted", token))
+        position = match.end()
+    if position < len(sql):
+        segments.append(("code", sql[position:]))
+    for kind, text in segments:
+        if kind == "code" and any(mark in text for mark in ["'", '"', "`", "/*"]):
+            raise QueryError("Unterminated quoted string, identifier or comment")
+    return segments
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Strips comments, a trailing semicolon and redundant whitespace from a statement, leaving
+    quoted literals and identifiers untouched. Used for logging and cache keys, not execution.
+    """
+    parts = [""]
+    for kind, text in split_sql(sql):
+        if kind == "quoted":
+            parts.extend([text, ""])
+        else:
+            parts[-1] += text if kind == "code" else " "
+    # Even indices hold the code between quoted segments
+    statement = "".join(part if index % 2 else re.sub(r"\s+", " ", part) for index, part in enumerate(parts))
+    return statement.strip().rstrip(";").strip()
+
+
+def validate_read_only(sql: str) -> str:
+    """
+    Rejects anything but a single read-only query and returns the statement to execute: the
+    query as written, with only a trailing semicolon removed.
+    """
+    segments = split_sql(sql)
+    # Drop the trailing semicolon of the last code segment with content (a comment may follow it)
+    for index in range(len(segments) - 1, -1, -1):
+        kind, text = segments[index]
+        if kind == "quoted" or (kind == "code" and text.strip()):
+            if kind == "code" and text.rstrip().endswith(";"):
+                stripped = text.rstrip()
+                segments[index] = ("code", stripped[:-1] + text[len(stripped):])
+            break
+    code = " ".join(text for kind, text in segments if kind != "comment")
+    if not code.strip():
+        raise QueryError("Query is empty")
+    if any(";" in text for kind, text in segments if kind == "code"):
+        raise QueryError("Only a single statement is allowed")
+    if statement_keyword(sql) not in READ_ONLY_STATEMENTS:
+        raise QueryError("Only read-only queries (SELECT/WITH) are allowed")
+    return "".join(text for _, text in segments).strip()
+
+
+def statement_keyword(sql: str) -> Optional[str]:
+    """Returns the lower-cased first word of a statement's code, skipping leading comments."""
+    first_word = re.match(r"\s*(\w+)", " ".join(text for kind, text in split_sql(sql) if kind == "code"))
+    return first_word.group(1).lower() if first_word else None
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    text = str(value)
+    return text if len(text) <= QUERY_MAX_CELL_CHARS else f"{text[:QUERY_MAX_CELL_CHARS]}..."
+
+
+def _bigquery_parameter(name: str, value: Any):
+    if isinstance(value, bool):
+        return bigquery.ScalarQueryParameter(name, "BOOL", value)
+    if isinstance(value, int):
+        return bigquery.ScalarQueryParameter(name, "INT64", value)
+    if isinstance(value, float):
+        return bigquery.ScalarQueryParameter(name, "FLOAT64", value)
+    return bigquery.ScalarQueryParameter(name, "STRING", None if value is None else str(value))
+
+
+def _sql_tokens(sql: str) -> List[Tuple[str, str]]:
+    """
+    Tokenizes SQL into ("name" | "literal" | "symbol", text) tokens. Dotted names, including
+    quoted and backtick parts, become a single name token; comments are dropped.
+    """
+    tokens = []
+    for kind, text in split_sql(sql):
+        if kind == "comment":
+            continue
+        if kind == "quoted":
+            parts = [("literal", text)] if text.startswith("'") else [("name", text)]
+        else:
+            parts = [("name" if re.match(r"[A-Za-z_]", token) else "symbol", token) for token in SQL_TOKEN_PATTERN.findall(text)]
+        for token in parts:
+            previous = tokens[-1] if tokens else None
+            if previous and previous[0] == "name" and (token == ("symbol", ".") or token[0] == "name" and previous[1].endswith(".")):
+                tokens[-1] = ("name", previous[1] + token[1])
+            else:
+                tokens.append(token)
+    return tokens
+
+
+def _table_name(token: str) -> str:
+    return token.split(".")[-1].strip("`\"").lower()
+
+
+def referenced_tables(sql: str) -> frozenset:
+    """
+    Returns the lower-cased, unqualified names of tables a statement reads from: every item of
+    each FROM list (comma joins included), JOIN targets and subqueries, and TABLE statements.
+    Returns {ALL_TABLES} when a FROM list holds something other than tables and subqueries (a
+    table function or parenthesized join), so the result is invalidated by a change to any table.
+    """
+    tokens = _sql_tokens(sql)
+    words = [text.lower() if kind == "name" else text for kind, text in tokens]
+    if len(tokens) > 1 and words[0] == "table" and tokens[1][0] == "name":
+        return frozenset([_table_name(tokens[1][1])])
+    names = set()
+    # One frame per open parenthesis: whether it holds a query, and what the FROM-list parser expects next
+    frames = [{"query": True, "expect": None, "from_list": False}]
+    for index, (kind, text) in enumerate(tokens):
+        word = words[index]
+        frame = frames[-1]
+        following = words[index + 1] if index + 1 < len(words) else None
+        if frame["expect"] == "alias":
+            frame["expect"] = None
+            if word == "as":
+                frame["expect"] = "alias_name"
+                continue
+            if kind == "name" and word not in SQL_CLAUSE_KEYWORDS:
+                continue
+        elif frame["expect"] == "alias_name":
+            frame["expect"] = None
+            continue
+        elif frame["expect"] == "item":
+            if word in ("only", "lateral"):
+                continue
+            frame["expect"] = None
+            if word == "(":
+                if following not in ("select", "with", "values"):
+                    return frozenset([ALL_TABLES])
+                # The subquery is read like any other query; its alias follows the closing parenthesis
+                frame["expect"] = "alias"
+            elif kind == "name" and word not in SQL_CLAUSE_KEYWORDS:
+                if following == "(":
+                    # A table function such as generate_series() or UNNEST()
+                    return frozenset([ALL_TABLES])
+                names.add(_table_name(text))
+                frame["expect"] = "alias"
+                continue
+        if word == "(":
+            frames.append({"query": following in ("select", "with", "values", "("), "expect": None, "from_list": False})
+        elif word == ")":
+            if len(frames) > 1:
+                frames.pop()
+        elif not frame["query"]:
+            # FROM inside a function call, e.g. EXTRACT(YEAR FROM created_at), is not a table list
+            continue
+        elif word in ("from", "join"):
+            frame["expect"] = "item"
+            frame["from_list"] = True
+        elif word == "," and frame["from_list"]:
+            frame["expect"] = "item"
+        elif word in SQL_CLAUSE_KEYWORDS - JOIN_KEYWORDS:
+            frame["from_list"] = False
+    names.discard("")
+    return frozenset(names)
+
+
+class QueryResultCache:
+    """
+    LRU + TTL cache of query results keyed by connector id, normalized SQL, parameters and limits.
+    Each key also carries the tables the statement reads, so entries can be dropped per table
+    when an upstream load changes them.
+    """
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES, ttl: float = QUERY_CACHE_TTL_SECONDS):
+        self._cache = TTLCache(max_entries=max_entries, ttl=ttl)
+
+    @staticmethod
+    def normalize(statement: str) -> str:
+        """Lower-cases a normalized statement outside quoted literals and identifiers."""
+        parts = re.split(r"('(?:[^']|'')*'|\"[^\"]*\"|`[^`]*`)", statement)
+        return "".join(part if index % 2 else part.lower() for index, part in enumerate(parts))
+
+    @classmethod
+    def key(cls, connector_id: str, statement: str, params: Any, limits: Dict[str, Any]) -> tuple:
+        return (
+            connector_id,
+            cls.normalize(statement),
+            json.dumps(params, sort_keys=True, default=str),
+            limits["max_rows"],
+            limits["max_bytes"],
+            referenced_tables(statement)
+        )
+
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        return self._cache.get(key)
+
+    def set(self, key: tuple, result: Dict[str, Any], ttl: Optional[float] = None):
+        self._cache.set(key, result, ttl=ttl)
+
+    def invalidate_connector(self, connector_id: str) -> int:
+        return self._cache.remove_where(lambda key: key[0] == connector_id)
+
+    def invalidate_tables(self, connector_id: str, tables: List[str]) -> int:
+        """Drops cached results of a connector that read any of the given tables or unknown tables."""
+        names = {_table_name(table) for table in tables} | {ALL_TABLES}
+        return self._cache.remove_where(lambda key: key[0] == connector_id and bool(key[-1] & names))
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+def describe_connector(connector: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the non-secret parts of a connector record, safe to include in prompts and logs."""
+    if connector.get("connectorType") == "bigquery":
+        fields = ["uniqueName", "connectorType", "projectId", "datasetId"]
+    else:
+        fields = ["uniqueName", "connectorType", "vectorStoreDBName"]
+    return {field: connector.get(field) for field in fields if connector.get(field) is not None}
+
+
+def format_result_as_text(result: Dict[str, Any]) -> str:
+    """Renders a query result as a compact pipe-separated table for prompts and tool answers."""
+    lines = [" | ".join(result["headers"])]
+    lines.extend(" | ".join(row) for row in result["rows"])
+    footer = f"({result['row_count']} rows"
+    if result["truncated"]:
+        footer += f", truncated: {result['truncated_reason']}"
+    lines.append(footer + ")")
+    return "\n".join(lines)
+
+
+class DataQueryEngine:
+    """
+    Runs read-only SQL against a data connector through the pooled Postgres connections or the
+    cached BigQuery clients. Rows are streamed (server-side cursor / paged results) and collection
+    stops at the row or byte cap, so large tables are never loaded into memory or into a prompt.
+    Results use the TableData shape: {"headers": [...], "rows": [[str, ...], ...]} plus truncation info.
+    """
+    def __init__(
+        self,
+        postgres_pools: PostgresPoolManager,
+        bigquery_clients: BigQueryClientCache,
+        max_rows: int = QUERY_MAX_ROWS,
+        max_bytes: int = QUERY_MAX_BYTES,
+        timeout: float = QUERY_TIMEOUT_SECONDS,
+        fetch_size: int = QUERY_FETCH_SIZE,
+        schema_introspector=None,
+        result_cache: Optional[QueryResultCache] = None
+    ):
+        self.postgres_pools = postgres_pools
+        # Optional SchemaIntrospector; when set, query tools describe the connector's tables to the LLM
+        self.schema_introspector = schema_introspector
+        self.result_cache = result_cache
+        self.bigquery_clients = bigquery_clients
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.fetch_size = fetch_size
+
+    def execute(
+        self,
+        connector: Dict[str, Any],
+        sql: str,
+        params: Optional[Union[Dict[str, Any], List[Any]]] = None,
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+        use_cache: bool = False,
+        cache_ttl: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Executes a read-only query against a connector record from data/connectors.json.
+        With use_cache, identical queries are answered from the result cache until its TTL expires.
+        """
+        statement = validate_read_only(sql)
+        limits = {
+            "max_rows": min(max_rows or self.max_rows, self.max_rows),
+            "max_bytes": min(max_bytes or self.max_bytes, self.max_bytes),
+            "timeout": min(timeout or self.timeout, self.timeout)
+        }
+        cache_key = None
+        if use_cache and self.result_cache:
+            cache_key = self.result_cache.key(connector.get("id"), normalize_sql(statement), params, limits)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Query cache hit on connector {connector.get('id')} ({cached['row_count']} rows)")
+                return {**cached, "cached": True}
+
+        connector_type = connector.get("connectorType")
+        start = time.monotonic()
+        if connector_type == "postgres":
+            result = self._execute_postgres(connector, statement, params, **limits)
+        elif connector_type == "bigquery":
+            result = self._execute_bigquery(connector, statement, params, **limits)
+        else:
+            raise QueryError(f"Unsupported connector type: {connector_type}")
+        result["elapsed_ms"] = round((time.monotonic() - start) * 1000, 1)
+        logger.info(
+            f"Query on connector {connector.get('id')} returned {result['row_count']} rows in {result['elapsed_ms']}ms"
+            + (f" (truncated: {result['truncated_reason']})" if result["truncated"] else "")
+        )
+        result["cached"] = False
+        if cache_key is not None:
+            self.result_cache.set(cache_key, result, ttl=cache_ttl)
+        return result
+
+    def _collect(self, headers: List[str], batches, max_rows: int, max_bytes: int) -> Dict[str, Any]:
+        """Consumes row batches until exhausted or a cap is reached."""
+        rows = []
+        size = sum(len(h) for h in headers)
+        truncated_reason = None
+        for batch in batches:
+            for raw_row in batch:
+                if len(rows) >= max_rows:
+                    truncated_reason = f"row limit {max_rows}"
+                    break
+                row = [_cell(value) for value in raw_row]
+                row_size = sum(len(value) for value in row) + len(row)
+                if size + row_size > max_bytes:
+                    truncated_reason = f"byte limit {max_bytes}"
+                    break
+                rows.append(row)
+                size += row_size
+            if truncated_reason:
+                break
+        return {
+            "headers": headers,
+            "rows": rows,
+            "row_count": len(rows),
+            "truncated": truncated_reason is not None,
+            "truncated_reason": truncated_reason
+        }
+
+    def _execute_postgres(self, connector, statement, params, max_rows, max_bytes, timeout) -> Dict[str, Any]:
+        with self.postgres_pools.connection(connector.get("id"), connector) as conn:
+            try:
+                with conn.cursor() as setup:
+                    setup.execute("SET TRANSACTION READ ONLY")
+                    setup.execute("SET LOCAL statement_timeout = %s", (int(timeout * 1000),))
+                # Named cursors are server-side: rows are fetched in batches instead of all at once.
+                # EXPLAIN and SHOW cannot be declared as cursors; their small output is read client-side
+                server_side = statement_keyword(statement) in CURSOR_STATEMENTS
+                with conn.cursor(name=f"data_query_{uuid.uuid4().hex[:12]}" if server_side else None) as cur:
+                    cur.execute(statement, params or None)
+                    # The description of a named cursor is only available after the first fetch
+                    first_batch = cur.fetchmany(self.fetch_size)
+                    headers = [column[0] for column in cur.description or []]
+
+                    def batches():
+                        batch = first_batch
+                        while batch:
+                            yield batch
+                            batch = cur.fetchmany(self.fetch_size)
+
+                    return self._collect(headers, batches(), max_rows, max_bytes)
+            except psycopg2.errors.QueryCanceled:
+                raise QueryError(f"Query exceeded the statement timeout of {timeout}s")
+            except psycopg2.Error as e:
+                raise QueryError(f"Query failed: {str(e).strip()}")
+
+    def _execute_bigquery(self, connector, statement, params, max_rows, max_bytes, timeout) -> Dict[str, Any]:
+        project_id, dataset_id, _ = bigquery_settings(connector)
+        client = self.bigquery_clients.get_client(connector.get("id"), connector)
+        job_config = bigquery.QueryJobConfig(
+            default_dataset=f"{project_id}.{dataset_id}" if dataset_id else None,
+            query_parameters=[_bigquery_parameter(name, value) for name, value in (params or {}).items()] if isinstance(params, dict) else [],
+            job_timeout_ms=int(timeout * 1000)
+        )
+        try:
+            job = client.query(statement, job_config=job_config, timeout=timeout)
+            # Ask for one row past the cap so truncation can be detected without reading more pages
+            row_iterator = job.result(timeout=timeout, page_size=self.fetch_size, max_results=max_rows + 1)
+            headers = [field.name for field in row_iterator.schema]
+            batches = ([row.values() for row in page] for page in row_iterator.pages)
+            return self._collect(headers, batches, max_rows, max_bytes)
+        except Exception as e:
+            raise QueryError(f"Query failed: {str(e).strip()}")
+
+
+
+
+def _query_tool_name(connector: Dict[str, Any]) -> str:
+    name = re.sub(r"[^a-z0-9_]+", "_", str(connector.get("uniqueName") or connector.get("id")).lower()).strip("_")
+    return f"query_{name}"
+
+
+def create_query_tools(engine: DataQueryEngine, tools_config: List[Dict[str, Any]], log: logging.Logger) -> List[Tool]:
+    """
+    Builds one SQL tool per distinct data connector referenced by an agent's tools (the dataQuery feature).
+    Query errors are returned as text so the LLM can correct its statement.
+    """
+    tools = []
+    connectors: Dict[str, Dict[str, Any]] = {}
+    for tool_config in tools_config or []:
+        connector = tool_config.get("data_connector")
+        if not connector:
+            continue
+        entry = connectors.setdefault(connector.get("id"), {"connector": connector, "use_cache": False, "cache_ttl": None})
+        # Result caching is opted into per tool via tool_metadata; a connector is cached if any of its tools opt in
+        metadata = tool_config.get("metadata") or {}
+        if metadata.get("cache_query_results"):
+            entry["use_cache"] = True
+            ttl = metadata.get("query_cache_ttl")
+            if ttl:
+                entry["cache_ttl"] = min(ttl, entry["cache_ttl"] or ttl)
+
+    for entry in connectors.values():
+        connector = entry["connector"]
+
+        def create_query_runner(connector: Dict[str, Any], use_cache: bool, cache_ttl: Optional[float]):
+            def run_query(sql: str, **kwargs) -> str:
+                log.info(f"Running data query on connector {connector.get('uniqueName')}: {normalize_sql(sql)[:500]}")
+                try:
+                    return format_result_as_text(engine.execute(connector, sql, use_cache=use_cache, cache_ttl=cache_ttl))
+                except (QueryError, TimeoutError) as e:
+                    log.warning(f"Data query on connector {connector.get('uniqueName')} failed: {e}")
+                    return f"Query error: {e}"
+            return run_query
+
+        connector_info = json.dumps(describe_connector(connector), ensure_ascii=False)
+        description = (
+            f"Runs a read-only SQL query on data connector {connector_info}. "
+            f"Input must be a single SELECT statement. Returns at most {engine.max_rows} rows as a pipe-separated table."
+        )
+        if engine.schema_introspector:
+            try:
+                description += "\n" + engine.schema_introspector.digest(connector)
+            except Exception as e:
+                log.warning(f"Schema introspection failed for connector {connector.get('uniqueName')}: {e}")
+        tools.append(
+            Tool(
+                name=_query_tool_name(connector),
+                func=create_query_runner(connector, entry["use_cache"], entry["cache_ttl"]),
+                description=description
+            )
+        )
+    return tools
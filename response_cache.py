@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import Optional, Dict, Any, List
+
+from cache_utils import TTLCache
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", "data/response_cache")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_DEFAULT_TTL = float(os.getenv("RESPONSE_CACHE_DEFAULT_TTL", "3600"))
+
+
+def _sha256(data: Any) -> str:
+    if not isinstance(data, (bytes, str)):
+        data = json.dumps(data, sort_keys=True, default=str)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def agent_config_fingerprint(agent: Dict[str, Any], tools_config: List[Dict[str, Any]], extra: Any = None) -> str:
+    """
+    Hashes everything an agent's answer depends on besides the input: the stored agent record and
+    each tool's schema, auth, metadata and connector. Editing the agent or a tool changes the hash,
+    so earlier cached responses are never served for the new configuration.
+    """
+    return _sha256({"agent": agent, "tools": tools_config, "extra": extra})
+
+
+class ResponseCache:
+    """
+    Exact-match cache of agent responses keyed by (agent id, config fingerprint, user input, attachment hash).
+    An in-memory LRU tier answers hot keys; agents can opt into a persistent tier under
+    data/response_cache/{agent_id}/ that survives restarts. Entries carry their own TTL.
+    """
+    def __init__(
+        self,
+        directory: str = RESPONSE_CACHE_DIR,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        default_ttl: float = RESPONSE_CACHE_DEFAULT_TTL
+    ):
+        self.directory = directory
+        self.default_ttl = default_ttl
+        self._memory = TTLCache(max_entries=max_entries, ttl=default_ttl)
+        self.persistent_hits = 0
+        self._last_purge = 0.0
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(agent_id: str, config_fingerprint: str, user_input: str, attachment_hash: Optional[str] = None) -> str:
+        return _sha256({
+            "agent_id": agent_id,
+            "config": config_fingerprint,
+            "input": (user_input or "").strip(),
+            "attachment": attachment_hash
+        })
+
+    def _agent_dir(self, agent_id: str) -> str:
+        if not agent_id or os.sep in agent_id or ".." in agent_id:
+            raise ValueError(f"Invalid agent id: {agent_id}")
+        return os.path.join(self.directory, agent_id)
+
+    def get(self, agent_id: str, key: str, persistent: bool = False) -> Optional[Dict[str, Any]]:
+        """Returns the cached entry ({"text", "created_at", "source_execution_id"}) or None."""
+        entry = self._memory.get((agent_id, key))
+        if entry is not None:
+            return entry
+        if not persistent:
+            return None
+        path = os.path.join(self._agent_dir(agent_id), f"{key}.json")
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        remaining = entry.get("expires_at", 0) - time.time()
+        if remaining <= 0:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        # Promote to the memory tier for the rest of its lifetime
+        self._memory.set((agent_id, key), entry, ttl=remaining)
+        self.persistent_hits += 1
+        return entry
+
+    def set(
+        self,
+        agent_id: str,
+        key: str,
+        text: str,
+        ttl: Optional[float] = None,
+        persistent: bool = False,
+        source_execution_id: Optional[str] = None
+    ):
+        ttl = ttl or self.default_ttl
+        entry = {
+            "text": text,
+            "created_at": time.time(),
+            "expires_at": time.time() + ttl,
+            "source_execution_id": source_execution_id
+        }
+        self._memory.set((agent_id, key), entry, ttl=ttl)
+        if persistent:
+            directory = self._agent_dir(agent_id)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{key}.json")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            if time.time() - self._last_purge > 600:
+                self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """Deletes expired persistent entries, including those of superseded agent configurations."""
+        self._last_purge = time.time()
+        removed = 0
+        for agent_id in os.listdir(self.directory):
+            directory = os.path.join(self.directory, agent_id)
+            if not os.path.isdir(directory):
+                continue
+            for filename in os.listdir(directory):
+                path = os.path.join(directory, filename)
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        expired = json.load(f).get("expires_at", 0) <= time.time()
+                except (OSError, json.JSONDecodeError):
+                    expired = True
+                if expired:
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except OSError:
+                        pass
+        if removed:
+            logger.info(f"Purged {removed} expired cached responses")
+        return removed
+
+    def invalidate_agent(self, agent_id: str) -> int:
+        """Drops every cached response of an agent from both tiers."""
+        removed = self._memory.remove_where(lambda cache_key: cache_key[0] == agent_id)
+        directory = self._agent_dir(agent_id)
+        if os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                try:
+                    os.remove(os.path.join(directory, filename))
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._memory.stats(), "persistent_hits": self.persistent_hits}
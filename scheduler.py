@@ -0,0 +1,420 @@
+import os
+import json
+import uuid
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Callable
+
+import pytz
+
+from worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+SCHEDULES_FILE = os.getenv("SCHEDULES_FILE", "data/schedules.json")
+SCHEDULER_LOCK_FILE = os.getenv("SCHEDULER_LOCK_FILE", "data/scheduler.lock")
+SCHEDULER_TICK_SECONDS = float(os.getenv("SCHEDULER_TICK_SECONDS", "15"))
+SCHEDULER_MAX_CONCURRENT_RUNS = int(os.getenv("SCHEDULER_MAX_CONCURRENT_RUNS", "2"))
+SCHEDULE_RUN_HISTORY = int(os.getenv("SCHEDULE_RUN_HISTORY", "50"))
+
+TARGET_TYPES = ["agent", "multi_agent"]
+ACTIVE_RUN_STATUSES = ["queued", "running"]
+# Final run statuses counted by the scheduler; anything else a run target returns counts as failed
+RUN_OUTCOMES = ["completed", "failed", "budget_exceeded", "cancelled"]
+
+CRON_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *"
+}
+# (minimum, maximum) of minute, hour, day of month, month, day of week (0 = Sunday; 7 is accepted too)
+CRON_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+class CronExpression:
+    """
+    Standard five-field cron expression (minute hour day-of-month month day-of-week) with *, lists,
+    ranges, steps and the @hourly/@daily/... aliases, evaluated in a schedule's timezone. As in cron,
+    a restricted day-of-month and day-of-week match when either does. Raises ValueError if invalid.
+    """
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        fields = CRON_ALIASES.get(self.expression.lower(), self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields (minute hour day month weekday): '{expression}'")
+        self.minutes, self.hours, self.days, self.months, weekdays = [
+            self._parse_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELDS)
+        ]
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> set:
+        values = set()
+        for part in field.split(","):
+            value_range, _, step = part.partition("/")
+            if value_range == "*":
+                start, end = low, high
+            elif "-" in value_range:
+                start, end = (int(v) for v in value_range.split("-", 1))
+            else:
+                start = end = int(value_range)
+            step = int(step) if step else 1
+            if not (low <= start <= end <= high) or step < 1:
+                raise ValueError(f"Cron field '{field}' is outside {low}-{high}")
+            if step > 1 and "-" not in value_range and value_range != "*":
+                end = high
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, day: datetime) -> bool:
+        day_ok = day.day in self.days
+        weekday_ok = (day.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, after: datetime, timezone: str = "UTC") -> datetime:
+        """First matching minute strictly after `after` (aware), returned in UTC."""
+        tz = pytz.timezone(timezone)
+        local = after.astimezone(tz).replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        # Day by day, then only the matching hours and minutes of a matching day
+        for _ in range(366 * 5):
+            if local.month in self.months and self._day_matches(local):
+                for hour in sorted(h for h in self.hours if h >= local.hour):
+                    for minute in sorted(m for m in self.minutes if hour > local.hour or m >= local.minute):
+                        candidate = local.replace(hour=hour, minute=minute)
+                        try:
+                            return tz.localize(candidate, is_dst=None).astimezone(pytz.UTC)
+                        except pytz.NonExistentTimeError:
+                            # Skipped by a DST change
+                            continue
+                        except pytz.AmbiguousTimeError:
+                            return tz.localize(candidate, is_dst=False).astimezone(pytz.UTC)
+            local = (local + timedelta(days=1)).replace(hour=0, minute=0)
+        raise ValueError(f"Cron expression '{self.expression}' never matches")
+
+
+def next_run_at(schedule: Dict[str, Any], after: Optional[datetime] = None) -> str:
+    after = after or datetime.now(pytz.UTC)
+    return CronExpression(schedule["cron"]).next_after(after, schedule.get("timezone") or "UTC").isoformat()
+
+
+class ScheduleStore:
+    """
+    Schedules and their run state (next_run_at, recent runs) in one JSON file shared by all
+    uvicorn workers; every read-modify-write holds an exclusive file lock.
+    """
+    def __init__(self, path: str = SCHEDULES_FILE, run_history: int = SCHEDULE_RUN_HISTORY):
+        self.path = path
+        self.run_history = run_history
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock, open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except json.JSONDecodeError as e:
+            logger.error(f"Corrupt schedules file {self.path}: {e}")
+            return []
+
+    def _write(self, schedules: List[Dict[str, Any]]):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(schedules, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._locked():
+            return self._read()
+
+    def get(self, schedule_id: str) -> Optional[Dict[str, Any]]:
+        return next((s for s in self.list() if s["id"] == schedule_id), None)
+
+    def create(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        schedule = {
+            **config,
+            "id": str(uuid.uuid4()),
+            "created_at": datetime.now(pytz.UTC).isoformat(),
+            "next_run_at": next_run_at(config) if config.get("enabled", True) else None,
+            "runs": []
+        }
+        with self._locked():
+            schedules = self._read()
+            schedules.append(schedule)
+            self._write(schedules)
+        return schedule
+
+    def update(self, schedule_id: str, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Replaces a schedule's settings, keeping its runs; the next run is recomputed."""
+        with self._locked():
+            schedules = self._read()
+            schedule = next((s for s in schedules if s["id"] == schedule_id), None)
+            if schedule is None:
+                return None
+            schedule.update(config)
+            schedule["next_run_at"] = next_run_at(schedule) if schedule.get("enabled", True) else None
+            self._write(schedules)
+            return schedule
+
+    def delete(self, schedule_id: str) -> bool:
+        with self._locked():
+            schedules = self._read()
+            remaining = [s for s in schedules if s["id"] != schedule_id]
+            if len(remaining) == len(schedules):
+                return False
+            self._write(remaining)
+            return True
+
+    def claim_due(self, now: datetime, slots: int, is_active: Callable[[str], bool]) -> List[Dict[str, Any]]:
+        """
+        Atomically picks up to `slots` due schedules, records a queued run for each and advances its
+        next_run_at (missed occurrences collapse into one run). A due schedule whose previous run is
+        still active and that does not allow overlap skips this occurrence.
+        """
+        claimed = []
+        with self._locked():
+            schedules = self._read()
+            due = sorted(
+                (s for s in schedules if s.get("enabled", True) and s.get("next_run_at") and datetime.fromisoformat(s["next_run_at"]) <= now),
+                key=lambda s: s["next_run_at"]
+            )
+            for schedule in due:
+                active = [run for run in schedule["runs"] if run["status"] in ACTIVE_RUN_STATUSES and is_active(run["execution_id"])]
+                if active and not schedule.get("allow_overlap", False):
+                    self._append_run(schedule, {"execution_id": None, "status": "skipped", "scheduled_for": schedule["next_run_at"], "error": "Previous run still active"})
+                elif len(claimed) < slots:
+                    run = {"execution_id": None, "status": "queued", "scheduled_for": schedule["next_run_at"]}
+                    self._append_run(schedule, run)
+                    claimed.append({"schedule": dict(schedule), "run": run})
+                else:
+                    # No free slot: stays due and is picked up on a later tick
+                    continue
+                schedule["next_run_at"] = next_run_at(schedule, now)
+            if due:
+                self._write(schedules)
+        return claimed
+
+    def run_now(self, schedule_id: str) -> Optional[Dict[str, Any]]:
+        """Makes a schedule due immediately, so the leader fires it on its next tick under the usual limits."""
+        with self._locked():
+            schedules = self._read()
+            schedule = next((s for s in schedules if s["id"] == schedule_id), None)
+            if schedule is None:
+                return None
+            schedule["next_run_at"] = datetime.now(pytz.UTC).isoformat()
+            self._write(schedules)
+            return schedule
+
+    def _append_run(self, schedule: Dict[str, Any], run: Dict[str, Any]):
+        run.setdefault("run_id", uuid.uuid4().hex)
+        run.setdefault("created_at", datetime.now(pytz.UTC).isoformat())
+        schedule["runs"] = (schedule.get("runs", []) + [run])[-self.run_history:]
+
+    def update_run(self, schedule_id: str, run_id: str, **fields):
+        with self._locked():
+            schedules = self._read()
+            schedule = next((s for s in schedules if s["id"] == schedule_id), None)
+            run = next((r for r in (schedule or {}).get("runs", []) if r["run_id"] == run_id), None)
+            if run is not None:
+                run.update(fields)
+                self._write(schedules)
+
+    def interrupt_active_runs(self) -> int:
+        """Marks queued / running runs as interrupted; called by a new leader, whose predecessor's runs died with it."""
+        interrupted = 0
+        with self._locked():
+            schedules = self._read()
+            for schedule in schedules:
+                for run in schedule.get("runs", []):
+                    if run["status"] in ACTIVE_RUN_STATUSES:
+                        run["status"] = "interrupted"
+                        run["finished_at"] = datetime.now(pytz.UTC).isoformat()
+                        interrupted += 1
+            if interrupted:
+                self._write(schedules)
+        return interrupted
+
+
+class LeaderLock:
+    """
+    Non-blocking exclusive lock on a file shared by all workers on the host. Only the holder fires
+    schedules; the OS releases it when the holding process exits, so another worker takes over.
+    """
+    def __init__(self, path: str = SCHEDULER_LOCK_FILE):
+        self.path = path
+        self._file = None
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def try_acquire(self) -> bool:
+        if self._file is not None:
+            return True
+        lock_file = open(self.path, "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(f"{os.getpid()}\n")
+        lock_file.flush()
+        self._file = lock_file
+        return True
+
+    def holder(self) -> Optional[int]:
+        """Pid of the worker that last took the lock (the leader, while it is alive)."""
+        try:
+            with open(self.path, "r") as f:
+                return int(f.read().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class Scheduler:
+    """
+    Fires due schedules from a background thread in the worker that holds the leader lock. Runs
+    go through the shared worker pool at background priority, at most max_concurrent_runs at a
+    time; run_target(schedule, execution_id) executes the agent or multi-agent and returns
+    {"status", "output", "error", "log_url"}.
+    """
+    def __init__(
+        self,
+        store: ScheduleStore,
+        pool: WorkerPool,
+        run_target: Callable[[Dict[str, Any], str], Dict[str, Any]],
+        log_url_for: Callable[[Dict[str, Any], str], str],
+        leader_lock: Optional[LeaderLock] = None,
+        tick_seconds: float = SCHEDULER_TICK_SECONDS,
+        max_concurrent_runs: int = SCHEDULER_MAX_CONCURRENT_RUNS
+    ):
+        self.store = store
+        self.pool = pool
+        self.run_target = run_target
+        self.log_url_for = log_url_for
+        self.leader_lock = leader_lock or LeaderLock()
+        self.tick_seconds = tick_seconds
+        self.max_concurrent_runs = max_concurrent_runs
+        self._running: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.counters = {"fired": 0, **{outcome: 0 for outcome in RUN_OUTCOMES}}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.tick_seconds)
+        self.leader_lock.release()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if not self.leader_lock.held and self.leader_lock.try_acquire():
+                    interrupted = self.store.interrupt_active_runs()
+                    logger.info(f"Scheduler leadership acquired by pid {os.getpid()}" + (f"; {interrupted} runs of the previous leader marked interrupted" if interrupted else ""))
+                if self.leader_lock.held:
+                    self.tick()
+            except Exception as e:
+                logger.error(f"Scheduler tick failed: {e}", exc_info=True)
+            self._stop.wait(self.tick_seconds)
+
+    def running_count(self) -> int:
+        with self._lock:
+            return len(self._running)
+
+    def is_running(self, execution_id: Optional[str]) -> bool:
+        with self._lock:
+            return execution_id in self._running
+
+    def tick(self, now: Optional[datetime] = None) -> int:
+        """Dispatches the due schedules that fit in the free run slots; returns how many were fired."""
+        now = now or datetime.now(pytz.UTC)
+        slots = max(0, self.max_concurrent_runs - self.running_count())
+        claimed = self.store.claim_due(now, slots, self.is_running)
+        for item in claimed:
+            self._dispatch(item["schedule"], item["run"])
+        return len(claimed)
+
+    def _dispatch(self, schedule: Dict[str, Any], run: Dict[str, Any]):
+        timestamp = datetime.now(pytz.UTC).strftime("%Y%m%d_%H%M%S")
+        execution_id = f"{uuid.uuid4()}_{timestamp}"
+        run.update(execution_id=execution_id, log_url=self.log_url_for(schedule, execution_id))
+        self.store.update_run(schedule["id"], run["run_id"], execution_id=execution_id, log_url=run["log_url"])
+        with self._lock:
+            self._running[execution_id] = run
+            self.counters["fired"] += 1
+        logger.info(f"Schedule {schedule['id']} ({schedule['target_type']} {schedule['target_id']}) fired as execution {execution_id}")
+        self.pool.submit_background(self._execute, schedule, run)
+
+    def _execute(self, schedule: Dict[str, Any], run: Dict[str, Any]):
+        execution_id = run["execution_id"]
+        self.store.update_run(schedule["id"], run["run_id"], status="running", started_at=datetime.now(pytz.UTC).isoformat())
+        try:
+            result = self.run_target(schedule, execution_id)
+        except Exception as e:
+            logger.error(f"Scheduled execution {execution_id} failed: {e}", exc_info=True)
+            result = {"status": "failed", "error": str(e)}
+        finally:
+            with self._lock:
+                self._running.pop(execution_id, None)
+        status = result.get("status", "completed")
+        with self._lock:
+            self.counters[status if status in RUN_OUTCOMES else "failed"] += 1
+        self.store.update_run(
+            schedule["id"],
+            run["run_id"],
+            status=status,
+            finished_at=datetime.now(pytz.UTC).isoformat(),
+            output_preview=(result.get("output") or "")[:500] or None,
+            error=result.get("error")
+        )
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            running = list(self._running)
+            counters = dict(self.counters)
+        return {
+            "leader": self.leader_lock.held,
+            "pid": os.getpid(),
+            "leader_pid": self.leader_lock.holder(),
+            "running": running,
+            "max_concurrent_runs": self.max_concurrent_runs,
+            **counters
+        }
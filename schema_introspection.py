@@ -0,0 +1,244 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, Any, List
+
+import psycopg2
+
+from connector_pools import PostgresPoolManager, BigQueryClientCache, bigquery_settings, postgres_params, connector_fingerprint
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_CACHE_TTL_SECONDS = float(os.getenv("SCHEMA_CACHE_TTL_SECONDS", "900"))
+SCHEMA_DIGEST_MAX_TOKENS = int(os.getenv("SCHEMA_DIGEST_MAX_TOKENS", "1500"))
+SCHEMA_MAX_TABLES = int(os.getenv("SCHEMA_MAX_TABLES", "200"))
+
+POSTGRES_COLUMNS_QUERY = """
+    SELECT c.table_schema, c.table_name, t.table_type, c.column_name, c.data_type, c.is_nullable
+    FROM information_schema.columns c
+    JOIN information_schema.tables t
+      ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+    WHERE c.table_schema NOT IN ('pg_catalog', 'information_schema')
+      AND c.table_schema NOT LIKE 'pg_toast%'
+    ORDER BY c.table_schema, c.table_name, c.ordinal_position
+"""
+
+# reltuples is the planner's estimate; it is -1 (or 0) for tables that were never analyzed
+POSTGRES_ROW_ESTIMATES_QUERY = """
+    SELECT n.nspname, c.relname, c.reltuples::bigint
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE c.relkind IN ('r', 'p', 'm')
+      AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+"""
+
+# Top-level columns of every table in a dataset, in one round trip
+BIGQUERY_COLUMNS_QUERY = """
+    SELECT c.table_name, t.table_type, c.column_name, c.data_type, c.is_nullable
+    FROM {dataset}.INFORMATION_SCHEMA.COLUMNS c
+    JOIN {dataset}.INFORMATION_SCHEMA.TABLES t ON t.table_name = c.table_name
+    ORDER BY c.table_name, c.ordinal_position
+"""
+
+# Row counts of all tables in a dataset (views have none)
+BIGQUERY_ROW_COUNTS_QUERY = "SELECT table_id, row_count FROM {dataset}.__TABLES__"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) used for prompt budgets."""
+    return len(text or "") // 4 + 1
+
+
+class SchemaIntrospector:
+    """
+    Fetches table, column, type and row-estimate metadata for data connectors and caches it
+    per connector for ttl seconds. A connector whose settings change is re-introspected, and
+    refresh=True or invalidate() forces a new fetch. digest() renders a compact, token-budgeted
+    summary for prompts.
+    """
+    def __init__(
+        self,
+        postgres_pools: PostgresPoolManager,
+        bigquery_clients: BigQueryClientCache,
+        ttl: float = SCHEMA_CACHE_TTL_SECONDS,
+        max_tables: int = SCHEMA_MAX_TABLES
+    ):
+        self.postgres_pools = postgres_pools
+        self.bigquery_clients = bigquery_clients
+        self.ttl = ttl
+        self.max_tables = max_tables
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._fetch_locks: Dict[str, threading.Lock] = {}
+
+    @staticmethod
+    def _fingerprint(connector: Dict[str, Any]) -> str:
+        if connector.get("connectorType") == "bigquery":
+            project_id, dataset_id, _ = bigquery_settings(connector)
+            return connector_fingerprint({"project": project_id, "dataset": dataset_id})
+        params = postgres_params(connector)
+        params.pop("password", None)
+        return connector_fingerprint(params)
+
+    def get_schema(self, connector: Dict[str, Any], refresh: bool = False) -> Dict[str, Any]:
+        """Returns the cached schema for a connector, introspecting it when missing, stale or refresh is set."""
+        connector_id = connector.get("id")
+        fingerprint = self._fingerprint(connector)
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(connector_id, threading.Lock())
+
+        # One fetch per connector at a time; concurrent callers wait and reuse its result
+        with fetch_lock:
+            with self._lock:
+                cached = self._cache.get(connector_id)
+            if (
+                cached and not refresh
+                and cached["fingerprint"] == fingerprint
+                and time.monotonic() - cached["fetched_monotonic"] < self.ttl
+            ):
+                return cached["schema"]
+
+            start = time.monotonic()
+            connector_type = connector.get("connectorType")
+            if connector_type == "postgres":
+                tables = self._introspect_postgres(connector)
+            elif connector_type == "bigquery":
+                tables = self._introspect_bigquery(connector)
+            else:
+                raise ValueError(f"Unsupported connector type: {connector_type}")
+
+            schema = {
+                "connector_id": connector_id,
+                "connector_name": connector.get("uniqueName"),
+                "connector_type": connector_type,
+                "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "table_count": len(tables),
+                "tables": tables
+            }
+            with self._lock:
+                self._cache[connector_id] = {
+                    "schema": schema,
+                    "fingerprint": fingerprint,
+                    "fetched_monotonic": time.monotonic()
+                }
+            logger.info(f"Introspected {len(tables)} tables for connector {connector_id} in {time.monotonic() - start:.2f}s")
+            return schema
+
+    def invalidate(self, connector_id: str):
+        with self._lock:
+            self._cache.pop(connector_id, None)
+
+    def digest(self, connector: Dict[str, Any], max_tokens: int = SCHEMA_DIGEST_MAX_TOKENS, refresh: bool = False) -> str:
+        """Renders the connector schema as one line per table, trimmed to fit max_tokens."""
+        return render_schema_digest(self.get_schema(connector, refresh=refresh), max_tokens)
+
+    def _introspect_postgres(self, connector: Dict[str, Any]) -> List[Dict[str, Any]]:
+        tables: Dict[tuple, Dict[str, Any]] = {}
+        with self.postgres_pools.connection(connector.get("id"), connector) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SET TRANSACTION READ ONLY")
+                cur.execute(POSTGRES_COLUMNS_QUERY)
+                for table_schema, table_name, table_type, column_name, data_type, is_nullable in cur:
+                    key = (table_schema, table_name)
+                    if key not in tables:
+                        if len(tables) >= self.max_tables:
+                            continue
+                        tables[key] = {
+                            "schema": table_schema,
+                            "name": table_name,
+                            "type": "view" if table_type == "VIEW" else "table",
+                            "row_estimate": None,
+                            "columns": []
+                        }
+                    tables[key]["columns"].append({
+                        "name": column_name,
+                        "type": data_type,
+                        "nullable": is_nullable == "YES"
+                    })
+                try:
+                    cur.execute(POSTGRES_ROW_ESTIMATES_QUERY)
+                    for table_schema, table_name, estimate in cur:
+                        table = tables.get((table_schema, table_name))
+                        if table and estimate is not None and estimate > 0:
+                            table["row_estimate"] = int(estimate)
+                except psycopg2.Error as e:
+                    logger.warning(f"Could not read row estimates for connector {connector.get('id')}: {e}")
+        return list(tables.values())
+
+    def _introspect_bigquery(self, connector: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Reads the whole dataset's columns with one INFORMATION_SCHEMA query instead of a get_table call per table."""
+        project_id, dataset_id, _ = bigquery_settings(connector)
+        if "`" in f"{project_id}{dataset_id}":
+            raise ValueError("Invalid BigQuery project or dataset id")
+        client = self.bigquery_clients.get_client(connector.get("id"), connector)
+        dataset = f"`{project_id}.{dataset_id}`"
+        tables: Dict[str, Dict[str, Any]] = {}
+        for row in client.query(BIGQUERY_COLUMNS_QUERY.format(dataset=dataset)).result():
+            name = row["table_name"]
+            if name not in tables:
+                if len(tables) >= self.max_tables:
+                    continue
+                tables[name] = {
+                    "schema": dataset_id,
+                    "name": name,
+                    "type": "view" if "VIEW" in (row["table_type"] or "") else "table",
+                    "row_estimate": None,
+                    "columns": []
+                }
+            tables[name]["columns"].append({
+                "name": row["column_name"],
+                "type": row["data_type"],
+                "nullable": row["is_nullable"] == "YES"
+            })
+        try:
+            for row in client.query(BIGQUERY_ROW_COUNTS_QUERY.format(dataset=dataset)).result():
+                table = tables.get(row["table_id"])
+                if table and row["row_count"] is not None:
+                    table["row_estimate"] = int(row["row_count"])
+        except Exception as e:
+            logger.warning(f"Could not read row counts for connector {connector.get('id')}: {e}")
+        return list(tables.values())
+
+
+def _table_line(table: Dict[str, Any], columns: List[Dict[str, Any]], omitted: int = 0) -> str:
+    name = table["name"] if table["schema"] in ("public", None) else f"{table['schema']}.{table['name']}"
+    label = f"{name} ({table['type']}"
+    if table.get("row_estimate") is not None:
+        label += f", ~{table['row_estimate']} rows"
+    column_text = ", ".join(f"{column['name']} {column['type']}" for column in columns)
+    if omitted:
+        column_text += f", +{omitted} more columns"
+    return f"{label}): {column_text}"
+
+
+def render_schema_digest(schema: Dict[str, Any], max_tokens: int = SCHEMA_DIGEST_MAX_TOKENS) -> str:
+    """
+    Renders a schema as a compact digest. Tables are added whole while they fit the budget;
+    the first table that does not fit is added with a shortened column list, the rest are counted.
+    """
+    lines = [f"Tables in {schema.get('connector_name') or schema.get('connector_id')} ({schema.get('connector_type')}):"]
+    used = estimate_tokens(lines[0])
+    # Reserve room for the trailing "more tables" note
+    budget = max_tokens - 10
+    tables = schema.get("tables", [])
+    for index, table in enumerate(tables):
+        line = _table_line(table, table["columns"])
+        cost = estimate_tokens(line)
+        if used + cost <= budget:
+            lines.append(line)
+            used += cost
+            continue
+        columns = list(table["columns"])
+        while columns:
+            columns.pop()
+            line = _table_line(table, columns, len(table["columns"]) - len(columns))
+            if used + estimate_tokens(line) <= budget:
+                lines.append(line)
+                index += 1
+                break
+        remaining = len(tables) - index
+        if remaining:
+            lines.append(f"... {remaining} more tables not shown")
+        break
+    return "\n".join(lines)
@@ -1,43 +1,46 @@
 import logging
+import threading
 import os
 from datetime import datetime
 import pytz
-from crewai import Crew, Process, Task, Agent as CrewAgent, LLM
+from crewai import Crew, Process, Task, Agent as CrewAgent
 from langchain.tools import Tool
-import requests
 from dotenv import load_dotenv
 from functools import partial
 import json
 import base64
 import csv
-from typing import Optional, Dict, Any, List
-import PyPDF2
+from typing import Optional, Dict, Any, List, Callable
 from PIL import Image
-import random
+from document_readers import (
+    ALLOWED_FILE_TYPES,
+    EXTENSION_TO_MIME,
+    read_csv_as_text,
+    read_json_as_text,
+    read_txt_as_text,
+    read_pdf_as_text
+)
+from query_engine import DataQueryEngine, create_query_tools, describe_connector
+from payload_cache import PayloadCache
+from payload_validation import operation_validator, repair_feedback, PAYLOAD_REPAIR_ATTEMPTS
+from http_resilience import ResilientHttpClient, RetryPolicy, default_http_client
+from tool_responses import read_tool_response
+from llm_registry import LLMRegistry, default_llm_registry
+from budget import ExecutionBudget, BudgetExceeded, guard_tool
+from cancellation import CancellationToken, ExecutionCancelled
+from artifact_store import ArtifactStore
+from tool_digest import (
+    operation_index_for,
+    operation_tool_names,
+    operation_tool_description,
+    render_operation_digest,
+    split_payload,
+    merge_headers,
+    connector_summary
+)
 
 load_dotenv()
 
-ALLOWED_FILE_TYPES = {
-    "image/jpeg": "image",
-    "image/png": "image",
-    "image/gif": "image",
-    "text/csv": "csv",
-    "application/json": "json",
-    "text/plain": "text",
-    "application/pdf": "pdf"
-}
-
-EXTENSION_TO_MIME = {
-    "jpg": "image/jpeg",
-    "jpeg": "image/jpeg",
-    "png": "image/png",
-    "gif": "image/gif",
-    "csv": "text/csv",
-    "json": "application/json",
-    "txt": "text/plain",
-    "pdf": "application/pdf"
-}
-
 # Utility to sanitize strings for logging, preserving emojis
 def sanitize_for_logging(text: Any) -> str:
     try:
@@ -53,8 +56,20 @@ class TaskExecutor:
         self,
         agent_config: Dict[str, str],
         tools_config: Optional[list] = None,
-        log_file: Optional[str] = None
+        log_file: Optional[str] = None,
+        query_engine: Optional[DataQueryEngine] = None,
+        knowledge_base=None,
+        payload_cache: Optional[PayloadCache] = None,
+        http_client: Optional[ResilientHttpClient] = None,
+        execution_id: Optional[str] = None,
+        artifact_store: Optional[ArtifactStore] = None,
+        llm_registry: Optional[LLMRegistry] = None,
+        budget: Optional[ExecutionBudget] = None,
+        cancel_token: Optional[CancellationToken] = None
     ):
+        # Per-run state (budget, crewai agents, payload cache counts) of runs sharing this executor concurrently, e.g. batch items
+        self._run = threading.local()
+
         # Configure logger for this execution
         self.logger = logging.getLogger(f"task_executor_{id(self)}")
         self.logger.setLevel(logging.DEBUG)
@@ -72,9 +87,28 @@ class TaskExecutor:
         console_handler.setFormatter(formatter)
         self.logger.addHandler(console_handler)
 
-        API_KEY = get_api_key()
-        self.llm_client = LLM(model="gemini/gemini-2.5-flash-preview-04-17", api_key=API_KEY)
-        self.internal_llm_client = LLM(model="gemini/gemini-2.0-flash", api_key=os.getenv("INTERNAL_GEMINI_API_KEY"))
+        # KnowledgeBase of the agent (knowledgeBase feature); relevant chunks are added to each task
+        self.knowledge_base = knowledge_base
+
+        # Shared memo of generated payloads; hits and misses are counted per run in self._run
+        self.payload_cache = payload_cache
+
+        # Tool HTTP calls share retry, circuit breaker and hedging state across executions
+        self.http_client = http_client or default_http_client()
+
+        # Large tool responses are stored whole as artifacts of the execution; the agent gets a preview
+        self.execution_id = execution_id
+        self.artifact_store = artifact_store
+
+        # Deadline and LLM call, tool call and token caps of this execution (the agent's budget settings)
+        self.budget = budget or ExecutionBudget.from_config(agent_config.get("budget"))
+        # Cancellation is checked at the same points as the budget: every agent step and tool call
+        self.budget.cancel_token = cancel_token or self.budget.cancel_token
+
+        # Clients follow the agent's llmProvider / llmModel (internal agents: internalLlm*) and are shared across executions
+        self.llm_registry = llm_registry or default_llm_registry()
+        self.llm_client = self.llm_registry.for_agent(agent_config, gemini_key_env="GEMINI_API_KEYS_FREE")
+        self.internal_llm_client = self.llm_registry.internal_for_agent(agent_config)
 
         # Unmodified agent configurations
         self.schema_agent = CrewAgent(
@@ -86,14 +120,7 @@ class TaskExecutor:
             llm=self.internal_llm_client
         )
 
-        self.payload_agent = CrewAgent(
-            role="Payload Generator",
-            goal="Generate accurate payloads for API tools",
-            backstory="Expert at creating valid API payloads.",
-            verbose=False,
-            allow_delegation=False,
-            llm=self.internal_llm_client
-        )
+        self.payload_agent = self._create_payload_agent()
 
         self.tools = []
         if tools_config:
@@ -102,11 +129,25 @@ class TaskExecutor:
                 tool_headers = tool_config.get("auth", {}).get("headers", {})
                 tool_params = tool_config.get("auth", {}).get("params", {})
                 tool_data_connector = tool_config.get("data_connector", None)
-
-                def create_api_caller(tool_schema, tool_headers, tool_params, tool_data_connector):
+                tool_id = tool_config.get("id")
+                operation_index = operation_index_for(tool_config)
+                retry_policy = RetryPolicy.from_config((tool_config.get("metadata") or {}).get("resilience"))
+                cache_config = (tool_config.get("metadata") or {}).get("http_cache") or {}
+                if not operation_index:
+                    self.logger.warning(f"Skipping tool {tool_id}: no GET, POST, PUT, PATCH or DELETE operation in schema")
+                    continue
+
+                def create_api_caller(tool_schema, tool_headers, tool_params, tool_data_connector, tool_id, operation, validator, retry_policy, cache_config):
                     def api_caller(input_text, **kwargs):
                         try:
-                            result = self.generate_payload(input_text, tool_schema, tool_data_connector)
+                            result = self.generate_payload(
+                                input_text,
+                                tool_schema,
+                                tool_data_connector,
+                                tool_id=tool_id,
+                                operation=operation,
+                                validator=validator
+                            )
                             if not result or "error" in result:
                                 return {"error": result.get("error", "Failed to generate payload or endpoint URL")}
 
@@ -115,83 +156,132 @@ class TaskExecutor:
                             if not endpoint_url:
                                 return {"error": "Missing endpoint URL"}
 
-                            # Determine HTTP method from schema
-                            paths = tool_schema.get("paths", {})
-                            if not paths:
-                                return {"error": "No paths found in schema"}
-
-                            path_key = next(iter(paths))
-                            method = None
-                            for m in paths[path_key]:
-                                if m.lower() in ["get", "post"]:
-                                    method = m.lower()
-                                    break
-                            if not method:
-                                return {"error": "No supported HTTP method (GET/POST) found in schema"}
-
-                            # Prepare request
-                            headers = tool_headers.copy() if tool_headers else {}
+                            # Prepare request; the payload is split into query parameters, body and headers by the operation's fields
+                            method = operation["method"].lower()
                             params = tool_params.copy() if tool_params else {}
-
-                            if method == "get":
-                                # For GET, payload contains query parameters (if any)
-                                if payload:
-                                    params.update(payload)
-                                response = requests.get(
-                                    endpoint_url,
-                                    headers=headers,
-                                    params=params if params else None
-                                )
-                            else:  # method == "post"
-                                response = requests.post(
-                                    endpoint_url,
-                                    headers=headers,
-                                    params=params if params else None,
-                                    json=payload if payload else None
-                                )
-
-                            if response.status_code == 200:
-                                try:
-                                    self.logger.debug(f"Tool returned response: {response.json()}")
-                                    return response.json()
-                                except ValueError:
-                                    return {"result": response.text}
+                            query, body, parameter_headers = split_payload(operation, payload)
+                            headers = merge_headers(tool_headers, parameter_headers)
+                            params.update(query)
+
+                            response = self.http_client.request(
+                                method,
+                                endpoint_url,
+                                policy=retry_policy,
+                                timeout=self.budget.clamp_timeout(retry_policy.timeout),
+                                endpoint=f"{operation['method']} {operation['url_template']}",
+                                headers=headers,
+                                params=params if params else None,
+                                json=body if body else None,
+                                use_cache=cache_config.get("enabled", True),
+                                cache_ttl=cache_config.get("ttl_seconds"),
+                                cache_tag=tool_id,
+                                stream=True
+                            )
+
+                            # The body is read with a byte cap; large bodies come back as a bounded preview
+                            tool_response = read_tool_response(
+                                response,
+                                artifact_store=self.artifact_store,
+                                execution_id=self.execution_id,
+                                artifact_key=f"tool-response:{operation['operation_id']}"
+                            )
+                            data = tool_response["data"]
+                            if 200 <= response.status_code < 300:
+                                if tool_response["summarized"]:
+                                    self.logger.debug(f"Tool returned {tool_response['size']} bytes, summarized (artifact: {(tool_response['artifact'] or {}).get('id')})")
+                                self.logger.debug(f"Tool returned response: {sanitize_for_logging(json.dumps(data, ensure_ascii=False, default=str))}")
+                                if tool_response["is_json"] or tool_response["summarized"]:
+                                    return data
+                                return {"result": data}
                             else:
                                 self.logger.debug(f"Tool returned status code: {response.status_code}")
-                                try:
-                                    return {"error": response.json().get('detail', str(response.status_code))}
-                                except ValueError:
-                                    return {"error": response.text or str(response.status_code)}
+                                if isinstance(data, dict) and not tool_response["summarized"]:
+                                    return {"error": data.get('detail', str(response.status_code))}
+                                return {"error": data or str(response.status_code)}
+                        except (ExecutionCancelled, BudgetExceeded):
+                            # The run stops with its partial output; these are not tool errors for the agent to handle
+                            raise
                         except Exception as e:
                             self.logger.debug(f"Tool returned error: {sanitize_for_logging(e)}")
                             return {"error": sanitize_for_logging(e)}
                     return api_caller
 
-                tool_name = tool_schema["info"]["title"].lower().replace(" ", "_")
-                api_caller = create_api_caller(tool_schema, tool_headers, tool_params, tool_data_connector)
-                api_caller_with_config = partial(
-                    api_caller,
-                    headers=tool_headers,
-                    params=tool_params
-                )
-                self.tools.append(
-                    Tool(
-                        name=tool_name,
-                        func=api_caller_with_config,
-                        description=f"Calls API: {tool_schema['info']['title']}.",
-                        result_as_answer=True
+                # Every operation of the schema is its own tool, so the agent picks the operation directly
+                tool_title = tool_schema["info"]["title"]
+                tool_name = tool_title.lower().replace(" ", "_")
+                operations = operation_index["operations"]
+                for operation, name in zip(operations, operation_tool_names(tool_name, operations)):
+                    validator = operation_validator(tool_schema, operation_index["schema_hash"], operation)
+                    api_caller = create_api_caller(tool_schema, tool_headers, tool_params, tool_data_connector, tool_id, operation, validator, retry_policy, cache_config)
+                    api_caller_with_config = partial(
+                        api_caller,
+                        headers=tool_headers,
+                        params=tool_params
                     )
-                )
-
-        self.agent = CrewAgent(
-            role=agent_config["role"],
-            goal=agent_config["goal"],
-            backstory=agent_config["backstory"],
+                    self.tools.append(
+                        Tool(
+                            name=name,
+                            func=api_caller_with_config,
+                            description=operation_tool_description(tool_title, operation),
+                            result_as_answer=True
+                        )
+                    )
+                self.logger.debug(f"Loaded {len(operations)} operations for tool {tool_id}")
+
+        # Agents with the dataQuery feature can run SQL directly against their tools' connectors
+        if query_engine and agent_config.get("features", {}).get("dataQuery"):
+            self.tools.extend(create_query_tools(query_engine, tools_config, self.logger))
+
+        # Every tool call counts against the budget of the run that makes it
+        self.tools = [guard_tool(tool, lambda: self.budget) for tool in self.tools]
+
+        self.agent_config = agent_config
+        self.agent = self._create_agent()
+
+    @property
+    def budget(self) -> ExecutionBudget:
+        """Budget of the run on the current thread (batch items get their own), else the executor's."""
+        return getattr(self._run, "budget", None) or self._budget
+
+    @budget.setter
+    def budget(self, budget: ExecutionBudget):
+        self._budget = budget
+
+    @property
+    def payload_agent(self) -> CrewAgent:
+        return getattr(self._run, "payload_agent", None) or self._payload_agent
+
+    @payload_agent.setter
+    def payload_agent(self, agent: CrewAgent):
+        self._payload_agent = agent
+
+    @property
+    def payload_cache_stats(self) -> Dict[str, int]:
+        """Payload cache hits and misses of the run on the current thread."""
+        if not hasattr(self._run, "payload_cache_stats"):
+            self._run.payload_cache_stats = {"hits": 0, "misses": 0}
+        return self._run.payload_cache_stats
+
+    def _create_agent(self) -> CrewAgent:
+        return CrewAgent(
+            role=self.agent_config["role"],
+            goal=self.agent_config["goal"],
+            backstory=self.agent_config["backstory"],
             llm=self.llm_client,
             tools=self.tools,
             verbose=True
         )
 
+    def _create_payload_agent(self) -> CrewAgent:
+        return CrewAgent(
+            role="Payload Generator",
+            goal="Generate accurate payloads for API tools",
+            backstory="Expert at creating valid API payloads.",
+            verbose=False,
+            allow_delegation=False,
+            llm=self.internal_llm_client
+        )
+
     def analyze_schema(self, schema: dict) -> str:
         self.logger.debug("Analyzing schema")
         schema_str = json.dumps(schema, indent=2, ensure_ascii=False)
@@ -200,85 +290,112 @@ class TaskExecutor:
             expected_output="Summary of schema requirements including HTTP method, parameters, and payload requirements",
             agent=self.schema_agent
         )
-        crew = Crew(agents=[self.schema_agent], tasks=[analysis_task], process=Process.sequential)
-        result = crew.kickoff()
+        tracker = self.budget.tracker(analysis_task)
+        crew = Crew(agents=[self.schema_agent], tasks=[analysis_task], process=Process.sequential, step_callback=tracker.on_step)
+        result = tracker.finish(crew.kickoff())
         sanitized_result = sanitize_for_logging(result)
         return str(result)  # Return unsanitized result to preserve accuracy
 
-    def generate_payload(self, user_input: str, schema: dict, tool_data_connector: Optional[dict] = None) -> Dict[str, Any]:
+    def generate_payload(
+        self,
+        user_input: str,
+        schema: dict,
+        tool_data_connector: Optional[dict] = None,
+        tool_id: Optional[str] = None,
+        operation: Optional[dict] = None,
+        validator: Optional[Callable[[Any], List[str]]] = None
+    ) -> Dict[str, Any]:
         self.logger.debug(f"Generating payload and endpoint URL for input: {sanitize_for_logging(user_input)}")
-        paths = schema.get("paths", {})
-        if not paths:
-            self.logger.error("No paths in schema")
-            return {"error": "No paths in schema"}
-
-        path_key = next(iter(paths))
-        method = next((m for m in paths[path_key] if m.lower() in ["get", "post"]), "post")
-        
-        # Determine request schema based on method
-        request_schema = {}
-        if method == "get":
-            parameters = paths[path_key].get(method, {}).get("parameters", [])
-            if parameters:
-                request_schema = {"parameters": parameters}
-        else:  # method == "post"
-            request_body = paths[path_key].get(method, {}).get("requestBody", {})
-            if request_body:
-                request_schema = request_body.get("content", {}).get("application/json", {}).get("schema", {})
-
-        connector_info = f"Tool Data Connector:\n{json.dumps(tool_data_connector, indent=2, ensure_ascii=False)}\n" if tool_data_connector else ""
+        if operation is None:
+            operation_index = operation_index_for({"schema": schema})
+            if not operation_index:
+                self.logger.error("No operations in schema")
+                return {"error": "No operations in schema"}
+            operation = operation_index["operations"][0]
+            validator = operation_validator(schema, operation_index["schema_hash"], operation)
+        method = operation["method"]
+
+        # The prompt carries a compact digest of the called operation instead of the raw OpenAPI document
+        operation_info = f"Operation:\n{render_operation_digest(operation)}"
+
+        # Only non-secret connector fields go into the prompt; credentials stay server-side
+        connector_info = f"Tool Data Connector: {connector_summary(describe_connector(tool_data_connector))}" if tool_data_connector else ""
+
+        cache_key = None
+        if self.payload_cache:
+            cache_key = self.payload_cache.key(tool_id, schema, user_input, {"operation": operation["operation_id"], "connector": connector_info})
+            cached = self.payload_cache.get(cache_key)
+            if cached is not None:
+                self.payload_cache_stats["hits"] += 1
+                self.logger.debug(f"Payload cache hit for tool {tool_id}: {cached['endpoint_url']}")
+                return cached
+            self.payload_cache_stats["misses"] += 1
         
         # Combine schema analysis and payload generation in a single task
-        payload_task = Task(
-            description=f"""
+        description = f"""
             User Input: '{user_input}'
-            Request Schema: {json.dumps(request_schema, indent=2, ensure_ascii=False)}
-            Full Schema: {json.dumps(schema, indent=2, ensure_ascii=False)}
+            {operation_info}
             {connector_info}
             
             Perform the following steps:
-            1. Analyze the provided OpenAPI schema, focusing on required fields, types, constraints, parameters, and response structure.
-            2. Validate that the user input contains all necessary information to generate a valid JSON payload (for POST) or query parameters (for GET) based on the schema's required fields.
+            1. Analyze the operation above, focusing on required fields, types, constraints and allowed values.
+            2. Validate that the user input contains all necessary information for the operation's required fields (query, path, header, cookie and body).
                - If any required fields are missing in the user input, return an error JSON object with the key "error" and a message listing the missing required fields. Do NOT use example values or defaults from the schema.
-               - For GET requests, check if required query parameters are provided in the input.
-               - For POST requests, check if required properties in the requestBody schema are provided in the input.
-            3. If validation passes, generate a valid JSON payload (if required) and the endpoint URL for the API call.
-               - For GET requests, return a dictionary of query parameters if parameters are defined in the schema, otherwise return null.
-               - For POST requests, generate a JSON payload if a requestBody is defined in the schema, otherwise return null.
-            4. Construct the endpoint URL using the appropriate server URL from the schema's "servers" field and the correct path from the "paths" field.
+            3. If validation passes, generate the payload and the endpoint URL for the API call.
+               - The payload is a single flat JSON object holding the query, header, cookie and body fields by name (nested body fields as nested objects), or null if the operation has no fields.
+            4. Construct the endpoint URL from the operation's URL template, substituting any path parameters.
             
             Return the response as a JSON object with two keys (unless an error occurs):
-            - "payload": The JSON payload or query parameters (or null if not applicable).
-            - "endpoint_url": The full URL for the API endpoint, corresponding to the {method.upper()} endpoint in the schema.
+            - "payload": The JSON payload (or null if not applicable).
+            - "endpoint_url": The full URL for the API endpoint, corresponding to the {method.upper()} operation.
             If an error occurs due to missing required fields, return a JSON object with a single key:
             - "error": A message describing the missing required fields.
-            Ensure the endpoint_url is valid and matches the schema. Do NOT use example values from the schema unless explicitly provided in the user input.
-            """,
-            expected_output="JSON object with 'payload' and 'endpoint_url', or 'error' if required fields are missing",
-            agent=self.payload_agent
-        )
-        crew = Crew(agents=[self.payload_agent], tasks=[payload_task], process=Process.sequential)
-        result = crew.kickoff()
-        try:
-            # Parse the agent's response
-            result_str = str(result.raw if hasattr(result, 'raw') else result).strip('`').strip('json').strip()
-            result_json = json.loads(result_str)
-            if "error" in result_json:
-                self.logger.error(f"Payload generation failed: {sanitize_for_logging(result_json['error'])}")
-                return {"error": result_json["error"]}
-            payload = result_json.get("payload")
-            endpoint_url = result_json.get("endpoint_url")
-            
+            Ensure the endpoint_url is valid and matches the operation. Do NOT use example values unless explicitly provided in the user input.
+            """
+
+        # Payloads are validated locally against the operation's schema; validation errors are fed
+        # back to the generator for a bounded number of repair attempts instead of reaching the API
+        repair_note = ""
+        for attempt in range(PAYLOAD_REPAIR_ATTEMPTS + 1):
+            payload_task = Task(
+                description=description + repair_note,
+                expected_output="JSON object with 'payload' and 'endpoint_url', or 'error' if required fields are missing",
+                agent=self.payload_agent
+            )
+            tracker = self.budget.tracker(payload_task)
+            crew = Crew(agents=[self.payload_agent], tasks=[payload_task], process=Process.sequential, step_callback=tracker.on_step)
+            result = tracker.finish(crew.kickoff())
+            try:
+                # Parse the agent's response
+                result_str = str(result.raw if hasattr(result, 'raw') else result).strip('`').strip('json').strip()
+                result_json = json.loads(result_str)
+                if "error" in result_json:
+                    self.logger.error(f"Payload generation failed: {sanitize_for_logging(result_json['error'])}")
+                    return {"error": result_json["error"]}
+                payload = result_json.get("payload")
+                endpoint_url = result_json.get("endpoint_url")
+            except (json.JSONDecodeError, AttributeError) as e:
+                self.logger.error(f"Error parsing payload or endpoint_url: {sanitize_for_logging(e)}")
+                return {"error": f"Error parsing payload or endpoint_url: {sanitize_for_logging(e)}"}
+
             if not endpoint_url:
                 self.logger.error("Missing endpoint_url in agent response")
                 return {"error": "Missing endpoint_url in agent response"}
-            
-            self.logger.debug(f"Generated payload: {json.dumps(payload, ensure_ascii=False) if payload else 'null'}")
-            self.logger.debug(f"Generated endpoint URL: {endpoint_url}")
-            return {"payload": payload, "endpoint_url": endpoint_url}
-        except (json.JSONDecodeError, AttributeError) as e:
-            self.logger.error(f"Error parsing payload or endpoint_url: {sanitize_for_logging(e)}")
-            return {"error": f"Error parsing payload or endpoint_url: {sanitize_for_logging(e)}"}
+
+            validation_errors = validator(payload) if validator else []
+            if not validation_errors:
+                break
+            self.logger.warning(f"Generated payload failed validation (attempt {attempt + 1}): {sanitize_for_logging(validation_errors)}")
+            repair_note = repair_feedback(payload, validation_errors)
+        else:
+            return {"error": f"Generated payload failed schema validation: {'; '.join(validation_errors)}"}
+
+        self.logger.debug(f"Generated payload: {json.dumps(payload, ensure_ascii=False) if payload else 'null'}")
+        self.logger.debug(f"Generated endpoint URL: {endpoint_url}")
+        result = {"payload": payload, "endpoint_url": endpoint_url}
+        if cache_key:
+            self.payload_cache.set(cache_key, result)
+        return result
 
     def get_task_descriptions(self, description, expected_output, task_name=None, **kwargs):
         self.logger.debug(f"Processing task descriptions for: {sanitize_for_logging(task_name)}")
@@ -305,9 +422,7 @@ class TaskExecutor:
     def read_csv_as_text(self, csv_path: str) -> str:
         self.logger.debug(f"Reading CSV: {sanitize_for_logging(csv_path)}")
         try:
-            with open(csv_path, "r", encoding="utf-8", errors="replace") as csv_file:
-                content = csv_file.read()
-                return content
+            return read_csv_as_text(csv_path)
         except Exception as e:
             self.logger.error(f"Error reading CSV: {sanitize_for_logging(e)}")
             return f"Error reading CSV: {sanitize_for_logging(e)}"
@@ -315,9 +430,7 @@ class TaskExecutor:
     def read_json_as_text(self, json_path: str) -> str:
         self.logger.debug(f"Reading JSON: {sanitize_for_logging(json_path)}")
         try:
-            with open(json_path, "r", encoding="utf-8", errors="replace") as json_file:
-                data = json.load(json_file)
-                return json.dumps(data, indent=2, ensure_ascii=False)
+            return read_json_as_text(json_path)
         except Exception as e:
             self.logger.error(f"Error reading JSON: {sanitize_for_logging(e)}")
             return f"Error reading JSON: {sanitize_for_logging(e)}"
@@ -325,8 +438,7 @@ class TaskExecutor:
     def read_txt_as_text(self, txt_path: str) -> str:
         self.logger.debug(f"Reading TXT: {sanitize_for_logging(txt_path)}")
         try:
-            with open(txt_path, "r", encoding="utf-8", errors="replace") as txt_file:
-                return txt_file.read()
+            return read_txt_as_text(txt_path)
         except Exception as e:
             self.logger.error(f"Error reading TXT: {sanitize_for_logging(e)}")
             return f"Error reading TXT: {sanitize_for_logging(e)}"
@@ -334,10 +446,7 @@ class TaskExecutor:
     def read_pdf_as_text(self, pdf_path: str) -> str:
         self.logger.debug(f"Reading PDF: {sanitize_for_logging(pdf_path)}")
         try:
-            with open(pdf_path, "rb") as pdf_file:
-                reader = PyPDF2.PdfReader(pdf_file)
-                text = "".join(page.extract_text() or "" for page in reader.pages)
-                return text.strip() or "No readable text in PDF"
+            return read_pdf_as_text(pdf_path)
         except Exception as e:
             self.logger.error(f"Error reading PDF: {sanitize_for_logging(e)}")
             return f"Error reading PDF: {sanitize_for_logging(e)}"
@@ -361,13 +470,41 @@ class TaskExecutor:
             return f"\n\nPDF content:\n{content}"
         return ""
 
-    def execute_task(self, description: str, expected_output: str, task_name: Optional[str] = None, file_path: Optional[str] = None, file_type: Optional[str] = None, **kwargs):
+    def execute_task(
+        self,
+        description: str,
+        expected_output: str,
+        task_name: Optional[str] = None,
+        file_path: Optional[str] = None,
+        file_type: Optional[str] = None,
+        budget: Optional[ExecutionBudget] = None,
+        **kwargs
+    ):
+        """
+        Runs the agent on one task. With a budget, the run is isolated from other runs on this
+        executor (own budget and crewai agents), so batch items can share one executor concurrently.
+        """
+        if budget is None:
+            return self._execute_task(self.agent, description, expected_output, task_name, file_path, file_type, **kwargs)
+        self._run.budget = budget
+        self._run.payload_agent = self._create_payload_agent()
+        try:
+            return self._execute_task(self._create_agent(), description, expected_output, task_name, file_path, file_type, **kwargs)
+        finally:
+            self._run.__dict__.clear()
+
+    def _execute_task(self, agent: CrewAgent, description: str, expected_output: str, task_name: Optional[str] = None, file_path: Optional[str] = None, file_type: Optional[str] = None, **kwargs):
         self.logger.info(f"Starting task execution: {sanitize_for_logging(task_name or 'Unnamed Task')}")
         self.logger.debug(f"Task description: {sanitize_for_logging(description)}")
         self.logger.debug(f"Expected output: {sanitize_for_logging(expected_output)}")
         self.logger.debug(f"Input kwargs: {sanitize_for_logging(kwargs)}")
         if file_path:
             self.logger.info(f"Processing file: {sanitize_for_logging(file_path)}")
+        if self.artifact_store:
+            self.artifact_store.purge_expired()
+        # A run cancelled while it was being set up stops before its first LLM call
+        self.budget.check()
+        self._run.payload_cache_stats = {"hits": 0, "misses": 0}
 
         task_info = self.get_task_descriptions(description, expected_output, task_name, **kwargs)
         processed_description = task_info["description"]
@@ -382,22 +519,41 @@ class TaskExecutor:
             else:
                 self.logger.warning(f"Unsupported file type: {file_type} for file: {sanitize_for_logging(file_path)}")
 
+        if self.knowledge_base:
+            query = str(kwargs.get("input") or processed_description)
+            try:
+                context = self.knowledge_base.build_context(query)
+            except Exception as e:
+                self.logger.error(f"Knowledge base retrieval failed: {sanitize_for_logging(e)}")
+                context = ""
+            if context:
+                processed_description += f"\n\nRelevant knowledge base context:\n{context}"
+                self.logger.info(f"Appended knowledge base context (length: {len(context)})")
+
         task = Task(
             description=processed_description,
             expected_output=processed_expected_output,
-            agent=self.agent
+            agent=agent
         )
 
+        tracker = self.budget.tracker(task)
         crew = Crew(
-            agents=[self.agent],
+            agents=[agent],
             tasks=[task],
             process=Process.sequential,
-            verbose=True
+            verbose=True,
+            step_callback=tracker.on_step
         )
 
         try:
             self.logger.info("Initiating CrewAI execution")
-            result = crew.kickoff()
+            result = tracker.finish(crew.kickoff())
+        except BudgetExceeded as e:
+            self.logger.warning(f"{e.message}; usage: {e.usage}")
+            raise
+        except ExecutionCancelled as e:
+            self.logger.warning(f"{e}; usage: {self.budget.usage()}")
+            raise
         except Exception as e:
             self.logger.error(f"Error during CrewAI execution: {sanitize_for_logging(e)}", exc_info=True)
             raise
@@ -413,13 +569,16 @@ class TaskExecutor:
             raw_output = str(result)
 
         self.logger.info(f"Task '{sanitize_for_logging(task_name or 'Unnamed Task')}' completed")
+        if self.payload_cache:
+            stats = self.payload_cache_stats
+            self.logger.info(f"Payload cache: {stats['hits']} hits, {stats['misses']} misses")
         self.logger.debug(f"Raw LLM output: {sanitize_for_logging(raw_output)}")
 
         return raw_output
 
-def get_api_key():
-    keys = os.getenv("GEMINI_API_KEYS_FREE", "")
-    key_list = [key.strip() for key in keys.split(",") if key.strip()]
-    if not key_list:
-        raise ValueError("No API keys found in GEMINI_API_KEYS environment variable.")
-    return random.choice(key_list)
\ No newline at end of file
+    def close(self):
+        """Releases the execution's log handlers and logger, which are unique per executor and would otherwise stay open."""
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            handler.close()
+        logging.Logger.manager.loggerDict.pop(self.logger.name, None)
@@ -0,0 +1,65 @@
+import os
+import time
+
+import pytest
+
+from artifact_store import ArtifactStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(str(tmp_path), retention_hours=1, summary_chars=20)
+
+
+def test_references_expand_to_the_stored_output_exactly(store):
+    output = "Line one\n\n  indented | table\n"
+    artifact = store.put("exec-1", "step:extract", output)
+
+    text, resolved = store.resolve_references("exec-1", f"Extractor Output: {artifact['reference']}")
+
+    assert artifact["reference"] == f"{{{{artifact:{artifact['id']}}}}}"
+    assert text == f"Extractor Output: {output}"
+    assert resolved == 1
+
+
+def test_artifact_ids_are_stable_per_key(store):
+    assert store.put("exec-1", "step:a", "first")["id"] == store.put("exec-1", "step:a", "second")["id"]
+    assert store.get("exec-1", ArtifactStore.artifact_id("step:a")) == "second"
+    assert ArtifactStore.artifact_id("step:a") != ArtifactStore.artifact_id("step:b")
+
+
+def test_unknown_and_foreign_references_are_left_in_place(store):
+    artifact = store.put("exec-1", "step:a", "secret of exec-1")
+    text = f"{artifact['reference']} and {{{{artifact:000000000000}}}}"
+
+    expanded, resolved = store.resolve_references("exec-2", text)
+
+    assert expanded == text
+    assert resolved == 0
+
+
+def test_summary_is_a_single_line_preview(store):
+    artifact = store.put("exec-1", "step:a", "word " * 20)
+
+    assert artifact["summary"] == "word word word word... (100 chars)"
+    assert artifact["size"] == 100
+
+
+def test_paths_are_validated(store):
+    store.put("exec-1", "step:a", "x")
+
+    assert store.path("exec-1", "../../etc/passwd") is None
+    assert store.path("exec-1", ArtifactStore.artifact_id("step:a")).endswith(".txt")
+    with pytest.raises(ValueError):
+        store.put("../outside", "step:a", "x")
+
+
+def test_purge_removes_executions_past_retention(store):
+    store.put("old", "step:a", "x")
+    store.put("new", "step:a", "y")
+    two_hours_ago = time.time() - 7200
+    os.utime(os.path.join(store.directory, "old"), (two_hours_ago, two_hours_ago))
+
+    assert store.purge_expired() == 1
+    assert store.get("old", ArtifactStore.artifact_id("step:a")) is None
+    assert store.get("new", ArtifactStore.artifact_id("step:a")) == "y"
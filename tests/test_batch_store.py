@@ -0,0 +1,73 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from batch_store import BatchStore, parse_batch_file
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BatchStore(str(tmp_path), retention_hours=72)
+
+
+def test_csv_rows_use_the_input_column_or_the_configured_field():
+    # Excel writes a byte order mark before the header
+    data = b"\xef\xbb\xbfinput,lang\nHello,en\n\"Bonjour, monde\",fr\n"
+
+    assert parse_batch_file("items.csv", data) == ["Hello", "Bonjour, monde"]
+    assert parse_batch_file("items.csv", data, input_field="lang") == ["en", "fr"]
+    assert parse_batch_file("single.CSV", b"question\nWhat is new?\n") == ["What is new?"]
+
+
+def test_jsonl_lines_accept_strings_and_objects_and_skip_blank_lines():
+    data = b'"plain text"\n\n{"userInput": "from object"}\n{"id": 3, "text": "x"}\n'
+
+    assert parse_batch_file("items.jsonl", data) == ["plain text", "from object", '{"id": 3, "text": "x"}']
+
+
+def test_invalid_jsonl_line_is_reported_with_its_number():
+    with pytest.raises(ValueError, match="line 2"):
+        parse_batch_file("items.ndjson", b'"ok"\n{"input": \n')
+
+
+def test_other_file_types_are_rejected():
+    with pytest.raises(ValueError, match="CSV"):
+        parse_batch_file("items.xlsx", b"")
+
+
+def test_truncated_result_line_leaves_the_item_pending(store):
+    batch = store.create("agent-1", ["a", "b", "c"], "exec-1")
+    store.record(batch["batch_id"], {"index": 0, "status": "completed", "output": "A"})
+    store.record(batch["batch_id"], {"index": 1, "status": "failed", "error": "timeout"})
+    # A crash while appending leaves the last line cut short
+    with open(os.path.join(store.directory, batch["batch_id"], "results.jsonl"), "a", encoding="utf-8") as f:
+        f.write('{"index": 2, "status": "compl')
+
+    assert store.pending_indices(batch["batch_id"]) == [1, 2]
+
+
+def test_latest_result_per_item_wins(store):
+    batch = store.create("agent-1", ["a", "b"], "exec-1")
+    store.record(batch["batch_id"], {"index": 1, "status": "failed", "error": "timeout"})
+    store.record(batch["batch_id"], {"index": 1, "status": "completed", "output": "B"})
+
+    assert store.pending_indices(batch["batch_id"]) == [0]
+    store.finish(batch["batch_id"], "failed")
+    assert store.load(batch["batch_id"])["counts"] == {"completed": 1}
+
+
+def test_purge_removes_only_batches_past_retention(store):
+    old = store.create("agent-1", ["a"], "exec-1")
+    fresh = store.create("agent-1", ["b"], "exec-2")
+    meta_path = os.path.join(store.directory, old["batch_id"], "batch.json")
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["updated_at"] = (datetime.utcnow() - timedelta(hours=73)).isoformat()
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    assert store.purge_expired() == 1
+    assert store.load(old["batch_id"]) is None
+    assert store.load(fresh["batch_id"]) is not None
@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+
+import pytest
+
+from budget import BudgetExceeded, ExecutionBudget, guard_tool
+
+
+def make_tool(result, result_as_answer=True):
+    return SimpleNamespace(func=lambda *args, **kwargs: result, result_as_answer=result_as_answer)
+
+
+def test_error_answer_from_tool_marks_failed_answer():
+    budget = ExecutionBudget()
+    tool = guard_tool(make_tool({"error": "404"}), lambda: budget)
+
+    assert tool.func("input") == {"error": "404"}
+    assert budget.failed_answer
+    assert budget.tool_calls == 1
+
+
+def test_successful_or_intermediate_tool_results_do_not_mark_failed_answer():
+    budget = ExecutionBudget()
+    guard_tool(make_tool({"id": 1}), lambda: budget).func("input")
+    guard_tool(make_tool({"error": "bad sql"}, result_as_answer=False), lambda: budget).func("input")
+
+    assert not budget.failed_answer
+
+
+def make_task(description="d" * 400, expected_output="e" * 100):
+    agent = SimpleNamespace(role="r" * 40, goal="g" * 40, backstory="b" * 19)
+    return SimpleNamespace(agent=agent, description=description, expected_output=expected_output)
+
+
+def test_each_step_counts_the_prompt_and_scratchpad_as_input():
+    budget = ExecutionBudget()
+    tracker = budget.tracker(make_task())
+    prompt_chars = tracker.prompt_chars
+
+    tracker.on_step(SimpleNamespace(text="t" * 200))
+    tracker.on_step(SimpleNamespace(text="t" * 200))
+
+    # Step 1 sends the prompt, step 2 the prompt plus step 1's text
+    assert budget.tokens == (prompt_chars + 200) // 4 + (prompt_chars + 400) // 4
+    assert budget.llm_calls == 2
+
+
+def test_single_call_without_steps_counts_the_prompt():
+    budget = ExecutionBudget()
+    tracker = budget.tracker(make_task())
+
+    tracker.finish(SimpleNamespace(raw="o" * 80))
+
+    assert budget.tokens == (tracker.prompt_chars + 80) // 4
+    assert budget.llm_calls == 1
+
+
+def test_reported_usage_replaces_the_estimate():
+    budget = ExecutionBudget()
+    tracker = budget.tracker(make_task())
+    tracker.on_step(SimpleNamespace(text="t" * 200))
+
+    tracker.finish(SimpleNamespace(raw="done", token_usage={"total_tokens": 1234}))
+
+    assert budget.tokens == 1234
+
+
+def test_tool_refusal_answer_keeps_the_last_real_output():
+    budget = ExecutionBudget(max_tool_calls=1)
+    tool = guard_tool(make_tool({"id": 1}, result_as_answer=True), lambda: budget)
+    tracker = budget.tracker(make_task())
+    tracker.on_step(SimpleNamespace(output="Draft answer from the agent"))
+    tool.func("first")
+
+    refusal = tool.func("second")
+    with pytest.raises(BudgetExceeded) as raised:
+        tracker.finish(SimpleNamespace(raw=refusal))
+
+    assert refusal.startswith("Execution budget exhausted")
+    assert raised.value.limit == "tool_calls"
+    assert raised.value.partial_output == "Draft answer from the agent"
+
+
+def run_agent(budget, steps_before_answer):
+    """Simulates a crew: one LLM call per step, tool actions until the final answer; returns the calls made."""
+    calls = 0
+    tracker = budget.tracker(make_task())
+    for step in range(steps_before_answer + 1):
+        calls += 1
+        if step < steps_before_answer:
+            tracker.on_step(SimpleNamespace(tool="search", result="observation", text="thought"))
+        else:
+            tracker.on_step(SimpleNamespace(output="final answer"))
+    tracker.finish(SimpleNamespace(raw="final answer"))
+    return calls
+
+
+def test_llm_call_cap_allows_exactly_n_calls():
+    budget = ExecutionBudget(max_llm_calls=3)
+
+    with pytest.raises(BudgetExceeded) as raised:
+        run_agent(budget, steps_before_answer=10)
+
+    assert raised.value.limit == "llm_calls"
+    assert budget.llm_calls == 3
+
+
+def test_final_answer_on_the_last_allowed_call_completes():
+    budget = ExecutionBudget(max_llm_calls=3)
+
+    assert run_agent(budget, steps_before_answer=2) == 3
+    assert budget.llm_calls == 3
+    # A further crew of the same execution has no call left
+    with pytest.raises(BudgetExceeded):
+        budget.tracker(make_task())
@@ -0,0 +1,69 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from checkpoint_store import CheckpointStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CheckpointStore(str(tmp_path), retention_hours=72, completed_retention_hours=24)
+
+
+def age(store, execution_id, hours):
+    """Backdates a checkpoint's last update."""
+    path = os.path.join(store.directory, f"{execution_id}.json")
+    with open(path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    checkpoint["updated_at"] = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+
+
+def test_only_completed_steps_are_returned_for_resume(store):
+    store.create("exec-1", "ma-1", "hello")
+    store.save_step("exec-1", "extract", {"status": "completed", "agent_id": "a1", "artifact_id": "art-1", "duration": 1.0})
+    store.save_step("exec-1", "summarize", {"status": "failed", "agent_id": "a2", "error": "RateLimitError"})
+
+    completed = store.completed_steps("exec-1")
+
+    assert list(completed) == ["extract"]
+    assert completed["extract"]["artifact_id"] == "art-1"
+
+
+def test_resume_marks_the_checkpoint_running_again(store):
+    store.create("exec-1", "ma-1", "hello")
+    store.finish("exec-1", "failed", error="Incomplete steps: ['summarize']")
+
+    store.mark_running("exec-1")
+
+    checkpoint = store.load("exec-1")
+    assert checkpoint["status"] == "running" and checkpoint["error"] is None
+    assert checkpoint["resumed_count"] == 1
+
+
+def test_purge_keeps_incomplete_runs_longer_than_completed_ones(store):
+    for execution_id, status in [("done", "completed"), ("failed", "failed")]:
+        store.create(execution_id, "ma-1", "hello")
+        store.finish(execution_id, status)
+    for execution_id in ["done", "failed"]:
+        age(store, execution_id, hours=48)
+
+    assert store.purge_expired() == 1
+    assert store.load("done") is None
+    assert store.load("failed") is not None
+
+
+def test_corrupt_checkpoint_loads_as_missing_and_is_purged(store):
+    with open(os.path.join(store.directory, "broken.json"), "w", encoding="utf-8") as f:
+        f.write("{not json")
+
+    assert store.load("broken") is None
+    assert store.purge_expired() == 1
+
+
+def test_execution_id_cannot_leave_the_directory(store):
+    with pytest.raises(ValueError):
+        store.load("../outside")
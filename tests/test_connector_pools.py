@@ -0,0 +1,165 @@
+import time
+import threading
+
+import pytest
+
+import connector_pools
+from connector_pools import BigQueryClientCache, PostgresPoolManager
+
+
+class StubClient:
+    def __init__(self, project_id, service_account_info):
+        self.project_id = project_id
+        self.service_account_info = service_account_info
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class StubFactory:
+    """Client factory recording its calls; a project listed in slow_projects blocks until released."""
+    def __init__(self, slow_projects=()):
+        self.calls = []
+        self.slow_projects = set(slow_projects)
+        self.release = threading.Event()
+
+    def __call__(self, project_id, service_account_info):
+        self.calls.append(project_id)
+        if project_id in self.slow_projects:
+            self.release.wait(5)
+        return StubClient(project_id, service_account_info)
+
+
+def bigquery_connector(project="proj", key_id="key-1"):
+    return {"projectId": project, "datasetId": "ds", "serviceAccountKey": {"private_key_id": key_id}}
+
+
+def test_bigquery_client_is_built_once_per_connector():
+    factory = StubFactory()
+    cache = BigQueryClientCache(client_factory=factory)
+
+    first = cache.get_client("c1", bigquery_connector())
+    second = cache.get_client("c1", bigquery_connector())
+
+    assert first is second
+    assert factory.calls == ["proj"]
+    assert cache.stats() == {"c1": {"uses": 2}}
+
+
+def test_bigquery_credentials_change_rebuilds_and_closes_old_client():
+    factory = StubFactory()
+    cache = BigQueryClientCache(client_factory=factory)
+
+    old = cache.get_client("c1", bigquery_connector(key_id="key-1"))
+    new = cache.get_client("c1", bigquery_connector(key_id="key-2"))
+
+    assert new is not old
+    assert old.closed
+    assert len(factory.calls) == 2
+
+
+def test_bigquery_invalidate_closes_client():
+    cache = BigQueryClientCache(client_factory=StubFactory())
+    client = cache.get_client("c1", bigquery_connector())
+
+    cache.invalidate("c1")
+
+    assert client.closed
+    assert cache.get_client("c1", bigquery_connector()) is not client
+
+
+def test_bigquery_slow_factory_does_not_block_other_connectors():
+    factory = StubFactory(slow_projects={"slow"})
+    cache = BigQueryClientCache(client_factory=factory)
+    slow_clients = []
+    threads = [
+        threading.Thread(target=lambda: slow_clients.append(cache.get_client("slow", bigquery_connector(project="slow"))))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+
+    started = time.monotonic()
+    cache.get_client("fast", bigquery_connector(project="fast"))
+    assert time.monotonic() - started < 1
+
+    factory.release.set()
+    for thread in threads:
+        thread.join()
+    # Concurrent callers for the slow connector shared a single build
+    assert factory.calls.count("slow") == 1
+    assert len({id(client) for client in slow_clients}) == 1
+
+
+def test_bigquery_factory_error_reaches_every_waiter_and_is_not_cached():
+    calls = []
+
+    def failing_factory(project_id, service_account_info):
+        calls.append(project_id)
+        raise RuntimeError("bad credentials")
+
+    cache = BigQueryClientCache(client_factory=failing_factory)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            cache.get_client("c1", bigquery_connector())
+    assert len(calls) == 2
+    assert cache.stats() == {}
+
+
+def test_bigquery_adhoc_clients_are_capped():
+    cache = BigQueryClientCache(client_factory=StubFactory(), max_adhoc_clients=2)
+    clients = [cache.get_client(None, bigquery_connector(key_id=f"key-{i}")) for i in range(3)]
+
+    assert clients[0].closed
+    assert not clients[1].closed and not clients[2].closed
+    assert len(cache.stats()) == 2
+
+
+def test_bigquery_idle_clients_are_evicted():
+    cache = BigQueryClientCache(client_factory=StubFactory(), idle_timeout=0.05)
+    client = cache.get_client(None, bigquery_connector())
+    time.sleep(0.1)
+
+    cache.evict_idle()
+
+    assert client.closed
+    assert cache.stats() == {}
+
+
+class StubPostgresPool:
+    def __init__(self, min_size, max_size, connect_timeout=None, **params):
+        if params["host"] == "slow":
+            time.sleep(0.5)
+        self.params = params
+        self.closed = False
+
+    def closeall(self):
+        self.closed = True
+
+
+def postgres_connector(host):
+    return {"host": host, "port": 5432, "database": "db", "user": "user", "password": "secret"}
+
+
+def test_postgres_slow_pool_build_does_not_block_other_connectors(monkeypatch):
+    monkeypatch.setattr(connector_pools.pg_pool, "ThreadedConnectionPool", StubPostgresPool)
+    manager = PostgresPoolManager()
+    params = connector_pools.postgres_params
+    slow_entries = []
+    threads = [
+        threading.Thread(target=lambda: slow_entries.append(manager._get_pool("slow", params(postgres_connector("slow")))))
+        for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+
+    started = time.monotonic()
+    manager._get_pool("fast", params(postgres_connector("fast")))
+    assert time.monotonic() - started < 0.3
+
+    for thread in threads:
+        thread.join()
+    assert slow_entries[0] is slow_entries[1]
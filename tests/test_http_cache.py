@@ -0,0 +1,147 @@
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from http_cache import HttpResponseCache, freshness_lifetime, parse_cache_control
+from http_resilience import ResilientHttpClient
+
+
+def response(body=b"{}", status=200, **headers):
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict({key.replace("_", "-"): value for key, value in headers.items()})
+    response._content = body
+    response.url = "https://api.example.com/orders"
+    return response
+
+
+def test_cache_control_directives_are_parsed_case_insensitively():
+    assert parse_cache_control('Private, Max-Age=60, no-cache="Set-Cookie"') == {"private": True, "max-age": "60", "no-cache": "Set-Cookie"}
+    assert parse_cache_control(None) == {}
+
+
+@pytest.mark.parametrize("headers, lifetime", [
+    ({"Cache-Control": "max-age=60", "Age": "15"}, 45.0),
+    ({"Cache-Control": "max-age=60, s-maxage=10"}, 10.0),
+    ({"Cache-Control": "max-age=10", "Age": "30"}, 0.0),
+    ({"Cache-Control": "no-cache, max-age=60"}, 0.0),
+    ({"Cache-Control": "max-age=soon"}, 0.0),
+    ({"Expires": formatdate(1_000_120, usegmt=True), "Date": formatdate(1_000_000, usegmt=True)}, 120.0),
+    ({"Expires": "0"}, 0.0),
+    ({"Content-Type": "application/json"}, None),
+])
+def test_freshness_lifetime(headers, lifetime):
+    assert freshness_lifetime(headers) == lifetime
+
+
+def test_only_cacheable_responses_are_stored():
+    cache = HttpResponseCache(max_entry_bytes=10)
+
+    assert not cache.store("no-store", response(Cache_Control="no-store, max-age=60"))
+    assert not cache.store("error", response(status=500, Cache_Control="max-age=60"))
+    assert not cache.store("no-freshness", response())
+    assert not cache.store("too-large", response(b"x" * 11, Cache_Control="max-age=60"))
+    assert cache.store("fresh", response(Cache_Control="max-age=60"))
+    # Validators without freshness are kept, but stale at once so every use revalidates
+    assert cache.store("validators", response(ETag='"v1"'))
+    assert not cache.is_fresh(cache.lookup("validators"))
+    # The tool's TTL wins over the server's headers
+    assert cache.store("override", response(Cache_Control="no-cache"), ttl_override=60)
+    assert cache.is_fresh(cache.lookup("override"))
+
+
+def test_least_recently_used_entries_are_evicted_over_the_byte_budget():
+    cache = HttpResponseCache(max_bytes=10)
+    cache.store("a", response(b"aaaa", Cache_Control="max-age=60"))
+    cache.store("b", response(b"bbbb", Cache_Control="max-age=60"))
+    cache.lookup("a")
+
+    cache.store("c", response(b"cccc", Cache_Control="max-age=60"))
+
+    assert cache.lookup("b") is None
+    assert cache.lookup("a")["content"] == b"aaaa" and cache.lookup("c")["content"] == b"cccc"
+    assert cache.stats()["bytes"] == 8 and cache.stats()["evictions"] == 1
+
+
+def test_keys_separate_auth_identities_and_ignore_parameter_order():
+    assert HttpResponseCache.key("u", {"a": 1, "b": 2}, {"Authorization": "x"}) == HttpResponseCache.key("u", {"b": 2, "a": 1}, {"authorization": "x"})
+    assert HttpResponseCache.key("u", None, {"Authorization": "x"}) != HttpResponseCache.key("u", None, {"Authorization": "y"})
+
+
+class ETagServer:
+    """Serves /orders with an ETag and no freshness, answering 304 when If-None-Match matches."""
+    def __init__(self):
+        self.version = "v1"
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests.append(self.headers.get("If-None-Match"))
+                etag = f'"{server.version}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                body = f'{{"version": "{server.version}"}}'.encode()
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/orders"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    server = ETagServer()
+    yield server
+    server.close()
+
+
+def test_stale_entries_are_revalidated_with_their_etag(server):
+    client = ResilientHttpClient(response_cache=HttpResponseCache())
+    try:
+        first = client.request("GET", server.url)
+        revalidated = client.request("GET", server.url)
+        server.version = "v2"
+        changed = client.request("GET", server.url)
+
+        assert "X-Cache" not in first.headers and first.json() == {"version": "v1"}
+        assert revalidated.headers["X-Cache"] == "REVALIDATED" and revalidated.json() == {"version": "v1"}
+        assert changed.json() == {"version": "v2"}
+        assert server.requests == [None, '"v1"', '"v1"']
+        assert client.response_cache.stats()["revalidated"] == 1
+    finally:
+        client.close()
+
+
+def test_fresh_entries_are_served_without_a_request(server):
+    client = ResilientHttpClient(response_cache=HttpResponseCache())
+    try:
+        client.request("GET", server.url, cache_ttl=60, cache_tag="orders")
+        hit = client.request("GET", server.url, cache_ttl=60, cache_tag="orders")
+
+        assert hit.headers["X-Cache"] == "HIT" and hit.json() == {"version": "v1"}
+        assert len(server.requests) == 1
+        assert client.response_cache.invalidate("orders") == 1
+        client.request("GET", server.url, cache_ttl=60, cache_tag="orders")
+        assert len(server.requests) == 2
+    finally:
+        client.close()
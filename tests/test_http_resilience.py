@@ -0,0 +1,138 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_resilience import CircuitBreaker, CircuitOpenError, ResilientHttpClient, RetryPolicy
+
+FAST_RETRIES = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.05, timeout=5)
+
+
+class FlakyServer:
+    """
+    Local HTTP server whose paths follow a script: /fail/{n} answers 503 n times then 200,
+    /down always answers 503, /slow-once delays its first response by a second.
+    """
+    def __init__(self):
+        self.hits = {}
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _respond(self):
+                with server._lock:
+                    hit = server.hits[self.path] = server.hits.get(self.path, 0) + 1
+                status = 200
+                if self.path.startswith("/fail/") and hit <= int(self.path.rsplit("/", 1)[1]):
+                    status = 503
+                elif self.path == "/down":
+                    status = 503
+                elif self.path == "/slow-once" and hit == 1:
+                    time.sleep(1)
+                body = f'{{"hit": {hit}}}'.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = _respond
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.host = f"127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    server = FlakyServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def client():
+    client = ResilientHttpClient()
+    yield client
+    client.close()
+
+
+def test_get_is_retried_until_it_succeeds(server, client):
+    response = client.request("GET", f"{server.url}/fail/2", policy=FAST_RETRIES)
+
+    assert response.status_code == 200
+    assert server.hits["/fail/2"] == 3
+    assert client.counters["retries"] == 2
+
+
+def test_post_is_not_retried_by_default(server, client):
+    response = client.request("POST", f"{server.url}/fail/1", policy=FAST_RETRIES, json={})
+
+    assert response.status_code == 503
+    assert server.hits["/fail/1"] == 1
+
+
+def test_last_error_status_is_returned_once_attempts_run_out(server, client):
+    response = client.request("GET", f"{server.url}/down", policy=FAST_RETRIES)
+
+    assert response.status_code == 503
+    assert server.hits["/down"] == 3
+
+
+def test_transport_error_is_raised_after_retries(client):
+    with pytest.raises(requests.ConnectionError):
+        client.request("GET", "http://127.0.0.1:9/unreachable", policy=FAST_RETRIES)
+    assert client.counters["attempts"] == 3
+
+
+def test_breaker_opens_fails_fast_and_closes_after_trial(server, client):
+    client._breakers[server.host] = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    once = RetryPolicy(max_attempts=1)
+
+    for _ in range(2):
+        client.request("GET", f"{server.url}/down", policy=once)
+    with pytest.raises(CircuitOpenError):
+        client.request("GET", f"{server.url}/fail/0", policy=once)
+    assert "/fail/0" not in server.hits
+
+    time.sleep(0.25)
+    assert client.request("GET", f"{server.url}/fail/0", policy=once).status_code == 200
+    assert client.breaker(server.host).snapshot()["state"] == "closed"
+
+
+def test_half_open_trial_is_released_after_unexpected_error(server, client):
+    breaker = client._breakers[server.host] = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    once = RetryPolicy(max_attempts=1)
+    client.request("GET", f"{server.url}/down", policy=once)
+    time.sleep(0.15)
+
+    def broken_hook(response, **kwargs):
+        raise ValueError("hook failed")
+
+    with pytest.raises(ValueError):
+        client.request("GET", f"{server.url}/fail/0", policy=once, hooks={"response": broken_hook})
+
+    # The trial slot is free again, so the next request is the new trial and closes the breaker
+    assert client.request("GET", f"{server.url}/fail/0", policy=once).status_code == 200
+    assert breaker.snapshot()["state"] == "closed"
+
+
+def test_slow_get_is_hedged_and_backup_wins(server, client):
+    started = time.monotonic()
+    response = client.request("GET", f"{server.url}/slow-once", policy=RetryPolicy(max_attempts=1, hedge_after=0.1))
+
+    assert response.status_code == 200
+    assert response.json() == {"hit": 2}
+    assert time.monotonic() - started < 0.9
+    assert client.counters["hedges"] == 1 and client.counters["hedge_wins"] == 1
@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+from ingestion import IngestionPipeline
+from knowledge_base import HashingEmbedder, KnowledgeBaseStore
+
+
+class CountingEmbedder(HashingEmbedder):
+    """Counts the chunks embedded, so tests can tell re-embedded documents from skipped ones."""
+    def __init__(self):
+        super().__init__(dim=64)
+        self.embedded = 0
+
+    def embed(self, texts):
+        self.embedded += len(texts)
+        return super().embed(texts)
+
+
+@pytest.fixture
+def embedder():
+    return CountingEmbedder()
+
+
+@pytest.fixture
+def pipeline(tmp_path, embedder):
+    pipeline = IngestionPipeline(
+        KnowledgeBaseStore(str(tmp_path / "kb"), embedder=embedder),
+        max_workers=2,
+        batch_size=2,
+        jobs_dir=str(tmp_path / "jobs")
+    )
+    yield pipeline
+    pipeline.shutdown()
+
+
+def wait_for(pipeline, job):
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        job = pipeline.get_job(job["job_id"])
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Ingestion job {job['job_id']} did not finish: {job}")
+
+
+def corpus(edited=None):
+    return [
+        {"doc_id": f"doc-{number}", "text": f"Note {number} about {'edited ' if number == edited else ''}invoices and refunds"}
+        for number in range(5)
+    ]
+
+
+def test_reingesting_an_unchanged_corpus_only_embeds_the_edits(pipeline, embedder):
+    first = wait_for(pipeline, pipeline.submit("a1", corpus()))
+    assert (first["status"], first["indexed"], first["progress"]) == ("completed", 5, 1.0)
+    embedded = embedder.embedded
+
+    second = wait_for(pipeline, pipeline.submit("a1", corpus(edited=3)))
+
+    assert (second["indexed"], second["skipped"]) == (1, 4)
+    assert embedder.embedded - embedded == 1
+    kb = pipeline.knowledge_bases.get("a1")
+    assert len(kb.list_documents()) == 5
+    assert kb.search("edited invoices", top_k=1)[0]["doc_id"] == "doc-3"
+
+
+def test_prune_deletes_documents_missing_from_the_batch(pipeline):
+    wait_for(pipeline, pipeline.submit("a1", corpus()))
+
+    job = wait_for(pipeline, pipeline.submit("a1", corpus()[:2], prune=True))
+
+    assert (job["skipped"], job["deleted"]) == (2, 3)
+    assert sorted(document["doc_id"] for document in pipeline.knowledge_bases.get("a1").list_documents()) == ["doc-0", "doc-1"]
+
+
+def test_failed_document_is_reported_without_stopping_the_job(pipeline, tmp_path):
+    upload = tmp_path / "scan.png"
+    upload.write_bytes(b"not text")
+    documents = corpus()[:2] + [{"doc_id": "scan", "path": str(upload), "file_type": "image/png", "cleanup": True}]
+
+    job = wait_for(pipeline, pipeline.submit("a1", documents))
+
+    assert (job["status"], job["indexed"], job["failed"], job["processed"]) == ("completed", 2, 1, 3)
+    assert job["errors"][0]["doc_id"] == "scan" and "Unsupported file type" in job["errors"][0]["error"]
+    # Uploaded files are cleaned up whether or not they could be indexed
+    assert not upload.exists()
+
+
+def test_finished_jobs_are_readable_after_a_restart(pipeline, tmp_path, embedder):
+    job = wait_for(pipeline, pipeline.submit("a1", corpus()))
+
+    restarted = IngestionPipeline(KnowledgeBaseStore(str(tmp_path / "kb"), embedder=embedder), jobs_dir=str(tmp_path / "jobs"))
+    try:
+        assert restarted.get_job(job["job_id"])["indexed"] == 5
+        assert [listed["job_id"] for listed in restarted.list_jobs("a1")] == [job["job_id"]]
+        assert restarted.list_jobs("a2") == []
+    finally:
+        restarted.shutdown()
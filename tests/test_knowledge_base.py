@@ -0,0 +1,122 @@
+import numpy as np
+
+import knowledge_base
+from knowledge_base import KnowledgeBase, VectorIndex, normalize_rows
+
+TOPICS = ["invoice payment refund", "kubernetes pod deployment", "sourdough bread baking", "marathon training plan"]
+
+
+def document(topic: int, number: int) -> str:
+    return f"{TOPICS[topic]} note {number}: {TOPICS[topic]} details and {TOPICS[topic]} checklist"
+
+
+def ingest(kb: KnowledgeBase, doc_ids, topic=None):
+    upserts = []
+    for doc_id in doc_ids:
+        text = document(topic if topic is not None else doc_id % len(TOPICS), doc_id)
+        chunks, vectors = kb.prepare_document(text)
+        upserts.append({"doc_id": str(doc_id), "text": text, "chunks": chunks, "vectors": vectors})
+    return kb.apply_changes(upserts)
+
+
+def make_kb(tmp_path, monkeypatch, threshold=20):
+    monkeypatch.setattr(knowledge_base, "KB_ANN_THRESHOLD", threshold)
+    builds = []
+    build_ivf = VectorIndex.build_ivf
+
+    def counting_build(index, *args, **kwargs):
+        builds.append(len(index))
+        return build_ivf(index, *args, **kwargs)
+
+    monkeypatch.setattr(VectorIndex, "build_ivf", counting_build)
+    return KnowledgeBase(str(tmp_path / "kb")), builds
+
+
+def test_small_corpus_stays_exhaustive(tmp_path, monkeypatch):
+    kb, builds = make_kb(tmp_path, monkeypatch)
+    ingest(kb, range(5))
+    kb.remove_document("0")
+
+    assert builds == []
+    assert not kb.index.has_ivf
+    assert len(kb.index) == len(kb.chunks) == 4
+
+
+def test_additions_are_assigned_without_retraining(tmp_path, monkeypatch):
+    kb, builds = make_kb(tmp_path, monkeypatch)
+    ingest(kb, range(24))
+    assert builds == [24]
+
+    for doc_id in range(24, 30):
+        ingest(kb, [doc_id])
+
+    assert builds == [24]
+    assert len(kb.index) == 30
+    assert int(kb.index.list_offsets[-1]) == 30
+    assert sorted(kb.index.list_ids.tolist()) == list(range(30))
+    assert kb.search(document(1, 29), top_k=1)[0]["doc_id"] == "29"
+
+
+def test_deletes_are_tombstoned_and_hidden_from_search(tmp_path, monkeypatch):
+    kb, builds = make_kb(tmp_path, monkeypatch)
+    ingest(kb, range(24))
+
+    assert kb.remove_document("5")
+
+    assert builds == [24]
+    assert kb.index.tombstones == 1 and len(kb.index) == 24
+    assert all(result["doc_id"] != "5" for result in kb.search(document(1, 5), top_k=10))
+    assert kb.search(document(1, 9), top_k=1)[0]["doc_id"] == "9"
+
+
+def test_tombstone_ratio_triggers_retrain_and_compaction(tmp_path, monkeypatch):
+    kb, builds = make_kb(tmp_path, monkeypatch)
+    ingest(kb, range(30))
+
+    kb.apply_changes([], [str(doc_id) for doc_id in range(4)])
+    assert builds == [30]
+    kb.apply_changes([], [str(doc_id) for doc_id in range(4, 8)])
+
+    assert builds == [30, 22]
+    assert kb.index.tombstones == 0
+    assert len(kb.index) == len(kb.chunks) == 22
+    assert not any(chunk.get("deleted") for chunk in kb.chunks)
+
+
+def test_replaced_document_is_searchable_under_the_same_id(tmp_path, monkeypatch):
+    kb, _ = make_kb(tmp_path, monkeypatch)
+    ingest(kb, range(24))
+
+    ingest(kb, [3], topic=2)
+
+    results = kb.search(document(2, 3), top_k=1)
+    assert results[0]["doc_id"] == "3"
+    assert "sourdough" in results[0]["text"]
+    assert kb.list_documents()[-1]["doc_id"] == "3"
+
+
+def test_drift_triggers_retrain():
+    rng = np.random.default_rng(0)
+    index = VectorIndex(16)
+    cluster = normalize_rows(np.tile(np.eye(16, dtype=np.float32)[0], (50, 1)) + 0.01 * rng.standard_normal((50, 16)).astype(np.float32))
+    index.add(cluster)
+    index.build_ivf(n_lists=2)
+    assert not index.needs_retrain()
+
+    index.add(normalize_rows(rng.standard_normal((50, 16)).astype(np.float32)))
+
+    assert index.drift > knowledge_base.KB_IVF_MAX_DRIFT
+    assert index.needs_retrain()
+
+
+def test_tombstones_survive_reload(tmp_path, monkeypatch):
+    kb, _ = make_kb(tmp_path, monkeypatch)
+    ingest(kb, range(24))
+    kb.remove_document("7")
+
+    reopened = KnowledgeBase(str(tmp_path / "kb"))
+
+    assert reopened.index.has_ivf
+    assert reopened.index.tombstones == 1
+    assert reopened.list_documents() and "7" not in {doc["doc_id"] for doc in reopened.list_documents()}
+    assert all(result["doc_id"] != "7" for result in reopened.search(document(3, 7), top_k=10))
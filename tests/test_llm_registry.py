@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("crewai")
+
+from llm_registry import LLMRegistry, StubLLM
+
+
+@pytest.mark.parametrize("provider, model, expected", [
+    ("impact", "impact-storm-11", "gemini/gemini-2.5-flash-preview-04-17"),
+    ("google", "gemini-2.0-flash", "gemini/gemini-2.0-flash"),
+    ("openai", "gpt-4o-mini", "openai/gpt-4o-mini"),
+    ("anthropic", "claude-sonnet", "anthropic/claude-sonnet"),
+    ("mistral", "mistral-large", "mistral/mistral-large"),
+    ("openai", "azure/gpt-4o", "azure/gpt-4o"),
+    ("stub", "fixed", "stub/fixed"),
+])
+def test_provider_and_model_resolve_to_litellm_model(provider, model, expected):
+    assert LLMRegistry.resolve_model(provider, model) == expected
+
+
+def test_agent_key_wins_and_masked_key_uses_the_server_pool(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "server-key")
+    monkeypatch.setenv("INTERNAL_GEMINI_API_KEY", "internal-key")
+
+    assert LLMRegistry.api_key("openai", "agent-key") == "agent-key"
+    assert LLMRegistry.api_key("openai", "****") == "server-key"
+    assert LLMRegistry.api_key("google", None, gemini_key_env="INTERNAL_GEMINI_API_KEY") == "internal-key"
+    assert LLMRegistry.api_key("stub") is None
+
+
+def test_stub_provider_routes_to_an_offline_client_and_is_cached():
+    registry = LLMRegistry()
+
+    first = registry.for_agent({"llmProvider": "stub", "llmModel": "echo"})
+    again = registry.for_agent({"llmProvider": "stub", "llmModel": "echo"})
+    other = registry.for_agent({"llmProvider": "stub", "llmModel": "fixed"})
+
+    assert isinstance(first, StubLLM)
+    assert first is again
+    assert other is not first
+
+
+def test_internal_agents_follow_the_agent_override():
+    registry = LLMRegistry()
+    agent = {"llmProvider": "openai", "llmModel": "gpt-4o", "internalLlmProvider": "stub", "internalLlmModel": "payload"}
+
+    internal = registry.internal_for_agent(agent)
+
+    assert isinstance(internal, StubLLM)
+    assert internal is registry.client("stub", "payload")
+
+
+def test_stub_llm_echoes_the_last_user_message_or_a_fixed_reply():
+    echo = StubLLM(response=None)
+    messages = [{"role": "system", "content": "be brief"}, {"role": "user", "content": "first"}, {"role": "user", "content": "ping"}]
+
+    assert echo.call(messages).endswith("Final Answer: ping")
+    assert echo.calls == 1
+    assert StubLLM(response="pong").call("anything").endswith("Final Answer: pong")
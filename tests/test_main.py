@@ -0,0 +1,216 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("crewai")
+pytest.importorskip("langchain")
+
+from fastapi.testclient import TestClient
+
+import main
+import multi_agent_executor
+import task_executor
+from artifact_store import ArtifactStore
+from batch_store import BatchStore
+from checkpoint_store import CheckpointStore
+from response_cache import ResponseCache
+
+AGENTS = [
+    {"id": agent_id, "name": role, "role": role, "goal": f"Act as {role}", "backstory": f"An experienced {role}.",
+     "instructions": instructions, "expectedOutput": "Text", "llmProvider": "stub", "llmModel": "echo", "tools": []}
+    for agent_id, role, instructions in [
+        ("a1", "Extractor", "Extractor step"),
+        ("a2", "Summarizer", "Summarizer step"),
+        ("a3", "Reporter", "Reporter step"),
+        ("b1", "Translator", "Translate {{input}}"),
+        ("c1", "Greeter", "Greet {{input}}"),
+        ("c2", "Order desk", "Look up {{input}}")
+    ]
+]
+for agent in AGENTS:
+    if agent["id"] in ("c1", "c2"):
+        agent["responseCache"] = {"enabled": True}
+
+ORDERS_SCHEMA = {
+    "openapi": "3.0.0",
+    "info": {"title": "Orders"},
+    "servers": [{"url": "https://api.example.com"}],
+    "paths": {"/orders": {"get": {"operationId": "listOrders", "summary": "Lists orders."}}}
+}
+
+WORKFLOW = {
+    "id": "ma-1",
+    "agent_ids": ["a1", "a2", "a3"],
+    "llmProvider": "stub",
+    "llmModel": "echo",
+    "execution_mode": "workflow",
+    "steps": [
+        {"id": "extract", "agent_id": "a1", "inputs": ["input"]},
+        {"id": "summarize", "agent_id": "a2", "inputs": ["extract"]},
+        {"id": "report", "agent_id": "a3", "inputs": ["summarize"]}
+    ]
+}
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    """The app with its checkpoints, artifacts, batches, logs and configs under tmp_path; crews record what they run."""
+    monkeypatch.setattr(main, "checkpoint_store", CheckpointStore(str(tmp_path / "checkpoints")))
+    monkeypatch.setattr(main, "artifact_store", ArtifactStore(str(tmp_path / "artifacts")))
+    monkeypatch.setattr(main, "batch_store", BatchStore(str(tmp_path / "batches")))
+    monkeypatch.setattr(main, "response_cache", ResponseCache(str(tmp_path / "responses")))
+    monkeypatch.setattr(main, "LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "load_multi_agents", lambda: [dict(WORKFLOW)])
+    monkeypatch.setattr(main, "load_agents", lambda: [dict(agent) for agent in AGENTS])
+    monkeypatch.setattr(main, "load_custom_tools", lambda: [])
+    monkeypatch.setattr(main, "load_connectors", lambda: [])
+    calls = []
+
+    class RecordingCrew:
+        def __init__(self, agents, tasks, step_callback=None, **kwargs):
+            self.role = agents[0].role
+            self.step_input = tasks[0].description.split("Input to process: ", 1)[-1]
+
+        def kickoff(self):
+            calls.append((self.role, self.step_input) if self.role == "Translator" else self.role)
+            return SimpleNamespace(raw=f"{self.role} handled <{self.step_input}>")
+
+    monkeypatch.setattr(multi_agent_executor, "Crew", RecordingCrew)
+    monkeypatch.setattr(task_executor, "Crew", RecordingCrew)
+    return SimpleNamespace(client=TestClient(main.app), calls=calls)
+
+
+def interrupted_checkpoint(execution_id):
+    """Checkpoint of a run cancelled after its first step completed."""
+    main.checkpoint_store.create(execution_id, "ma-1", "Quarterly numbers")
+    artifact = main.artifact_store.put(execution_id, "step:extract", "Extractor handled <Quarterly numbers>")
+    main.checkpoint_store.save_step(execution_id, "extract", {"status": "completed", "agent_id": "a1", "artifact_id": artifact["id"]})
+    main.checkpoint_store.finish(execution_id, "cancelled", error="Error: Execution cancelled (stopped by user)")
+
+
+def test_resume_endpoint_runs_only_the_incomplete_steps(app):
+    interrupted_checkpoint("exec-1")
+
+    response = app.client.post("/api/multi_agent/resume/exec-1")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["type"] == "text"
+    assert "Reporter handled <Summarizer handled <Extractor handled <Quarterly numbers>>>" in body["content"]["response"]
+    assert app.calls == ["Summarizer", "Reporter"]
+    assert main.checkpoint_store.load("exec-1")["status"] == "completed"
+
+
+def test_resuming_a_completed_execution_returns_the_stored_result(app):
+    main.checkpoint_store.create("exec-2", "ma-1", "Quarterly numbers")
+    main.checkpoint_store.finish("exec-2", "completed", final_output="Stored report")
+
+    response = app.client.post("/api/multi_agent/resume/exec-2")
+
+    assert response.json()["content"]["response"] == "Stored report"
+    assert app.calls == []
+
+
+def test_resume_without_checkpoint_is_not_found(app):
+    assert app.client.post("/api/multi_agent/resume/unknown").status_code == 404
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+
+def test_batch_file_upload_runs_every_row(app):
+    response = app.client.post("/api/agents/b1/batch", files={"file": ("items.csv", b"input\nhello\nthanks\n", "text/csv")})
+
+    lines = ndjson(response)
+    assert lines[0]["type"] == "batch" and lines[0]["total"] == 2
+    items = sorted((line for line in lines if line["type"] == "item"), key=lambda line: line["index"])
+    assert [item["output"] for item in items] == ["Translator handled <Translate 'hello'>", "Translator handled <Translate 'thanks'>"]
+    assert lines[-1] == {"type": "summary", "batch_id": lines[0]["batch_id"], "status": "completed", "counts": {"completed": 2, "failed": 0, "cancelled": 0}}
+
+
+def test_resumed_batch_reruns_only_incomplete_items(app):
+    batch = main.batch_store.create("b1", ["one", "two", "three"], "exec-1")
+    main.batch_store.record(batch["batch_id"], {"index": 0, "status": "completed", "output": "first run"})
+    main.batch_store.record(batch["batch_id"], {"index": 1, "status": "failed", "error": "timeout"})
+    main.batch_store.finish(batch["batch_id"], "failed")
+
+    response = app.client.post("/api/agents/b1/batch", json={"resumeBatchId": batch["batch_id"]})
+
+    lines = ndjson(response)
+    assert lines[0]["scheduled"] == 2
+    assert sorted(line["index"] for line in lines if line["type"] == "item") == [1, 2]
+    assert sorted(app.calls) == [("Translator", "Translate 'three'"), ("Translator", "Translate 'two'")]
+    assert lines[-1]["status"] == "completed"
+    results = main.batch_store.results(batch["batch_id"])
+    assert results[0]["output"] == "first run"
+    assert {index: result["status"] for index, result in results.items()} == {0: "completed", 1: "completed", 2: "completed"}
+    assert main.batch_store.load(batch["batch_id"])["execution_ids"][0] == "exec-1"
+
+
+def test_resuming_a_batch_of_another_agent_is_not_found(app):
+    batch = main.batch_store.create("a1", ["one"], "exec-1")
+
+    response = app.client.post("/api/agents/b1/batch", json={"resumeBatchId": batch["batch_id"]})
+
+    assert response.status_code == 404
+
+
+class NotFoundResponse:
+    status_code = 404
+    encoding = "utf-8"
+    headers = {}
+
+    def iter_content(self, chunk_size=None):
+        yield b'{"detail": "Order not found"}'
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def order_desk(app, monkeypatch):
+    """The Order desk agent answers with its orders tool's result, which is a 404 error."""
+    executors = []
+
+    class RecordingTaskExecutor(main.TaskExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            executors.append(self)
+
+    class ToolAnsweringCrew:
+        def __init__(self, agents, tasks, step_callback=None, **kwargs):
+            self.agent = agents[0]
+
+        def kickoff(self):
+            executor = executors[-1]
+            if self.agent is executor.payload_agent:
+                return SimpleNamespace(raw='{"payload": null, "endpoint_url": "https://api.example.com/orders"}')
+            app.calls.append(self.agent.role)
+            return SimpleNamespace(raw=str(executor.tools[0].func("order 42")))
+
+    monkeypatch.setattr(main, "TaskExecutor", RecordingTaskExecutor)
+    monkeypatch.setattr(main, "load_agent_tools_config", lambda agent, logger: [{"id": "orders", "schema": ORDERS_SCHEMA}] if agent["id"] == "c2" else [])
+    monkeypatch.setattr(main, "tool_http_client", SimpleNamespace(request=lambda method, url, **kwargs: NotFoundResponse()))
+    monkeypatch.setattr(task_executor, "Crew", ToolAnsweringCrew)
+    return app
+
+
+def test_repeated_request_is_served_from_the_response_cache(app):
+    first = app.client.post("/api/agent/infer", json={"agentId": "c1", "userInput": "Ada"})
+    second = app.client.post("/api/agent/infer", json={"agentId": "c1", "userInput": " Ada "})
+
+    assert first.headers["X-Cache"] == "MISS" and second.headers["X-Cache"] == "HIT"
+    assert second.json()["content"] == first.json()["content"]
+    assert app.calls == ["Greeter"]
+
+
+def test_tool_error_returned_as_the_answer_is_not_cached(order_desk):
+    first = order_desk.client.post("/api/agent/infer", json={"agentId": "c2", "userInput": "order 42"})
+    second = order_desk.client.post("/api/agent/infer", json={"agentId": "c2", "userInput": "order 42"})
+
+    assert "Order not found" in first.json()["content"]["text"]
+    assert first.headers["X-Cache"] == "MISS" and second.headers["X-Cache"] == "MISS"
+    assert order_desk.calls == ["Order desk", "Order desk"]
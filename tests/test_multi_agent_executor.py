@@ -0,0 +1,259 @@
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("crewai")
+pytest.importorskip("langchain")
+
+import multi_agent_executor
+from artifact_store import ArtifactStore
+from cancellation import CancellationToken
+from checkpoint_store import CheckpointStore
+from multi_agent_executor import MultiAgentExecutor
+
+
+def worker(agent_id, role):
+    return {
+        "id": agent_id,
+        "name": role,
+        "role": role,
+        "goal": f"Act as {role}",
+        "backstory": f"An experienced {role}.",
+        "instructions": f"{role} step",
+        "expectedOutput": "Text",
+        "llmProvider": "stub",
+        "llmModel": "echo",
+        "tools": []
+    }
+
+
+WORKERS = [worker("a1", "Extractor"), worker("a2", "Summarizer"), worker("a3", "Reporter")]
+
+WORKFLOW = {
+    "id": "ma-1",
+    "role": "Coordinator",
+    "goal": "Coordinate",
+    "backstory": "Coordinates workers.",
+    "description": "Handle the request",
+    "expected_output": "Report",
+    "agent_ids": ["a1", "a2", "a3"],
+    "llmProvider": "stub",
+    "llmModel": "echo",
+    "execution_mode": "workflow",
+    "steps": [
+        {"id": "extract", "agent_id": "a1", "inputs": ["input"]},
+        {"id": "summarize", "agent_id": "a2", "inputs": ["extract"]},
+        {"id": "report", "agent_id": "a3", "inputs": ["summarize"]}
+    ]
+}
+
+
+class ScriptedCrews:
+    """
+    Stands in for crewai.Crew: every worker answers with its role and the input it received, so
+    outputs are deterministic. The role in interrupt_at is cancelled by the user mid-step.
+    """
+    def __init__(self, interrupt_at=None, cancel_token=None):
+        self.calls = []
+        self.interrupt_at = interrupt_at
+        self.cancel_token = cancel_token
+        scripted = self
+
+        class Crew:
+            def __init__(self, agents, tasks, step_callback=None, **kwargs):
+                self.agent = agents[0]
+                self.task = tasks[0]
+                self.step_callback = step_callback
+
+            def kickoff(self):
+                role = self.agent.role
+                scripted.calls.append(role)
+                if role == scripted.interrupt_at:
+                    scripted.cancel_token.cancel("stopped by user")
+                step_input = self.task.description.split("Input to process: ", 1)[-1]
+                output = f"{role} handled <{step_input}>"
+                # The callback raises ExecutionCancelled for the cancelled step, like a real crew step
+                self.step_callback(SimpleNamespace(output=output))
+                return SimpleNamespace(raw=output)
+
+        self.Crew = Crew
+
+
+@pytest.fixture
+def stores(tmp_path):
+    return CheckpointStore(str(tmp_path / "checkpoints")), ArtifactStore(str(tmp_path / "artifacts"))
+
+
+def run_workflow(monkeypatch, stores, execution_id, crews, resume=False, cancel_token=None):
+    monkeypatch.setattr(multi_agent_executor, "Crew", crews.Crew)
+    checkpoint_store, artifact_store = stores
+    executor = MultiAgentExecutor(
+        multi_agent_config={**WORKFLOW},
+        worker_agent_configs=[dict(config) for config in WORKERS],
+        execution_id=execution_id,
+        checkpoint_store=checkpoint_store,
+        artifact_store=artifact_store,
+        cancel_token=cancel_token
+    )
+    return executor, executor.execute_task("Quarterly numbers", resume=resume)
+
+
+def test_resumed_workflow_skips_completed_steps_and_matches_an_uninterrupted_run(monkeypatch, stores, tmp_path):
+    checkpoint_store, _ = stores
+    _, expected = run_workflow(monkeypatch, (CheckpointStore(str(tmp_path / "clean")), ArtifactStore(str(tmp_path / "clean-artifacts"))), "clean-run", ScriptedCrews())
+
+    token = CancellationToken()
+    interrupted = ScriptedCrews(interrupt_at="Summarizer", cancel_token=token)
+    _, first_result = run_workflow(monkeypatch, stores, "exec-1", interrupted, cancel_token=token)
+
+    assert first_result.startswith("Error: Execution cancelled")
+    assert interrupted.calls == ["Extractor", "Summarizer"]
+    checkpoint = checkpoint_store.load("exec-1")
+    assert checkpoint["status"] == "cancelled"
+    assert set(checkpoint_store.completed_steps("exec-1")) == {"extract"}
+
+    resumed = ScriptedCrews()
+    executor, result = run_workflow(monkeypatch, stores, "exec-1", resumed, resume=True)
+
+    # The completed step is restored from its artifact instead of calling the LLM again
+    assert resumed.calls == ["Summarizer", "Reporter"]
+    assert executor.step_results["summarize"]["output"] == "Summarizer handled <Extractor handled <Quarterly numbers>>"
+    assert result == expected
+    checkpoint = checkpoint_store.load("exec-1")
+    assert checkpoint["status"] == "completed" and checkpoint["resumed_count"] == 1
+    assert set(checkpoint_store.completed_steps("exec-1")) == {"extract", "summarize", "report"}
+
+
+def test_step_with_a_missing_artifact_runs_again_on_resume(monkeypatch, stores):
+    checkpoint_store, artifact_store = stores
+    token = CancellationToken()
+    run_workflow(monkeypatch, stores, "exec-2", ScriptedCrews(interrupt_at="Summarizer", cancel_token=token), cancel_token=token)
+    artifact_store.delete_execution("exec-2")
+
+    resumed = ScriptedCrews()
+    _, result = run_workflow(monkeypatch, stores, "exec-2", resumed, resume=True)
+
+    assert resumed.calls == ["Extractor", "Summarizer", "Reporter"]
+    assert "Reporter handled <Summarizer handled <Extractor handled <Quarterly numbers>>>" in result
+
+
+def fan_out(monkeypatch, stores, crew_class, **config):
+    monkeypatch.setattr(multi_agent_executor, "Crew", crew_class)
+    checkpoint_store, artifact_store = stores
+    executor = MultiAgentExecutor(
+        multi_agent_config={**WORKFLOW, "execution_mode": "parallel", "agent_ids": ["a1", "a2"], **config},
+        worker_agent_configs=[dict(config) for config in WORKERS[:2]],
+        checkpoint_store=checkpoint_store,
+        artifact_store=artifact_store
+    )
+    return executor, executor.execute_task("Quarterly numbers")
+
+
+def test_fan_out_runs_workers_concurrently_and_merges_in_agent_order(monkeypatch, stores):
+    both_running = threading.Barrier(2)
+
+    class ConcurrentCrew:
+        def __init__(self, agents, tasks, **kwargs):
+            self.role = agents[0].role
+
+        def kickoff(self):
+            # Each branch waits for the other, so this only completes when they run at the same time
+            both_running.wait(timeout=5)
+            if self.role == "Extractor":
+                time.sleep(0.05)
+            return SimpleNamespace(raw=f"{self.role} answer")
+
+    executor, result = fan_out(monkeypatch, stores, ConcurrentCrew)
+
+    assert {step_id: step["status"] for step_id, step in executor.step_results.items()} == {"a1": "completed", "a2": "completed"}
+    assert result.index("Extractor Output: Extractor answer") < result.index("Summarizer Output: Summarizer answer")
+
+
+def test_failed_branch_is_reported_alongside_the_others(monkeypatch, stores):
+    class PartlyFailingCrew:
+        def __init__(self, agents, tasks, **kwargs):
+            self.role = agents[0].role
+
+        def kickoff(self):
+            if self.role == "Summarizer":
+                raise RuntimeError("model unavailable")
+            return SimpleNamespace(raw=f"{self.role} answer")
+
+    _, result = fan_out(monkeypatch, stores, PartlyFailingCrew, merge_template="{{name}} [{{status}}]: {{output}}")
+
+    assert "Extractor [completed]: Extractor answer" in result
+    assert "Summarizer [failed]: [failed: model unavailable]" in result
+
+
+def test_slow_branch_times_out_and_stops_at_its_next_step(monkeypatch, stores):
+    steps_taken = []
+
+    class SlowCrew:
+        def __init__(self, agents, tasks, step_callback=None, **kwargs):
+            self.role = agents[0].role
+            self.step_callback = step_callback
+
+        def kickoff(self):
+            for step in range(40 if self.role == "Summarizer" else 1):
+                time.sleep(0.05)
+                self.step_callback(SimpleNamespace(text=f"step {step}"))
+                steps_taken.append(self.role)
+            return SimpleNamespace(raw=f"{self.role} answer")
+
+    executor, result = fan_out(monkeypatch, stores, SlowCrew, branch_timeout=0.2, merge_template="{{name}} [{{status}}]")
+
+    assert executor.step_results["a1"]["status"] == "completed"
+    assert executor.step_results["a2"]["status"] == "timed_out"
+    assert "Summarizer [timed_out]" in result
+    # The abandoned branch raised at a step after its timeout instead of running all 40
+    assert steps_taken.count("Summarizer") < 40
+
+
+def sequential(monkeypatch, stores, manager_answer):
+    """Runs a1 then a2 in sequential mode; the manager answers with manager_answer(its prompt)."""
+    class ReferencingCrew:
+        def __init__(self, agents, tasks, **kwargs):
+            self.role = agents[0].role
+            self.description = tasks[0].description
+
+        def kickoff(self):
+            if self.role == "Coordinator":
+                return SimpleNamespace(raw=manager_answer(self.description))
+            # Long, multi-line outputs the manager only ever sees as a reference and preview
+            return SimpleNamespace(raw=f"{self.role} report\n" + "detail line\n" * 200)
+
+    monkeypatch.setattr(multi_agent_executor, "Crew", ReferencingCrew)
+    checkpoint_store, artifact_store = stores
+    executor = MultiAgentExecutor(
+        multi_agent_config={**WORKFLOW, "execution_mode": "sequential", "agent_ids": ["a1", "a2"]},
+        worker_agent_configs=[dict(config) for config in WORKERS[:2]],
+        checkpoint_store=checkpoint_store,
+        artifact_store=artifact_store
+    )
+    return executor.execute_task("Quarterly numbers")
+
+
+def test_manager_references_expand_to_the_full_worker_outputs(monkeypatch, stores):
+    prompts = []
+
+    def manager_answer(prompt):
+        prompts.append(prompt)
+        references = re.findall(r"\{\{artifact:[0-9a-f]{12}\}\}", prompt)
+        return f"Summary\nFirst: {references[0]}\nSecond: {references[1]}"
+
+    result = sequential(monkeypatch, stores, manager_answer)
+
+    assert "detail line\n" * 200 not in prompts[0]
+    assert result.startswith("Summary\nFirst: Extractor report\n" + "detail line\n" * 200)
+    assert "Second: Summarizer report\n" in result
+
+
+def test_manager_answer_without_references_falls_back_to_server_side_assembly(monkeypatch, stores):
+    result = sequential(monkeypatch, stores, lambda prompt: "I summarized everything in my own words.")
+
+    assert "Extractor Output: Extractor report\n" in result
+    assert "Summarizer Output: Summarizer report\n" in result
+    assert "own words" not in result
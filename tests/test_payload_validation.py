@@ -0,0 +1,89 @@
+import pytest
+
+from payload_validation import compile_validator, operation_validator, repair_feedback
+from tool_digest import build_operation_index
+
+SCHEMA = {
+    "openapi": "3.0.0",
+    "paths": {
+        "/bookings": {
+            "post": {
+                "operationId": "createBooking",
+                "parameters": [{"name": "dryRun", "in": "query", "required": True, "schema": {"type": "boolean"}}],
+                "requestBody": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/Booking"}}}}
+            }
+        }
+    },
+    "components": {
+        "schemas": {
+            "Booking": {
+                "type": "object",
+                "required": ["guests", "date"],
+                "additionalProperties": False,
+                "properties": {
+                    "guests": {"type": "integer", "minimum": 1, "maximum": 8},
+                    "date": {"type": "string", "format": "date"},
+                    "room": {"type": "string", "enum": ["single", "double"]},
+                    "note": {"type": "string", "nullable": True, "maxLength": 10},
+                    "parent": {"$ref": "#/components/schemas/Booking"}
+                }
+            }
+        }
+    }
+}
+
+
+@pytest.fixture
+def validate():
+    index = build_operation_index(SCHEMA)
+    return operation_validator(SCHEMA, index["schema_hash"], index["operations"][0])
+
+
+def test_valid_payload_has_no_errors(validate):
+    assert validate({"dryRun": False, "guests": 2.0, "date": "2026-10-19", "room": "double", "note": None}) == []
+
+
+def test_every_violation_is_reported_with_its_path(validate):
+    errors = validate({"guests": 12, "date": "19/10/2026", "room": "suite", "note": "x" * 11, "floor": 3})
+
+    assert errors == [
+        "payload.dryRun: is required",
+        "payload.guests: must be <= 8",
+        "payload.date: is not a valid date",
+        "payload.room: \"suite\" is not one of ['single', 'double']",
+        "payload.note: length must be between 0 and 10",
+        "payload.floor: is not an allowed property"
+    ]
+
+
+def test_recursive_refs_are_validated_at_depth(validate):
+    booking = {"dryRun": True, "guests": 1, "date": "2026-10-19", "parent": {"guests": 0, "date": "2026-10-18", "parent": {"date": True}}}
+
+    assert validate(booking) == [
+        "payload.parent.guests: must be >= 1",
+        "payload.parent.parent.guests: is required",
+        "payload.parent.parent.date: expected string, got bool"
+    ]
+
+
+def test_validators_are_compiled_once_per_schema_and_operation():
+    index = build_operation_index(SCHEMA)
+    operation = index["operations"][0]
+
+    assert operation_validator(SCHEMA, index["schema_hash"], operation) is operation_validator(SCHEMA, index["schema_hash"], operation)
+
+
+def test_one_of_requires_exactly_one_match():
+    validate = compile_validator({"oneOf": [{"type": "integer"}, {"type": "number"}]}, {})
+
+    assert validate("3") == ["payload: must match exactly one of the oneOf schemas"]
+    # 3 is both an integer and a number
+    assert validate(3) == ["payload: must match exactly one of the oneOf schemas"]
+    assert validate(3.5) == []
+
+
+def test_repair_feedback_lists_the_payload_and_every_error():
+    feedback = repair_feedback({"guests": 12}, ["payload.guests: must be <= 8", "payload.date: is required"])
+
+    assert 'returned this payload: {"guests": 12}' in feedback
+    assert "- payload.guests: must be <= 8\n- payload.date: is required" in feedback
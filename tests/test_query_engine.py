@@ -0,0 +1,201 @@
+from contextlib import contextmanager
+
+import pytest
+
+from query_engine import (
+    ALL_TABLES,
+    DataQueryEngine,
+    QueryError,
+    QueryResultCache,
+    normalize_sql,
+    referenced_tables,
+    validate_read_only
+)
+
+
+def test_validate_returns_query_as_written_without_trailing_semicolon():
+    assert validate_read_only("SELECT *\n  FROM users ;  ") == "SELECT *\n  FROM users"
+
+
+def test_whitespace_inside_literals_is_preserved():
+    assert validate_read_only("SELECT * FROM users WHERE name = 'a  b';") == "SELECT * FROM users WHERE name = 'a  b'"
+    assert normalize_sql("SELECT  *  FROM users WHERE name = 'a  b'") == "SELECT * FROM users WHERE name = 'a  b'"
+
+
+def test_double_dash_inside_literal_is_not_a_comment():
+    sql = "SELECT * FROM logs WHERE message = 'a -- b' AND level = 'error'"
+    assert validate_read_only(sql) == sql
+    assert normalize_sql(sql) == sql
+
+
+def test_block_comment_markers_inside_literal_are_kept():
+    sql = "SELECT '/* not a comment */' AS text"
+    assert validate_read_only(sql) == sql
+
+
+def test_semicolon_inside_literal_is_allowed():
+    sql = "SELECT * FROM notes WHERE body = 'first; second'"
+    assert validate_read_only(sql + ";") == sql
+
+
+def test_semicolon_inside_quoted_identifier_is_allowed():
+    sql = 'SELECT "odd;column" FROM t'
+    assert validate_read_only(sql) == sql
+
+
+def test_escaped_quote_inside_literal():
+    sql = "SELECT * FROM users WHERE name = 'O''Brien; x'"
+    assert validate_read_only(sql) == sql
+
+
+def test_second_statement_is_rejected():
+    with pytest.raises(QueryError, match="single statement"):
+        validate_read_only("SELECT 1; DROP TABLE users")
+    with pytest.raises(QueryError, match="single statement"):
+        validate_read_only("SELECT 'a;b'; DELETE FROM users")
+
+
+def test_statement_hidden_after_literal_is_rejected():
+    with pytest.raises(QueryError):
+        validate_read_only("SELECT 'x'; DROP TABLE users; --'")
+
+
+def test_write_statements_are_rejected():
+    with pytest.raises(QueryError, match="read-only"):
+        validate_read_only("DELETE FROM users WHERE note = 'select'")
+    with pytest.raises(QueryError, match="read-only"):
+        validate_read_only("/* select */ UPDATE users SET name = 'x'")
+
+
+def test_leading_comment_before_select_is_allowed():
+    assert validate_read_only("-- report\nSELECT 1;") == "-- report\nSELECT 1"
+
+
+def test_trailing_comment_after_semicolon():
+    assert validate_read_only("SELECT 1; -- done") == "SELECT 1 -- done"
+
+
+def test_unterminated_literal_is_rejected():
+    with pytest.raises(QueryError, match="Unterminated"):
+        validate_read_only("SELECT 'abc")
+
+
+def test_empty_query_is_rejected():
+    with pytest.raises(QueryError, match="empty"):
+        validate_read_only("  -- nothing\n ; ")
+
+
+def test_cache_key_ignores_formatting_but_not_literal_contents():
+    limits = {"max_rows": 10, "max_bytes": 100}
+    key = lambda sql: QueryResultCache.key("c1", normalize_sql(validate_read_only(sql)), None, limits)
+    assert key("select * from t where a = 'x'") == key("SELECT *\n FROM t -- comment\n WHERE a = 'x';")
+    assert key("SELECT * FROM t WHERE a = 'x'") != key("SELECT * FROM t WHERE a = 'X'")
+    assert key("SELECT * FROM t WHERE a = 'a  b'") != key("SELECT * FROM t WHERE a = 'a b'")
+
+
+def test_comma_join_records_every_table_in_the_from_list():
+    assert referenced_tables("SELECT * FROM a, b") == {"a", "b"}
+    assert referenced_tables('SELECT * FROM public.a x, "S"."B" AS y, c WHERE x.id = y.id') == {"a", "b", "c"}
+    assert referenced_tables("SELECT * FROM a JOIN b ON a.id = b.id, c ORDER BY 1") == {"a", "b", "c"}
+
+
+def test_subqueries_and_ctes_add_their_tables():
+    assert referenced_tables("SELECT * FROM (SELECT id FROM a) s, b") == {"a", "b"}
+    assert referenced_tables("SELECT * FROM t WHERE x IN (SELECT y FROM u, v) GROUP BY a, b") == {"t", "u", "v"}
+    assert referenced_tables("SELECT EXTRACT(YEAR FROM created_at) FROM orders") == {"orders"}
+
+
+def test_undeterminable_from_list_depends_on_all_tables():
+    assert referenced_tables("SELECT * FROM generate_series(1, 3) g") == {ALL_TABLES}
+    assert referenced_tables("SELECT * FROM a LEFT JOIN (b JOIN c ON true) ON true") == {ALL_TABLES}
+
+
+def test_invalidating_the_second_table_of_a_comma_join_drops_the_result():
+    cache = QueryResultCache()
+    limits = {"max_rows": 10, "max_bytes": 100}
+    joined = QueryResultCache.key("c1", "SELECT * FROM a, b", None, limits)
+    unknown = QueryResultCache.key("c1", "SELECT * FROM generate_series(1, 3)", None, limits)
+    other = QueryResultCache.key("c1", "SELECT * FROM a", None, limits)
+    for key in (joined, unknown, other):
+        cache.set(key, {"rows": []})
+
+    assert cache.invalidate_tables("c1", ["public.b"]) == 2
+    assert cache.get(joined) is None and cache.get(unknown) is None
+    assert cache.get(other) is not None
+
+
+class FakeCursor:
+    """Mimics psycopg2: a named (server-side) cursor can only be declared for a query."""
+    def __init__(self, connection, name):
+        self.connection = connection
+        self.name = name
+        self.description = None
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        self.connection.executed.append((self.name, statement))
+        if statement.startswith("SET "):
+            return
+        if self.name and statement.split()[0].lower() not in ("select", "with", "values", "table"):
+            raise AssertionError(f"DECLARE CURSOR does not accept: {statement}")
+        self.description = [("QUERY PLAN",)]
+        self._rows = [(f"line {n}",) for n in range(10)]
+
+    def fetchmany(self, size):
+        batch, self._rows = self._rows[:size], self._rows[size:]
+        return batch
+
+
+class FakeConnection:
+    def __init__(self):
+        self.executed = []
+
+    def cursor(self, name=None):
+        return FakeCursor(self, name)
+
+
+class FakePools:
+    def __init__(self):
+        self.conn = FakeConnection()
+
+    @contextmanager
+    def connection(self, connector_id, connector):
+        yield self.conn
+
+
+def postgres_engine():
+    return DataQueryEngine(FakePools(), bigquery_clients=None, max_rows=3, fetch_size=2)
+
+
+def test_explain_runs_on_a_plain_cursor_with_the_row_cap():
+    engine = postgres_engine()
+
+    result = engine.execute({"id": "pg", "connectorType": "postgres"}, "EXPLAIN SELECT * FROM orders")
+
+    assert (None, "EXPLAIN SELECT * FROM orders") in engine.postgres_pools.conn.executed
+    assert result["headers"] == ["QUERY PLAN"]
+    assert result["row_count"] == 3 and result["truncated"]
+
+
+def test_show_runs_on_a_plain_cursor_with_the_row_cap():
+    engine = postgres_engine()
+
+    result = engine.execute({"id": "pg", "connectorType": "postgres"}, "-- settings\nSHOW search_path;")
+
+    assert (None, "-- settings\nSHOW search_path") in engine.postgres_pools.conn.executed
+    assert result["row_count"] == 3 and result["truncated"]
+
+
+def test_select_still_uses_a_server_side_cursor():
+    engine = postgres_engine()
+
+    engine.execute({"id": "pg", "connectorType": "postgres"}, "SELECT * FROM orders")
+
+    name, statement = engine.postgres_pools.conn.executed[-1]
+    assert statement == "SELECT * FROM orders" and name.startswith("data_query_")
@@ -0,0 +1,62 @@
+import json
+import os
+import time
+
+import pytest
+
+from response_cache import ResponseCache, agent_config_fingerprint
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path), default_ttl=60)
+
+
+def test_key_ignores_surrounding_whitespace_but_not_the_config():
+    fingerprint = agent_config_fingerprint({"id": "a1", "instructions": "Answer"}, [])
+    edited = agent_config_fingerprint({"id": "a1", "instructions": "Answer briefly"}, [])
+
+    assert ResponseCache.key("a1", fingerprint, " hello ") == ResponseCache.key("a1", fingerprint, "hello")
+    assert ResponseCache.key("a1", fingerprint, "hello") != ResponseCache.key("a1", edited, "hello")
+    assert ResponseCache.key("a1", fingerprint, "hello") != ResponseCache.key("a1", fingerprint, "hello", attachment_hash="abc")
+
+
+def test_tool_changes_change_the_fingerprint():
+    agent = {"id": "a1"}
+    assert agent_config_fingerprint(agent, [{"id": "t1", "schema": {"v": 1}}]) != agent_config_fingerprint(agent, [{"id": "t1", "schema": {"v": 2}}])
+
+
+def test_persistent_entries_survive_a_restart(cache, tmp_path):
+    cache.set("a1", "k1", "stored answer", persistent=True, source_execution_id="exec-1")
+
+    restarted = ResponseCache(str(tmp_path), default_ttl=60)
+
+    assert restarted.get("a1", "k1") is None
+    entry = restarted.get("a1", "k1", persistent=True)
+    assert entry["text"] == "stored answer" and entry["source_execution_id"] == "exec-1"
+    assert restarted.stats()["persistent_hits"] == 1
+    # Promoted to the memory tier
+    assert restarted.get("a1", "k1")["text"] == "stored answer"
+
+
+def test_expired_persistent_entry_is_a_miss_and_removed(cache, tmp_path):
+    cache.set("a1", "k1", "old answer", persistent=True)
+    path = os.path.join(str(tmp_path), "a1", "k1.json")
+    with open(path, encoding="utf-8") as f:
+        entry = json.load(f)
+    entry["expires_at"] = time.time() - 1
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+
+    assert ResponseCache(str(tmp_path)).get("a1", "k1", persistent=True) is None
+    assert not os.path.exists(path)
+
+
+def test_invalidate_agent_drops_both_tiers(cache):
+    cache.set("a1", "k1", "memory only")
+    cache.set("a1", "k2", "on disk", persistent=True)
+    cache.set("a2", "k1", "other agent")
+
+    assert cache.invalidate_agent("a1") == 3
+    assert cache.get("a1", "k1") is None and cache.get("a1", "k2", persistent=True) is None
+    assert cache.get("a2", "k1")["text"] == "other agent"
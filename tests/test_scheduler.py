@@ -0,0 +1,48 @@
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from scheduler import Scheduler, ScheduleStore, LeaderLock
+from worker_pool import WorkerPool
+
+
+def run_schedules(tmp_path, outcomes):
+    store = ScheduleStore(str(tmp_path / "schedules.json"))
+    results = iter(outcomes)
+    pool = WorkerPool(max_workers=1)
+    scheduler = Scheduler(
+        store,
+        pool,
+        run_target=lambda schedule, execution_id: next(results),
+        log_url_for=lambda schedule, execution_id: f"/logs/{execution_id}",
+        leader_lock=LeaderLock(str(tmp_path / "scheduler.lock")),
+        max_concurrent_runs=len(outcomes)
+    )
+    for index in range(len(outcomes)):
+        store.create({"target_type": "agent", "target_id": f"a{index}", "cron": "@hourly", "user_input": "hi"})
+    scheduler.tick(datetime.now(pytz.UTC) + timedelta(hours=2))
+    deadline = time.monotonic() + 5
+    while pool.stats()["completed"] < len(outcomes) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pool.shutdown()
+    return scheduler, store
+
+
+def test_budget_exceeded_and_cancelled_runs_are_not_counted_as_failures(tmp_path):
+    scheduler, store = run_schedules(tmp_path, [
+        {"status": "completed", "output": "ok"},
+        {"status": "budget_exceeded", "error": "limit of 5 LLM calls exceeded", "output": "partial"},
+        {"status": "cancelled", "error": "cancelled"},
+        {"status": "failed", "error": "boom"},
+        {"status": "unexpected"},
+    ])
+
+    status = scheduler.status()
+    assert status["fired"] == 5
+    assert {key: status[key] for key in ["completed", "budget_exceeded", "cancelled", "failed"]} == {
+        "completed": 1, "budget_exceeded": 1, "cancelled": 1, "failed": 2
+    }
+    runs = {schedule["target_id"]: schedule["runs"][-1] for schedule in store.list()}
+    assert runs["a1"]["status"] == "budget_exceeded"
+    assert runs["a1"]["output_preview"] == "partial"
@@ -0,0 +1,212 @@
+import time
+import threading
+from contextlib import contextmanager
+
+from connector_pools import BigQueryClientCache
+from schema_introspection import SchemaIntrospector, render_schema_digest
+
+BIGQUERY_COLUMNS = [
+    {"table_name": "events", "table_type": "BASE TABLE", "column_name": "id", "data_type": "INT64", "is_nullable": "NO"},
+    {"table_name": "events", "table_type": "BASE TABLE", "column_name": "name", "data_type": "STRING", "is_nullable": "YES"},
+    {"table_name": "daily", "table_type": "VIEW", "column_name": "day", "data_type": "DATE", "is_nullable": "YES"},
+    {"table_name": "users", "table_type": "BASE TABLE", "column_name": "email", "data_type": "STRING", "is_nullable": "YES"},
+]
+BIGQUERY_ROW_COUNTS = [{"table_id": "events", "row_count": 1200}, {"table_id": "users", "row_count": 3}]
+
+
+class StubQueryJob:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def result(self):
+        return iter(self.rows)
+
+
+class StubBigQueryClient:
+    def __init__(self, fail_row_counts=False):
+        self.queries = []
+        self.fail_row_counts = fail_row_counts
+
+    def query(self, sql):
+        self.queries.append(sql)
+        if "__TABLES__" in sql:
+            if self.fail_row_counts:
+                raise RuntimeError("access denied")
+            return StubQueryJob(BIGQUERY_ROW_COUNTS)
+        return StubQueryJob(BIGQUERY_COLUMNS)
+
+    def get_table(self, reference):
+        raise AssertionError("Introspection must not fetch tables one by one")
+
+    def close(self):
+        pass
+
+
+def bigquery_connector(dataset="analytics", connector_id="bq1"):
+    return {
+        "id": connector_id,
+        "uniqueName": "warehouse",
+        "connectorType": "bigquery",
+        "projectId": "proj",
+        "datasetId": dataset,
+        "serviceAccountKey": {"private_key_id": "k"}
+    }
+
+
+def make_introspector(client=None, **kwargs):
+    client = client or StubBigQueryClient()
+    introspector = SchemaIntrospector(None, BigQueryClientCache(client_factory=lambda project, key: client), **kwargs)
+    return introspector, client
+
+
+def test_bigquery_dataset_is_read_with_information_schema():
+    introspector, client = make_introspector()
+
+    schema = introspector.get_schema(bigquery_connector())
+
+    assert len(client.queries) == 2
+    assert "`proj.analytics`.INFORMATION_SCHEMA.COLUMNS" in client.queries[0]
+    tables = {table["name"]: table for table in schema["tables"]}
+    assert list(tables) == ["events", "daily", "users"]
+    assert tables["events"]["row_estimate"] == 1200
+    assert tables["events"]["columns"] == [
+        {"name": "id", "type": "INT64", "nullable": False},
+        {"name": "name", "type": "STRING", "nullable": True}
+    ]
+    assert tables["daily"]["type"] == "view" and tables["daily"]["row_estimate"] is None
+
+
+def test_bigquery_missing_row_counts_do_not_fail_introspection():
+    introspector, _ = make_introspector(StubBigQueryClient(fail_row_counts=True))
+
+    schema = introspector.get_schema(bigquery_connector())
+
+    assert schema["table_count"] == 3
+    assert all(table["row_estimate"] is None for table in schema["tables"])
+
+
+def test_bigquery_max_tables_is_applied():
+    introspector, _ = make_introspector(max_tables=2)
+    assert [table["name"] for table in introspector.get_schema(bigquery_connector())["tables"]] == ["events", "daily"]
+
+
+def test_schema_is_cached_until_ttl_refresh_or_invalidate():
+    introspector, client = make_introspector(ttl=60)
+    connector = bigquery_connector()
+
+    first = introspector.get_schema(connector)
+    assert introspector.get_schema(connector) is first
+    assert len(client.queries) == 2
+
+    introspector.get_schema(connector, refresh=True)
+    assert len(client.queries) == 4
+
+    introspector.invalidate(connector["id"])
+    introspector.get_schema(connector)
+    assert len(client.queries) == 6
+
+
+def test_schema_cache_expires_after_ttl():
+    introspector, client = make_introspector(ttl=0.05)
+    introspector.get_schema(bigquery_connector())
+    time.sleep(0.1)
+    introspector.get_schema(bigquery_connector())
+    assert len(client.queries) == 4
+
+
+def test_changed_connector_settings_are_reintrospected():
+    introspector, client = make_introspector(ttl=60)
+    introspector.get_schema(bigquery_connector(dataset="analytics"))
+    schema = introspector.get_schema(bigquery_connector(dataset="staging"))
+
+    assert len(client.queries) == 4
+    assert schema["tables"][0]["schema"] == "staging"
+
+
+def test_concurrent_callers_share_one_fetch():
+    class SlowClient(StubBigQueryClient):
+        def query(self, sql):
+            time.sleep(0.1)
+            return super().query(sql)
+
+    introspector, client = make_introspector(SlowClient(), ttl=60)
+    schemas = []
+    threads = [threading.Thread(target=lambda: schemas.append(introspector.get_schema(bigquery_connector()))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(client.queries) == 2
+    assert all(schema is schemas[0] for schema in schemas)
+
+
+class StubCursor:
+    def __init__(self, results):
+        self.results = results
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql, params=None):
+        self.rows = next((rows for marker, rows in self.results if marker in sql), [])
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class StubPostgresPools:
+    def __init__(self, results):
+        self.results = results
+        self.borrows = 0
+
+    @contextmanager
+    def connection(self, connector_id, connector):
+        self.borrows += 1
+        conn = type("Conn", (), {"cursor": lambda _: StubCursor(self.results)})()
+        yield conn
+
+
+def test_postgres_introspection_and_digest():
+    pools = StubPostgresPools([
+        ("information_schema.columns", [
+            ("public", "orders", "BASE TABLE", "id", "integer", "NO"),
+            ("public", "orders", "BASE TABLE", "total", "numeric", "YES"),
+            ("sales", "summary", "VIEW", "month", "date", "YES"),
+        ]),
+        ("pg_class", [("public", "orders", 5000), ("sales", "summary", -1)]),
+    ])
+    introspector = SchemaIntrospector(pools, None)
+    connector = {"id": "pg1", "uniqueName": "shop", "connectorType": "postgres", "host": "db", "port": 5432, "database": "shop", "user": "u"}
+
+    schema = introspector.get_schema(connector)
+    introspector.get_schema(connector)
+
+    assert pools.borrows == 1
+    assert render_schema_digest(schema).splitlines() == [
+        "Tables in shop (postgres):",
+        "orders (table, ~5000 rows): id integer, total numeric",
+        "sales.summary (view): month date"
+    ]
+
+
+def test_digest_is_trimmed_to_budget():
+    schema = {
+        "connector_name": "wide",
+        "connector_type": "postgres",
+        "tables": [
+            {"schema": "public", "name": f"t{i}", "type": "table", "row_estimate": None,
+             "columns": [{"name": f"column_{j}", "type": "text"} for j in range(20)]}
+            for i in range(10)
+        ]
+    }
+
+    digest = render_schema_digest(schema, max_tokens=150)
+
+    assert len(digest) // 4 <= 150
+    assert "more columns" in digest
+    assert digest.splitlines()[-1].endswith("more tables not shown")
@@ -0,0 +1,193 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("crewai")
+pytest.importorskip("langchain")
+
+import task_executor
+from budget import ExecutionBudget
+from cancellation import CancellationToken, ExecutionCancelled
+from payload_cache import PayloadCache
+from task_executor import TaskExecutor
+
+ORDERS_SCHEMA = {
+    "openapi": "3.0.0",
+    "info": {"title": "Orders"},
+    "servers": [{"url": "https://api.example.com"}],
+    "paths": {"/orders": {"get": {"operationId": "listOrders", "summary": "Lists orders."}}}
+}
+
+AGENT_CONFIG = {
+    "role": "Assistant",
+    "goal": "Answer questions about orders",
+    "backstory": "Knows the orders API.",
+    "llmProvider": "stub",
+    "llmModel": "echo",
+    "internalLlmProvider": "stub",
+    "internalLlmModel": "payload"
+}
+
+
+class RecordingHttpClient:
+    def __init__(self):
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url))
+        raise AssertionError("A cancelled tool call must not reach the API")
+
+
+def test_cancel_during_tool_call_stops_the_run(monkeypatch):
+    cancel_token = CancellationToken()
+    http_client = RecordingHttpClient()
+    executor = TaskExecutor(
+        agent_config=AGENT_CONFIG,
+        tools_config=[{"id": "orders", "schema": ORDERS_SCHEMA}],
+        http_client=http_client,
+        cancel_token=cancel_token
+    )
+    observations = []
+
+    class ScriptedCrew:
+        """Main crew calls the orders tool; the cancel lands while the tool's payload agent runs."""
+        def __init__(self, agents, tasks, step_callback=None, **kwargs):
+            self.agents = agents
+            self.step_callback = step_callback
+
+        def kickoff(self):
+            if self.agents[0] is executor.payload_agent:
+                cancel_token.cancel("cancelled by user")
+                return SimpleNamespace(raw='{"payload": null, "endpoint_url": "https://api.example.com/orders"}')
+            self.step_callback(SimpleNamespace(tool="orders", text="I will list the orders"))
+            observations.append(executor.tools[0].func("list orders"))
+            self.step_callback(SimpleNamespace(output="answer built from the tool result"))
+            return SimpleNamespace(raw="answer built from the tool result")
+
+    monkeypatch.setattr(task_executor, "Crew", ScriptedCrew)
+
+    with pytest.raises(ExecutionCancelled):
+        executor.execute_task(description="List my orders", expected_output="The orders")
+
+    # The tool raised instead of handing the agent an error to continue from
+    assert observations == []
+    assert http_client.requests == []
+    executor.close()
+
+
+class OfflineHttpClient:
+    def request(self, method, url, **kwargs):
+        raise ConnectionError("offline")
+
+
+def test_payload_cache_counts_are_kept_per_run(monkeypatch, caplog):
+    executor = TaskExecutor(
+        agent_config=AGENT_CONFIG,
+        tools_config=[{"id": "orders", "schema": ORDERS_SCHEMA}],
+        http_client=OfflineHttpClient(),
+        payload_cache=PayloadCache()
+    )
+    both_called_the_tool = threading.Barrier(2)
+
+    class ToolCallingCrew:
+        def __init__(self, agents, tasks, step_callback=None, **kwargs):
+            self.agents = agents
+            self.tasks = tasks
+
+        def kickoff(self):
+            if self.agents[0] is executor.payload_agent:
+                return SimpleNamespace(raw='{"payload": null, "endpoint_url": "https://api.example.com/orders"}')
+            executor.tools[0].func(self.tasks[0].description.split("'")[1])
+            if threading.current_thread() is not threading.main_thread():
+                both_called_the_tool.wait(timeout=5)
+            return SimpleNamespace(raw="done")
+
+    monkeypatch.setattr(task_executor, "Crew", ToolCallingCrew)
+    # Warms the cache for one input, so the concurrent runs below see one hit and one miss
+    executor.execute_task(description="Run 'cached orders'", expected_output="The orders")
+    caplog.clear()
+
+    runs = [
+        threading.Thread(target=executor.execute_task, kwargs={"description": f"Run '{text}'", "expected_output": "The orders", "budget": ExecutionBudget()})
+        for text in ["cached orders", "fresh orders"]
+    ]
+    for run in runs:
+        run.start()
+    for run in runs:
+        run.join()
+
+    counts = sorted(record.getMessage() for record in caplog.records if record.getMessage().startswith("Payload cache:"))
+    assert counts == ["Payload cache: 0 hits, 1 misses", "Payload cache: 1 hits, 0 misses"]
+    executor.close()
+
+
+def test_payload_prompt_carries_the_operation_digest_instead_of_the_schema(monkeypatch):
+    executor = TaskExecutor(agent_config=AGENT_CONFIG, tools_config=[], http_client=OfflineHttpClient())
+    prompts = []
+
+    class PromptRecordingCrew:
+        def __init__(self, agents, tasks, **kwargs):
+            prompts.append(tasks[0].description)
+
+        def kickoff(self):
+            return SimpleNamespace(raw='{"payload": null, "endpoint_url": "https://api.example.com/orders"}')
+
+    monkeypatch.setattr(task_executor, "Crew", PromptRecordingCrew)
+
+    result = executor.generate_payload("list orders", ORDERS_SCHEMA, {"type": "postgres", "database": "shop", "password": "secret"})
+
+    assert result["endpoint_url"] == "https://api.example.com/orders"
+    assert "Operation:\nGET https://api.example.com/orders\nPurpose: Lists orders.\nNo parameters or body fields." in prompts[0]
+    assert '"openapi"' not in prompts[0] and '"paths"' not in prompts[0]
+    assert "secret" not in prompts[0]
+    executor.close()
+
+
+LIMITED_SCHEMA = {
+    "openapi": "3.0.0",
+    "servers": [{"url": "https://api.example.com"}],
+    "paths": {"/orders": {"get": {"parameters": [{"name": "limit", "in": "query", "required": True, "schema": {"type": "integer", "maximum": 50}}]}}}
+}
+
+
+def scripted_payloads(monkeypatch, *payloads):
+    """Payload agent answers with the given payloads in turn; returns the prompts it was given."""
+    answers = iter(payloads)
+    prompts = []
+
+    class PayloadCrew:
+        def __init__(self, agents, tasks, **kwargs):
+            prompts.append(tasks[0].description)
+
+        def kickoff(self):
+            return SimpleNamespace(raw=f'{{"payload": {next(answers)}, "endpoint_url": "https://api.example.com/orders"}}')
+
+    monkeypatch.setattr(task_executor, "Crew", PayloadCrew)
+    return prompts
+
+
+def test_invalid_payload_is_repaired_with_the_validation_errors(monkeypatch):
+    executor = TaskExecutor(agent_config=AGENT_CONFIG, tools_config=[], http_client=OfflineHttpClient(), payload_cache=PayloadCache())
+    prompts = scripted_payloads(monkeypatch, '{"limit": 500}', '{"limit": 50}')
+
+    result = executor.generate_payload("the last 500 orders", LIMITED_SCHEMA, tool_id="orders")
+
+    assert result["payload"] == {"limit": 50}
+    assert len(prompts) == 2
+    assert "rejected by schema validation:\n- payload.limit: must be <= 50" in prompts[1]
+    assert "rejected" not in prompts[0]
+    executor.close()
+
+
+def test_payload_that_stays_invalid_never_reaches_the_api_or_the_cache(monkeypatch):
+    payload_cache = PayloadCache()
+    executor = TaskExecutor(agent_config=AGENT_CONFIG, tools_config=[], http_client=OfflineHttpClient(), payload_cache=payload_cache)
+    prompts = scripted_payloads(monkeypatch, *['{"limit": "all"}'] * (task_executor.PAYLOAD_REPAIR_ATTEMPTS + 1))
+
+    result = executor.generate_payload("all orders", LIMITED_SCHEMA, tool_id="orders")
+
+    assert result == {"error": "Generated payload failed schema validation: payload.limit: expected integer, got str"}
+    assert len(prompts) == task_executor.PAYLOAD_REPAIR_ATTEMPTS + 1
+    assert payload_cache.stats()["entries"] == 0
+    executor.close()
@@ -0,0 +1,165 @@
+import json
+
+from payload_cache import schema_hash
+from tool_digest import (
+    build_operation_index,
+    connector_summary,
+    merge_headers,
+    operation_index_for,
+    operation_payload_schema,
+    operation_tool_names,
+    render_operation_digest,
+    split_payload
+)
+
+SCHEMA = {
+    "openapi": "3.0.0",
+    "info": {"title": "Orders"},
+    "servers": [{"url": "https://api.example.com"}],
+    "paths": {
+        "/orders/{id}": {
+            "parameters": [{"name": "id", "in": "path", "required": True, "schema": {"type": "string"}}],
+            "get": {
+                "operationId": "getOrder",
+                "parameters": [
+                    {"name": "expand", "in": "query", "schema": {"type": "string"}},
+                    {"name": "X-Tenant", "in": "header", "required": True, "schema": {"type": "string"}},
+                    {"name": "session", "in": "cookie", "schema": {"type": "string"}},
+                    {"name": "Authorization", "in": "header", "schema": {"type": "string"}}
+                ]
+            },
+            "put": {
+                "operationId": "updateOrder",
+                "parameters": [{"name": "X-Request-Id", "in": "header", "schema": {"type": "string"}}],
+                "requestBody": {"content": {"application/json": {"schema": {
+                    "type": "object", "required": ["status"], "properties": {"status": {"type": "string"}}
+                }}}}
+            }
+        }
+    }
+}
+
+
+def operation(operation_id):
+    return next(op for op in build_operation_index(SCHEMA)["operations"] if op["operation_id"] == operation_id)
+
+
+def test_header_and_cookie_parameters_are_indexed_and_required():
+    fields = {(field["name"], field["in"]) for field in operation("getorder")["fields"]}
+    assert ("X-Tenant", "header") in fields and ("session", "cookie") in fields
+    # OpenAPI ignores Accept, Content-Type and Authorization header parameters
+    assert ("Authorization", "header") not in fields
+
+    payload_schema = operation_payload_schema(SCHEMA, "/orders/{id}", "get")
+    assert payload_schema["required"] == ["X-Tenant"]
+    assert {"expand", "X-Tenant", "session"} <= set(payload_schema["properties"])
+
+
+def test_get_payload_sends_header_and_cookie_parameters_outside_the_query():
+    query, body, headers = split_payload(operation("getorder"), {"id": "7", "expand": "items", "X-Tenant": "acme", "session": "abc"})
+
+    assert query == {"expand": "items"}
+    assert body is None
+    assert headers == {"X-Tenant": "acme", "Cookie": "session=abc"}
+
+
+def test_body_payload_sends_header_parameters_outside_the_body():
+    query, body, headers = split_payload(operation("updateorder"), {"status": "shipped", "X-Request-Id": 42})
+
+    assert query == {}
+    assert body == {"status": "shipped"}
+    assert headers == {"X-Request-Id": "42"}
+
+
+def test_tool_auth_headers_win_and_cookies_are_combined():
+    headers = merge_headers({"x-tenant": "from-auth", "Cookie": "auth=1"}, {"X-Tenant": "acme", "Cookie": "session=abc"})
+    assert headers == {"x-tenant": "from-auth", "Cookie": "session=abc; auth=1"}
+
+
+def test_tool_names_stay_unique_after_truncation():
+    prefix = "x" * 70
+    operations = [{"operation_id": f"{prefix}_{suffix}"} for suffix in ["list", "create", "delete"]]
+
+    names = operation_tool_names("api", operations)
+
+    assert len(set(names)) == 3
+    assert all(len(name) <= 64 for name in names)
+    assert names[1].endswith("_2") and names[2].endswith("_3")
+
+
+def test_single_operation_uses_the_tool_name():
+    assert operation_tool_names("orders", [{"operation_id": "getorder"}]) == ["orders"]
+
+
+PETS_SCHEMA = {
+    "openapi": "3.0.0",
+    "info": {"title": "Pets"},
+    "servers": [{"url": "https://{region}.pets.example.com/v1/", "variables": {"region": {"default": "eu", "enum": ["eu", "us"]}}}],
+    "paths": {
+        "/pets": {
+            "post": {
+                "operationId": "createPet",
+                "summary": "Creates a pet. The pet is owned by the caller.",
+                "requestBody": {"required": True, "content": {"application/json": {"schema": {"$ref": "#/components/schemas/NewPet"}}}}
+            }
+        }
+    },
+    "components": {
+        "schemas": {
+            "Named": {"type": "object", "required": ["name"], "properties": {"name": {"type": "string", "maxLength": 40}}},
+            "NewPet": {
+                "allOf": [
+                    {"$ref": "#/components/schemas/Named"},
+                    {"type": "object", "properties": {
+                        "species": {"type": "string", "enum": ["cat", "dog"], "description": "Kind of animal.\n  Used for   vet records."},
+                        "owner": {"type": "object", "required": ["email"], "properties": {"email": {"type": "string", "format": "email"}}}
+                    }}
+                ]
+            }
+        }
+    }
+}
+
+
+def test_digest_resolves_refs_all_of_and_server_variables():
+    digest = build_operation_index(PETS_SCHEMA)["operations"][0]
+
+    assert (digest["method"], digest["url_template"]) == ("POST", "https://eu.pets.example.com/v1/pets")
+    assert digest["summary"] == "Creates a pet."
+    assert digest["server_variables"] == {"region": {"default": "eu", "enum": ["eu", "us"]}}
+    assert digest["fields"] == [
+        {"name": "name", "in": "body", "type": "string", "required": True, "constraints": {"maxLength": 40}},
+        {"name": "species", "in": "body", "type": "string", "required": False, "enum": ["cat", "dog"], "description": "Kind of animal."},
+        {"name": "owner", "in": "body", "type": "object", "required": False},
+        # Required inside an optional parent is optional overall
+        {"name": "owner.email", "in": "body", "type": "string", "required": False, "constraints": {"format": "email"}}
+    ]
+
+
+def test_rendered_digest_is_one_line_per_field_and_much_smaller_than_the_schema():
+    rendered = render_operation_digest(build_operation_index(PETS_SCHEMA)["operations"][0])
+
+    assert rendered.splitlines() == [
+        "POST https://eu.pets.example.com/v1/pets",
+        "Purpose: Creates a pet.",
+        "Server variable region: default eu, one of ['eu', 'us']",
+        "- body name: string, required, maxLength=40",
+        "- body species: string, optional, one of ['cat', 'dog'] (Kind of animal.)",
+        "- body owner: object, optional",
+        "- body owner.email: string, optional, format=email"
+    ]
+    assert len(rendered) < len(json.dumps(PETS_SCHEMA, indent=2)) / 3
+
+
+def test_stored_index_is_used_until_the_schema_changes():
+    stored = {"schema_hash": schema_hash(PETS_SCHEMA), "operations": [{"operation_id": "stored"}]}
+
+    assert operation_index_for({"schema": PETS_SCHEMA, "metadata": {"operation_index": stored}}) is stored
+    edited = {**PETS_SCHEMA, "servers": [{"url": "https://pets.example.com"}]}
+    rebuilt = operation_index_for({"schema": edited, "metadata": {"operation_index": stored}})
+    assert rebuilt["operations"][0]["url_template"] == "https://pets.example.com/pets"
+    assert build_operation_index({"paths": {}}) is None
+
+
+def test_connector_summary_is_one_line_without_empty_fields():
+    assert connector_summary({"type": "postgres", "database": "shop", "schema": None}) == "type=postgres, database=shop"
@@ -0,0 +1,81 @@
+import io
+import json
+
+import pytest
+import requests
+
+import tool_responses
+from artifact_store import ArtifactStore
+from tool_responses import prune_json, read_body, read_tool_response, stream_prune_json
+
+ORDERS = [{"id": number, "note": "n" * 500} for number in range(200)]
+
+
+def response(body: bytes, encoding="utf-8"):
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(body)
+    response.encoding = encoding
+    return response
+
+
+def test_read_body_stops_at_the_cap():
+    body, capped = read_body(response(b"x" * 200_000), max_bytes=100_000)
+
+    assert (len(body), capped) == (100_000, True)
+    assert read_body(response(b"x" * 100_000), max_bytes=100_000) == (b"x" * 100_000, False)
+
+
+def test_small_bodies_are_returned_whole():
+    assert read_tool_response(response(b'{"id": 1}'))["data"] == {"id": 1}
+    text = read_tool_response(response(b"plain text"))
+    assert (text["data"], text["is_json"], text["summarized"]) == ("plain text", False, False)
+
+
+def test_prune_json_keeps_the_shape_of_large_data():
+    assert prune_json({"orders": ORDERS}, max_items=2, max_string=10) == {
+        "orders": [{"id": 0, "note": "nnnnnnnnnn... (500 chars)"}, {"id": 1, "note": "nnnnnnnnnn... (500 chars)"}, "... 198 more items"]
+    }
+    assert prune_json({f"k{i}": i for i in range(4)}, max_keys=2) == {"k0": 0, "k1": 1, "...": "2 more keys"}
+
+
+def test_streamed_preview_matches_the_parsed_one():
+    pytest.importorskip("ijson")
+    body = json.dumps({"orders": ORDERS, "meta": {"total": 200}}).encode()
+
+    assert stream_prune_json(body, max_items=3, max_string=20) == prune_json(json.loads(body), max_items=3, max_string=20)
+
+
+def test_large_body_is_stored_as_an_artifact_and_summarized(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    body = json.dumps(ORDERS).encode()
+
+    result = read_tool_response(response(body), store, "exec-1", "orders", preview_chars=2000)
+
+    summary = result["data"]
+    assert (result["summarized"], result["is_json"], result["capped"]) == (True, True, False)
+    assert summary["size_bytes"] == len(body) and summary["artifact_id"] == result["artifact"]["id"]
+    assert len(json.dumps(summary["preview"])) <= 2000
+    assert summary["preview"][0]["id"] == 0 and summary["preview"][-1].endswith("more items")
+    assert json.loads(store.get("exec-1", summary["artifact_id"])) == ORDERS
+
+
+def test_capped_json_gets_a_preview_of_the_parsed_prefix():
+    pytest.importorskip("ijson")
+    body = json.dumps(ORDERS).encode()
+
+    result = read_tool_response(response(body), max_bytes=5000, inline_bytes=1000)
+
+    assert result["capped"] and result["size"] == 5000
+    assert "(capped)" in result["data"]["note"] and "artifact" not in result["data"]["note"]
+    assert result["is_json"] and result["data"]["preview"][0] == {"id": 0, "note": "n" * 300 + "... (500 chars)"}
+
+
+def test_capped_json_falls_back_to_text_without_ijson(monkeypatch):
+    monkeypatch.setattr(tool_responses, "ijson", None)
+    body = json.dumps(ORDERS).encode()
+
+    result = read_tool_response(response(body), max_bytes=5000, inline_bytes=1000, preview_chars=100)
+
+    assert not result["is_json"]
+    assert result["data"]["preview"] == body[:100].decode()
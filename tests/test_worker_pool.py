@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+from worker_pool import SingleFlight, WorkerPool
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(max_workers=2)
+    yield pool
+    pool.shutdown()
+
+
+def blocked_work(release, result="answer"):
+    def work():
+        release.wait(timeout=5)
+        return result
+    return work
+
+
+def test_concurrent_callers_share_one_execution(pool):
+    flights = SingleFlight(pool)
+    release = threading.Event()
+
+    leader, is_leader = flights.submit("key", blocked_work(release), execution_id="exec-1")
+    follower, follower_is_leader = flights.submit("key", blocked_work(release, "other"), execution_id="exec-2")
+    release.set()
+
+    assert is_leader and not follower_is_leader
+    assert follower is leader and follower["execution_id"] == "exec-1"
+    assert leader["future"].result(timeout=5) == "answer"
+    assert flights.stats()["leaders"] == 1 and flights.stats()["coalesced"] == 1
+
+
+def test_key_is_released_when_the_work_finishes(pool):
+    flights = SingleFlight(pool)
+    flight, _ = flights.submit("key", lambda: "answer")
+    flight["future"].result(timeout=5)
+
+    _, is_leader = flights.submit("key", lambda: "again")
+
+    assert is_leader
+
+
+def test_leave_frees_the_key_once_the_last_waiter_is_gone(pool):
+    flights = SingleFlight(pool)
+    release = threading.Event()
+    flight, _ = flights.submit("key", blocked_work(release), execution_id="exec-1")
+    flights.submit("key", blocked_work(release))
+
+    assert flights.leave("key", flight) == 1
+    # One caller still waits, so a new caller joins the running execution
+    joined, is_leader = flights.submit("key", blocked_work(release))
+    assert not is_leader and joined is flight
+
+    assert flights.leave("key", flight) == 1
+    assert flights.leave("key", flight) == 0
+    assert flights.stats()["in_flight"] == 0
+    fresh, is_leader = flights.submit("key", blocked_work(release), execution_id="exec-2")
+    assert is_leader and fresh is not flight
+    release.set()
+
+
+def test_finished_abandoned_flight_does_not_release_its_successor(pool):
+    flights = SingleFlight(pool)
+    release = threading.Event()
+    successor_release = threading.Event()
+    abandoned, _ = flights.submit("key", blocked_work(release))
+    flights.leave("key", abandoned)
+    successor, _ = flights.submit("key", blocked_work(successor_release))
+
+    release.set()
+    abandoned["future"].result(timeout=5)
+
+    assert flights.submit("key", lambda: None)[0] is successor
+    successor_release.set()
+
+
+def test_drop_releases_a_cancelled_execution(pool):
+    flights = SingleFlight(pool)
+    release = threading.Event()
+    flights.submit("key", blocked_work(release), execution_id="exec-1")
+
+    assert flights.drop("exec-1")
+    assert flights.submit("key", blocked_work(release), execution_id="exec-2")[1]
+    release.set()
@@ -0,0 +1,67 @@
+import pytest
+
+from workflow_dag import evaluate_condition, sink_steps, step_dependencies, validate_workflow_steps
+
+
+def step(step_id, inputs=None, condition=None, agent_id="a1"):
+    return {"id": step_id, "agent_id": agent_id, "inputs": inputs or ["input"], "condition": condition}
+
+
+def test_steps_are_returned_in_topological_order():
+    steps = [
+        step("report", ["summary", "facts"]),
+        step("summary", ["facts"]),
+        step("facts"),
+    ]
+
+    order = validate_workflow_steps(steps)
+
+    assert order.index("facts") < order.index("summary") < order.index("report")
+
+
+def test_condition_source_counts_as_a_dependency():
+    gated = step("escalate", condition={"source": "triage", "operator": "contains", "value": "urgent"})
+
+    assert step_dependencies(gated) == ["triage"]
+    assert validate_workflow_steps([step("triage"), gated]) == ["triage", "escalate"]
+
+
+def test_cycle_is_rejected_with_its_steps():
+    steps = [step("a", ["c"]), step("b", ["a"]), step("c", ["b"]), step("d")]
+
+    with pytest.raises(ValueError, match="cycle between steps: a, b, c"):
+        validate_workflow_steps(steps)
+
+
+def test_self_reference_is_a_cycle():
+    with pytest.raises(ValueError, match="cycle"):
+        validate_workflow_steps([step("a", ["a"])])
+
+
+@pytest.mark.parametrize("steps, message", [
+    ([], "at least one step"),
+    ([step("a"), step("a")], "Duplicate step ids: a"),
+    ([step("input")], "reserved"),
+    ([step("a", ["missing"])], "unknown steps: missing"),
+    ([step("a", agent_id=None)], "no agent_id"),
+    ([step("a", condition={"operator": "matches"})], "unsupported condition operator"),
+])
+def test_invalid_workflows_are_rejected(steps, message):
+    with pytest.raises(ValueError, match=message):
+        validate_workflow_steps(steps)
+
+
+def test_sink_steps_are_the_steps_nothing_depends_on():
+    steps = [step("facts"), step("summary", ["facts"]), step("audit", ["facts"])]
+
+    assert sink_steps(steps) == ["summary", "audit"]
+
+
+def test_conditions_compare_case_insensitively():
+    outputs = {"triage": "Priority: URGENT"}
+
+    assert evaluate_condition({"source": "triage", "operator": "contains", "value": "urgent"}, "", outputs)
+    assert not evaluate_condition({"source": "triage", "operator": "not_contains", "value": "urgent"}, "", outputs)
+    assert evaluate_condition({"operator": "equals", "value": "yes"}, " Yes ", outputs)
+    assert evaluate_condition({"source": "missing", "operator": "empty"}, "", outputs)
+    assert evaluate_condition(None, "", outputs)
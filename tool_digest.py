@@ -0,0 +1,332 @@
+import re
+import logging
+from typing import Optional, Dict, Any, List, Tuple
+
+from payload_cache import schema_hash
+
+logger = logging.getLogger(__name__)
+
+HTTP_METHODS = ["get", "post", "put", "patch", "delete"]
+# Methods whose generated payload is sent as query parameters rather than a JSON body
+QUERY_METHODS = ["get", "delete"]
+CONSTRAINT_KEYS = [
+    "format", "pattern", "minimum", "maximum", "exclusiveMinimum", "exclusiveMaximum",
+    "minLength", "maxLength", "minItems", "maxItems", "multipleOf"
+]
+MAX_FIELD_DEPTH = 3
+# Header parameters OpenAPI says to ignore; they are set from the request itself or the tool's auth
+IGNORED_HEADER_PARAMETERS = ["accept", "content-type", "authorization"]
+# Payload fields sent outside the URL and JSON body
+HEADER_LOCATIONS = ["header", "cookie"]
+MAX_TOOL_NAME_CHARS = 64
+MAX_DESCRIPTION_CHARS = 80
+
+
+def resolve_schema(node: Any, schema: Dict[str, Any], depth: int = 0) -> Dict[str, Any]:
+    """Follows local $ref pointers (#/components/...) and merges allOf members."""
+    if not isinstance(node, dict):
+        return {}
+    ref = node.get("$ref")
+    if isinstance(ref, str) and ref.startswith("#/") and depth < 10:
+        target: Any = schema
+        for part in ref[2:].split("/"):
+            target = target.get(part, {}) if isinstance(target, dict) else {}
+        return resolve_schema(target, schema, depth + 1)
+    if "allOf" in node and depth < 10:
+        merged: Dict[str, Any] = {k: v for k, v in node.items() if k != "allOf"}
+        for member in node["allOf"]:
+            member = resolve_schema(member, schema, depth + 1)
+            merged.setdefault("properties", {}).update(member.get("properties", {}))
+            merged["required"] = list(merged.get("required", [])) + list(member.get("required", []))
+            for key, value in member.items():
+                if key not in ["properties", "required"]:
+                    merged.setdefault(key, value)
+        return merged
+    return node
+
+
+def _type_of(node: Dict[str, Any], schema: Dict[str, Any]) -> str:
+    node_type = node.get("type")
+    if isinstance(node_type, list):
+        node_type = "|".join(str(t) for t in node_type)
+    if node_type == "array":
+        return f"array<{_type_of(resolve_schema(node.get('items', {}), schema), schema)}>"
+    if not node_type:
+        variants = node.get("oneOf") or node.get("anyOf")
+        if variants:
+            return "|".join(_type_of(resolve_schema(v, schema), schema) for v in variants)
+        return "object" if "properties" in node else "any"
+    return node_type
+
+
+def _short(text: Any) -> Optional[str]:
+    if not text:
+        return None
+    text = re.sub(r"\s+", " ", str(text)).strip()
+    first_sentence = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    if len(first_sentence) > MAX_DESCRIPTION_CHARS:
+        first_sentence = first_sentence[:MAX_DESCRIPTION_CHARS - 3].rstrip() + "..."
+    return first_sentence
+
+
+def _field(name: str, location: str, node: Dict[str, Any], required: bool, schema: Dict[str, Any], description: Any = None) -> Dict[str, Any]:
+    field = {"name": name, "in": location, "type": _type_of(node, schema), "required": required}
+    constraints = {key: node[key] for key in CONSTRAINT_KEYS if key in node}
+    if constraints:
+        field["constraints"] = constraints
+    enum = node.get("enum") or resolve_schema(node.get("items", {}), schema).get("enum")
+    if enum:
+        field["enum"] = enum
+    description = _short(description or node.get("description"))
+    if description:
+        field["description"] = description
+    return field
+
+
+def _body_fields(node: Dict[str, Any], schema: Dict[str, Any], prefix: str = "", parent_required: bool = True, depth: int = 0) -> List[Dict[str, Any]]:
+    node = resolve_schema(node, schema)
+    fields = []
+    required = set(node.get("required", []))
+    for name, prop in (node.get("properties") or {}).items():
+        prop = resolve_schema(prop, schema)
+        full_name = f"{prefix}{name}"
+        is_required = parent_required and name in required
+        fields.append(_field(full_name, "body", prop, is_required, schema))
+        # Nested objects are flattened to dotted names so the digest stays one line per field
+        if prop.get("properties") and depth + 1 < MAX_FIELD_DEPTH:
+            fields.extend(_body_fields(prop, schema, f"{full_name}.", is_required, depth + 1))
+    return fields
+
+
+def _server(schema: Dict[str, Any], path_item: Dict[str, Any], operation: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Resolves the base URL (operation, then path, then document servers) with variable defaults
+    substituted, and returns the variables that can be overridden.
+    """
+    servers = operation.get("servers") or path_item.get("servers") or schema.get("servers") or [{}]
+    server = servers[0] if isinstance(servers[0], dict) else {}
+    server_url = server.get("url", "")
+    variables = {}
+    for variable, spec in (server.get("variables") or {}).items():
+        if isinstance(spec, dict) and "default" in spec:
+            server_url = server_url.replace(f"{{{variable}}}", str(spec["default"]))
+            variables[variable] = {key: spec[key] for key in ["default", "enum"] if key in spec}
+    return server_url.rstrip("/"), variables
+
+
+def _operation_id(operation: Dict[str, Any], method: str, path_key: str) -> str:
+    operation_id = operation.get("operationId") or f"{method}_{path_key}"
+    return re.sub(r"[^a-zA-Z0-9]+", "_", operation_id).strip("_").lower()
+
+
+def _operation_parts(schema: Dict[str, Any], path_key: str, method: str) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[tuple, Dict[str, Any]], Dict[str, Any]]:
+    """Returns (path item, operation, parameters by (name, location), request body) with refs resolved."""
+    path_item = resolve_schema(schema["paths"][path_key], schema)
+    operation = next(value for key, value in path_item.items() if key.lower() == method) or {}
+    parameters = {}
+    for parameter in list(path_item.get("parameters") or []) + list(operation.get("parameters") or []):
+        parameter = resolve_schema(parameter, schema)
+        if parameter.get("in") == "header" and str(parameter.get("name", "")).lower() in IGNORED_HEADER_PARAMETERS:
+            continue
+        if parameter.get("name"):
+            # Operation-level parameters override path-level ones with the same name and location
+            parameters[(parameter["name"], parameter.get("in", "query"))] = parameter
+    body = resolve_schema(operation.get("requestBody") or {}, schema)
+    return path_item, operation, parameters, body
+
+
+def build_operation_digest(schema: Dict[str, Any], path_key: str, method: str) -> Dict[str, Any]:
+    """
+    Reduces one operation to what payload generation needs: method, URL template, and its
+    parameters (by location) and JSON body fields with type, required flag, constraints and enums.
+    """
+    path_item, operation, parameters, body = _operation_parts(schema, path_key, method)
+
+    fields = []
+    for (name, location), parameter in parameters.items():
+        node = resolve_schema(parameter.get("schema", {}), schema)
+        fields.append(_field(name, location, node, bool(parameter.get("required")) or location == "path", schema, parameter.get("description")))
+
+    body_schema = body.get("content", {}).get("application/json", {}).get("schema")
+    if body_schema:
+        fields.extend(_body_fields(body_schema, schema, parent_required=bool(body.get("required", True))))
+
+    server_url, server_variables = _server(schema, path_item, operation)
+    digest = {
+        "operation_id": _operation_id(operation, method, path_key),
+        "method": method.upper(),
+        "path": path_key,
+        "url_template": f"{server_url}{path_key}",
+        "summary": _short(operation.get("summary") or operation.get("description")),
+        "has_body": bool(body_schema),
+        "fields": fields
+    }
+    if server_variables:
+        digest["server_variables"] = server_variables
+    return digest
+
+
+def operation_payload_schema(schema: Dict[str, Any], path_key: str, method: str) -> Dict[str, Any]:
+    """
+    JSON Schema of the flat payload the generator returns for an operation: query, header and
+    cookie parameters plus JSON body properties in one object. Nested $refs are left for the
+    validator to resolve.
+    """
+    _, _, parameters, body = _operation_parts(schema, path_key, method)
+    properties: Dict[str, Any] = {}
+    required: List[str] = []
+    for (name, location), parameter in parameters.items():
+        if location in ["query", "path"] + HEADER_LOCATIONS:
+            properties[name] = parameter.get("schema", {})
+            # Path parameters are filled into the URL, so the payload may omit them
+            if location != "path" and parameter.get("required"):
+                required.append(name)
+
+    payload_schema: Dict[str, Any] = {"type": "object", "properties": properties}
+    body_schema = resolve_schema(body.get("content", {}).get("application/json", {}).get("schema"), schema)
+    if body_schema:
+        if "properties" not in body_schema and body_schema.get("type") not in [None, "object"]:
+            # A non-object body (e.g. an array) is the payload itself
+            return body_schema if not properties else payload_schema
+        properties.update(body_schema.get("properties", {}))
+        if body.get("required", True):
+            required.extend(body_schema.get("required", []))
+        if body_schema.get("additionalProperties") is False:
+            payload_schema["additionalProperties"] = False
+    if required:
+        payload_schema["required"] = required
+    else:
+        payload_schema["nullable"] = True
+    return payload_schema
+
+
+def build_operation_index(schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Indexes every operation (GET, POST, PUT, PATCH, DELETE on every path) of a tool's OpenAPI
+    document, in document order. Returns None when the schema has no supported operation.
+    """
+    if not isinstance(schema, dict):
+        return None
+    operations = []
+    seen_ids = set()
+    for path_key, path_item in (schema.get("paths") or {}).items():
+        if not isinstance(path_item, dict):
+            continue
+        for method in [m.lower() for m in path_item if m.lower() in HTTP_METHODS]:
+            try:
+                digest = build_operation_digest(schema, path_key, method)
+            except Exception as e:
+                logger.warning(f"Could not index operation {method.upper()} {path_key}: {e}")
+                continue
+            # operationIds should be unique, but generated tool names must be
+            while digest["operation_id"] in seen_ids:
+                digest["operation_id"] += "_"
+            seen_ids.add(digest["operation_id"])
+            operations.append(digest)
+    if not operations:
+        return None
+    return {"schema_hash": schema_hash(schema), "operations": operations}
+
+
+def render_operation_digest(digest: Dict[str, Any]) -> str:
+    """Renders an operation digest as compact prompt text, one line per field."""
+    lines = [f"{digest['method']} {digest['url_template']}"]
+    if digest.get("summary"):
+        lines.append(f"Purpose: {digest['summary']}")
+    for variable, spec in (digest.get("server_variables") or {}).items():
+        allowed = f", one of {spec['enum']}" if spec.get("enum") else ""
+        lines.append(f"Server variable {variable}: default {spec.get('default')}{allowed}")
+    if not digest["fields"]:
+        lines.append("No parameters or body fields.")
+    for field in digest["fields"]:
+        details = [field["type"], "required" if field["required"] else "optional"]
+        details.extend(f"{key}={value}" for key, value in field.get("constraints", {}).items())
+        if field.get("enum"):
+            details.append(f"one of {field['enum']}")
+        line = f"- {field['in']} {field['name']}: {', '.join(str(d) for d in details)}"
+        if field.get("description"):
+            line += f" ({field['description']})"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def operation_index_for(tool_config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Returns the tool's precomputed operation index, rebuilding it if missing or stale for the current schema."""
+    schema = tool_config.get("schema") or {}
+    index = (tool_config.get("metadata") or {}).get("operation_index")
+    if index and index.get("schema_hash") == schema_hash(schema):
+        return index
+    return build_operation_index(schema)
+
+
+def operation_tool_name(tool_name: str, operation: Dict[str, Any]) -> str:
+    return re.sub(r"[^a-z0-9_]+", "_", f"{tool_name}_{operation['operation_id']}".lower())[:MAX_TOOL_NAME_CHARS]
+
+
+def operation_tool_names(tool_name: str, operations: List[Dict[str, Any]]) -> List[str]:
+    """
+    Tool names for a schema's operations, in order: the tool name alone for a single operation,
+    else one name per operation. Names are cut to MAX_TOOL_NAME_CHARS and then deduplicated,
+    since operation ids that only differ past the cut would otherwise collide.
+    """
+    if len(operations) == 1:
+        return [tool_name]
+    names = []
+    for operation in operations:
+        name = operation_tool_name(tool_name, operation)
+        suffix = 2
+        while name in names:
+            tail = f"_{suffix}"
+            name = f"{operation_tool_name(tool_name, operation)[:MAX_TOOL_NAME_CHARS - len(tail)]}{tail}"
+            suffix += 1
+        names.append(name)
+    return names
+
+
+def operation_tool_description(tool_title: str, operation: Dict[str, Any]) -> str:
+    """Tool description the agent routes on: the operation, its purpose and its required inputs."""
+    description = f"Calls API: {tool_title} - {operation['method']} {operation['path']}."
+    if operation.get("summary"):
+        description += f" {operation['summary'].rstrip('.')}."
+    required = [field["name"] for field in operation["fields"] if field["required"]]
+    if required:
+        description += f" Requires: {', '.join(required)}."
+    return description
+
+
+def split_payload(operation: Dict[str, Any], payload: Any) -> Tuple[Dict[str, Any], Any, Dict[str, str]]:
+    """
+    Splits a generated payload into (query parameters, JSON body, headers) for the operation's method.
+    Header parameters become headers and cookie parameters one Cookie header; path parameters
+    are already part of the endpoint URL and are dropped.
+    """
+    if not isinstance(payload, dict):
+        return {}, payload, {}
+    locations = {field["name"]: field["in"] for field in operation["fields"] if field["in"] in ["path"] + HEADER_LOCATIONS}
+    headers = {key: str(value) for key, value in payload.items() if locations.get(key) == "header" and value is not None}
+    cookies = [f"{key}={value}" for key, value in payload.items() if locations.get(key) == "cookie" and value is not None]
+    if cookies:
+        headers["Cookie"] = "; ".join(cookies)
+    payload = {key: value for key, value in payload.items() if key not in locations}
+    if operation["method"].lower() in QUERY_METHODS:
+        return payload, None, headers
+    query_names = {field["name"] for field in operation["fields"] if field["in"] == "query"}
+    query = {key: value for key, value in payload.items() if key in query_names}
+    body = {key: value for key, value in payload.items() if key not in query_names}
+    return query, body or None, headers
+
+
+def merge_headers(tool_headers: Optional[Dict[str, Any]], parameter_headers: Dict[str, str]) -> Dict[str, Any]:
+    """Request headers from the tool's auth headers and the payload's header parameters; auth wins, cookies are combined."""
+    headers = dict(parameter_headers)
+    for name, value in (tool_headers or {}).items():
+        headers.pop(next((key for key in headers if key.lower() == name.lower()), None), None)
+        if name.lower() == "cookie" and parameter_headers.get("Cookie"):
+            value = f"{parameter_headers['Cookie']}; {value}"
+        headers[name] = value
+    return headers
+
+
+def connector_summary(connector_description: Dict[str, Any]) -> str:
+    """One-line form of describe_connector() output for prompts."""
+    return ", ".join(f"{key}={value}" for key, value in connector_description.items() if value)
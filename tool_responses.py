@@ -0,0 +1,192 @@
+import io
+import os
+import json
+import uuid
+import logging
+from typing import Optional, Dict, Any, Tuple
+
+import requests
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+# Bodies are read up to TOOL_RESPONSE_MAX_BYTES; anything over TOOL_RESPONSE_INLINE_BYTES is stored
+# as an artifact and the agent only sees a pruned preview of at most TOOL_RESPONSE_PREVIEW_CHARS
+TOOL_RESPONSE_MAX_BYTES = int(os.getenv("TOOL_RESPONSE_MAX_BYTES", str(20 * 1024 * 1024)))
+TOOL_RESPONSE_INLINE_BYTES = int(os.getenv("TOOL_RESPONSE_INLINE_BYTES", str(16 * 1024)))
+TOOL_RESPONSE_PREVIEW_CHARS = int(os.getenv("TOOL_RESPONSE_PREVIEW_CHARS", "4000"))
+PREVIEW_MAX_ITEMS = 20
+PREVIEW_MAX_KEYS = 50
+PREVIEW_MAX_STRING = 300
+CHUNK_SIZE = 64 * 1024
+
+
+def read_body(response: requests.Response, max_bytes: int = TOOL_RESPONSE_MAX_BYTES) -> Tuple[bytes, bool]:
+    """Reads a (streamed) response body up to max_bytes; returns the bytes and whether it was capped."""
+    chunks, size, capped = [], 0, False
+    try:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            if size + len(chunk) > max_bytes:
+                chunks.append(chunk[:max_bytes - size])
+                capped = True
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+    finally:
+        response.close()
+    return b"".join(chunks), capped
+
+
+def _clip(value: Any, max_string: int) -> Any:
+    if isinstance(value, str) and len(value) > max_string:
+        return f"{value[:max_string]}... ({len(value)} chars)"
+    return value
+
+
+def prune_json(value: Any, max_items: int = PREVIEW_MAX_ITEMS, max_keys: int = PREVIEW_MAX_KEYS, max_string: int = PREVIEW_MAX_STRING) -> Any:
+    """Keeps the first items of arrays and keys of objects, clipping long strings, to show the shape of large data."""
+    if isinstance(value, list):
+        pruned = [prune_json(item, max_items, max_keys, max_string) for item in value[:max_items]]
+        if len(value) > max_items:
+            pruned.append(f"... {len(value) - max_items} more items")
+        return pruned
+    if isinstance(value, dict):
+        items = list(value.items())
+        pruned = {key: prune_json(item, max_items, max_keys, max_string) for key, item in items[:max_keys]}
+        if len(items) > max_keys:
+            pruned["..."] = f"{len(items) - max_keys} more keys"
+        return pruned
+    return _clip(value, max_string)
+
+
+def stream_prune_json(body: bytes, max_items: int = PREVIEW_MAX_ITEMS, max_keys: int = PREVIEW_MAX_KEYS, max_string: int = PREVIEW_MAX_STRING) -> Any:
+    """
+    Builds the prune_json() preview from ijson parse events without materializing the document,
+    so memory stays proportional to the preview. A capped (incomplete) body yields the prefix
+    parsed so far. Raises ValueError if the body is not JSON.
+    """
+    root, stack, skip = None, [], 0
+
+    def add(value) -> bool:
+        nonlocal root
+        if not stack:
+            root = value
+            return True
+        frame = stack[-1]
+        frame["count"] += 1
+        limit = max_items if isinstance(frame["value"], list) else max_keys
+        if frame["count"] > limit:
+            return False
+        if isinstance(frame["value"], list):
+            frame["value"].append(value)
+        else:
+            frame["value"][frame["key"]] = value
+        return True
+
+    try:
+        for _, event, value in ijson.parse(io.BytesIO(body), use_float=True):
+            if skip:
+                if event in ("start_map", "start_array"):
+                    skip += 1
+                elif event in ("end_map", "end_array"):
+                    skip -= 1
+                continue
+            if event == "map_key":
+                stack[-1]["key"] = value
+            elif event in ("start_map", "start_array"):
+                container = {} if event == "start_map" else []
+                if add(container):
+                    stack.append({"value": container, "count": 0, "key": None})
+                else:
+                    skip = 1
+            elif event in ("end_map", "end_array"):
+                frame = stack.pop()
+                if isinstance(frame["value"], list) and frame["count"] > max_items:
+                    frame["value"].append(f"... {frame['count'] - max_items} more items")
+                elif isinstance(frame["value"], dict) and frame["count"] > max_keys:
+                    frame["value"]["..."] = f"{frame['count'] - max_keys} more keys"
+            else:
+                add(_clip(value, max_string))
+    except ijson.common.IncompleteJSONError:
+        if root is None:
+            raise ValueError("Response body is not JSON")
+    except ijson.common.JSONError as e:
+        raise ValueError(f"Response body is not JSON: {e}")
+    return root
+
+
+def json_preview(body: bytes, capped: bool, preview_chars: int = TOOL_RESPONSE_PREVIEW_CHARS) -> Any:
+    """Pruned preview of a large JSON body, shrunk until it fits preview_chars. Raises ValueError if not JSON."""
+    if ijson is not None:
+        preview = stream_prune_json(body)
+    elif capped:
+        # Without ijson a capped body cannot be parsed
+        raise ValueError("Response body was capped before the end of the JSON document")
+    else:
+        preview = prune_json(json.loads(body))
+    max_items, max_string = PREVIEW_MAX_ITEMS, PREVIEW_MAX_STRING
+    while len(json.dumps(preview, ensure_ascii=False, default=str)) > preview_chars and (max_items > 1 or max_string > 40):
+        max_items, max_string = max(1, max_items // 2), max(40, max_string // 2)
+        preview = prune_json(preview, max_items, max(max_items, 5), max_string)
+    return preview
+
+
+def decode_body(body: bytes, encoding: Optional[str]) -> str:
+    try:
+        return body.decode(encoding or "utf-8", errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+def read_tool_response(
+    response: requests.Response,
+    artifact_store=None,
+    execution_id: Optional[str] = None,
+    artifact_key: str = "tool-response",
+    max_bytes: int = TOOL_RESPONSE_MAX_BYTES,
+    inline_bytes: int = TOOL_RESPONSE_INLINE_BYTES,
+    preview_chars: int = TOOL_RESPONSE_PREVIEW_CHARS
+) -> Dict[str, Any]:
+    """
+    Reads a tool response with a byte cap and returns {"data", "is_json", "summarized", "size", "capped", "artifact"}.
+    Small bodies are returned parsed as before. Large bodies are stored whole (up to the cap) as an
+    execution artifact when a store is given, and "data" becomes a bounded summary with a pruned
+    preview and the artifact id, fit for the prompt and the logs.
+    """
+    body, capped = read_body(response, max_bytes)
+    if len(body) <= inline_bytes and not capped:
+        try:
+            return {"data": json.loads(body) if body else None, "is_json": True, "summarized": False, "size": len(body), "capped": False, "artifact": None}
+        except ValueError:
+            return {"data": decode_body(body, response.encoding), "is_json": False, "summarized": False, "size": len(body), "capped": False, "artifact": None}
+
+    text = decode_body(body, response.encoding)
+    artifact = None
+    if artifact_store is not None and execution_id:
+        try:
+            artifact = artifact_store.put(execution_id, f"{artifact_key}:{uuid.uuid4().hex}", text)
+        except Exception as e:
+            logger.warning(f"Could not store tool response artifact for execution {execution_id}: {e}")
+
+    summary = {
+        "truncated": True,
+        "size_bytes": len(body),
+        "body_capped": capped,
+        "note": (
+            f"Response was {len(body)} bytes{' (capped)' if capped else ''}; only a preview is shown."
+            + (f" Full body stored as artifact {artifact['id']}." if artifact else "")
+        )
+    }
+    if artifact:
+        summary["artifact_id"] = artifact["id"]
+    try:
+        summary["preview"] = json_preview(body, capped, preview_chars)
+        is_json = True
+    except ValueError:
+        summary["preview"] = text[:preview_chars]
+        is_json = False
+    return {"data": summary, "is_json": is_json, "summarized": True, "size": len(body), "capped": capped, "artifact": artifact}
@@ -0,0 +1,175 @@
+import os
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+AGENT_WORKERS = int(os.getenv("AGENT_WORKERS", "8"))
+
+
+class WorkerPool:
+    """
+    Shared thread pool for blocking agent executions (CrewAI kickoff, tool calls), so request
+    handlers await a future instead of blocking the event loop. Tracks running and queued work.
+    Background work (scheduled runs) goes through submit_background() and only starts on an idle
+    worker, so it never queues ahead of interactive requests.
+    """
+    def __init__(self, max_workers: int = AGENT_WORKERS, name: str = "agent-worker"):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._finished = 0
+        self._background = deque()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self._lock:
+            self._submitted += 1
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def submit_background(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queues low-priority work; it is handed to the pool once a worker is idle."""
+        future = Future()
+        with self._lock:
+            self._background.append((future, fn, args, kwargs))
+        self._dispatch_background()
+        return future
+
+    def _dispatch_background(self):
+        while True:
+            with self._lock:
+                if not self._background or self._submitted - self._finished >= self.max_workers:
+                    return
+                future, fn, args, kwargs = self._background.popleft()
+            # Cancelled while it waited for a worker
+            if not future.set_running_or_notify_cancel():
+                continue
+            self.submit(_run_into, future, fn, args, kwargs)
+
+    def _on_done(self, future: Future):
+        with self._lock:
+            self._finished += 1
+        self._dispatch_background()
+
+    def shutdown(self):
+        with self._lock:
+            background, self._background = list(self._background), deque()
+        for future, _, _, _ in background:
+            future.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            outstanding = self._submitted - self._finished
+            return {
+                "max_workers": self.max_workers,
+                "running": min(outstanding, self.max_workers),
+                "queued": max(0, outstanding - self.max_workers),
+                "background_queued": len(self._background),
+                "completed": self._finished
+            }
+
+
+def _run_into(future: Future, fn: Callable, args, kwargs):
+    try:
+        future.set_result(fn(*args, **kwargs))
+    except BaseException as e:
+        future.set_exception(e)
+
+
+def when_all_done(futures: Iterable[Future], callback: Callable[[], None]):
+    """Calls callback once every future has finished (or been cancelled); at once if they all have."""
+    remaining = [future for future in futures if not future.done()]
+    if not remaining:
+        callback()
+        return
+    state = {"left": len(remaining)}
+    lock = threading.Lock()
+
+    def on_done(_):
+        with lock:
+            state["left"] -= 1
+            last = state["left"] == 0
+        if last:
+            callback()
+
+    for future in remaining:
+        future.add_done_callback(on_done)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key onto one execution. The first caller (the leader)
+    submits the work; callers arriving while it is in flight receive the same future together
+    with the leader's execution metadata. The key is released as soon as the work finishes, or
+    earlier when every waiting caller has left or the execution was cancelled.
+    """
+    def __init__(self, pool: WorkerPool):
+        self.pool = pool
+        self._inflight: Dict[Hashable, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def submit(
+        self,
+        key: Hashable,
+        fn: Callable,
+        execution_id: Optional[str] = None,
+        log_url: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Returns (flight, is_leader); flight holds future, execution_id, log_url, followers and waiting."""
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is not None:
+                flight["followers"] += 1
+                flight["waiting"] += 1
+                self.coalesced += 1
+                return flight, False
+            flight = {"execution_id": execution_id, "log_url": log_url, "followers": 0, "waiting": 1}
+            self._inflight[key] = flight
+            self.leaders += 1
+        try:
+            flight["future"] = self.pool.submit(fn)
+        except Exception:
+            with self._lock:
+                self._inflight.pop(key, None)
+            raise
+        flight["future"].add_done_callback(lambda _: self._release(key, flight))
+        return flight, True
+
+    def _release(self, key: Hashable, flight: Dict[str, Any]):
+        with self._lock:
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+        if flight["followers"]:
+            logger.info(f"Execution {flight['execution_id']} served {flight['followers']} coalesced requests")
+
+    def leave(self, key: Hashable, flight: Dict[str, Any]) -> int:
+        """
+        A waiting caller went away (e.g. its client disconnected); returns how many callers still
+        wait. Once none do, the key is released so new callers start a fresh execution.
+        """
+        with self._lock:
+            flight["waiting"] -= 1
+            if flight["waiting"] <= 0 and self._inflight.get(key) is flight:
+                del self._inflight[key]
+            return flight["waiting"]
+
+    def drop(self, execution_id: str) -> bool:
+        """Releases the key of a (cancelled) execution so no new caller joins it."""
+        with self._lock:
+            for key, flight in list(self._inflight.items()):
+                if flight["execution_id"] == execution_id:
+                    del self._inflight[key]
+                    return True
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"in_flight": len(self._inflight), "leaders": self.leaders, "coalesced": self.coalesced}
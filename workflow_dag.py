@@ -0,0 +1,99 @@
+from typing import Any, Dict, List, Optional
+
+# Reserved input source that refers to the original user input rather than a step output
+USER_INPUT_SOURCE = "input"
+
+CONDITION_OPERATORS = ["contains", "not_contains", "equals", "not_equals", "empty", "not_empty"]
+
+
+def step_dependencies(step: Dict[str, Any]) -> List[str]:
+    """Returns the upstream step ids a workflow step waits on (inputs plus its condition source)."""
+    dependencies = [source for source in step.get("inputs") or [] if source != USER_INPUT_SOURCE]
+    condition = step.get("condition") or {}
+    source = condition.get("source", USER_INPUT_SOURCE)
+    if source != USER_INPUT_SOURCE and source not in dependencies:
+        dependencies.append(source)
+    return dependencies
+
+
+def validate_workflow_steps(steps: List[Dict[str, Any]]) -> List[str]:
+    """
+    Validates a workflow DAG and returns its step ids in topological order.
+    Raises ValueError for duplicate ids, unknown references, bad conditions or cycles.
+    """
+    if not steps:
+        raise ValueError("Workflow must contain at least one step")
+
+    step_ids = [step.get("id") for step in steps]
+    if any(not step_id for step_id in step_ids):
+        raise ValueError("Every workflow step needs an id")
+    if USER_INPUT_SOURCE in step_ids:
+        raise ValueError(f"'{USER_INPUT_SOURCE}' is reserved for the user input and cannot be a step id")
+    duplicates = sorted({step_id for step_id in step_ids if step_ids.count(step_id) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate step ids: {', '.join(duplicates)}")
+
+    known = set(step_ids)
+    for step in steps:
+        if not step.get("agent_id"):
+            raise ValueError(f"Step '{step['id']}' has no agent_id")
+        condition = step.get("condition")
+        if condition and condition.get("operator") not in CONDITION_OPERATORS:
+            raise ValueError(f"Step '{step['id']}' has unsupported condition operator '{condition.get('operator')}'")
+        unknown = [source for source in step_dependencies(step) if source not in known]
+        if unknown:
+            raise ValueError(f"Step '{step['id']}' references unknown steps: {', '.join(unknown)}")
+
+    # Kahn's algorithm; anything left unvisited sits on a cycle
+    dependencies = {step["id"]: step_dependencies(step) for step in steps}
+    in_degree = {step_id: len(deps) for step_id, deps in dependencies.items()}
+    dependents = {step_id: [] for step_id in dependencies}
+    for step_id, deps in dependencies.items():
+        for dep in deps:
+            dependents[dep].append(step_id)
+
+    ready = [step_id for step_id in step_ids if in_degree[step_id] == 0]
+    order = []
+    while ready:
+        step_id = ready.pop(0)
+        order.append(step_id)
+        for dependent in dependents[step_id]:
+            in_degree[dependent] -= 1
+            if in_degree[dependent] == 0:
+                ready.append(dependent)
+
+    if len(order) != len(step_ids):
+        cyclic = [step_id for step_id in step_ids if step_id not in order]
+        raise ValueError(f"Workflow contains a cycle between steps: {', '.join(cyclic)}")
+    return order
+
+
+def sink_steps(steps: List[Dict[str, Any]]) -> List[str]:
+    """Returns ids of steps no other step depends on, in declaration order."""
+    used = {dep for step in steps for dep in step_dependencies(step)}
+    return [step["id"] for step in steps if step["id"] not in used]
+
+
+def evaluate_condition(condition: Optional[Dict[str, Any]], user_input: str, outputs: Dict[str, str]) -> bool:
+    """Evaluates a step condition against the user input or an upstream step output."""
+    if not condition:
+        return True
+    source = condition.get("source", USER_INPUT_SOURCE)
+    text = user_input if source == USER_INPUT_SOURCE else outputs.get(source, "")
+    text = (text or "").strip().lower()
+    value = str(condition.get("value", "")).strip().lower()
+    operator = condition.get("operator", "contains")
+
+    if operator == "contains":
+        return value in text
+    if operator == "not_contains":
+        return value not in text
+    if operator == "equals":
+        return text == value
+    if operator == "not_equals":
+        return text != value
+    if operator == "empty":
+        return not text
+    if operator == "not_empty":
+        return bool(text)
+    return False